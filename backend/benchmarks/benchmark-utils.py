@@ -0,0 +1,67 @@
+"""
+VeriCrop FinBridge - Benchmark Utilities
+Shared helpers for the backend benchmark scripts: loading the Lambda modules
+(whose file names are not valid Python identifiers) and printing reports
+"""
+
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_SRC = Path(__file__).resolve().parent.parent / 'src'
+
+# Lambda modules create boto3 clients at import time, which needs a region
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-south-1')
+
+
+def load_lambda_module(domain, name):
+    """
+    Import a Lambda module such as ('forensic-validation', 'solar-azimuth-calculator')
+    """
+    domain_dir = str(BACKEND_SRC / domain)
+    if domain_dir not in sys.path:
+        sys.path.insert(0, domain_dir)
+    return importlib.import_module(name)
+
+
+def print_banner(title):
+    """
+    Print a section banner in the style of the other VeriCrop test scripts
+    """
+    print("\n" + "=" * 70)
+    print(title.upper())
+    print("=" * 70)
+
+
+def summarize_latencies(latencies_ms):
+    """
+    Mean/p50/p95/p99/max of a list of latencies in milliseconds
+    """
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    if latencies.size == 0:
+        return {}
+    return {
+        'count': int(latencies.size),
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+    }
+
+
+def print_latency_summary(label, latencies_ms):
+    """
+    Print the latency summary for one measured path
+    """
+    stats = summarize_latencies(latencies_ms)
+    if not stats:
+        print(f"{label}: no samples")
+        return stats
+    print(f"{label}: n={stats['count']}  mean={stats['mean_ms']:.3f} ms  "
+          f"p50={stats['p50_ms']:.3f} ms  p95={stats['p95_ms']:.3f} ms  "
+          f"p99={stats['p99_ms']:.3f} ms  max={stats['max_ms']:.3f} ms")
+    return stats
@@ -0,0 +1,129 @@
+"""
+VeriCrop FinBridge - Bridge Loan Batch Benchmark
+================================================
+
+Disaster-day surge: issues bridge loans for many certificates against an
+in-memory DynamoDB stand-in, one put_item per loan (the single-claim
+handler's path) vs the batch entry point's chunked conditional
+TransactWriteItems, at a simulated per-request latency and with part of
+the transactions throttled (cancelled with ThrottlingError reasons, or
+rejected outright with a ThrottlingException). Disbursement jobs go to an
+in-memory SQS stand-in. Reports loans/sec, requests made and write units
+per loan: a transactional put costs 2 WCU where a BatchWriteItem put costs
+1, the price of the write condition. Every approved loan must be in the
+table. Two overlapping calls of the same batch must issue each loan once
+and queue one job per loan.
+
+Usage:
+    python bridge-loan-batch-benchmark.py --loans 10000 --latency-ms 10
+"""
+
+import argparse
+import importlib
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+
+
+def make_certificates(count, seed=0):
+    rng = random.Random(seed)
+    return [{'certificate_id': f'CERT-SURGE-{i:06d}',
+             'damage_amount': round(rng.uniform(5000, 80000), 2),
+             'farmer_id': f'FARMER-{rng.randrange(count):06d}',
+             'farmer_upi': f'farmer{i}@upi'} for i in range(count)]
+
+
+def use_table(latency_ms, unprocessed_rate=0.0):
+    db = local_aws.LocalDynamoDB(latency_ms=latency_ms, unprocessed_rate=unprocessed_rate)
+    calculator.table = db.Table('vericrop-claims')
+    calculator.sqs = local_aws.LocalSQSClient(latency_ms=latency_ms)
+    calculator.DISBURSEMENT_QUEUE_URL = calculator.sqs.create_queue(QueueName='vericrop-disbursements')['QueueUrl']
+    calculator.RECENT_LOANS.clear()
+    return db
+
+
+def reject_transactions(db, rate, seed=0):
+    """
+    Make a share of TransactWriteItems calls fail with a top-level
+    ThrottlingException, as DynamoDB rejects a request over the table's rate
+    """
+    rng = random.Random(seed)
+    transact = db.meta.client.transact_write_items
+
+    def throttled(**kwargs):
+        if rng.random() < rate:
+            db._wait()
+            db.unprocessed += len(kwargs['TransactItems'])
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                              'TransactWriteItems')
+        return transact(**kwargs)
+
+    db.meta.client.transact_write_items = throttled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk bridge-loan issuance')
+    parser.add_argument('--loans', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=10, help='Simulated DynamoDB request latency')
+    parser.add_argument('--single-loans', type=int, default=500, help='Loans for the one-put-per-loan baseline')
+    args = parser.parse_args()
+    calculator.BATCH_RETRY_BASE_SECONDS = args.latency_ms / 1000
+
+    certificates = make_certificates(args.loans)
+    utils.print_banner(f'{args.loans} certificates, DynamoDB stand-in at {args.latency_ms:.0f} ms per request')
+
+    db = use_table(args.latency_ms)
+    start = time.perf_counter()
+    for certificate in certificates[:args.single_loans]:
+        calculator.lambda_handler(certificate, None)
+    elapsed = time.perf_counter() - start
+    print(f"put_item per loan ({args.single_loans} loans):       {args.single_loans / elapsed:8.0f} loans/s, "
+          f"{db.requests} requests, {db.write_units / args.single_loans:.1f} WCU/loan")
+
+    for unprocessed_rate, rejected_rate in ((0.0, 0.0), (0.1, 0.0), (0.3, 0.0), (0.0, 0.3)):
+        db = use_table(args.latency_ms, unprocessed_rate)
+        reject_transactions(db, rejected_rate)
+        label = (f"{rejected_rate:4.0%} rejected (ThrottlingException)" if rejected_rate else
+                 f"{unprocessed_rate:4.0%} of transactions throttled")
+        start = time.perf_counter()
+        body = json.loads(calculator.batch_lambda_handler({'certificates': certificates}, None)['body'])
+        elapsed = time.perf_counter() - start
+        stored = db.items('vericrop-claims')
+        approved = [r for r in body['results'] if r['status'] == 'APPROVED']
+        missing = sum(r['loan_id'] not in stored for r in approved)
+        print(f"batch, {label}: {args.loans / elapsed:8.0f} loans/s, "
+              f"{db.requests} requests ({db.unprocessed} items resent), {db.write_units / args.loans:.1f} WCU/loan, "
+              f"write {body['write_seconds']:.2f} s, {body['summary']}, {missing} approved loans missing")
+
+    # Overlapping calls of the same batch: each loan is issued by one of them
+    db = use_table(args.latency_ms)
+    overlap = make_certificates(200, seed=1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bodies = list(executor.map(lambda _: json.loads(calculator.batch_lambda_handler(
+            {'certificates': overlap}, None)['body']), range(2)))
+    fresh = sum(not result['replayed'] for body in bodies for result in body['results'])
+    print(f"\ntwo overlapping batches of 200: {[body['summary']['APPROVED'] for body in bodies]} approved, "
+          f"{fresh} issued (not replayed), {calculator.sqs.sent} jobs queued, "
+          f"{len(db.items('vericrop-claims'))} loans stored, {db.conditional_failures} caught by the write condition")
+
+    # Validation: bad and repeated certificates are rejected, the rest issued
+    db = use_table(0)
+    mixed = make_certificates(6) + [{'certificate_id': 'CERT-SURGE-000001', 'damage_amount': 1000, 'farmer_id': 'F'},
+                                    {'certificate_id': 'CERT-BAD-1', 'damage_amount': -5, 'farmer_id': 'F'},
+                                    {'certificate_id': 'CERT-BAD-2', 'damage_amount': 'nan', 'farmer_id': 'F'},
+                                    {'certificate_id': 'CERT-BAD-3', 'damage_amount': 1000}]
+    body = json.loads(calculator.batch_lambda_handler({'certificates': mixed}, None)['body'])
+    print(f"\nvalidation: {body['summary']}")
+    for result in body['results'][6:]:
+        print(f"  {result['certificate_id']}: {result['status']} - {result['error']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+VeriCrop FinBridge - Bridge Loan Idempotency Benchmark
+======================================================
+
+Repeated submissions of the same certificate against in-memory DynamoDB and
+SQS stand-ins with a simulated request latency: first approval, retries on
+the warm container (recent-loan cache; the loan re-read while its
+disbursement is pending), a retry on a fresh container (conditional write
+fails, stored loan read back), concurrent duplicate submissions and a
+retried batch. A disbursement worker pool drains the queue between rounds.
+Counts gateway calls and distinct disbursement references per certificate;
+both must stay at one.
+
+Usage:
+    python bridge-loan-idempotency-benchmark.py --loans 200 --latency-ms 5
+"""
+
+import argparse
+import importlib
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+worker = utils.load_lambda_module('financial-automation', 'disbursement-worker')
+
+GATEWAY_CALLS = defaultdict(list)
+GATEWAY_LOCK = threading.Lock()
+disburse_loan = calculator.disburse_loan
+
+
+def counting_disburse_loan(amount, upi_id, idempotency_key=None):
+    reference = disburse_loan(amount, upi_id, idempotency_key=idempotency_key)
+    with GATEWAY_LOCK:
+        GATEWAY_CALLS[idempotency_key].append(reference)
+    return reference
+
+
+def submit(certificate):
+    start = time.perf_counter()
+    body = json.loads(calculator.lambda_handler(certificate, None)['body'])
+    return body, (time.perf_counter() - start) * 1000
+
+
+def certificates(prefix, count):
+    return [{'certificate_id': f'CERT-{prefix}-{i:05d}', 'damage_amount': 20000 + i,
+             'farmer_id': f'FARMER-{i:05d}', 'farmer_upi': f'farmer{i}@upi'} for i in range(count)]
+
+
+def report(db, label):
+    calls = sum(len(references) for references in GATEWAY_CALLS.values())
+    references = max(len(set(references)) for references in GATEWAY_CALLS.values())
+    loans = [item['data'] for item in db.items('vericrop-claims').values() if item.get('type') == 'LOAN']
+    disbursed = sum(loan['status'] == calculator.DISBURSED for loan in loans)
+    print(f"{label}: {len(loans)} loans stored, {disbursed} disbursed, {calls} gateway calls, "
+          f"at most {references} distinct reference(s) per loan")
+
+
+def drain(sqs):
+    worker.DisbursementWorkerPool(queue_url=calculator.DISBURSEMENT_QUEUE_URL, sqs_client=sqs,
+                                  gateway=counting_disburse_loan, concurrency=16, wait_seconds=0.05).run(drain=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark idempotent bridge-loan issuance')
+    parser.add_argument('--loans', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=5, help='Simulated DynamoDB/SQS request latency')
+    args = parser.parse_args()
+
+    db = local_aws.LocalDynamoDB(latency_ms=args.latency_ms)
+    sqs = local_aws.LocalSQSClient(latency_ms=args.latency_ms)
+    calculator.table = db.Table('vericrop-claims')
+    calculator.sqs = sqs
+    calculator.DISBURSEMENT_QUEUE_URL = sqs.create_queue(QueueName='vericrop-disbursements')['QueueUrl']
+    utils.print_banner(f'{args.loans} certificates, DynamoDB/SQS stand-ins at {args.latency_ms:.0f} ms per request')
+
+    batch = certificates('SINGLE', args.loans)
+    latencies = {}
+    requests = {}
+    rounds = (('first', 'first submission', False), ('pending', 'retry, warm, loan pending', False),
+              ('warm', 'retry, warm, loan disbursed', False), ('warm2', 'retry, warm, again', False),
+              ('cold', 'retry, fresh container', True))
+    for label, _, reset_cache in rounds:
+        db.reset_counters()
+        sqs.reset_counters()
+        latencies[label] = []
+        for certificate in batch:
+            if reset_cache:
+                calculator.RECENT_LOANS.clear()
+            body, elapsed = submit(certificate)
+            latencies[label].append(elapsed)
+            assert body['replayed'] == (label != 'first'), body
+        requests[label] = (db.requests + sqs.requests) / len(batch)
+        if label == 'pending':
+            drain(sqs)
+    for label, title, _ in rounds:
+        utils.print_latency_summary(f'{title:28s}', latencies[label])
+    print('DynamoDB + SQS requests per submission: ' +
+          ', '.join(f'{title} {requests[label]:.0f}' for label, title, _ in rounds))
+    report(db, 'after 5 submissions of each certificate')
+
+    # Same certificate submitted concurrently from 8 fresh containers
+    racing = certificates('RACE', args.loans // 4)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for certificate in racing:
+            calculator.RECENT_LOANS.clear()
+            bodies = list(executor.map(lambda _: submit(certificate)[0], range(8)))
+            assert len({body['loan_id'] for body in bodies}) == 1
+            assert sum(not body['replayed'] for body in bodies) == 1
+    print(f'{len(racing)} certificates x 8 concurrent submissions: {sqs.sent} jobs queued')
+    drain(sqs)
+    report(db, 'after draining')
+
+    # Batch retried whole, then again on a fresh container
+    surge = certificates('BATCH', args.loans * 5)
+    summaries = []
+    for reset_cache in (False, False, True):
+        if reset_cache:
+            calculator.RECENT_LOANS.clear()
+        db.reset_counters()
+        sqs.reset_counters()
+        start = time.perf_counter()
+        body = json.loads(calculator.batch_lambda_handler({'certificates': surge}, None)['body'])
+        summaries.append(f"{body['summary']['APPROVED']} approved / {body['replayed']} replayed in "
+                         f"{(time.perf_counter() - start) * 1000:.0f} ms, {db.requests + sqs.requests} requests, "
+                         f"{sqs.sent} jobs queued")
+        drain(sqs)
+    print(f"batch of {len(surge)}: first {summaries[0]}; retry {summaries[1]}; "
+          f"retry on a fresh container {summaries[2]}")
+    report(db, 'overall')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+VeriCrop FinBridge - Disbursement Budget Benchmark
+==================================================
+
+Sharded budget counters (disbursement-budget.py) against the in-memory
+DynamoDB stand-in with a per-item write limit (DynamoDB throttles a single
+hot partition at about 1000 writes/s):
+
+- sustained reservations/sec from many threads on one budget with 1 shard
+  (a single counter item) and with more shards, with throttles and latency
+- exhaustion: concurrent loans of random size against a small budget, and
+  checks that nothing is overspent and that no loan the shards together
+  could still cover was refused
+- a rebalance to more shards under load, checking nothing is lost
+- cached vs consistent summary reads
+- bridge-loan-calculator approvals against a district budget until it
+  refuses, and overlapping batches of the same loans charging it once
+
+Usage:
+    python disbursement-budget-benchmark.py --seconds 3 --threads 64 --shards 1 4 16 64
+"""
+
+import argparse
+import importlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+budgets = utils.load_lambda_module('financial-automation', 'disbursement-budget')
+
+TABLE = 'vericrop-claims'
+
+
+def setup(latency_ms, item_write_limit):
+    db = local_aws.LocalDynamoDB(latency_ms=latency_ms, item_write_limit=item_write_limit)
+    budgets.table = db.Table(TABLE)
+    calculator.table = db.Table(TABLE)
+    budgets.BUDGET_CACHE.clear()
+    for key in budgets.BUDGET_STATS:
+        budgets.BUDGET_STATS[key] = 0
+    return db
+
+
+def hammer(budget_id, threads, seconds, amount=lambda rng: 100):
+    """
+    Reserve from `threads` threads for `seconds`; returns latencies of the
+    successful reservations, amounts reserved, refusals and errors
+    """
+    latencies, reserved, refusals, errors = [], [], [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            value = amount(rng)
+            start = time.perf_counter()
+            try:
+                budgets.reserve(budget_id, value)
+            except budgets.BudgetExhausted as e:
+                with lock:
+                    refusals.append((value, e.remaining))
+                continue
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                reserved.append(value)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(loop, range(threads)))
+    return latencies, reserved, refusals, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded disbursement-budget counters')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--latency-ms', type=float, default=2, help='Simulated DynamoDB request latency')
+    parser.add_argument('--item-write-limit', type=float, default=1000, help='Writes/s one item takes')
+    args = parser.parse_args()
+
+    utils.print_banner(f'Sustained reservations, {args.threads} threads for {args.seconds:.0f} s, '
+                       f'{args.item_write_limit:.0f} writes/s per item')
+    for shards in args.shards:
+        db = setup(args.latency_ms, args.item_write_limit)
+        budgets.create_budget('DISTRICT#Load', 10 ** 12, shards=shards)
+        db.reset_counters()
+        latencies, reserved, _, errors, elapsed = hammer('DISTRICT#Load', args.threads, args.seconds)
+        summary = budgets.budget_summary('DISTRICT#Load', max_age=0)
+        print(f"\n{shards:>2} shard(s): {len(reserved) / elapsed:,.0f} reservations/s, {db.throttled} throttled "
+              f"writes, {len(errors)} failed, {budgets.BUDGET_STATS['transactions']} cross-shard transactions; "
+              f"spent ₹{summary['spent']:,.0f} = {len(reserved)} x ₹100: {summary['spent'] == 100 * len(reserved)}")
+        utils.print_latency_summary('  reserve', latencies)
+
+    utils.print_banner('Exhaustion: loans of ₹1,000-50,000 against a ₹2 crore budget, 16 shards')
+    setup(args.latency_ms, args.item_write_limit)
+    limit = 2 * 10 ** 7
+    budgets.create_budget('SCHEME#Flood', limit, shards=16)
+    _, reserved, refusals, errors, elapsed = hammer('SCHEME#Flood', args.threads, args.seconds,
+                                                    amount=lambda rng: rng.randrange(100000, 5000001) / 100)
+    summary = budgets.budget_summary('SCHEME#Flood', max_age=0)
+    wrongly_refused = sum(value <= remaining for value, remaining in refusals)
+    print(f"{len(reserved)} loans reserved (₹{sum(reserved):,.2f}), {len(refusals)} refused, {len(errors)} failed; "
+          f"cross-shard transactions {budgets.BUDGET_STATS['transactions']}")
+    print(f"limit ₹{limit:,.2f}, spent ₹{summary['spent']:,.2f}, remaining ₹{summary['remaining']:,.2f}; "
+          f"overspent: {summary['spent'] > limit}, books balance: "
+          f"{Decimal(str(summary['spent'])) + Decimal(str(summary['remaining'])) == limit}, "
+          f"refused while covered: {wrongly_refused}")
+
+    utils.print_banner('Rebalance 8 -> 32 -> 8 shards under load')
+    setup(args.latency_ms, args.item_write_limit)
+    budgets.create_budget('DISTRICT#Rebalance', 10 ** 9, shards=8)
+    results = {}
+    duration = args.seconds + budgets.BUDGET_CACHE_TTL_SECONDS + 1
+    load = threading.Thread(target=lambda: results.update(
+        outcome=hammer('DISTRICT#Rebalance', args.threads, duration)))
+    load.start()
+    time.sleep(args.seconds / 3)
+    for shards in (32, 8):
+        start = time.perf_counter()
+        after = budgets.rebalance_budget('DISTRICT#Rebalance', shards=shards)
+        print(f"rebalanced to {after['shards']} shards in {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"{budgets.BUDGET_STATS['transaction_conflicts']} conflicts retried so far")
+    load.join()
+    _, reserved, _, errors, elapsed = results['outcome']
+    summary = budgets.budget_summary('DISTRICT#Rebalance', max_age=0)
+    print(f"{len(reserved)} reservations ({len(reserved) / elapsed:,.0f}/s), {len(errors)} failed; spent "
+          f"₹{summary['spent']:,.0f} = {len(reserved)} x ₹100: {summary['spent'] == 100 * len(reserved)}, "
+          f"remaining + spent = limit: {summary['remaining'] + summary['spent'] == 10 ** 9}")
+
+    utils.print_banner('Summary reads, 64 shards')
+    setup(args.latency_ms, args.item_write_limit)
+    budgets.create_budget('DISTRICT#Read', 10 ** 9, shards=64)
+    for label, max_age in (('consistent (max_age=0)', 0), (f'cached ({budgets.BUDGET_CACHE_TTL_SECONDS:.0f} s TTL)', None)):
+        latencies = []
+        for _ in range(200):
+            start = time.perf_counter()
+            budgets.budget_summary('DISTRICT#Read', max_age=max_age)
+            latencies.append((time.perf_counter() - start) * 1000)
+        utils.print_latency_summary(f'  {label}', latencies)
+
+    utils.print_banner('Loan approvals against a ₹10 lakh district budget')
+    db = setup(args.latency_ms, args.item_write_limit)
+    calculator.RECENT_LOANS.clear()
+    sqs = local_aws.LocalSQSClient()
+    calculator.sqs = sqs
+    calculator.DISBURSEMENT_QUEUE_URL = sqs.create_queue(QueueName='vericrop-disbursements')['QueueUrl']
+    budgets.create_budget('DISTRICT#Nashik', 10 ** 6, shards=8)
+    certificates = [{'certificate_id': f'CERT-NSK-{i:05d}', 'damage_amount': 20000 + 97 * i,
+                     'farmer_id': f'FARMER-{i:05d}', 'district': 'Nashik'} for i in range(100)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        bodies = [json.loads(response['body'])
+                  for response in executor.map(lambda c: calculator.lambda_handler(c, None), certificates)]
+    statuses = {}
+    for body in bodies:
+        statuses[body['status']] = statuses.get(body['status'], 0) + 1
+    approved = sum(body['loan_amount'] for body in bodies if body['status'] != calculator.REFUSED)
+    summary = budgets.budget_summary('DISTRICT#Nashik', max_age=0)
+    replay = json.loads(calculator.lambda_handler(certificates[0], None)['body'])
+    print(f"statuses {statuses}; approved ₹{approved:,.2f}, budget spent ₹{summary['spent']:,.2f}, remaining "
+          f"₹{summary['remaining']:,.2f}; {sqs.sent} jobs queued; retry of an approved loan after exhaustion: "
+          f"{replay['status']} (replayed={replay.get('replayed')})")
+
+    utils.print_banner('Two overlapping batches of the same 200 loans against a district budget')
+    setup(args.latency_ms, args.item_write_limit)
+    calculator.RECENT_LOANS.clear()
+    budgets.create_budget('DISTRICT#Pune', 10 ** 8, shards=8)
+    batch = [{'certificate_id': f'CERT-PUNE-{i:05d}', 'damage_amount': 1000, 'farmer_id': f'FARMER-{i:05d}',
+              'district': 'Pune'} for i in range(200)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bodies = list(executor.map(lambda _: json.loads(calculator.batch_lambda_handler(
+            {'certificates': batch}, None)['body']), range(2)))
+    summary = budgets.budget_summary('DISTRICT#Pune', max_age=0)
+    print(f"approved {[body['summary']['APPROVED'] for body in bodies]}; budget spent ₹{summary['spent']:,.2f} "
+          f"for 200 loans of ₹700 (₹{200 * 700:,.2f} expected)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+VeriCrop FinBridge - Disbursement Pipeline Benchmark
+====================================================
+
+Loan approval with the UPI disbursement inline (the gateway call inside the
+approval) vs queued: approval stores the loan as DISBURSEMENT_PENDING and
+queues a job that a DisbursementWorkerPool pays. Runs against in-memory
+DynamoDB and SQS stand-ins and a fake gateway with a long-tailed latency
+and transient and permanent failures. Reports approval latency, the time
+to drain the queue, time from approval to disbursement, retries, and checks
+every loan ends DISBURSED or DISBURSEMENT_FAILED with at most one transfer.
+Payouts that settle only after the worker runs out of attempts must end
+DISBURSED (through DISBURSEMENT_UNKNOWN) with their budgets kept.
+
+Usage:
+    python disbursement-pipeline-benchmark.py --loans 1000 --concurrency 16 64
+"""
+
+import argparse
+import importlib
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+worker = utils.load_lambda_module('financial-automation', 'disbursement-worker')
+
+TABLE = 'vericrop-claims'
+
+
+class FakeUpiGateway:
+    """
+    Payout API stand-in: lognormal latency around median_ms with a tail_rate
+    share of calls taking tail_ms, failure_rate transient failures (timeouts)
+    and permanent_rate refusals. Deduplicates on the idempotency key and
+    counts transfers per key and calls in flight
+    """
+
+    def __init__(self, median_ms=300, tail_ms=3000, tail_rate=0.02, failure_rate=0.05, permanent_rate=0.005,
+                 seed=0):
+        self.median_ms = median_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.failure_rate = failure_rate
+        self.permanent_rate = permanent_rate
+        self.random = random.Random(seed)
+        self.transfers = {}
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, amount, upi_id, idempotency_key=None):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            draw = self.random.random()
+            slow = self.random.random() < self.tail_rate
+            latency = self.tail_ms if slow else self.median_ms * self.random.lognormvariate(0, 0.3)
+        try:
+            time.sleep(latency / 1000)
+            if draw < self.permanent_rate:
+                raise calculator.DisbursementError(f'VPA {upi_id} is invalid', retryable=False)
+            if draw < self.permanent_rate + self.failure_rate:
+                raise TimeoutError('Gateway timed out')
+            with self.lock:
+                if idempotency_key not in self.transfers:
+                    self.transfers[idempotency_key] = f'UPI-{uuid.uuid4().hex[:12].upper()}'
+                return self.transfers[idempotency_key]
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class LateSettlingGateway:
+    """
+    Gateway whose payouts stay processing (a retryable error) for the first
+    `checks` calls per idempotency key, then settle
+    """
+
+    def __init__(self, checks):
+        self.checks = checks
+        self.calls = {}
+        self.transfers = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, amount, upi_id, idempotency_key=None):
+        with self.lock:
+            self.calls[idempotency_key] = self.calls.get(idempotency_key, 0) + 1
+            if self.calls[idempotency_key] <= self.checks:
+                raise calculator.DisbursementError(f'Payout {idempotency_key} still processing', retryable=True)
+            return self.transfers.setdefault(idempotency_key, f'UPI-{uuid.uuid4().hex[:12].upper()}')
+
+
+def certificates(prefix, count):
+    return [{'certificate_id': f'CERT-{prefix}-{i:06d}', 'damage_amount': 20000 + i,
+             'farmer_id': f'FARMER-{i:06d}', 'farmer_upi': f'farmer{i}@upi'} for i in range(count)]
+
+
+def setup(latency_ms):
+    db = local_aws.LocalDynamoDB(latency_ms=latency_ms)
+    sqs = local_aws.LocalSQSClient(latency_ms=latency_ms)
+    calculator.table = db.Table(TABLE)
+    calculator.sqs = sqs
+    calculator.DISBURSEMENT_QUEUE_URL = sqs.create_queue(QueueName='vericrop-disbursements')['QueueUrl']
+    calculator.RECENT_LOANS.clear()
+    return db, sqs
+
+
+def approve_all(batch, clients, approve):
+    latencies = []
+    lock = threading.Lock()
+
+    def submit(certificate):
+        start = time.perf_counter()
+        approve(certificate)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(submit, batch))
+    return latencies
+
+
+def loan_outcomes(db):
+    loans = [item['data'] for item in db.items(TABLE).values() if item.get('type') == 'LOAN']
+    statuses = {}
+    for loan in loans:
+        statuses[loan['status']] = statuses.get(loan['status'], 0) + 1
+    waits = [(datetime.fromisoformat(loan['disbursed_at']) - datetime.fromisoformat(loan['approved_at']))
+             .total_seconds() * 1000 for loan in loans if loan['status'] == calculator.DISBURSED]
+    return loans, statuses, waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark queued vs inline loan disbursement')
+    parser.add_argument('--loans', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent approval requests')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64], help='Worker pool sizes')
+    parser.add_argument('--latency-ms', type=float, default=3, help='Simulated DynamoDB/SQS request latency')
+    parser.add_argument('--inline-loans', type=int, default=400)
+    args = parser.parse_args()
+    worker.DISBURSEMENT_RETRY_BASE_SECONDS = 1
+
+    utils.print_banner(f'Approval latency, {args.clients} concurrent clients, gateway median 300 ms, '
+                       f'2% at 3 s, 5% timeouts')
+    db, _ = setup(args.latency_ms)
+    gateway = FakeUpiGateway()
+
+    def inline_approval(certificate):
+        # The pre-queue handler: store, then pay and record before returning
+        _, loan = calculator.store_loan(calculator.build_loan(certificate))
+        try:
+            reference = gateway(loan['loan_amount'], loan['farmer_upi'], idempotency_key=loan['loan_id'])
+            worker.record_status(loan, calculator.DISBURSED, 1, disbursement_ref=reference)
+        except Exception as e:
+            worker.record_status(loan, calculator.DISBURSEMENT_FAILED, 1, error=str(e))
+
+    inline = approve_all(certificates('INLINE', args.inline_loans), args.clients, inline_approval)
+    utils.print_latency_summary('inline disbursement', inline)
+
+    db, sqs = setup(args.latency_ms)
+    queued = approve_all(certificates('QUEUED', args.loans), args.clients,
+                         lambda certificate: calculator.lambda_handler(certificate, None))
+    utils.print_latency_summary('queued disbursement', queued)
+    print(f"approval p99 {sorted(inline)[int(len(inline) * 0.99)]:.0f} ms inline vs "
+          f"{sorted(queued)[int(len(queued) * 0.99)]:.1f} ms queued; {sqs.sent} jobs queued")
+
+    for concurrency in args.concurrency:
+        db, sqs = setup(args.latency_ms)
+        approve_all(certificates(f'POOL{concurrency}', args.loans), args.clients,
+                    lambda certificate: calculator.lambda_handler(certificate, None))
+        gateway = FakeUpiGateway(seed=concurrency)
+        worker.DISBURSEMENT_STATS.update(disbursed=0, retried=0, failed=0, duplicates=0, unknown=0)
+        pool = worker.DisbursementWorkerPool(queue_url=calculator.DISBURSEMENT_QUEUE_URL, sqs_client=sqs,
+                                             gateway=gateway, concurrency=concurrency, wait_seconds=0.2)
+        start = time.perf_counter()
+        pool.run(drain=True)
+        elapsed = time.perf_counter() - start
+        loans, statuses, waits = loan_outcomes(db)
+        transfers = len(gateway.transfers)
+        pending = statuses.get(calculator.DISBURSEMENT_PENDING, 0)
+        utils.print_banner(f'Worker pool, concurrency {concurrency}: {args.loans} queued loans')
+        print(f"drained in {elapsed:.1f} s ({args.loans / elapsed:.0f} loans/s), max {gateway.max_in_flight} "
+              f"gateway calls in flight, {gateway.calls} calls, stats {json.dumps(worker.DISBURSEMENT_STATS)}")
+        print(f"loan statuses {statuses}; {transfers} transfers for {statuses.get(calculator.DISBURSED, 0)} "
+              f"disbursed loans, {pending} left pending")
+        utils.print_latency_summary('approval to disbursed', waits)
+
+    utils.print_banner('Late settlement: payouts processing for 3 checks, workers give up after 2 attempts')
+    db, sqs = setup(args.latency_ms)
+    approve_all(certificates('LATE', 50), args.clients,
+                lambda certificate: calculator.lambda_handler(certificate, None))
+    gateway = LateSettlingGateway(checks=3)
+    released = []
+    release_budgets = calculator.release_budgets
+    calculator.release_budgets = released.append
+    worker.DISBURSEMENT_STATS.update(disbursed=0, retried=0, failed=0, duplicates=0, unknown=0)
+    try:
+        worker.DisbursementWorkerPool(queue_url=calculator.DISBURSEMENT_QUEUE_URL, sqs_client=sqs, gateway=gateway,
+                                      max_attempts=2, wait_seconds=0.2).run(drain=True)
+    finally:
+        calculator.release_budgets = release_budgets
+    _, statuses, _ = loan_outcomes(db)
+    print(f"loan statuses {statuses}; {worker.DISBURSEMENT_STATS['unknown']} attempts past the limit recorded "
+          f"DISBURSEMENT_UNKNOWN, "
+          f"{len(gateway.transfers)} transfers, {len(released)} budget releases")
+
+
+if __name__ == '__main__':
+    main()
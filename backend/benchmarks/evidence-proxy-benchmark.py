@@ -0,0 +1,111 @@
+"""
+VeriCrop FinBridge - Evidence Proxy Benchmark
+=============================================
+
+Builds 480p analysis proxies for synthetic phone-style uploads on a local
+file-based S3 stand-in and reports build throughput, peak memory (in a fresh
+process) and size reduction, then the S3 bytes, requests and time per claim
+for the shadow comparator and the keyframe label detector reading the
+original vs the proxy.
+
+Usage:
+    python evidence-proxy-benchmark.py --seconds 10 60
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+builder = utils.load_lambda_module('forensic-validation', 'evidence-proxy-builder')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+detector = utils.load_lambda_module('forensic-validation', 'keyframe-label-detector')
+
+BUCKET = 'vericrop-evidence'
+
+
+def memory_status_mib(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def build_in_fresh_process(root, key, results):
+    """
+    Child-process body: build one proxy and report the resident set after
+    imports and its peak during the build (Linux: the peak is reset first)
+    """
+    baseline = memory_status_mib('VmRSS')
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    index = builder.build_proxy(BUCKET, key, s3_client=local_aws.LocalS3Client(root))
+    results.put((index, baseline, memory_status_mib('VmHWM')))
+
+
+def measure(s3, label, run):
+    s3.reset_counters()
+    start = time.perf_counter()
+    result = run()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"  {label:28s} {s3.bytes_served / 2**20:7.2f} MiB in {s3.requests:3d} GETs, {elapsed:6.0f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark evidence proxy generation and use')
+    parser.add_argument('--seconds', type=float, nargs='+', default=[10, 60])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-proxy-')
+    s3 = local_aws.LocalS3Client(workdir)
+    comparator.s3 = s3
+    comparator.SHADOW_PROGRESSIVE = False
+    comparator.SHADOW_TRAJECTORY_CHECK = False
+    spawn = multiprocessing.get_context('spawn')
+
+    for seconds in args.seconds:
+        key = f'claims/CLM-PROXY/evidence/{int(seconds)}s.mp4'
+        path = os.path.join(workdir, 'render.mp4')
+        synthetic.render_shadow_video(path, 200, seconds=seconds, width=args.width, height=args.height)
+        s3.upload_file(path, BUCKET, key)
+
+        utils.print_banner(f'{seconds:.0f} s {args.width}x{args.height} upload')
+        results = spawn.Queue()
+        process = spawn.Process(target=build_in_fresh_process, args=(workdir, key, results))
+        process.start()
+        index, baseline_rss, peak_rss = results.get()
+        process.join()
+        source_mib = index['source_size'] / 2**20
+        print(f"proxy build: {len(index['frames'])} keyframes, {index['build_seconds']:.2f} s "
+              f"({source_mib / index['build_seconds']:.0f} MiB/s of upload, "
+              f"{seconds / index['build_seconds']:.0f}x real time), peak RSS {peak_rss:.0f} MiB "
+              f"({peak_rss - baseline_rss:.0f} MiB over the imported modules)")
+        print(f"size: original {source_mib:.1f} MiB, proxy {index['proxy_size'] / 2**20:.2f} MiB "
+              f"({index['size_reduction']}x smaller, {index['width']}x{index['height']})")
+
+        print('per claim:')
+        angles = {}
+        for use_proxy in (False, True):
+            source = 'proxy' if use_proxy else 'original'
+            comparator.SHADOW_USE_PROXY = detector.LABEL_USE_PROXY = use_proxy
+            comparator.HASH_INDEX = comparator.phash.PerceptualHashIndex()
+            estimate = measure(s3, f'shadow angle, {source}',
+                               lambda: comparator.extract_shadow_angle(BUCKET, key, 200.0))
+            angles[source] = estimate['angle']
+            measure(s3, f'keyframe labels, {source}',
+                    lambda: detector.detect_keyframe_labels(BUCKET, key, s3_client=s3,
+                                                            rekognition_client=local_aws.LocalRekognitionClient(),
+                                                            cache=detector.LabelCache()))
+        print(f"  shadow angle: {angles['original']:.2f}° from the original, {angles['proxy']:.2f}° from the proxy")
+
+if __name__ == '__main__':
+    main()
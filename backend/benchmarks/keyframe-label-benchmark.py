@@ -0,0 +1,127 @@
+"""
+VeriCrop FinBridge - Keyframe Label Detection Benchmark
+=======================================================
+
+Rekognition calls and latency of keyframe-sampled label detection against
+a local Rekognition stand-in: a panning clip (every keyframe different),
+a static clip (one scene), the static clip re-encoded and resubmitted, and
+a clip that cuts from that scene to another. Then the panning clip with
+different concurrency limits against a stand-in that throttles above 3
+calls in flight.
+
+Usage:
+    python keyframe-label-benchmark.py --latency-ms 250
+"""
+
+import argparse
+import importlib
+import os
+import tempfile
+import time
+
+import av
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+detector = utils.load_lambda_module('forensic-validation', 'keyframe-label-detector')
+
+BUCKET = 'vericrop-evidence'
+
+
+def render_pan_video(path, seconds=30, fps=30, width=640, height=360, seed=0):
+    """
+    Camera panning across a wide field, so no two keyframes show the same view
+    """
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * fps)
+    speed = 8
+    ground = synthetic.render_ground(width + speed * frames, height, rng)
+    with av.open(path, mode='w') as container:
+        stream = container.add_stream('libx264', rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+        stream.codec_context.gop_size = fps
+        stream.options = {'preset': 'ultrafast', 'crf': '28'}
+        for index in range(frames):
+            view = ground[:, index * speed:index * speed + width] + rng.normal(0, 3, (height, width))
+            luma = np.clip(view, 0, 255).astype(np.uint8)
+            frame = av.VideoFrame.from_ndarray(np.repeat(luma[:, :, None], 3, axis=2), format='rgb24')
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def reencode(source, destination, width, height):
+    with av.open(source) as inp, av.open(destination, 'w') as out:
+        stream = out.add_stream('libx264', rate=30)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+        stream.codec_context.gop_size = 30
+        stream.options = {'crf': '32'}
+        for frame in inp.decode(video=0):
+            rgb = frame.to_ndarray(width=width, height=height, format='rgb24')
+            for packet in stream.encode(av.VideoFrame.from_ndarray(rgb, format='rgb24')):
+                out.mux(packet)
+        for packet in stream.encode():
+            out.mux(packet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark keyframe-sampled label detection')
+    parser.add_argument('--latency-ms', type=float, default=250, help='Simulated DetectLabels latency')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-labels-')
+    s3 = local_aws.LocalS3Client(workdir)
+    clips = {}
+    for name, render in (
+            ('pan', lambda path: render_pan_video(path)),
+            ('static', lambda path: synthetic.render_shadow_video(path, 200, seconds=30, seed=5)),
+            ('spliced', lambda path: synthetic.render_shadow_video(path, 200, seconds=30, seed=5,
+                                                                   splice_at=15, splice_azimuth=230))):
+        path = os.path.join(workdir, f'{name}.mp4')
+        render(path)
+        clips[name] = path
+    reencode(clips['static'], os.path.join(workdir, 'resubmitted.mp4'), 480, 270)
+    clips['resubmitted'] = os.path.join(workdir, 'resubmitted.mp4')
+    for name, path in clips.items():
+        s3.upload_file(path, BUCKET, f'labels/{name}.mp4')
+
+    utils.print_banner(f'Calls per clip - DetectLabels stand-in at {args.latency_ms:.0f} ms')
+    rekognition = local_aws.LocalRekognitionClient(latency_ms=args.latency_ms)
+    cache = detector.LabelCache()
+    totals = {'sampled': 0, 'calls': 0}
+    for label, name in (('panning clip', 'pan'), ('static clip', 'static'),
+                        ('static clip re-encoded, resubmitted', 'resubmitted'),
+                        ('static scene cut to another', 'spliced'), ('panning clip again', 'pan')):
+        start = time.perf_counter()
+        result = detector.detect_keyframe_labels(BUCKET, f'labels/{name}.mp4', s3_client=s3,
+                                                 rekognition_client=rekognition, cache=cache)
+        elapsed = (time.perf_counter() - start) * 1000
+        totals['sampled'] += result['frames_sampled']
+        totals['calls'] += result['calls']
+        print(f"{label:36s} {result['frames_sampled']:2d} keyframes sampled, "
+              f"{result['duplicates_skipped']:2d} duplicates, {result['cache_hits']} cache hits, "
+              f"{result['calls']} calls ({result['calls_avoided']} avoided), "
+              f"{len(result['damage_patterns'])} damage labels, {elapsed:.0f} ms")
+    print(f"\ntotal: {totals['calls']} calls for {totals['sampled']} sampled keyframes "
+          f"({1 - totals['calls'] / totals['sampled']:.0%} avoided); stand-in saw {rekognition.calls} calls, "
+          f"{rekognition.bytes_received / max(1, rekognition.calls) / 1024:.0f} KiB per image")
+
+    utils.print_banner('Concurrency limit - stand-in throttles above 3 in flight')
+    for concurrency in (1, 3, 5):
+        rekognition = local_aws.LocalRekognitionClient(latency_ms=args.latency_ms, max_concurrency=3)
+        retries = detector.LABEL_STATS['throttle_retries']
+        start = time.perf_counter()
+        result = detector.detect_keyframe_labels(BUCKET, 'labels/pan.mp4', s3_client=s3,
+                                                 rekognition_client=rekognition, cache=detector.LabelCache(),
+                                                 concurrency=concurrency)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"concurrency {concurrency}: {result['calls']} frames labelled in {elapsed:.0f} ms, "
+              f"max {rekognition.max_in_flight} in flight, {rekognition.throttled} throttled "
+              f"({detector.LABEL_STATS['throttle_retries'] - retries} retries)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+VeriCrop FinBridge - Loan Lookup Benchmark
+==========================================
+
+Loan lookups by farmer and by certificate through the FarmerLoanIndex and
+CertificateLoanIndex global secondary indexes (bridge-loan-calculator
+LOAN_INDEXES) vs a Scan with a filter, on the in-memory DynamoDB stand-in:
+
+- latency and DynamoDB requests per lookup: a farmer's loans, a
+  certificate's loan and repayments, and the loan by its derived ID
+- pagination: every loan of a farmer with many loans, page by page through
+  the iterator and through the handler's cursors, against a scan
+- index freshness: status updates from the disbursement worker and new
+  repayments show up in the index entries
+- loan-index-migration.py on a table holding loans stored before the
+  index attributes: creates the indexes, then backfills
+
+Usage:
+    python loan-lookup-benchmark.py --loans 100000 --latency-ms 2
+"""
+
+import argparse
+import importlib
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+worker = utils.load_lambda_module('financial-automation', 'disbursement-worker')
+migration = utils.load_lambda_module('financial-automation', 'loan-index-migration')
+
+TABLE = 'vericrop-claims'
+HEAVY_FARMER = 'FARMER-HEAVY'
+HEAVY_LOANS = 640
+
+
+def setup(latency_ms):
+    db = local_aws.LocalDynamoDB(latency_ms=latency_ms)
+    calculator.table = db.Table(TABLE)
+    for definition in calculator.LOAN_INDEXES:
+        db.create_index(TABLE, definition)
+    return db
+
+
+def loan_items(count, farmers, seed=0, legacy=False):
+    """
+    Loan items approved over the last year; a farmer has count / farmers
+    loans on average and HEAVY_FARMER has HEAVY_LOANS. legacy=True leaves
+    out the index attributes, as stored before them
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 10, 1)
+    step = count // HEAVY_LOANS
+    for i in range(count):
+        farmer = f'FARMER-{rng.randrange(farmers):07d}'
+        if i % step == 0 and i < step * HEAVY_LOANS:
+            farmer = HEAVY_FARMER
+        loan = calculator.build_loan({'certificate_id': f'CERT-{seed}-{i:07d}', 'farmer_id': farmer,
+                                      'damage_amount': rng.randrange(10000, 80000)})
+        loan['approved_at'] = (start + timedelta(seconds=rng.randrange(365 * 86400))).isoformat()
+        item = calculator.loan_item(loan)
+        if legacy:
+            item = {key: item[key] for key in ('claimId', 'timestamp', 'type', 'data')}
+        yield item
+
+
+def timed(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, latencies
+
+
+def scan_lookup(attribute, value):
+    """
+    What the lookup costs without an index: a Scan of the whole table
+    filtered on the nested attribute
+    """
+    request = {
+        'FilterExpression': '#type = :loan AND #data.#attribute = :value',
+        'ExpressionAttributeNames': {'#type': 'type', '#data': 'data', '#attribute': attribute},
+        'ExpressionAttributeValues': {':loan': 'LOAN', ':value': value}
+    }
+    loans = []
+    while True:
+        response = calculator.table.scan(**request)
+        loans += [calculator.loan_from_item(item) for item in response['Items']]
+        if 'LastEvaluatedKey' not in response:
+            return loans
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def measure(db, label, function, repeat):
+    db.reset_counters()
+    result, latencies = timed(function, repeat)
+    utils.print_latency_summary(f'{label}, {db.requests / repeat:.0f} req', latencies)
+    return result
+
+
+def handler_pages(event):
+    entries, cursor, pages = [], None, 0
+    while True:
+        body = json.loads(calculator.loan_lookup_lambda_handler(dict(event, cursor=cursor), None)['body'])
+        entries += body['entries']
+        pages += 1
+        cursor = body['cursor']
+        if cursor is None:
+            return entries, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GSI loan lookups against Scan')
+    parser.add_argument('--loans', type=int, default=100000)
+    parser.add_argument('--farmers', type=int, default=25000)
+    parser.add_argument('--latency-ms', type=float, default=2, help='Simulated DynamoDB request latency')
+    parser.add_argument('--repeat', type=int, default=200, help='Lookups per indexed measurement')
+    args = parser.parse_args()
+
+    db = setup(args.latency_ms)
+    start = time.perf_counter()
+    db.load(TABLE, loan_items(args.loans, args.farmers))
+    print(f"loaded {args.loans:,} loans for ~{args.farmers:,} farmers (indexed) in "
+          f"{time.perf_counter() - start:.1f} s")
+    items = db.items(TABLE)
+    rng = random.Random(1)
+    sample = [calculator.loan_from_item(item) for item in rng.sample(list(items.values()), 200)]
+    farmer = next(loan['farmer_id'] for loan in sample if loan['farmer_id'] != HEAVY_FARMER)
+    certificate = sample[0]['certificate_id']
+    for i, loan in enumerate(sample[:50]):
+        calculator.record_repayment(loan['loan_id'], round(loan['loan_amount'] / 2, 2), f'UTR-{i:05d}')
+    calculator.record_repayment(sample[0]['loan_id'], 100, 'UTR-EXTRA')
+
+    utils.print_banner(f'Lookups on {args.loans:,} loans: Scan + filter vs index Query')
+    scan_repeat = 3
+    scanned = measure(db, "farmer's loans, Scan", lambda: scan_lookup('farmer_id', farmer), scan_repeat)
+    measure(db, "certificate's loan, Scan", lambda: scan_lookup('certificate_id', certificate), scan_repeat)
+    listed = measure(db, "farmer's loans, FarmerLoanIndex",
+                     lambda: list(calculator.farmer_loans(farmer)), args.repeat)
+    measure(db, "farmer's loans + records, index + BatchGet",
+            lambda: calculator.fetch_loans([entry['loan_id'] for entry in calculator.farmer_loans(farmer)]),
+            args.repeat)
+    history = measure(db, "certificate's history, CertificateLoanIndex",
+                      lambda: list(calculator.certificate_entries(certificate)), args.repeat)
+    measure(db, "certificate's loan, GetItem on derived ID",
+            lambda: calculator.loan_for_certificate(certificate), args.repeat)
+    measure(db, 'handler, certificate lookup',
+            lambda: calculator.loan_lookup_lambda_handler({'certificate_id': certificate}, None), args.repeat)
+    print(f"farmer {farmer}: index {sorted(e['loan_id'] for e in listed) == sorted(l['loan_id'] for l in scanned)} "
+          f"match with scan ({len(listed)} loans); certificate history {[e['type'] for e in history]}")
+
+    utils.print_banner(f'Pagination: {HEAVY_FARMER}, {HEAVY_LOANS} loans')
+    expected = scan_lookup('farmer_id', HEAVY_FARMER)
+    for page_size in (25, 100, 1000):
+        db.reset_counters()
+        entries, latencies = timed(lambda: list(calculator.farmer_loans(HEAVY_FARMER, page_size=page_size)), 20)
+        times = [entry['at'] for entry in entries]
+        print(f"page size {page_size:>4}: {len(entries)} entries in {db.requests / 20:.0f} queries, "
+              f"p50 {sorted(latencies)[10]:.1f} ms; newest first: {times == sorted(times, reverse=True)}, "
+              f"same loans as scan: {sorted(e['loan_id'] for e in entries) == sorted(l['loan_id'] for l in expected)}")
+    entries, pages = handler_pages({'farmer_id': HEAVY_FARMER, 'limit': 64, 'oldest_first': True})
+    times = [entry['at'] for entry in entries]
+    print(f"handler cursors, limit 64: {len(entries)} entries in {pages} pages, "
+          f"{len(entries) - len({e['loan_id'] for e in entries})} duplicates, oldest first: {times == sorted(times)}")
+    body = json.loads(calculator.loan_lookup_lambda_handler({'farmer_id': HEAVY_FARMER, 'limit': 5, 'full': True},
+                                                            None)['body'])
+    print(f"first page with full=true: {body['count']} entries, {len(body['loans'])} loan records")
+
+    utils.print_banner('Index freshness')
+    stale = 0
+    for loan in sample[50:150]:
+        worker.record_status(loan, calculator.DISBURSED, 1, disbursement_ref='UTR1')
+    for loan in sample[50:150]:
+        entry = next(entry for entry in calculator.certificate_entries(loan['certificate_id'], 'LOAN'))
+        stale += entry['status'] != calculator.DISBURSED
+    repayments = list(calculator.farmer_loans(sample[1]['farmer_id'], item_type='REPAYMENT'))
+    print(f"100 loans disbursed by the worker: {stale} stale index entries; farmer {sample[1]['farmer_id']} "
+          f"repayments from the index: {[(e['repayment_id'], e['amount']) for e in repayments]}")
+
+    utils.print_banner('Migration: 10,000 loans stored before the indexes')
+    db = local_aws.LocalDynamoDB(latency_ms=args.latency_ms)
+    table = db.Table(TABLE)
+    db.load(TABLE, loan_items(10000, 2500, seed=1, legacy=True))
+    legacy_certificate = 'CERT-1-0000042'
+    start = time.perf_counter()
+    result = migration.migrate(table, segments=4, poll_seconds=0)
+    print(f"{result} in {time.perf_counter() - start:.1f} s ({db.requests:,} requests); "
+          f"{legacy_certificate} index entries {[e['type'] for e in calculator.certificate_entries(legacy_certificate)]}; "
+          f"a second run: {migration.migrate(table, segments=4, poll_seconds=0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,952 @@
+"""
+VeriCrop FinBridge - Local AWS Stand-ins
+Directory-backed S3 client with the subset of the boto3 API the Lambda code
+uses, so benchmarks can run without AWS. Counts requests and bytes served and
+can inject a fixed per-request latency and a transfer bandwidth to mimic S3
+round trips. A Rekognition stand-in answers DetectLabels the same way;
+in-memory DynamoDB and SQS stand-ins serve the table and queue APIs the
+loan code uses.
+"""
+
+import bisect
+import copy
+import functools
+import hashlib
+import heapq
+import io
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+
+class LocalS3Client:
+    """
+    boto3-style S3 client storing objects as files under root/bucket/key
+    """
+
+    def __init__(self, root, latency_ms=0.0, bandwidth_mbps=None):
+        self.root = root
+        self.latency_ms = latency_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.requests = 0
+        self.bytes_served = 0
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def _existing_path(self, bucket, key):
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}},
+                              'GetObject')
+        return path
+
+    def _wait(self):
+        self.requests += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def put_object(self, Bucket, Key, Body):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = Body.read() if hasattr(Body, 'read') else Body
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._wait()
+        return {'ETag': f'"{len(data)}"'}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f)
+
+    def head_object(self, Bucket, Key):
+        self._wait()
+        return {'ContentLength': os.path.getsize(self._existing_path(Bucket, Key))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._wait()
+        path = self._existing_path(Bucket, Key)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        if Range:
+            first, last = Range.replace('bytes=', '').split('-')
+            if first == '':
+                start = max(0, size - int(last))
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        self.bytes_served += len(data)
+        if self.bandwidth_mbps:
+            time.sleep(len(data) * 8 / (self.bandwidth_mbps * 1e6))
+        return {
+            'Body': io.BytesIO(data),
+            'ContentLength': len(data),
+            'ContentRange': f'bytes {start}-{start + len(data) - 1}/{size}'
+        }
+
+    def reset_counters(self):
+        self.requests = 0
+        self.bytes_served = 0
+
+
+class LocalRekognitionClient:
+    """
+    boto3-style Rekognition client whose detect_labels returns deterministic
+    labels derived from the image bytes after a fixed latency. Counts calls
+    and the most calls seen in flight; calls beyond max_concurrency fail with
+    ThrottlingException like the real per-account TPS limit
+    """
+
+    LABELS = ['Plant', 'Field', 'Crop', 'Soil', 'Leaf', 'Outdoors', 'Nature', 'Flood',
+              'Wilted Plant', 'Dead Plant', 'Land', 'Agriculture', 'Grass', 'Mud']
+
+    def __init__(self, latency_ms=0.0, max_concurrency=None):
+        self.latency_ms = latency_ms
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.throttled = 0
+        self.bytes_received = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def detect_labels(self, Image, MaxLabels=1000, MinConfidence=55):
+        data = Image['Bytes']
+        with self.lock:
+            self.calls += 1
+            self.bytes_received += len(data)
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.throttled += 1
+                raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                                  'DetectLabels')
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            digest = hashlib.sha256(data).digest()
+            labels = [{'Name': self.LABELS[b % len(self.LABELS)], 'Confidence': 60 + digest[i + 8] % 40,
+                       'Instances': []} for i, b in enumerate(digest[:8])]
+            unique = {label['Name']: label for label in labels if label['Confidence'] >= MinConfidence}
+            return {'Labels': list(unique.values())[:MaxLabels]}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def reset_counters(self):
+        self.calls = 0
+        self.throttled = 0
+        self.bytes_received = 0
+        self.max_in_flight = 0
+
+
+class LocalDynamoDB:
+    """
+    boto3-style DynamoDB resource keeping items in memory by hash key, with
+    Table(name) and a meta.client taking Python-typed items like the
+    resource's own client. Condition and update expressions cover the forms
+    the Lambda code writes (comparisons, attribute_[not_]exists joined by
+    AND/OR without parentheses; SET with +/- and if_not_exists, ADD,
+    REMOVE). Rejects floats and oversized batches the way boto3 and DynamoDB
+    do, charges latency_ms per request and leaves a random unprocessed_rate
+    share of each BatchWriteItem unprocessed (and cancels that share of
+    transactions as throttled). With item_write_limit set, each
+    item takes at most that many write units per second (a token bucket
+    holding one second's worth; transactional writes cost two) and further
+    writes to it are throttled, as DynamoDB throttles a hot partition at
+    1000 WCU/s. Scan pages hold at most page_items items (DynamoDB stops a
+    page at 1 MB) and split the table into segments by key hash. With
+    stream=True every change is also recorded as a NEW_AND_OLD_IMAGES
+    stream record in the typed form Lambda receives. create_index adds a
+    global secondary index (GlobalSecondaryIndexes format; sparse, with
+    its projection) kept current on every write and read by query.
+    write_units counts the write capacity the writes consumed (items under
+    1 KB: one unit per write, two per transactional write)
+    """
+
+    def __init__(self, latency_ms=0.0, unprocessed_rate=0.0, hash_key='claimId', seed=0, item_write_limit=None,
+                 page_items=1000, stream=False):
+        self.latency_ms = latency_ms
+        self.unprocessed_rate = unprocessed_rate
+        self.hash_key = hash_key
+        self.item_write_limit = item_write_limit
+        self.page_items = page_items
+        self.stream = stream
+        self.tables = {}
+        self.write_buckets = {}
+        self.key_changes = {}
+        self.segments = {}
+        self.streams = {}
+        self.indexes = {}
+        self.sequence = 0
+        self.serializer = TypeSerializer()
+        self.requests = 0
+        self.items_written = 0
+        self.write_units = 0
+        self.unprocessed = 0
+        self.conditional_failures = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.meta = type('Meta', (), {'client': LocalDynamoDBClient(self)})()
+
+    def Table(self, name):
+        return LocalDynamoTable(self, name)
+
+    def items(self, table_name):
+        return self.tables.setdefault(table_name, {})
+
+    def load(self, table_name, items):
+        """
+        Bulk-insert items directly (no latency, counters or stream records)
+        """
+        with self.lock:
+            table = self.items(table_name)
+            for item in items:
+                key = item[self.hash_key]
+                self._index(table_name, key, table.get(key), item)
+                table[key] = item
+            self.key_changes[table_name] = self.key_changes.get(table_name, 0) + 1
+
+    def create_index(self, table_name, definition):
+        """
+        Add a global secondary index and index the items already stored
+        """
+        keys = {entry['KeyType']: entry['AttributeName'] for entry in definition['KeySchema']}
+        with self.lock:
+            self.indexes.setdefault(table_name, {})[definition['IndexName']] = {
+                'hash': keys['HASH'], 'range': keys.get('RANGE'), 'projection': definition['Projection'],
+                'key_schema': definition['KeySchema'], 'partitions': {}}
+            for key, item in self.items(table_name).items():
+                self._index(table_name, key, None, item)
+
+    def _index(self, table_name, key, old, new):
+        """
+        Move one item's entries in the table's indexes; caller holds the lock
+        """
+        for index in self.indexes.get(table_name, {}).values():
+            for item, add in ((old, False), (new, True)):
+                if item is None or index['hash'] not in item or (index['range'] and index['range'] not in item):
+                    continue
+                entries = index['partitions'].setdefault(item[index['hash']], [])
+                entry = (item[index['range']] if index['range'] else '', key)
+                if add:
+                    bisect.insort(entries, entry)
+                else:
+                    entries.pop(bisect.bisect_left(entries, entry))
+
+    def stream_records(self, table_name, clear=True):
+        """
+        Stream records written so far, oldest first
+        """
+        with self.lock:
+            records = self.streams.get(table_name, [])
+            if clear:
+                self.streams[table_name] = []
+            return records
+
+    def _store(self, table_name, key, item, units=1):
+        """
+        Write (item) or delete (None) one item, counting the write units it
+        cost (two in a transaction); caller holds the lock
+        """
+        table = self.items(table_name)
+        old = table.get(key)
+        self.write_units += units
+        self._index(table_name, key, old, item)
+        if item is None:
+            table.pop(key, None)
+        else:
+            table[key] = item
+            self.items_written += 1
+        if (old is None) != (item is None):
+            self.key_changes[table_name] = self.key_changes.get(table_name, 0) + 1
+        if self.stream and old != item:
+            self.sequence += 1
+            record = {'Keys': self.serializer.serialize({self.hash_key: key})['M'],
+                      'SequenceNumber': f'{self.sequence:021d}', 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+            if item is not None:
+                record['NewImage'] = self.serializer.serialize(item)['M']
+            if old is not None:
+                record['OldImage'] = self.serializer.serialize(old)['M']
+            self.streams.setdefault(table_name, []).append({
+                'eventID': uuid.uuid4().hex,
+                'eventName': 'INSERT' if old is None else 'REMOVE' if item is None else 'MODIFY',
+                'eventSource': 'aws:dynamodb',
+                'eventSourceARN': f'arn:aws:dynamodb:local:000000000000:table/{table_name}/stream/local',
+                'dynamodb': record
+            })
+
+    def _segment_keys(self, table_name, segment, total):
+        """
+        Sorted keys of one scan segment, rebuilt when keys were added or
+        removed since; caller holds the lock
+        """
+        version = self.key_changes.get(table_name, 0)
+        cached = self.segments.get((table_name, total))
+        if cached is None or cached[0] != version:
+            lists = [[] for _ in range(total)]
+            for key in self.items(table_name):
+                lists[zlib.crc32(str(key).encode()) % total].append(key)
+            for keys in lists:
+                keys.sort()
+            cached = self.segments[(table_name, total)] = (version, lists)
+        return cached[1][segment]
+    def _wait(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _check(self, operation, item, condition, names, values):
+        if condition and not evaluate_condition(item or {}, condition, names or {}, values or {}):
+            self.conditional_failures += 1
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException',
+                                         'Message': 'The conditional request failed'}}, operation)
+
+    def _consume(self, table_name, key, units=1):
+        """
+        Take write units from the item's bucket (caller holds the lock);
+        False when the item is over its write limit
+        """
+        if not self.item_write_limit:
+            return True
+        now = time.monotonic()
+        tokens, last = self.write_buckets.get((table_name, key), (self.item_write_limit, now))
+        tokens = min(self.item_write_limit, tokens + (now - last) * self.item_write_limit)
+        if tokens < units:
+            self.write_buckets[(table_name, key)] = (tokens, now)
+            self.throttled += 1
+            return False
+        self.write_buckets[(table_name, key)] = (tokens - units, now)
+        return True
+
+    def _throttle(self, operation, table_name, key):
+        if not self._consume(table_name, key):
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                         'Message': 'The level of configured provisioned throughput for the '
+                                                    'table was exceeded.'}}, operation)
+
+    def reset_counters(self):
+        self.requests = 0
+        self.items_written = 0
+        self.write_units = 0
+        self.unprocessed = 0
+        self.conditional_failures = 0
+        self.throttled = 0
+
+
+class LocalDynamoDBClient:
+    """
+    The meta.client of LocalDynamoDB: put_item, get_item, update_item,
+    batch_write_item, batch_get_item, transact_write_items, scan, query
+    (on a global secondary index), and describe_table / update_table for
+    adding indexes (on-demand billing; a new index is ACTIVE at once)
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def describe_table(self, TableName):
+        self.db._wait()
+        indexes = self.db.indexes.get(TableName, {})
+        return {'Table': {
+            'TableName': TableName,
+            'TableStatus': 'ACTIVE',
+            'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'},
+            'KeySchema': [{'AttributeName': self.db.hash_key, 'KeyType': 'HASH'}],
+            'GlobalSecondaryIndexes': [{'IndexName': name, 'IndexStatus': 'ACTIVE', 'KeySchema': index['key_schema'],
+                                        'Projection': index['projection']} for name, index in indexes.items()]
+        }}
+
+    def update_table(self, TableName, AttributeDefinitions=None, GlobalSecondaryIndexUpdates=None):
+        updates = GlobalSecondaryIndexUpdates or []
+        if len(updates) != 1 or set(updates[0]) != {'Create'}:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Only one global secondary index can be created per update'}},
+                              'UpdateTable')
+        if updates[0]['Create']['IndexName'] in self.db.indexes.get(TableName, {}):
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Attempting to create an index which already exists'}},
+                              'UpdateTable')
+        self.db._wait()
+        self.db.create_index(TableName, updates[0]['Create'])
+        return self.describe_table(TableName)
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        check_no_floats(Item)
+        check_no_floats(ExpressionAttributeValues)
+        self.db._wait()
+        table = self.db.items(TableName)
+        with self.db.lock:
+            self.db._throttle('PutItem', TableName, Item[self.db.hash_key])
+            self.db._check('PutItem', table.get(Item[self.db.hash_key]), ConditionExpression,
+                           ExpressionAttributeNames, ExpressionAttributeValues)
+            self.db._store(TableName, Item[self.db.hash_key], copy.deepcopy(Item))
+        return {}
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        self.db._wait()
+        with self.db.lock:
+            item = self.db.items(TableName).get(Key[self.db.hash_key])
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues='NONE'):
+        check_no_floats(ExpressionAttributeValues)
+        self.db._wait()
+        table = self.db.items(TableName)
+        key = Key[self.db.hash_key]
+        with self.db.lock:
+            self.db._throttle('UpdateItem', TableName, key)
+            old = table.get(key)
+            self.db._check('UpdateItem', old, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            new = copy.deepcopy(old) if old is not None else dict(Key)
+            updated = apply_update(new, UpdateExpression, ExpressionAttributeNames or {},
+                                   ExpressionAttributeValues or {})
+            self.db._store(TableName, key, new)
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': copy.deepcopy(new)}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {name: copy.deepcopy(new[name]) for name in updated if name in new}}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            return {'Attributes': old}
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        requests = [(name, request) for name, table_requests in RequestItems.items() for request in table_requests]
+        if len(requests) > 25:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Too many items requested for the BatchWriteItem call'}},
+                              'BatchWriteItem')
+        for _, request in requests:
+            check_no_floats(request)
+        self.db._wait()
+        unprocessed = {}
+        with self.db.lock:
+            for name, request in requests:
+                if self.db.random.random() < self.db.unprocessed_rate:
+                    self.db.unprocessed += 1
+                    unprocessed.setdefault(name, []).append(request)
+                elif 'PutRequest' in request:
+                    item = request['PutRequest']['Item']
+                    self.db._store(name, item[self.db.hash_key], copy.deepcopy(item))
+                else:
+                    self.db._store(name, request['DeleteRequest']['Key'][self.db.hash_key], None)
+        return {'UnprocessedItems': unprocessed}
+
+    def batch_get_item(self, RequestItems):
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Too many items requested for the BatchGetItem call'}},
+                              'BatchGetItem')
+        self.db._wait()
+        responses = {}
+        with self.db.lock:
+            for name, request in RequestItems.items():
+                table = self.db.items(name)
+                found = (table.get(key[self.db.hash_key]) for key in request['Keys'])
+                responses[name] = [copy.deepcopy(item) for item in found if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None):
+        """
+        All-or-nothing Put/Update/Delete/ConditionCheck on up to 100 items;
+        any failed condition or throttled item cancels the whole transaction
+        with per-item CancellationReasons
+        """
+        if len(TransactItems) > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Member must have length less than or equal to 100'}},
+                              'TransactWriteItems')
+        check_no_floats(TransactItems)
+        self.db._wait()
+        with self.db.lock:
+            reasons = []
+            throttled = self.db.random.random() < self.db.unprocessed_rate
+            if throttled:
+                self.db.unprocessed += len(TransactItems)
+            for entry in TransactItems:
+                (action, request), = entry.items()
+                key = (request['Item'] if action == 'Put' else request['Key'])[self.db.hash_key]
+                current = self.db.items(request['TableName']).get(key)
+                condition = request.get('ConditionExpression')
+                if throttled or action != 'ConditionCheck' and not self.db._consume(request['TableName'], key,
+                                                                                    units=2):
+                    reasons.append({'Code': 'ThrottlingError', 'Message': 'Throughput exceeds the current '
+                                                                          'capacity for one or more items'})
+                elif condition and not evaluate_condition(current or {}, condition,
+                                                          request.get('ExpressionAttributeNames') or {},
+                                                          request.get('ExpressionAttributeValues') or {}):
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                else:
+                    reasons.append({'Code': 'None'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                self.db.conditional_failures += sum(reason['Code'] == 'ConditionalCheckFailed'
+                                                    for reason in reasons)
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                raise ClientError({'Error': {'Code': 'TransactionCanceledException',
+                                             'Message': f'Transaction cancelled, please refer cancellation '
+                                                        f'reasons for specific reasons [{codes}]'},
+                                   'CancellationReasons': reasons}, 'TransactWriteItems')
+            for entry in TransactItems:
+                (action, request), = entry.items()
+                table = self.db.items(request['TableName'])
+                if action == 'Put':
+                    self.db._store(request['TableName'], request['Item'][self.db.hash_key],
+                                   copy.deepcopy(request['Item']), units=2)
+                elif action == 'Delete':
+                    self.db._store(request['TableName'], request['Key'][self.db.hash_key], None, units=2)
+                elif action == 'Update':
+                    key = request['Key'][self.db.hash_key]
+                    new = copy.deepcopy(table[key]) if key in table else dict(request['Key'])
+                    apply_update(new, request['UpdateExpression'], request.get('ExpressionAttributeNames') or {},
+                                 request.get('ExpressionAttributeValues') or {})
+                    self.db._store(request['TableName'], key, new, units=2)
+        return {}
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, ExclusiveStartKey=None, Limit=None,
+             FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, ConsistentRead=False):
+        check_no_floats(ExpressionAttributeValues)
+        self.db._wait()
+        names = ExpressionAttributeNames or {}
+        with self.db.lock:
+            keys = self.db._segment_keys(TableName, Segment, TotalSegments)
+            start = 0 if ExclusiveStartKey is None else bisect.bisect_right(keys, ExclusiveStartKey[self.db.hash_key])
+            page = keys[start:start + min(Limit or self.db.page_items, self.db.page_items)]
+            table = self.db.items(TableName)
+            items = []
+            for key in page:
+                item = table.get(key)
+                if item is None or FilterExpression and not evaluate_condition(
+                        item, FilterExpression, names, ExpressionAttributeValues or {}):
+                    continue
+                items.append(project(item, ProjectionExpression, names) if ProjectionExpression
+                             else copy.deepcopy(item))
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(page)}
+        if start + len(page) < len(keys):
+            response['LastEvaluatedKey'] = {self.db.hash_key: page[-1]}
+        return response
+
+
+    def query(self, TableName, IndexName, KeyConditionExpression, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None,
+              FilterExpression=None, ConsistentRead=False):
+        if ConsistentRead:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Consistent reads are not supported on global secondary indexes'}},
+                              'Query')
+        check_no_floats(ExpressionAttributeValues)
+        self.db._wait()
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self.db.lock:
+            index = self.db.indexes.get(TableName, {}).get(IndexName)
+            if index is None:
+                raise ClientError({'Error': {'Code': 'ValidationException',
+                                             'Message': f'The table does not have the specified index: {IndexName}'}},
+                                  'Query')
+            hash_value, matches = _key_condition(KeyConditionExpression, index, names, values)
+            entries = [entry for entry in index['partitions'].get(hash_value, []) if matches(entry[0])]
+            if not ScanIndexForward:
+                entries.reverse()
+            if ExclusiveStartKey is not None:
+                start = (ExclusiveStartKey[index['range']] if index['range'] else '',
+                         ExclusiveStartKey[self.db.hash_key])
+                entries = entries[entries.index(start) + 1:]
+            size = min(Limit or self.db.page_items, self.db.page_items)
+            page = entries[:size]
+            table = self.db.items(TableName)
+            items = []
+            for _, key in page:
+                item = table[key]
+                if FilterExpression and not evaluate_condition(item, FilterExpression, names, values):
+                    continue
+                items.append(_index_projection(item, index, self.db.hash_key))
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(page)}
+        # Like DynamoDB, a page that reaches Limit has a LastEvaluatedKey
+        # even when nothing follows it
+        if page and (len(page) < len(entries) or len(page) == Limit):
+            last = table[page[-1][1]]
+            response['LastEvaluatedKey'] = {name: last[name] for name in
+                                            (self.db.hash_key, index['hash'], index['range']) if name}
+        return response
+
+
+class LocalDynamoTable:
+    """
+    boto3-style Table resource backed by a LocalDynamoDB
+    """
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.meta = db.meta
+
+    def put_item(self, **kwargs):
+        return self.meta.client.put_item(TableName=self.name, **kwargs)
+
+    def get_item(self, **kwargs):
+        return self.meta.client.get_item(TableName=self.name, **kwargs)
+
+    def update_item(self, **kwargs):
+        return self.meta.client.update_item(TableName=self.name, **kwargs)
+
+    def scan(self, **kwargs):
+        return self.meta.client.scan(TableName=self.name, **kwargs)
+
+    def query(self, **kwargs):
+        return self.meta.client.query(TableName=self.name, **kwargs)
+
+
+class LocalSQSClient:
+    """
+    boto3-style SQS client with in-memory standard queues: send (single and
+    batch), long-polling receive, delete, visibility timeouts (a received
+    message reappears unless deleted; change_message_visibility reschedules
+    it) and receive counts. Charges latency_ms per request
+    """
+
+    def __init__(self, latency_ms=0.0, visibility_timeout=30):
+        self.latency_ms = latency_ms
+        self.visibility_timeout = visibility_timeout
+        self.queues = {}
+        self.requests = 0
+        self.sent = 0
+        self.condition = threading.Condition()
+
+    def create_queue(self, QueueName):
+        url = f'https://sqs.local/000000000000/{QueueName}'
+        with self.condition:
+            self.queues.setdefault(url, {'messages': {}, 'ready': deque(), 'hidden': []})
+        return {'QueueUrl': url}
+
+    def _wait(self):
+        with self.condition:
+            self.requests += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _queue(self, url):
+        if url not in self.queues:
+            raise ClientError({'Error': {'Code': 'AWS.SimpleQueueService.NonExistentQueue',
+                                         'Message': 'The specified queue does not exist.'}}, 'SQS')
+        return self.queues[url]
+
+    def _release_due(self, queue, now):
+        while queue['hidden'] and queue['hidden'][0][0] <= now:
+            visible_at, message_id = heapq.heappop(queue['hidden'])
+            message = queue['messages'].get(message_id)
+            if message is not None and message['visible_at'] == visible_at:
+                queue['ready'].append(message_id)
+
+    def _enqueue(self, queue, body, delay):
+        message_id = str(uuid.uuid4())
+        message = {'id': message_id, 'body': body, 'receives': 0, 'visible_at': 0.0, 'sent_at': time.time()}
+        queue['messages'][message_id] = message
+        if delay:
+            message['visible_at'] = time.time() + delay
+            heapq.heappush(queue['hidden'], (message['visible_at'], message_id))
+        else:
+            queue['ready'].append(message_id)
+        self.sent += 1
+        return message_id
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        self._wait()
+        with self.condition:
+            message_id = self._enqueue(self._queue(QueueUrl), MessageBody, DelaySeconds)
+            self.condition.notify_all()
+        return {'MessageId': message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        if len(Entries) > 10:
+            raise ClientError({'Error': {'Code': 'AWS.SimpleQueueService.TooManyEntriesInBatchRequest',
+                                         'Message': 'Maximum number of entries per request are 10.'}},
+                              'SendMessageBatch')
+        self._wait()
+        with self.condition:
+            queue = self._queue(QueueUrl)
+            successful = [{'Id': entry['Id'], 'MessageId': self._enqueue(queue, entry['MessageBody'],
+                                                                          entry.get('DelaySeconds', 0))}
+                          for entry in Entries]
+            self.condition.notify_all()
+        return {'Successful': successful, 'Failed': []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None,
+                        AttributeNames=None):
+        self._wait()
+        deadline = time.time() + WaitTimeSeconds
+        timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        with self.condition:
+            queue = self._queue(QueueUrl)
+            while True:
+                now = time.time()
+                self._release_due(queue, now)
+                received = []
+                while queue['ready'] and len(received) < MaxNumberOfMessages:
+                    message = queue['messages'].get(queue['ready'].popleft())
+                    if message is None or message['visible_at'] > now:
+                        continue
+                    message['receives'] += 1
+                    message['visible_at'] = now + timeout
+                    message['receipt'] = f"{message['id']}#{message['receives']}"
+                    heapq.heappush(queue['hidden'], (message['visible_at'], message['id']))
+                    received.append({'MessageId': message['id'], 'ReceiptHandle': message['receipt'],
+                                     'Body': message['body'],
+                                     'Attributes': {'ApproximateReceiveCount': str(message['receives']),
+                                                    'SentTimestamp': str(int(message['sent_at'] * 1000))}})
+                if received or now >= deadline:
+                    return {'Messages': received} if received else {}
+                next_due = queue['hidden'][0][0] if queue['hidden'] else deadline
+                self.condition.wait(max(0.0, min(deadline, next_due) - now))
+
+    def _message(self, queue, receipt_handle):
+        message = queue['messages'].get(receipt_handle.split('#')[0])
+        if message is None or message.get('receipt') != receipt_handle:
+            raise ClientError({'Error': {'Code': 'ReceiptHandleIsInvalid',
+                                         'Message': 'The receipt handle is not valid.'}}, 'SQS')
+        return message
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._wait()
+        with self.condition:
+            queue = self._queue(QueueUrl)
+            del queue['messages'][self._message(queue, ReceiptHandle)['id']]
+        return {}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        if not isinstance(VisibilityTimeout, int) or not 0 <= VisibilityTimeout <= 43200:
+            raise ClientError({'Error': {'Code': 'InvalidParameterValue',
+                                         'Message': 'VisibilityTimeout must be an integer from 0 to 43200'}},
+                              'ChangeMessageVisibility')
+        self._wait()
+        with self.condition:
+            queue = self._queue(QueueUrl)
+            message = self._message(queue, ReceiptHandle)
+            message['visible_at'] = time.time() + VisibilityTimeout
+            heapq.heappush(queue['hidden'], (message['visible_at'], message['id']))
+            self.condition.notify_all()
+        return {}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        self._wait()
+        with self.condition:
+            queue = self._queue(QueueUrl)
+            now = time.time()
+            visible = sum(message['visible_at'] <= now for message in queue['messages'].values())
+        return {'Attributes': {'ApproximateNumberOfMessages': str(visible),
+                               'ApproximateNumberOfMessagesNotVisible': str(len(queue['messages']) - visible)}}
+
+    def reset_counters(self):
+        self.requests = 0
+        self.sent = 0
+
+
+def check_no_floats(value):
+    """
+    boto3's TypeSerializer refuses Python floats; raise the same error
+    """
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        for item in value.values():
+            check_no_floats(item)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            check_no_floats(item)
+
+
+_MISSING = object()
+_COMPARISONS = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b, '<': lambda a, b: a < b,
+                '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+
+
+def _path(expression, names):
+    return [names.get(part, part) for part in expression.strip().split('.')]
+
+
+def _lookup(item, path):
+    for part in path:
+        if not isinstance(item, dict) or part not in item:
+            return _MISSING
+        item = item[part]
+    return item
+
+
+def _operand(item, text, names, values):
+    text = text.strip()
+    if text.startswith(':'):
+        return values[text]
+    match = 'if_not_exists' in text and re.fullmatch(r'if_not_exists\(\s*([^,]+?)\s*,\s*(\S+?)\s*\)', text)
+    if match:
+        current = _lookup(item, _path(match.group(1), names))
+        return current if current is not _MISSING else _operand(item, match.group(2), names, values)
+    if text.startswith(':'):
+        return values[text]
+    return _lookup(item, _path(text, names))
+
+
+def evaluate_condition(item, expression, names, values):
+    """
+    True when item satisfies a condition expression (see LocalDynamoDB)
+    """
+    for alternative in _parse_condition(expression):
+        if all(_evaluate_term(item, term, names, values) for term in alternative):
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_condition(expression):
+    """
+    OR-alternatives of AND-ed terms, each ('exists', wanted, path) or
+    ('compare', left, operator, right)
+    """
+    alternatives = []
+    for alternative in re.split(r'\s+OR\s+', expression.strip()):
+        terms = []
+        for term in re.split(r'\s+AND\s+', alternative):
+            match = re.fullmatch(r'(attribute_exists|attribute_not_exists)\(\s*(\S+?)\s*\)', term.strip())
+            if match:
+                terms.append(('exists', match.group(1) == 'attribute_exists', match.group(2)))
+                continue
+            match = re.fullmatch(r'(\S+)\s*(<>|<=|>=|=|<|>)\s*(\S+)', term.strip())
+            if not match:
+                raise ValueError(f'Unsupported condition term {term!r}')
+            terms.append(('compare', match.group(1), match.group(2), match.group(3)))
+        alternatives.append(terms)
+    return alternatives
+
+
+def _evaluate_term(item, term, names, values):
+    if term[0] == 'exists':
+        return (_lookup(item, _path(term[2], names)) is not _MISSING) == term[1]
+    _, left, operator, right = term
+    left, right = _operand(item, left, names, values), _operand(item, right, names, values)
+    if left is _MISSING or right is _MISSING:
+        return False
+    try:
+        return _COMPARISONS[operator](left, right)
+    except TypeError:
+        return False
+
+
+def _key_condition(expression, index, names, values):
+    """
+    (hash value, test on the range value) for a KeyConditionExpression:
+    hash = :v, optionally AND a comparison, BETWEEN or begins_with on the
+    range key
+    """
+    match = re.fullmatch(r'\s*(\S+)\s*=\s*(:\w+)\s*(?:AND\s+(.+))?', expression)
+    if not match or names.get(match.group(1), match.group(1)) != index['hash']:
+        raise ClientError({'Error': {'Code': 'ValidationException',
+                                     'Message': f'Query key condition not supported: {expression}'}}, 'Query')
+    hash_value, condition = values[match.group(2)], (match.group(3) or '').strip()
+    if not condition:
+        return hash_value, lambda value: True
+    prefix = re.fullmatch(r'begins_with\(\s*(\S+)\s*,\s*(:\w+)\s*\)', condition)
+    between = re.fullmatch(r'(\S+)\s+BETWEEN\s+(:\w+)\s+AND\s+(:\w+)', condition)
+    compare = re.fullmatch(r'(\S+)\s*(<=|>=|=|<|>)\s*(:\w+)', condition)
+    if prefix:
+        return hash_value, lambda value: value.startswith(values[prefix.group(2)])
+    if between:
+        return hash_value, lambda value: values[between.group(2)] <= value <= values[between.group(3)]
+    if compare:
+        return hash_value, lambda value: _COMPARISONS[compare.group(2)](value, values[compare.group(3)])
+    raise ClientError({'Error': {'Code': 'ValidationException',
+                                 'Message': f'Query key condition not supported: {expression}'}}, 'Query')
+
+
+def _index_projection(item, index, hash_key):
+    projection = index['projection']
+    if projection['ProjectionType'] == 'ALL':
+        return copy.deepcopy(item)
+    names = {hash_key, index['hash'], index['range']}
+    if projection['ProjectionType'] == 'INCLUDE':
+        names.update(projection['NonKeyAttributes'])
+    return {name: copy.deepcopy(value) for name, value in item.items() if name in names}
+
+
+def project(item, expression, names):
+    """
+    The attributes a projection expression names, nested paths included
+    """
+    result = {}
+    for text in expression.split(','):
+        path = _path(text, names)
+        value = _lookup(item, path)
+        if value is _MISSING:
+            continue
+        target = result
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[path[-1]] = copy.deepcopy(value)
+    return result
+
+
+def apply_update(item, expression, names, values):
+    """
+    Apply an update expression to item in place; returns the top-level
+    attribute names it touched
+    """
+    touched = set()
+    clauses = re.split(r'\b(SET|ADD|REMOVE)\s+', expression.strip())[1:]
+    for action, body in zip(clauses[::2], clauses[1::2]):
+        for clause in re.split(r',\s*(?![^()]*\))', body.strip()):
+            if action == 'SET':
+                target, value = clause.split('=', 1)
+                terms = re.split(r'\s+([+-])\s+', value.strip())
+                result = _operand(item, terms[0], names, values)
+                for sign, term in zip(terms[1::2], terms[2::2]):
+                    operand = _operand(item, term, names, values)
+                    if result is _MISSING or operand is _MISSING:
+                        _invalid_path(clause)
+                    result = result + operand if sign == '+' else result - operand
+                if result is _MISSING:
+                    _invalid_path(clause)
+                path = _path(target, names)
+                _parent(item, path, clause)[path[-1]] = copy.deepcopy(result)
+            elif action == 'ADD':
+                target, value = clause.split()
+                path = _path(target, names)
+                parent = _parent(item, path, clause)
+                current = parent.get(path[-1])
+                operand = values[value]
+                if current is None:
+                    parent[path[-1]] = copy.deepcopy(operand)
+                elif isinstance(current, set):
+                    parent[path[-1]] = current | operand
+                else:
+                    parent[path[-1]] = current + operand
+            else:
+                path = _path(clause, names)
+                _parent(item, path, clause).pop(path[-1], None)
+            touched.add(path[0])
+    return touched
+
+
+def _parent(item, path, clause):
+    parent = _lookup(item, path[:-1])
+    if not isinstance(parent, dict):
+        _invalid_path(clause)
+    return parent
+
+
+def _invalid_path(clause):
+    raise ClientError({'Error': {'Code': 'ValidationException',
+                                 'Message': f'The document path provided in the update expression is invalid for update: {clause}'}},
+                      'UpdateItem')
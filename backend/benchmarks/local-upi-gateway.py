@@ -0,0 +1,161 @@
+"""
+VeriCrop FinBridge - Local UPI Gateway
+Stand-in for a payout provider's API (the endpoints upi-gateway-client.py
+calls) on a local threaded HTTP/1.1 server. Injects a handshake delay on
+every new connection (the TCP/TLS setup to a remote provider), request
+latency with a slow tail, transient 503s, and settlement delay: a share of
+payouts start 'processing' and settle later. Payouts are deduplicated on
+X-Payout-Idempotency; VPAs ending in @invalid fail. Counts connections,
+requests and the most requests in flight.
+
+Usage:
+    python local-upi-gateway.py --port 8099
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalUpiGateway:
+    """
+    Payout API stand-in; start() serves it on a background thread and
+    returns its base URL
+    """
+
+    def __init__(self, handshake_ms=30, latency_ms=40, tail_ms=800, tail_rate=0.03, error_rate=0.02,
+                 processing_rate=0.5, settle_ms=(100, 600), seed=0):
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.processing_rate = processing_rate
+        self.settle_ms = settle_ms
+        self.random = random.Random(seed)
+        self.payouts = {}
+        self.by_key = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = 0
+
+    def start(self, port=0):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with gateway.lock:
+                    gateway.connections += 1
+                time.sleep(gateway.handshake_ms / 1000)
+
+            def do_POST(self):
+                if self.headers.get('Authorization') is None:
+                    return self.respond(401, {'error': {'description': 'Missing credentials'}})
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                self.respond(*gateway.create_payout(body, self.headers.get('X-Payout-Idempotency')))
+
+            def do_GET(self):
+                self.respond(*gateway.payout_status(self.path.rsplit('/', 1)[-1]))
+
+            def respond(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _serve(self):
+        """
+        Request bookkeeping and injected latency; False for an injected 503
+        """
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            slow = self.random.random() < self.tail_rate
+            failed = self.random.random() < self.error_rate
+            latency = self.tail_ms if slow else self.latency_ms * self.random.lognormvariate(0, 0.25)
+        time.sleep(latency / 1000)
+        with self.lock:
+            self.in_flight -= 1
+            self.errors += failed
+        return not failed
+
+    def create_payout(self, body, idempotency_key):
+        if not self._serve():
+            return 503, {'error': {'description': 'Service unavailable'}}
+        with self.lock:
+            if idempotency_key in self.by_key:
+                return 200, self.payouts[self.by_key[idempotency_key]]
+            payout = {'id': f'pout_{uuid.uuid4().hex[:14]}', 'amount': body['amount'], 'vpa': body['vpa'],
+                      'reference_id': body.get('reference_id'), 'status': 'processed'}
+            if body['vpa'].endswith('@invalid'):
+                payout.update(status='failed', failure_reason='Invalid VPA')
+            elif self.random.random() < self.processing_rate:
+                payout.update(status='processing',
+                              settle_at=time.time() + self.random.uniform(*self.settle_ms) / 1000)
+            if payout['status'] == 'processed':
+                payout['utr'] = f'UTR{uuid.uuid4().int % 10 ** 12:012d}'
+            self.payouts[payout['id']] = payout
+            if idempotency_key:
+                self.by_key[idempotency_key] = payout['id']
+            return 200, payout
+
+    def payout_status(self, payout_id):
+        if not self._serve():
+            return 503, {'error': {'description': 'Service unavailable'}}
+        with self.lock:
+            payout = self.payouts.get(payout_id)
+            if payout is None:
+                return 404, {'error': {'description': f'No payout {payout_id}'}}
+            if payout['status'] == 'processing' and time.time() >= payout['settle_at']:
+                payout.update(status='processed', utr=f'UTR{uuid.uuid4().int % 10 ** 12:012d}')
+            return 200, payout
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local UPI payout API stand-in')
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+    url = LocalUpiGateway().start(args.port)
+    print(f'Local UPI gateway on {url} (UPI_GATEWAY_ENDPOINT={url}); Ctrl-C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+VeriCrop FinBridge - Parallel Frame Analysis Benchmark
+======================================================
+
+Exhaustive shadow extraction on a 60-second 1080p clip with 1-6 analysis
+workers, for both pool backends and two analysis widths. At the default
+320 px width decoding dominates; wider analysis shifts the work onto the
+pool. Speedup is bounded by the CPUs available (printed first).
+
+Usage:
+    python parallel-frame-analysis-benchmark.py --clip existing-1080p.mp4
+"""
+
+import argparse
+import importlib
+import os
+import tempfile
+import time
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+
+BUCKET = 'vericrop-evidence'
+KEY = 'parallel/60s-1080p.mp4'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel shadow frame analysis')
+    parser.add_argument('--clip', help='Existing clip to use instead of rendering one')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 3, 4, 5, 6])
+    parser.add_argument('--widths', type=int, nargs='+', default=[320, 1280])
+    parser.add_argument('--backends', nargs='+', default=['process', 'thread'])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-parallel-')
+    s3 = local_aws.LocalS3Client(workdir)
+    path = args.clip
+    if not path:
+        path = os.path.join(workdir, 'render.mp4')
+        print('Rendering 60 s 1920x1080 clip...')
+        synthetic.render_shadow_video(path, 200, seconds=60, width=1920, height=1080)
+    s3.upload_file(path, BUCKET, KEY)
+
+    utils.print_banner(f'Parallel frame analysis - 60 s 1080p, {os.cpu_count()} CPUs available')
+    for width in args.widths:
+        comparator.SHADOW_ANALYSIS_WIDTH = width
+        for backend in args.backends:
+            comparator.SHADOW_PARALLEL_BACKEND = backend
+            baseline = None
+            print(f"\nanalysis width {width} px, {backend} backend")
+            for workers in args.workers:
+                best = float('inf')
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    estimate = comparator.extract_shadow_angle(BUCKET, KEY, 200, s3_client=s3,
+                                                               progressive=False, workers=workers)
+                    best = min(best, time.perf_counter() - start)
+                baseline = baseline or best
+                print(f"  workers {workers}: {best:6.2f} s  {estimate['frames_decoded'] / best:6.1f} frames/s  "
+                      f"speedup {baseline / best:4.2f}x  angle {estimate['angle']:.2f}°")
+            for pool in comparator.FRAME_POOLS.values():
+                pool.close()
+            comparator.FRAME_POOLS.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+VeriCrop FinBridge - Perceptual Hash Index Benchmark
+====================================================
+
+Multi-index Hamming search over millions of stored frame hashes (build time,
+query latency, recall for 0-8 flipped bits, snapshot save/load), then the
+recycled-evidence check end to end: a clip analysed for one claim, the same
+footage re-encoded at a lower resolution for a second claim, and an
+unrelated clip, all checked against the large index. The same is repeated
+against the DynamoDB store (bucket items on the in-memory stand-in) from a
+fresh container with no snapshot: probe latency and requests, and an
+original registered by one container caught when re-uploaded to another.
+
+Usage:
+    python perceptual-hash-benchmark.py --hashes 2000000 --queries 2000 --store-hashes 300000
+"""
+
+import argparse
+import importlib
+import json
+import os
+import tempfile
+import time
+
+import av
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+phash = comparator.phash
+
+BUCKET = 'vericrop-evidence'
+TABLE = 'vericrop-claims'
+FRAMES_PER_VIDEO = 30
+CLAIM = {'bucket': BUCKET, 'expected_azimuth': 200.0, 'latitude': 19.0760, 'longitude': 72.8777,
+         'timestamp': '2026-03-01T06:30:00Z'}
+
+
+def random_index(count, rng):
+    """
+    Index of `count` random 64-bit hashes in videos of FRAMES_PER_VIDEO frames
+    """
+    index = phash.PerceptualHashIndex()
+    index.hashes = rng.integers(0, 2**64, size=count, dtype=np.uint64)
+    index.video_ids = (np.arange(count) // FRAMES_PER_VIDEO).astype(np.int32)
+    index.videos = [{'video_key': f'random/{i}.mp4', 'claim_id': f'CLM-{i}', 'analysis': None}
+                    for i in range(int(index.video_ids[-1]) + 1)]
+    return index
+
+
+def store_items(index):
+    """
+    DynamoHashStore items for every video of a random index: the PHASH
+    records and the substring bucket items
+    """
+    buckets = {}
+    for value, video_id in zip(index.hashes.tolist(), index.video_ids.tolist()):
+        entry = f'{value:016x} random/{video_id}.mp4'
+        for table in range(phash.SUBSTRINGS):
+            key = phash.DynamoHashStore.bucket_key(table, (value >> (table * phash.SUBSTRING_BITS))
+                                                   & phash.SUBSTRING_MASK)
+            buckets.setdefault(key, set()).add(entry)
+    for key, entries in buckets.items():
+        yield {'claimId': key, 'type': 'PHASH_BUCKET', 'entries': entries}
+    for video_id, video in enumerate(index.videos):
+        hashes = index.hashes[index.video_ids == video_id].tolist()
+        yield {'claimId': f"PHASH#{video['video_key']}", 'type': 'PHASH',
+               'data': {'video_key': video['video_key'], 'claim_id': video['claim_id'],
+                        'hashes': [f'{h:016x}' for h in hashes], 'analysis': json.dumps(None)}}
+
+
+def run_clips(s3, clips, prefix):
+    for label, path, claim_id in clips:
+        key = f'{prefix}/{claim_id}.mp4'
+        s3.upload_file(path, BUCKET, key)
+        start = time.perf_counter()
+        body = json.loads(comparator.lambda_handler(dict(CLAIM, video_key=key, claimId=claim_id), None)['body'])
+        elapsed = (time.perf_counter() - start) * 1000
+        match = body.get('duplicate_of')
+        print(f"{label}: {body['outcome']} in {elapsed:.1f} ms, {body['frames_decoded']} frames decoded"
+              + (f" - matches {match['claim_id']} ({match['matched_frames']} frames, "
+                 f"mean distance {match['mean_distance']})" if match else ''))
+
+
+def flip_bits(value, bits, rng):
+    for bit in rng.choice(64, size=bits, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+
+def reencode(source, destination, width, height, crf):
+    """
+    Decode and re-encode a clip at another size and quality, as a claimant
+    re-uploading saved footage through a messaging app would
+    """
+    with av.open(source) as inp, av.open(destination, 'w') as out:
+        stream = out.add_stream('libx264', rate=30)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+        stream.codec_context.gop_size = 30
+        stream.options = {'crf': str(crf)}
+        for frame in inp.decode(video=0):
+            rgb = frame.to_ndarray(width=width, height=height, format='rgb24')
+            for packet in stream.encode(av.VideoFrame.from_ndarray(rgb, format='rgb24')):
+                out.mux(packet)
+        for packet in stream.encode():
+            out.mux(packet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the perceptual hash index')
+    parser.add_argument('--hashes', type=int, default=2000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--store-hashes', type=int, default=300000, help='Hashes in the DynamoDB store')
+    parser.add_argument('--latency-ms', type=float, default=2, help='Simulated DynamoDB request latency')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    utils.print_banner(f'Multi-index search - {args.hashes:,} stored hashes')
+    index = random_index(args.hashes, rng)
+    start = time.perf_counter()
+    index.build()
+    print(f"build: {time.perf_counter() - start:.2f} s")
+
+    targets = rng.integers(0, args.hashes, size=args.queries)
+    for bits in (0, 3, 7, 8):
+        latencies, found = [], 0
+        for target in targets:
+            query = flip_bits(int(index.hashes[target]), bits, rng)
+            start = time.perf_counter()
+            video_ids, _ = index.search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found += int(index.video_ids[target]) in video_ids
+        utils.print_latency_summary(f"{bits} bits flipped (recall {found / args.queries:.1%})", latencies)
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-phash-')
+    snapshot = os.path.join(workdir, 'phash-index')
+    start = time.perf_counter()
+    index.save(snapshot)
+    saved = time.perf_counter() - start
+    start = time.perf_counter()
+    index = phash.PerceptualHashIndex.load(snapshot)
+    print(f"snapshot: save {saved:.2f} s, load {time.perf_counter() - start:.2f} s, "
+          f"{os.path.getsize(snapshot + '.npz') / 2**20:.0f} MiB")
+
+    utils.print_banner('Recycled evidence end to end')
+    s3 = local_aws.LocalS3Client(workdir)
+    comparator.s3 = s3
+    comparator.HASH_INDEX = index
+    original = os.path.join(workdir, 'original.mp4')
+    synthetic.render_shadow_video(original, 200, seconds=10, width=1280, height=720, seed=1)
+    recycled = os.path.join(workdir, 'recycled.mp4')
+    reencode(original, recycled, 640, 360, crf=32)
+    unrelated = os.path.join(workdir, 'unrelated.mp4')
+    synthetic.render_shadow_video(unrelated, 200, seconds=10, width=1280, height=720, seed=2)
+
+    run_clips(s3, (('original upload', original, 'CLM-A'),
+                   ('re-encoded 360p, other claim', recycled, 'CLM-B'),
+                   ('unrelated clip', unrelated, 'CLM-C')), 'evidence')
+
+    utils.print_banner(f'DynamoDB store - {args.store_hashes:,} stored hashes, no snapshot')
+    db = local_aws.LocalDynamoDB(latency_ms=args.latency_ms)
+    store_index = random_index(args.store_hashes, rng)
+    start = time.perf_counter()
+    db.load(TABLE, store_items(store_index))
+    print(f"loaded {len(db.items(TABLE)):,} items in {time.perf_counter() - start:.1f} s")
+    store = phash.DynamoHashStore(db.Table(TABLE))
+    targets = rng.integers(0, args.store_hashes, size=min(args.queries, 200))
+    for bits in (0, 3, 7, 8):
+        latencies, found = [], 0
+        db.reset_counters()
+        for target in targets:
+            query = flip_bits(int(store_index.hashes[target]), bits, rng)
+            start = time.perf_counter()
+            duplicate = store.find_duplicate([query], min_frames=1)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found += duplicate is not None and duplicate['video_key'] == f'random/{store_index.video_ids[target]}.mp4'
+        utils.print_latency_summary(f"{bits} bits flipped (recall {found / len(targets):.1%}, "
+                                    f"{db.requests / len(targets):.1f} req)", latencies)
+
+    # A fresh container: nothing in memory, every probe and registration goes to the store
+    comparator.HASH_INDEX = phash.PerceptualHashIndex()
+    comparator.HASH_STORE = store
+    db.reset_counters()
+    run_clips(s3, (('original upload', original, 'CLM-A'),
+                   ('re-encoded 360p, other claim', recycled, 'CLM-B'),
+                   ('unrelated clip', unrelated, 'CLM-C')), 'store')
+    print(f"{db.requests} DynamoDB requests; container index holds {len(comparator.HASH_INDEX)} hashes")
+
+
+if __name__ == '__main__':
+    main()
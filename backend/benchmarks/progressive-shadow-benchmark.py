@@ -0,0 +1,88 @@
+"""
+VeriCrop FinBridge - Progressive Shadow Analysis Benchmark
+==========================================================
+
+Runs the same claims through exhaustive and progressive (coarse-to-fine,
+early exit) shadow extraction. Claims use synthetic clips with a known
+shadow direction and expected azimuths offset by 0-15°, so some are clearly
+valid, some clearly fraudulent and some close to the ±5° threshold.
+Reports frames decoded per claim, latency distribution and how often the
+two modes reach the same fraud decision.
+
+Usage:
+    python progressive-shadow-benchmark.py --claims-per-clip 10
+"""
+
+import argparse
+import importlib
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+
+BUCKET = 'vericrop-evidence'
+
+
+def is_fraud(angle, expected):
+    return abs((angle - expected + 180) % 360 - 180) > comparator.FRAUD_TOLERANCE_DEG
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark progressive vs exhaustive shadow analysis')
+    parser.add_argument('--azimuths', type=float, nargs='+', default=[30, 95, 150, 200, 265, 320])
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--claims-per-clip', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-progressive-')
+    s3 = local_aws.LocalS3Client(workdir)
+    rng = np.random.default_rng(10)
+
+    claims = []
+    for azimuth in args.azimuths:
+        key = f'progressive/{int(azimuth)}.mp4'
+        path = os.path.join(workdir, 'render.mp4')
+        synthetic.render_shadow_video(path, azimuth, seconds=args.seconds, width=640, height=360,
+                                      seed=int(azimuth))
+        s3.upload_file(path, BUCKET, key)
+        for _ in range(args.claims_per_clip):
+            claims.append((key, azimuth, azimuth + rng.choice([-1, 1]) * rng.uniform(0, 15)))
+
+    results = {}
+    for label, progressive in (('exhaustive', False), ('progressive', True)):
+        latencies, frames, decisions, exits = [], [], [], 0
+        for key, _, expected in claims:
+            start = time.perf_counter()
+            estimate = comparator.extract_shadow_angle(BUCKET, key, expected, s3_client=s3,
+                                                       progressive=progressive)
+            latencies.append((time.perf_counter() - start) * 1000)
+            frames.append(estimate['frames_decoded'])
+            decisions.append(is_fraud(estimate['angle'], expected))
+            exits += estimate['early_exit']
+        results[label] = (latencies, frames, decisions, exits)
+
+    utils.print_banner(f'Progressive shadow analysis - {len(claims)} claims, {args.seconds:.0f} s clips')
+    for label, (latencies, frames, _, exits) in results.items():
+        print(f"\n{label}: frames decoded per claim mean {np.mean(frames):.1f}, "
+              f"distribution {dict(sorted(Counter(frames).items()))}, early exits {exits}")
+        utils.print_latency_summary(f"{label} latency", latencies)
+
+    exhaustive, progressive = results['exhaustive'], results['progressive']
+    truth = np.array([is_fraud(azimuth, expected) for _, azimuth, expected in claims])
+    agreement = np.mean(np.array(exhaustive[2]) == np.array(progressive[2]))
+    print(f"\nFraud decision agreement: {agreement:.1%}  (vs ground truth: exhaustive "
+          f"{np.mean(np.array(exhaustive[2]) == truth):.1%}, progressive "
+          f"{np.mean(np.array(progressive[2]) == truth):.1%})")
+    print(f"Frames decoded: {np.mean(progressive[1]) / np.mean(exhaustive[1]):.1%} of exhaustive, "
+          f"mean latency {np.mean(progressive[0]) / np.mean(exhaustive[0]):.1%} of exhaustive")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+VeriCrop FinBridge - Shadow Extraction Benchmark
+================================================
+
+Renders synthetic clips with a known shadow direction, stores them in a
+directory-backed local S3 and runs extract_shadow_angle against them.
+Reports angle error, confidence, bytes fetched, wall time and peak memory
+per clip length - memory should stay flat as clips get longer.
+
+Usage:
+    python shadow-extraction-benchmark.py --lengths 10 60 180
+"""
+
+import argparse
+import importlib
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+
+BUCKET = 'vericrop-evidence'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streamed shadow-angle extraction')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[10, 60, 180])
+    parser.add_argument('--azimuths', type=float, nargs='+', default=[30, 95, 150, 200, 265, 320])
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-shadow-')
+    s3 = local_aws.LocalS3Client(workdir)
+    rng = np.random.default_rng(9)
+
+    utils.print_banner('Shadow extraction accuracy (10 s clips)')
+    errors = []
+    for azimuth in args.azimuths:
+        key = f'accuracy/{int(azimuth)}.mp4'
+        path = os.path.join(workdir, 'render.mp4')
+        synthetic.render_shadow_video(path, azimuth, seconds=10, width=640, height=360, seed=int(azimuth))
+        s3.upload_file(path, BUCKET, key)
+        # Expected azimuth off by a few degrees, as a real claim would be
+        expected = azimuth + rng.uniform(-4, 4)
+        result = comparator.extract_shadow_angle(BUCKET, key, expected, s3_client=s3)
+        error = abs((result['angle'] - azimuth + 180) % 360 - 180)
+        errors.append(error)
+        print(f"sun {azimuth:6.1f}°  measured {result['angle']:6.1f}°  error {error:4.2f}°  "
+              f"confidence {result['confidence']:.3f}  frames {result['frames_analysed']}")
+    print(f"Mean error {np.mean(errors):.2f}°, max {np.max(errors):.2f}°")
+
+    utils.print_banner(f'Streaming cost vs clip length ({args.width}x{args.height})')
+    print(f"{'length':>8} {'size MB':>9} {'fetched MB':>11} {'requests':>9} {'time s':>8} "
+          f"{'py peak MB':>11} {'max RSS MB':>11}")
+    for seconds in args.lengths:
+        key = f'length/{int(seconds)}.mp4'
+        path = os.path.join(workdir, 'render.mp4')
+        synthetic.render_shadow_video(path, 200, seconds=seconds, width=args.width,
+                                      height=args.height, seed=int(seconds))
+        s3.upload_file(path, BUCKET, key)
+        size = os.path.getsize(path)
+        os.remove(path)
+
+        s3.reset_counters()
+        tracemalloc.start()
+        start = time.perf_counter()
+        comparator.extract_shadow_angle(BUCKET, key, 200, s3_client=s3)
+        elapsed = time.perf_counter() - start
+        _, python_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # ru_maxrss is a process high-water mark in KiB; it only grows, so a
+        # flat column means longer clips did not need more memory
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{seconds:>7.0f}s {size / 1e6:>9.1f} {s3.bytes_served / 1e6:>11.1f} {s3.requests:>9} "
+              f"{elapsed:>8.2f} {python_peak / 1e6:>11.1f} {max_rss:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
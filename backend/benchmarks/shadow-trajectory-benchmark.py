@@ -0,0 +1,107 @@
+"""
+VeriCrop FinBridge - Shadow Trajectory Benchmark
+================================================
+
+Splice detection from the per-frame shadow trajectory: genuine clips and
+clips that cut to footage with a different shadow direction part-way
+through, run through the comparator with the trajectory check on and off
+(and off with exhaustive rather than progressive sampling).
+Reports splice scores, detection and false-alarm rates, the cost of the
+check itself and the end-to-end latency difference.
+
+Usage:
+    python shadow-trajectory-benchmark.py --clips 8 --seconds 30
+"""
+
+import argparse
+import importlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+synthetic = importlib.import_module('synthetic-shadow-video')
+comparator = utils.load_lambda_module('forensic-validation', 'shadow-comparator')
+
+BUCKET = 'vericrop-evidence'
+LATITUDE, LONGITUDE = 19.0760, 72.8777
+TIMESTAMP = '2026-03-01T06:30:00Z'
+
+
+def run_claim(key, azimuth, trajectory, progressive=True):
+    comparator.SHADOW_TRAJECTORY_CHECK = trajectory
+    comparator.SHADOW_PROGRESSIVE = progressive
+    comparator.HASH_INDEX = comparator.phash.PerceptualHashIndex()
+    event = {'bucket': BUCKET, 'video_key': key, 'expected_azimuth': azimuth,
+             'latitude': LATITUDE, 'longitude': LONGITUDE, 'timestamp': TIMESTAMP}
+    start = time.perf_counter()
+    body = json.loads(comparator.lambda_handler(event, None)['body'])
+    return body, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shadow trajectory splice check')
+    parser.add_argument('--clips', type=int, default=8, help='Genuine and spliced clips each')
+    parser.add_argument('--seconds', type=float, default=30)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    workdir = tempfile.mkdtemp(prefix='vericrop-trajectory-')
+    s3 = local_aws.LocalS3Client(workdir)
+    comparator.s3 = s3
+    claimed = datetime.fromisoformat(TIMESTAMP.replace('Z', '+00:00'))
+    azimuth, _ = comparator.solar.calculate_solar_position(LATITUDE, LONGITUDE,
+                                                           comparator.solar.datetime_to_epoch(claimed))
+
+    cases = []
+    for i in range(2 * args.clips):
+        spliced = i >= args.clips
+        splice_at = float(rng.uniform(0.3, 0.7) * args.seconds) if spliced else None
+        shift = float(rng.choice([-1, 1]) * rng.uniform(8, 30)) if spliced else 0.0
+        key = f"trajectory/{'spliced' if spliced else 'genuine'}-{i}.mp4"
+        path = os.path.join(workdir, 'render.mp4')
+        synthetic.render_shadow_video(path, azimuth, seconds=args.seconds, seed=100 + i,
+                                      splice_at=splice_at, splice_azimuth=azimuth + shift)
+        s3.upload_file(path, BUCKET, key)
+        cases.append((key, spliced, splice_at, shift))
+
+    utils.print_banner(f'{args.clips} genuine + {args.clips} spliced clips, {args.seconds:.0f} s each')
+    latencies = {'plain': [], 'exhaustive': [], 'trajectory': []}
+    flagged = {False: 0, True: 0}
+    for key, spliced, splice_at, shift in cases:
+        plain, plain_ms = run_claim(key, azimuth, trajectory=False)
+        body, trajectory_ms = run_claim(key, azimuth, trajectory=True)
+        _, exhaustive_ms = run_claim(key, azimuth, trajectory=False, progressive=False)
+        latencies['plain'].append(plain_ms)
+        latencies['exhaustive'].append(exhaustive_ms)
+        latencies['trajectory'].append(trajectory_ms)
+        flagged[spliced] += body['outcome'] == 'SPLICED'
+        scores = body.get('trajectory', {})
+        truth = f"cut at {splice_at:4.1f} s, {shift:+5.1f}°" if spliced else 'genuine'
+        print(f"{truth:24s} without: {plain['outcome']:6s} ({plain['frames_decoded']:2d} frames)  "
+              f"with: {body['outcome']:8s} ({body['frames_decoded']:2d} frames)  "
+              f"splice score {scores.get('splice_score', 0):6.1f}, shift {scores.get('splice_shift_deg', 0):+6.1f}° "
+              f"at {scores.get('splice_at_s')} s, drift {scores.get('drift_deg_per_min', 0):+.2f}°/min")
+
+    print(f"\nspliced clips flagged: {flagged[True]}/{args.clips}, genuine clips flagged: {flagged[False]}/{args.clips}")
+    utils.print_latency_summary('single angle, progressive ', latencies['plain'])
+    utils.print_latency_summary('single angle, exhaustive  ', latencies['exhaustive'])
+    utils.print_latency_summary('progressive + trajectory  ', latencies['trajectory'])
+
+    # Cost of the check itself for a 60-frame trajectory
+    times = np.arange(60.0)
+    axes = (azimuth + rng.normal(0, 1, 60)) % 180
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        comparator.check_shadow_trajectory(LATITUDE, LONGITUDE, TIMESTAMP, times, axes)
+    print(f"check_shadow_trajectory, 60 frames: {(time.perf_counter() - start) / iterations * 1e6:.0f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+VeriCrop FinBridge - Solar Azimuth Batch Benchmark
+==================================================
+
+Checks that calculate_solar_azimuth_batch agrees with the scalar
+calculate_solar_azimuth to within 0.01° and measures throughput of both paths,
+plus the marginal cost of the fused geometry (shadow ratio, sunrise/sunset).
+
+The scalar path is timed on a sample and extrapolated, since running it over
+a million points takes a while.
+
+Usage:
+    python solar-azimuth-batch-benchmark.py --points 1000000 --scalar-sample 100000
+"""
+
+import argparse
+import importlib
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+
+def generate_observations(count, seed=42):
+    """
+    Random claims over India for the 2025-2026 seasons
+    """
+    rng = np.random.default_rng(seed)
+    latitudes = rng.uniform(8.0, 35.0, count)
+    longitudes = rng.uniform(68.0, 97.0, count)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+    epoch_seconds = rng.integers(int(start), int(start) + 2 * 365 * 86400, count)
+    return latitudes, longitudes, epoch_seconds
+
+
+def run_scalar(latitudes, longitudes, epoch_seconds):
+    return np.array([
+        solar.calculate_solar_azimuth(lat, lon, datetime.fromtimestamp(int(ts), tz=timezone.utc))
+        for lat, lon, ts in zip(latitudes, longitudes, epoch_seconds)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch vs scalar solar azimuth')
+    parser.add_argument('--points', type=int, default=1_000_000, help='Batch size (default: 1M)')
+    parser.add_argument('--scalar-sample', type=int, default=100_000,
+                        help='Points timed on the scalar path (default: 100k)')
+    args = parser.parse_args()
+
+    latitudes, longitudes, epoch_seconds = generate_observations(args.points)
+    sample = min(args.scalar_sample, args.points)
+
+    utils.print_banner('Solar azimuth - batch vs scalar')
+
+    start = time.perf_counter()
+    scalar_azimuth = run_scalar(latitudes[:sample], longitudes[:sample], epoch_seconds[:sample])
+    scalar_seconds = time.perf_counter() - start
+    scalar_rate = sample / scalar_seconds
+
+    start = time.perf_counter()
+    batch_azimuth, batch_altitude = solar.calculate_solar_azimuth_batch(
+        latitudes, longitudes, epoch_seconds
+    )
+    batch_seconds = time.perf_counter() - start
+    batch_rate = args.points / batch_seconds
+
+    # Wrap-aware difference so 359.99° vs 0.00° counts as 0.01°
+    diff = np.abs(batch_azimuth[:sample] - scalar_azimuth)
+    diff = np.minimum(diff, 360 - diff)
+    max_diff = float(diff.max())
+
+    print(f"Scalar:  {sample:,} points in {scalar_seconds:.3f} s  ({scalar_rate:,.0f} points/s)")
+    print(f"Batch:   {args.points:,} points in {batch_seconds:.3f} s  ({batch_rate:,.0f} points/s)")
+    print(f"Scalar extrapolated to {args.points:,} points: {args.points / scalar_rate:.1f} s")
+    print(f"Speedup: {batch_rate / scalar_rate:.1f}x")
+    print(f"Max |batch - scalar| azimuth over {sample:,} points: {max_diff:.4f}°")
+    print(f"Altitude range: {batch_altitude.min():.2f}° to {batch_altitude.max():.2f}°")
+    print(f"Status: {'✓ within 0.01°' if max_diff <= 0.01 else '✗ exceeds 0.01°'}")
+
+    utils.print_banner('Fused geometry overhead')
+    start = time.perf_counter()
+    geometry = solar.calculate_solar_geometry_batch(latitudes, longitudes, epoch_seconds)
+    fused_seconds = time.perf_counter() - start
+    print(f"Batch azimuth+altitude: {batch_seconds:.3f} s, fused geometry: {fused_seconds:.3f} s "
+          f"(+{(fused_seconds / batch_seconds - 1) * 100:.0f}%)")
+    print(f"Fused batch agrees with azimuth batch: "
+          f"{np.allclose(geometry['azimuth'], batch_azimuth) and np.allclose(geometry['altitude'], batch_altitude)}")
+
+    calls = min(sample, 50_000)
+    timings = {}
+    for name, fn in [('position', solar.calculate_solar_position), ('geometry', solar.calculate_solar_geometry)]:
+        start = time.perf_counter()
+        for i in range(calls):
+            fn(latitudes[i], longitudes[i], epoch_seconds[i])
+        timings[name] = (time.perf_counter() - start) / calls * 1e6
+    print(f"Scalar position: {timings['position']:.2f} µs, fused geometry: {timings['geometry']:.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+VeriCrop FinBridge - Solar Azimuth Handler Batch Benchmark
+==========================================================
+
+Compares the handler cost of one single-observation invocation, N separate
+invocations, and one invocation carrying N observations (JSON serialization
+included, cold starts excluded).
+
+Usage:
+    python solar-azimuth-handler-benchmark.py --observations 1000 --runs 50
+"""
+
+import argparse
+import importlib
+import time
+from datetime import datetime, timedelta, timezone
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+
+def build_frames(count):
+    """
+    Sampled video frames one second apart, as a claim video would produce
+    """
+    start = datetime(2026, 3, 1, 6, 30, tzinfo=timezone.utc)
+    return [
+        {
+            'latitude': 19.0760,
+            'longitude': 72.8777,
+            'timestamp': (start + timedelta(seconds=i)).isoformat().replace('+00:00', 'Z')
+        }
+        for i in range(count)
+    ]
+
+
+def time_calls(fn, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch observations in the solar handler')
+    parser.add_argument('--observations', type=int, default=1000, help='Observations per batch')
+    parser.add_argument('--runs', type=int, default=50, help='Timed runs per mode')
+    args = parser.parse_args()
+
+    frames = build_frames(args.observations)
+    batch_event = {'observations': frames}
+
+    utils.print_banner(f'Solar handler - {args.observations} observations')
+
+    single = utils.print_latency_summary(
+        'Single observation, 1 invocation ',
+        time_calls(lambda: solar.lambda_handler(frames[0], None), args.runs)
+    )
+    per_frame = utils.print_latency_summary(
+        f'{args.observations} invocations (one per frame)',
+        time_calls(lambda: [solar.lambda_handler(f, None) for f in frames], max(1, args.runs // 10))
+    )
+    batched = utils.print_latency_summary(
+        f'{args.observations} observations, 1 invocation',
+        time_calls(lambda: solar.lambda_handler(batch_event, None), args.runs)
+    )
+
+    print(f"\nBatch vs single invocation: {batched['p50_ms'] / single['p50_ms']:.1f}x the cost "
+          f"for {args.observations}x the work")
+    print(f"Batch vs per-frame invocations: {per_frame['p50_ms'] / batched['p50_ms']:.1f}x faster "
+          f"(before per-invocation Lambda overhead)")
+
+
+if __name__ == '__main__':
+    main()
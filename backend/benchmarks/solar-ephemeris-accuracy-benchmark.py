@@ -0,0 +1,147 @@
+"""
+VeriCrop FinBridge - Solar Ephemeris Accuracy Benchmark
+=======================================================
+
+Compares three solar position models over random Indian claims:
+
+- legacy:  Cooper's declination, no equation of time (the original calculator)
+- tabled:  NOAA terms looked up from the 366-row ephemeris table (current)
+- exact:   NOAA terms evaluated per call (the reference the table is built from)
+
+If pvlib is installed, the NREL SPA from pvlib is used as an independent reference
+on a sample of points as well.
+
+Usage:
+    python solar-ephemeris-accuracy-benchmark.py --points 200000
+"""
+
+import argparse
+import importlib
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+
+def legacy_solar_position(latitude, longitude, epoch_seconds):
+    """
+    The calculator as it was before the NOAA table: Cooper's declination,
+    UTC hour + longitude/15 as solar time, no refraction
+    """
+    dt = datetime.fromtimestamp(epoch_seconds, tz=timezone.utc)
+    lat_rad = math.radians(latitude)
+    day_of_year = dt.timetuple().tm_yday
+    declination_rad = math.radians(23.45 * math.sin(math.radians((360/365) * (day_of_year + 284))))
+    utc_hour = dt.hour + dt.minute/60 + dt.second/3600
+    hour_angle_deg = 15 * (utc_hour + longitude / 15 - 12)
+    sin_altitude = (math.sin(lat_rad) * math.sin(declination_rad) +
+                    math.cos(lat_rad) * math.cos(declination_rad) * math.cos(math.radians(hour_angle_deg)))
+    altitude_rad = math.asin(sin_altitude)
+    cos_azimuth = ((math.sin(declination_rad) - sin_altitude * math.sin(lat_rad)) /
+                   (math.cos(altitude_rad) * math.cos(lat_rad)))
+    azimuth_deg = math.degrees(math.acos(max(-1, min(1, cos_azimuth))))
+    if hour_angle_deg > 0:
+        azimuth_deg = 360 - azimuth_deg
+    return azimuth_deg, math.degrees(altitude_rad)
+
+
+def exact_solar_position_batch(latitudes, longitudes, epoch_seconds):
+    """
+    Same geometry as calculate_solar_azimuth_batch, NOAA terms evaluated per point
+    """
+    epoch = np.asarray(epoch_seconds, dtype=np.float64)
+    declination_deg, equation_of_time = solar.noaa_sun_terms(solar.UNIX_EPOCH_JULIAN_DAY + epoch / 86400)
+    declination_rad = np.radians(declination_deg)
+    sin_dec, cos_dec = np.sin(declination_rad), np.cos(declination_rad)
+
+    hour_angle_deg = (((epoch % 86400) / 60 + equation_of_time + 4 * longitudes) / 4) % 360 - 180
+    lat_rad = np.radians(latitudes)
+    sin_altitude = np.clip(np.sin(lat_rad) * sin_dec +
+                           np.cos(lat_rad) * cos_dec * np.cos(np.radians(hour_angle_deg)), -1, 1)
+    altitude_rad = np.arcsin(sin_altitude)
+    cos_azimuth = np.clip((sin_dec - sin_altitude * np.sin(lat_rad)) / (np.cos(altitude_rad) * np.cos(lat_rad)), -1, 1)
+    azimuth_deg = np.degrees(np.arccos(cos_azimuth))
+    azimuth_deg = np.where(hour_angle_deg > 0, 360 - azimuth_deg, azimuth_deg)
+    altitude_deg = np.degrees(altitude_rad)
+    return azimuth_deg, altitude_deg + solar.atmospheric_refraction_batch(altitude_deg)
+
+
+def angular_error(a, b):
+    diff = np.abs(np.asarray(a) - np.asarray(b)) % 360
+    return np.minimum(diff, 360 - diff)
+
+
+def report_errors(label, azimuth, altitude, ref_azimuth, ref_altitude, mask):
+    az_err = angular_error(azimuth, ref_azimuth)[mask]
+    alt_err = np.abs(np.asarray(altitude) - ref_altitude)[mask]
+    print(f"{label:<22} azimuth mean {az_err.mean():7.4f}°  p99 {np.percentile(az_err, 99):7.4f}°  "
+          f"max {az_err.max():7.4f}°  | altitude max {alt_err.max():7.4f}°")
+
+
+def time_scalar(fn, latitudes, longitudes, epoch_seconds, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(latitudes[i], longitudes[i], epoch_seconds[i])
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def exact_scalar(latitude, longitude, epoch_seconds):
+    return exact_solar_position_batch(np.array([latitude]), np.array([longitude]), np.array([epoch_seconds]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy and latency of the solar position models')
+    parser.add_argument('--points', type=int, default=200_000, help='Random observations')
+    parser.add_argument('--latency-calls', type=int, default=20_000, help='Scalar calls timed per model')
+    parser.add_argument('--spa-sample', type=int, default=2_000, help='Points checked against pvlib SPA')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    latitudes = rng.uniform(8.0, 35.0, args.points)
+    longitudes = rng.uniform(68.0, 97.0, args.points)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    epoch_seconds = rng.integers(int(start), int(start) + 16 * 365 * 86400, args.points).astype(np.float64)
+
+    tabled_az, tabled_alt = solar.calculate_solar_azimuth_batch(latitudes, longitudes, epoch_seconds)
+    exact_az, exact_alt = exact_solar_position_batch(latitudes, longitudes, epoch_seconds)
+    legacy = np.array([legacy_solar_position(a, b, c) for a, b, c in zip(latitudes, longitudes, epoch_seconds)])
+
+    # Shadow geometry only matters with the sun clearly up; azimuth is also
+    # ill-conditioned right at the zenith
+    daylight = (exact_alt > 5) & (exact_alt < 85)
+
+    utils.print_banner('Accuracy vs exact NOAA (sun 5°-85° above horizon, 2020-2035)')
+    report_errors('tabled NOAA (current)', tabled_az, tabled_alt, exact_az, exact_alt, daylight)
+    report_errors('legacy Cooper', legacy[:, 0], legacy[:, 1], exact_az, exact_alt, daylight)
+
+    try:
+        import pandas as pd
+        import pvlib
+        sample = min(args.spa_sample, args.points)
+        times = pd.to_datetime(epoch_seconds[:sample].astype(np.int64), unit='s', utc=True)
+        spa = pd.concat([
+            pvlib.solarposition.get_solarposition(times[i:i + 1], latitudes[i], longitudes[i], method='nrel_numpy')
+            for i in range(sample)
+        ])
+        spa_az, spa_alt = spa['azimuth'].values, spa['apparent_elevation'].values
+        mask = (spa_alt > 5) & (spa_alt < 85)
+        utils.print_banner(f'Accuracy vs NREL SPA (pvlib), {sample:,} points')
+        report_errors('tabled NOAA (current)', tabled_az[:sample], tabled_alt[:sample], spa_az, spa_alt, mask)
+        report_errors('exact NOAA', exact_az[:sample], exact_alt[:sample], spa_az, spa_alt, mask)
+        report_errors('legacy Cooper', legacy[:sample, 0], legacy[:sample, 1], spa_az, spa_alt, mask)
+    except ImportError:
+        print("\npvlib not installed, skipping the independent SPA reference")
+
+    calls = min(args.latency_calls, args.points)
+    utils.print_banner(f'Per-call latency (scalar, {calls:,} calls)')
+    print(f"tabled NOAA (current): {time_scalar(solar.calculate_solar_position, latitudes, longitudes, epoch_seconds, calls):6.2f} µs")
+    print(f"legacy Cooper:         {time_scalar(legacy_solar_position, latitudes, longitudes, epoch_seconds, calls):6.2f} µs")
+    print(f"exact NOAA (NumPy):    {time_scalar(exact_scalar, latitudes, longitudes, epoch_seconds, calls):6.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
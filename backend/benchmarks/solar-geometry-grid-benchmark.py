@@ -0,0 +1,108 @@
+"""
+VeriCrop FinBridge - Solar Geometry Grid Benchmark
+==================================================
+
+Builds a small grid with solar-geometry-grid-builder.py, then compares grid
+lookups with calculate_solar_position / calculate_solar_azimuth_batch for
+accuracy (per sun-altitude band, and for the handler, which calculates
+directly beyond ±GRID_MAX_ALTITUDE_DEG), per-call latency, batch throughput
+and cold-start open time.
+
+Usage:
+    python solar-geometry-grid-benchmark.py --bbox 18.0 20.0 73.0 75.0 --points 100000
+"""
+
+import argparse
+import importlib
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+builder = utils.load_lambda_module('forensic-validation', 'solar-geometry-grid-builder')
+
+
+def angular_error(a, b):
+    diff = np.abs(np.asarray(a) - np.asarray(b)) % 360
+    return np.minimum(diff, 360 - diff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory-mapped solar geometry grid')
+    parser.add_argument('--bbox', type=float, nargs=4, default=[18.0, 20.0, 73.0, 75.0],
+                        metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'))
+    parser.add_argument('--step', type=float, default=0.1)
+    parser.add_argument('--slot-minutes', type=int, default=5)
+    parser.add_argument('--points', type=int, default=100_000)
+    parser.add_argument('--scalar-calls', type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'grid.npy')
+
+        utils.print_banner('Build')
+        start = time.perf_counter()
+        metadata = builder.build_grid(path, *args.bbox, step=args.step, slot_minutes=args.slot_minutes)
+        print(f"{metadata['n_lat']}x{metadata['n_lon']} points, {os.path.getsize(path) / 1e6:,.1f} MB "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        grid = solar.SolarGeometryGrid(path)
+        print(f"Cold open (mmap, no data read): {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        rng = np.random.default_rng(5)
+        lat_min, lat_max, lon_min, lon_max = args.bbox
+        latitudes = rng.uniform(lat_min, lat_max, args.points)
+        longitudes = rng.uniform(lon_min, lon_max, args.points)
+        epoch_start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        epochs = rng.uniform(epoch_start, epoch_start + 3 * 365 * 86400, args.points)
+
+        exact_az, exact_alt = solar.calculate_solar_azimuth_batch(latitudes, longitudes, epochs)
+
+        start = time.perf_counter()
+        grid_az, grid_alt = grid.get_positions(latitudes, longitudes, epochs)
+        grid_batch_s = time.perf_counter() - start
+        start = time.perf_counter()
+        solar.calculate_solar_azimuth_batch(latitudes, longitudes, epochs)
+        direct_batch_s = time.perf_counter() - start
+
+        utils.print_banner('Accuracy vs direct calculation')
+        for low, high in [(5, 60), (60, 80), (80, 90)]:
+            mask = (exact_alt > low) & (exact_alt <= high)
+            if not mask.any():
+                continue
+            az_err = angular_error(grid_az, exact_az)[mask]
+            alt_err = np.abs(grid_alt - exact_alt)[mask]
+            print(f"sun {low:>2}°-{high}°: azimuth p99 {np.percentile(az_err, 99):.3f}° max {az_err.max():.3f}°  "
+                  f"altitude max {alt_err.max():.3f}°  ({mask.sum():,} points)")
+
+        # The handler calculates directly once the interpolated altitude is
+        # beyond ±GRID_MAX_ALTITUDE_DEG
+        fallback = np.abs(grid_alt) > solar.GRID_MAX_ALTITUDE_DEG
+        handler_err = np.where(fallback, 0.0, angular_error(grid_az, exact_az))
+        print(f"handler (direct beyond ±{solar.GRID_MAX_ALTITUDE_DEG:.0f}°): azimuth max {handler_err.max():.3f}°, "
+              f"{fallback.mean():.1%} of lookups calculated directly")
+
+        calls = min(args.scalar_calls, args.points)
+        start = time.perf_counter()
+        for i in range(calls):
+            grid.get_position(latitudes[i], longitudes[i], epochs[i])
+        grid_us = (time.perf_counter() - start) / calls * 1e6
+        start = time.perf_counter()
+        for i in range(calls):
+            solar.calculate_solar_position(latitudes[i], longitudes[i], epochs[i])
+        direct_us = (time.perf_counter() - start) / calls * 1e6
+
+        utils.print_banner('Latency')
+        print(f"Single lookup: grid {grid_us:.2f} µs, direct {direct_us:.2f} µs")
+        print(f"Batch of {args.points:,}: grid {args.points / grid_batch_s:,.0f} points/s, "
+              f"direct {args.points / direct_batch_s:,.0f} points/s")
+        del grid
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+VeriCrop FinBridge - Inverse Solar Solver Benchmark
+===================================================
+
+Latency of find_capture_windows (target < 5 ms per query) and a consistency
+check: for a random daylight capture time, the window list computed from the
+true azimuth must contain that time.
+
+Usage:
+    python solar-inverse-solver-benchmark.py --queries 2000
+"""
+
+import argparse
+import importlib
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the inverse capture-window solver')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--target-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    latencies = []
+    contained = 0
+    daylight_queries = 0
+    window_counts = []
+
+    for _ in range(args.queries):
+        latitude = rng.uniform(8.0, 35.0)
+        longitude = rng.uniform(68.0, 97.0)
+        local_date = datetime(2026, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+        # Claimed capture between 07:00 and 17:00 IST
+        capture = (datetime(local_date.year, local_date.month, local_date.day, tzinfo=timezone.utc) +
+                   timedelta(minutes=float(rng.uniform(7 * 60, 17 * 60)) - solar.IST_UTC_OFFSET_MINUTES))
+        azimuth, altitude = solar.calculate_solar_position(latitude, longitude, capture.timestamp())
+
+        start = time.perf_counter()
+        windows = solar.find_capture_windows(latitude, longitude, azimuth, local_date.date())
+        latencies.append((time.perf_counter() - start) * 1000)
+        window_counts.append(len(windows))
+
+        if altitude > 0:
+            daylight_queries += 1
+            capture_iso = capture.replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+            # ISO strings of equal format compare chronologically; 1 s refinement slack
+            if any(w['start'] <= capture_iso <= w['end'] for w in windows):
+                contained += 1
+            elif any(abs((datetime.fromisoformat(w[k].replace('Z', '+00:00')) - capture).total_seconds()) <= 1
+                     for w in windows for k in ('start', 'end')):
+                contained += 1
+
+    utils.print_banner(f'Inverse solver - {args.queries:,} queries')
+    stats = utils.print_latency_summary('find_capture_windows', latencies)
+    print(f"Windows per query: mean {np.mean(window_counts):.2f}, max {max(window_counts)}")
+    print(f"True capture time inside a returned window: {contained}/{daylight_queries}")
+    print(f"Target p99 < {args.target_ms} ms: {'✓' if stats['p99_ms'] < args.target_ms else '✗'}")
+
+
+if __name__ == '__main__':
+    main()
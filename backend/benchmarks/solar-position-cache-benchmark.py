@@ -0,0 +1,108 @@
+"""
+VeriCrop FinBridge - Solar Position Cache Benchmark
+===================================================
+
+Measures the quantized LRU cache in solar-azimuth-calculator.py (opt-in with
+SOLAR_CACHE_ENABLED=true):
+
+- error bound: cached vs exact position for random points, per quantization step
+- hit rate and latency for a clustered disaster-day workload (many claims from
+  a few villages over one afternoon)
+
+Usage:
+    python solar-position-cache-benchmark.py --claims 200000 --villages 300
+"""
+
+import argparse
+import importlib
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+
+def angular_error(a, b):
+    diff = np.abs(np.asarray(a) - np.asarray(b)) % 360
+    return np.minimum(diff, 360 - diff)
+
+
+def measure_error(latlon_step, minute_step, points, rng):
+    """
+    Worst-case azimuth/altitude error introduced by the cache for these steps
+    """
+    cache = solar.SolarPositionCache(max_size=points, latlon_step=latlon_step, minute_step=minute_step)
+    latitudes = rng.uniform(8.0, 35.0, points)
+    longitudes = rng.uniform(68.0, 97.0, points)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    epochs = rng.uniform(start, start + 3 * 365 * 86400, points)
+
+    exact = np.array([solar.calculate_solar_position(a, b, c) for a, b, c in zip(latitudes, longitudes, epochs)])
+    cached = np.array([cache.get_position(a, b, c) for a, b, c in zip(latitudes, longitudes, epochs)])
+
+    mask = (exact[:, 1] > 5) & (exact[:, 1] < 80)
+    az_err = angular_error(cached[:, 0], exact[:, 0])[mask]
+    alt_err = np.abs(cached[:, 1] - exact[:, 1])[mask]
+    return az_err.max(), np.percentile(az_err, 99), alt_err.max()
+
+
+def clustered_workload(claims, villages, rng):
+    """
+    Claims from a handful of villages between 13:00 and 17:00 IST on one day
+    """
+    village_lat = rng.uniform(20.0, 22.0, villages)
+    village_lon = rng.uniform(85.0, 87.0, villages)
+    which = rng.integers(0, villages, claims)
+    # Farms within ~500 m of the village centre
+    latitudes = village_lat[which] + rng.normal(0, 0.003, claims)
+    longitudes = village_lon[which] + rng.normal(0, 0.003, claims)
+    start = datetime(2026, 10, 18, 7, 30, tzinfo=timezone.utc).timestamp()
+    epochs = start + rng.uniform(0, 4 * 3600, claims)
+    return latitudes, longitudes, epochs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the quantized solar position cache')
+    parser.add_argument('--claims', type=int, default=200_000, help='Clustered claims to look up')
+    parser.add_argument('--villages', type=int, default=300, help='Distinct villages in the workload')
+    parser.add_argument('--error-points', type=int, default=50_000, help='Random points per error check')
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+
+    utils.print_banner('Quantization error (sun 5°-80° above horizon)')
+    for latlon_step, minute_step in [(0.001, 0.5), (0.01, 1.0), (0.02, 2.0), (0.05, 5.0)]:
+        az_max, az_p99, alt_max = measure_error(latlon_step, minute_step, args.error_points, rng)
+        print(f"step {latlon_step:>5}° / {minute_step:>3} min: azimuth max {az_max:.3f}° "
+              f"p99 {az_p99:.3f}°  altitude max {alt_max:.3f}°")
+
+    latitudes, longitudes, epochs = clustered_workload(args.claims, args.villages, rng)
+    cache = solar.SolarPositionCache()
+
+    start = time.perf_counter()
+    for a, b, c in zip(latitudes, longitudes, epochs):
+        solar.calculate_solar_position(a, b, c)
+    uncached_us = (time.perf_counter() - start) / args.claims * 1e6
+
+    start = time.perf_counter()
+    for a, b, c in zip(latitudes, longitudes, epochs):
+        cache.get_position(a, b, c)
+    cached_us = (time.perf_counter() - start) / args.claims * 1e6
+
+    utils.print_banner(f'Clustered workload: {args.claims:,} claims, {args.villages} villages')
+    print(f"Cache stats:        {cache.stats()}")
+    print(f"Uncached per call:  {uncached_us:.2f} µs")
+    print(f"Cached per call:    {cached_us:.2f} µs (including misses)")
+
+    # Hit path alone: replay the most recent claims, all still cached
+    replay = min(args.claims, cache.max_size // 2)
+    start = time.perf_counter()
+    for a, b, c in zip(latitudes[-replay:], longitudes[-replay:], epochs[-replay:]):
+        cache.get_position(a, b, c)
+    hit_us = (time.perf_counter() - start) / replay * 1e6
+    print(f"Cache hit per call: {hit_us:.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,277 @@
 """
 VeriCrop FinBridge - Bridge Loan Calculator
 Calculates 0% interest bridge loans (70% of damage amount)
+batch_lambda_handler issues many loans per invocation (disaster-day surges)
+One loan per certificate: the loan ID is derived from the certificate ID and
+written conditionally, so retried or duplicate submissions return the
+original loan and disbursement reference instead of paying out twice
+Approval only stores the loan as DISBURSEMENT_PENDING and queues a
+disbursement job; disbursement-worker.py pays it and records the outcome.
+Without DISBURSEMENT_QUEUE_URL and a payout provider (local runs, the MVP
+mock gateway) approval pays through the worker's process_job in the same
+request instead; a configured gateway always needs the queue
+A certificate naming a district or scheme is checked against that budget
+(disbursement-budget.py): the loan amount is reserved before the loan is
+stored, and the loan is refused once the budget cannot cover it
+repayment_lambda_handler records repayments as REPAYMENT items, which
+loan-portfolio-view.py folds into its outstanding totals
+Loans and repayments also carry top-level farmerId, certificateId and
+sortKey ('LOAN#' or 'REPAYMENT#' + ISO time) attributes keying two global
+secondary indexes (LOAN_INDEXES): a farmer's loans or a certificate's
+history is one paginated Query (loan_lookup_lambda_handler), not a Scan.
+loan-index-migration.py adds the indexes to an existing table and
+backfills older items
 """
 
+import base64
+import importlib
 import json
+import math
+import os
+import random
+import time
 import boto3
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
 import uuid
 
+gateway = importlib.import_module('upi-gateway-client')
+budgets = importlib.import_module('disbursement-budget')
+DisbursementError = gateway.DisbursementError
+BudgetExhausted = budgets.BudgetExhausted
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('vericrop-claims')
+sqs = boto3.client('sqs')
+
+DISBURSEMENT_QUEUE_URL = os.environ.get('DISBURSEMENT_QUEUE_URL', '')
+# SendMessageBatch takes at most 10 messages
+QUEUE_SEND_CHUNK = 10
+
+# Bulk issuance: loans are written in TransactWriteItems chunks of
+# BATCH_WRITE_CHUNK conditional puts (BatchWriteItem cannot write
+# conditionally) by BATCH_WRITE_WORKERS threads; a chunk cancelled by a loan
+# that already exists is resent without it, one throttled with backoff.
+# A transactional put costs two write units, twice a BatchWriteItem put:
+# the price of catching a loan an overlapping batch stored meanwhile
+BATCH_WRITE_CHUNK = 25
+BATCH_WRITE_WORKERS = int(os.environ.get('BATCH_WRITE_WORKERS', '4'))
+BATCH_MAX_RETRIES = int(os.environ.get('BATCH_MAX_RETRIES', '8'))
+BATCH_RETRY_BASE_SECONDS = 0.05
+THROTTLING_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException')
+BATCH_MAX_CERTIFICATES = int(os.environ.get('BATCH_MAX_CERTIFICATES', '50000'))
+
+LOAN_TO_DAMAGE_RATIO = 0.70
+
+# Idempotency: loan IDs are uuid5(LOAN_ID_NAMESPACE, certificate_id); loans
+# approved by this container are remembered (LRU) so a warm retry answers
+# with one read (a pending loan, refreshed) or none (a disbursed one)
+LOAN_ID_NAMESPACE = uuid.UUID('6f1c2a4e-8b0d-5e7a-9c3f-2d4b6a8e0c1f')
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+# A replayed loan still DISBURSEMENT_PENDING may have lost its job (approval
+# failed between the write and the enqueue), so every replay queues it
+# again; the worker pays under the loan ID as idempotency key and records
+# the outcome only while the loan is pending, so it pays once
+
+DISBURSEMENT_PENDING = 'DISBURSEMENT_PENDING'
+DISBURSED = 'DISBURSED'
+DISBURSEMENT_FAILED = 'DISBURSEMENT_FAILED'
+# Out of attempts on retryable gateway errors: the payout may still settle,
+# so the worker keeps checking it under the same idempotency key
+DISBURSEMENT_UNKNOWN = 'DISBURSEMENT_UNKNOWN'
+REFUSED = 'REFUSED'
+BATCH_GET_CHUNK = 100
+RECENT_LOANS = OrderedDict()
+
+# Access patterns: FarmerLoanIndex (farmerId, sortKey) lists a farmer's
+# loans or repayments by time; CertificateLoanIndex (certificateId, sortKey)
+# a certificate's loan and repayments. Both project the listing attributes
+# only, so a page is read from the index without touching the base items.
+# The table's hash-only FarmerIndex and CertificateIndex (projection ALL)
+# are separate indexes that the certificate verifier queries
+FARMER_INDEX = 'FarmerLoanIndex'
+CERTIFICATE_INDEX = 'CertificateLoanIndex'
+INDEX_ATTRIBUTES = ['type', 'loanId', 'amount', 'loanStatus']
+INDEX_KEY_ATTRIBUTES = [{'AttributeName': name, 'AttributeType': 'S'}
+                        for name in ('farmerId', 'certificateId', 'sortKey')]
+LOAN_INDEXES = [
+    {
+        'IndexName': index_name,
+        'KeySchema': [{'AttributeName': hash_key, 'KeyType': 'HASH'},
+                      {'AttributeName': 'sortKey', 'KeyType': 'RANGE'}],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': INDEX_ATTRIBUTES}
+    }
+    for index_name, hash_key in ((FARMER_INDEX, 'farmerId'), (CERTIFICATE_INDEX, 'certificateId'))
+]
+QUERY_PAGE_SIZE = int(os.environ.get('QUERY_PAGE_SIZE', '100'))
+QUERY_MAX_PAGE_SIZE = 1000
+ENTRY_TYPES = ('LOAN', 'REPAYMENT')
 
 def lambda_handler(event, context):
     """
-    Input: Certificate ID, damage amount
-    Output: Loan approval with disbursement details
+    Input: Certificate ID, damage amount (district and scheme optional)
+    Output: Loan approval; disbursement follows asynchronously (the loan
+            record moves to DISBURSED with its reference). REFUSED when a
+            budget is exhausted
     """
     
     try:
-        # Extract input
-        certificate_id = event['certificate_id']
-        damage_amount = float(event['damage_amount'])
-        farmer_id = event['farmer_id']
-        farmer_upi = event.get('farmer_upi', 'farmer@upi')
+        # Validate input and create loan record (70% of damage, 0% interest)
+        loan = build_loan(event)
+        require_disbursement_queue()
         
-        # Calculate loan amount (70% of damage)
-        loan_amount = damage_amount * 0.70
+        # A retry of a loan this container approved: re-read it while its
+        # disbursement is unsettled (the worker updates the record)
+        created = False
+        cached = recent_loan(loan['certificate_id'])
+        if cached is None:
+            # Reserve its budgets and store the loan in DynamoDB unless this
+            # certificate already has one
+            created, loan = issue_loan(loan)
+        elif cached['status'] in (DISBURSEMENT_PENDING, DISBURSEMENT_UNKNOWN):
+            loan = fetch_loan(cached['loan_id'])
+        else:
+            loan = cached
         
-        # Generate loan ID
-        loan_id = str(uuid.uuid4())
+        # Queue the disbursement (or queue it again while it is pending)
+        if created or loan['status'] == DISBURSEMENT_PENDING:
+            if dispatch_disbursements([loan]):
+                raise RuntimeError(f"Disbursement for loan {loan['loan_id']} could not be queued")
+        remember_loan(loan)
         
-        # Create loan record
-        loan = {
-            'loan_id': loan_id,
-            'certificate_id': certificate_id,
-            'farmer_id': farmer_id,
-            'damage_amount': damage_amount,
-            'loan_amount': loan_amount,
-            'interest_rate': 0.0,  # Zero interest!
-            'disbursement_method': 'UPI',
-            'farmer_upi': farmer_upi,
-            'status': 'APPROVED',
-            'approved_at': datetime.utcnow().isoformat(),
-            'repayment_status': 'PENDING',
-            'collateral': certificate_id
+        return {
+            'statusCode': 200,
+            'body': json.dumps(loan_response(loan, replayed=not created))
         }
         
-        # Store loan in DynamoDB
-        store_loan(loan)
+    except BudgetExhausted as e:
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'loan_id': None,
+                'certificate_id': event.get('certificate_id'),
+                'status': REFUSED,
+                'budget_id': e.budget_id,
+                'error': str(e),
+                'message': 'Bridge loan refused: disbursement budget exhausted'
+            })
+        }
         
-        # Simulate UPI disbursement (mock for MVP)
-        disbursement_ref = disburse_loan(loan_amount, farmer_upi)
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to process bridge loan'
+            })
+        }
+
+def batch_lambda_handler(event, context):
+    """
+    Input: {'certificates': [{certificate_id, damage_amount, farmer_id,
+           farmer_upi}, ...]} - up to BATCH_MAX_CERTIFICATES per invocation
+    Output: one result per certificate, in input order - APPROVED (stored,
+            disbursement queued or done), REJECTED (invalid or repeated in
+            the batch), REFUSED (a budget exhausted) or FAILED (not stored,
+            or its job not queued, after retries)
+    """
+    
+    try:
+        certificates = event['certificates']
+        if len(certificates) > BATCH_MAX_CERTIFICATES:
+            raise ValueError(f'At most {BATCH_MAX_CERTIFICATES} certificates per batch, got {len(certificates)}')
+        require_disbursement_queue()
+        
+        results = []
+        loans = []
+        seen = set()
+        for certificate in certificates:
+            certificate_id = certificate.get('certificate_id') if isinstance(certificate, dict) else None
+            try:
+                if certificate_id in seen:
+                    raise ValueError(f'Duplicate certificate_id {certificate_id} in batch')
+                loan = build_loan(certificate)
+            except (KeyError, TypeError, ValueError) as e:
+                results.append({'certificate_id': certificate_id, 'status': 'REJECTED', 'error': str(e)})
+                continue
+            seen.add(certificate_id)
+            loans.append(loan)
+            results.append({'certificate_id': certificate_id, 'loan': loan})
+        
+        # Certificates that already have a loan (a retried batch) keep it;
+        # looking them up first spares their budgets, and the conditional
+        # write catches any stored since (an overlapping batch)
+        start = time.time()
+        existing = {}
+        for loan in loans:
+            replay = recent_loan(loan['certificate_id'])
+            if replay is not None and replay['status'] in (DISBURSED, DISBURSEMENT_FAILED):
+                existing[loan['loan_id']] = replay
+        existing.update(fetch_loans([loan['loan_id'] for loan in loans if loan['loan_id'] not in existing]))
+        refused = reserve_loan_budgets([loan for loan in loans if loan['loan_id'] not in existing])
+        new_loans = [loan for loan in loans if loan['loan_id'] not in existing and loan['loan_id'] not in refused]
+        # Budgets reserved for loans not stored here are given back, also
+        # when the write or the duplicate lookup raises
+        stored = set()
+        try:
+            failed, duplicates = store_loans(new_loans)
+            stored = {loan['loan_id'] for loan in new_loans} - failed - duplicates
+            existing.update(fetch_loans(sorted(duplicates)))
+        except Exception:
+            release_unstored_budgets(new_loans, stored)
+            raise
+        for loan in new_loans:
+            if loan['loan_id'] not in stored:
+                release_budgets(loan)
+        new_loans = [loan for loan in new_loans if loan['loan_id'] not in duplicates]
+        write_seconds = time.time() - start
+        
+        # Queue disbursement jobs for the new loans and any old ones still
+        # pending
+        unqueued = dispatch_disbursements([
+            loan for loan in new_loans if loan['loan_id'] not in failed
+        ] + [loan for loan in existing.values() if loan['status'] == DISBURSEMENT_PENDING])
+        
+        summary = {'APPROVED': 0, 'REJECTED': 0, 'REFUSED': 0, 'FAILED': 0}
+        replayed = 0
+        for result in results:
+            loan = result.pop('loan', None)
+            if loan is not None:
+                if loan['loan_id'] in refused:
+                    result.update({'status': REFUSED, 'budget_id': refused[loan['loan_id']].budget_id,
+                                   'error': str(refused[loan['loan_id']])})
+                elif loan['loan_id'] in failed:
+                    result.update({'status': 'FAILED', 'loan_id': loan['loan_id'],
+                                   'error': 'Loan record not stored (DynamoDB unprocessed after retries)'})
+                elif loan['loan_id'] in unqueued:
+                    result.update({'status': 'FAILED', 'loan_id': loan['loan_id'],
+                                   'error': 'Disbursement not queued (SQS failed after retries)'})
+                else:
+                    replay = loan['loan_id'] in existing
+                    loan = existing.get(loan['loan_id'], loan)
+                    replayed += replay
+                    remember_loan(loan)
+                    result.update({
+                        'status': 'APPROVED',
+                        'loan_id': loan['loan_id'],
+                        'loan_amount': loan['loan_amount'],
+                        'loan_status': loan['status'],
+                        'disbursement_ref': loan.get('disbursement_ref'),
+                        'replayed': replay
+                    })
+            summary[result['status']] += 1
         
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'loan_id': loan_id,
-                'loan_amount': loan_amount,
-                'interest_rate': 0.0,
-                'disbursement_ref': disbursement_ref,
-                'farmer_upi': farmer_upi,
-                'message': f'Bridge loan of ₹{loan_amount:,.2f} approved and disbursed'
+                'results': results,
+                'summary': summary,
+                'replayed': replayed,
+                'write_seconds': round(write_seconds, 3),
+                'message': f"{summary['APPROVED']} of {len(results)} bridge loans approved"
             })
         }
         
@@ -69,29 +280,645 @@ def lambda_handler(event, context):
             'statusCode': 400,
             'body': json.dumps({
                 'error': str(e),
-                'message': 'Failed to process bridge loan'
+                'message': 'Failed to process bridge loan batch'
             })
         }
 
-def store_loan(loan):
+def repayment_lambda_handler(event, context):
+    """
+    Input: loan_id (or certificate_id), amount, repayment_id (the payment
+           reference; a repeated one is not counted twice)
+    Output: The stored repayment
+    """
+    
+    try:
+        loan_id = event.get('loan_id') or loan_id_for(event['certificate_id'])
+        created, repayment = record_repayment(loan_id, event['amount'], event['repayment_id'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps(dict(repayment, replayed=not created, message=(
+                f"Repayment of ₹{repayment['amount']:,.2f} " + ('already recorded' if not created else 'recorded'))))
+        }
+        
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to record repayment'
+            })
+        }
+
+def loan_lookup_lambda_handler(event, context):
+    """
+    Input: farmer_id or certificate_id; optional type (LOAN or REPAYMENT;
+           a farmer's LOANs by default, everything for a certificate),
+           limit (QUERY_PAGE_SIZE), oldest_first, cursor (from the
+           previous page) and full (true to include the loan records)
+    Output: {'entries': [...], 'cursor': next page or None}, newest first;
+            a certificate lookup also returns its loan
+    """
+    
+    try:
+        limit = min(int(event.get('limit') or QUERY_PAGE_SIZE), QUERY_MAX_PAGE_SIZE)
+        newest_first = not event.get('oldest_first', False)
+        cursor = decode_cursor(event.get('cursor'))
+        if event.get('farmer_id'):
+            pages = index_pages(FARMER_INDEX, 'farmerId', event['farmer_id'], event.get('type', 'LOAN'),
+                                newest_first, limit, cursor)
+        elif event.get('certificate_id'):
+            pages = index_pages(CERTIFICATE_INDEX, 'certificateId', event['certificate_id'], event.get('type'),
+                                newest_first, limit, cursor)
+        else:
+            raise ValueError('farmer_id or certificate_id is required')
+        entries, cursor = next(pages)
+        body = {'entries': entries, 'count': len(entries), 'cursor': encode_cursor(cursor)}
+        if event.get('full'):
+            loan_ids = list(dict.fromkeys(entry['loan_id'] for entry in entries))
+            loans = fetch_loans(loan_ids)
+            body['loans'] = [loans[loan_id] for loan_id in loan_ids if loan_id in loans]
+        if not event.get('farmer_id'):
+            body['loan'] = loan_for_certificate(event['certificate_id'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps(body)
+        }
+        
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to look up loans'
+            })
+        }
+
+def build_loan(certificate):
+    """
+    Validate one certificate and create its loan record
+    Raises KeyError/ValueError for a missing field or an unusable amount
+    """
+    certificate_id = certificate['certificate_id']
+    damage_amount = float(certificate['damage_amount'])
+    farmer_id = certificate['farmer_id']
+    farmer_upi = certificate.get('farmer_upi', 'farmer@upi')
+    district = certificate.get('district')
+    scheme = certificate.get('scheme')
+    damage_type = certificate.get('damage_type')
+    if not certificate_id or not farmer_id:
+        raise ValueError('certificate_id and farmer_id must not be empty')
+    if not math.isfinite(damage_amount) or damage_amount <= 0:
+        raise ValueError(f'Invalid damage_amount {certificate["damage_amount"]!r}')
+    
+    # Calculate loan amount (70% of damage)
+    loan_amount = round(damage_amount * LOAN_TO_DAMAGE_RATIO, 2)
+    
+    loan = {
+        'loan_id': loan_id_for(certificate_id),
+        'certificate_id': certificate_id,
+        'farmer_id': farmer_id,
+        'damage_amount': damage_amount,
+        'loan_amount': loan_amount,
+        'interest_rate': 0.0,  # Zero interest!
+        'disbursement_method': 'UPI',
+        'farmer_upi': farmer_upi,
+        'status': DISBURSEMENT_PENDING,
+        'approved_at': datetime.utcnow().isoformat(),
+        'repayment_status': 'PENDING',
+        'collateral': certificate_id
+    }
+    if district:
+        loan['district'] = district
+    if scheme:
+        loan['scheme'] = scheme
+    if damage_type:
+        loan['damage_type'] = damage_type
+    budget_ids = budgets.budget_ids_for(district, scheme)
+    if budget_ids:
+        loan['budget_ids'] = budget_ids
+    return loan
+
+def loan_id_for(certificate_id):
+    """
+    The one loan ID a certificate can ever have
+    """
+    return str(uuid.uuid5(LOAN_ID_NAMESPACE, str(certificate_id)))
+
+def loan_response(loan, replayed=False):
+    """
+    Handler response body for an approved loan
+    """
+    action = {
+        DISBURSEMENT_PENDING: 'approved; disbursement queued',
+        DISBURSED: 'approved and disbursed',
+        DISBURSEMENT_FAILED: 'approved; disbursement failed',
+        DISBURSEMENT_UNKNOWN: 'approved; disbursement being confirmed'
+    }.get(loan['status'], 'approved')
+    if replayed:
+        action = 'was already ' + action
+    return {
+        'loan_id': loan['loan_id'],
+        'loan_amount': loan['loan_amount'],
+        'interest_rate': loan['interest_rate'],
+        'status': loan['status'],
+        'disbursement_ref': loan.get('disbursement_ref'),
+        'farmer_upi': loan['farmer_upi'],
+        'replayed': replayed,
+        'message': f"Bridge loan of ₹{loan['loan_amount']:,.2f} {action}"
+    }
+
+def require_disbursement_queue():
+    """
+    Raises RuntimeError when a payout provider is configured but no
+    disbursement queue: checked before a loan is stored, which would
+    otherwise stay pending unpaid. The mock gateway needs no queue
+    (dispatch_disbursements pays inline)
+    """
+    if not DISBURSEMENT_QUEUE_URL and gateway.CLIENT is not None:
+        raise RuntimeError('DISBURSEMENT_QUEUE_URL is not set; loans cannot be queued for disbursement')
+
+def recent_loan(certificate_id):
+    """
+    Loan for certificate_id from this container's LRU, or None
+    """
+    loan = RECENT_LOANS.get(certificate_id)
+    if loan is not None:
+        RECENT_LOANS.move_to_end(certificate_id)
+    return loan
+
+def remember_loan(loan):
+    RECENT_LOANS[loan['certificate_id']] = loan
+    RECENT_LOANS.move_to_end(loan['certificate_id'])
+    while len(RECENT_LOANS) > IDEMPOTENCY_CACHE_SIZE:
+        RECENT_LOANS.popitem(last=False)
+
+def loan_from_item(item):
+    """
+    Loan record from a DynamoDB item (Decimal numbers back to int/float)
+    """
+    return json.loads(json.dumps(item['data'], default=lambda d: int(d) if d == d.to_integral_value() else float(d)))
+
+def loan_item(loan):
     """
-    Store loan record in DynamoDB
+    DynamoDB item for a loan record (numbers as Decimal: boto3 rejects floats)
     """
-    table.put_item(Item={
+    return {
         'claimId': loan['loan_id'],
         'timestamp': int(datetime.utcnow().timestamp()),
         'type': 'LOAN',
-        'data': loan
-    })
+        'data': json.loads(json.dumps(loan), parse_float=Decimal),
+        **index_attributes('LOAN', loan)
+    }
+
+def index_attributes(item_type, record):
+    """
+    Top-level attributes keying and projected into LOAN_INDEXES for a loan
+    or repayment record; the status is kept in step by the worker
+    """
+    if item_type == 'LOAN':
+        attributes = {'loanId': record['loan_id'], 'sortKey': f"LOAN#{record['approved_at']}",
+                      'amount': record['loan_amount'], 'loanStatus': record['status']}
+    else:
+        attributes = {'loanId': record['loan_id'], 'sortKey': f"REPAYMENT#{record['repaid_at']}",
+                      'amount': record['amount']}
+    if record.get('farmer_id'):
+        attributes['farmerId'] = record['farmer_id']
+    if record.get('certificate_id'):
+        attributes['certificateId'] = record['certificate_id']
+    return json.loads(json.dumps(attributes), parse_float=Decimal)
+
+def issue_loan(loan):
+    """
+    Reserve the loan's budgets, then store it; the reservation is released
+    again when the certificate already had a loan or the write fails
+    Output: as store_loan
+    Raises BudgetExhausted - unless the certificate already has a loan, which
+    is returned as a replay
+    """
+    try:
+        reserve_budgets(loan)
+    except BudgetExhausted:
+        item = table.get_item(Key={'claimId': loan['loan_id']}, ConsistentRead=True).get('Item')
+        if item is None:
+            raise
+        return False, loan_from_item(item)
+    try:
+        created, stored = store_loan(loan)
+    except Exception:
+        release_budgets(loan)
+        raise
+    if not created:
+        release_budgets(loan)
+    return created, stored
+
+def reserve_budgets(loan):
+    """
+    Reserve the loan amount from each of its budgets, all or none
+    Raises BudgetExhausted
+    """
+    reserved = []
+    try:
+        for budget_id in loan.get('budget_ids', []):
+            budgets.reserve(budget_id, loan['loan_amount'])
+            reserved.append(budget_id)
+    except Exception:
+        for budget_id in reserved:
+            budgets.release(budget_id, loan['loan_amount'])
+        raise
+
+def release_budgets(loan):
+    for budget_id in loan.get('budget_ids', []):
+        budgets.release(budget_id, loan['loan_amount'])
+
+def reserve_loan_budgets(loans):
+    """
+    reserve_budgets for many loans on BATCH_WRITE_WORKERS threads
+    Output: {loan_id: BudgetExhausted} for the loans refused
+    Raises the first other error, after releasing every reservation made
+    """
+    def reserve_one(loan):
+        try:
+            reserve_budgets(loan)
+        except Exception as e:
+            return e
+    
+    budgeted = [loan for loan in loans if loan.get('budget_ids')]
+    with ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS) as executor:
+        outcomes = list(executor.map(reserve_one, budgeted))
+    errors = [outcome for outcome in outcomes if outcome is not None and not isinstance(outcome, BudgetExhausted)]
+    if errors:
+        for loan, outcome in zip(budgeted, outcomes):
+            if outcome is None:
+                release_budgets(loan)
+        raise errors[0]
+    return {loan['loan_id']: outcome for loan, outcome in zip(budgeted, outcomes) if outcome is not None}
+
+def release_unstored_budgets(loans, stored):
+    """
+    Release the budgets of loans not in stored after a batch write raised;
+    a loan found stored with its own approval time was written by a
+    transaction whose response was lost, and keeps its reservation
+    """
+    unconfirmed = [loan for loan in loans if loan['loan_id'] not in stored]
+    try:
+        found = fetch_loans([loan['loan_id'] for loan in unconfirmed])
+    except Exception:
+        found = {}
+    for loan in unconfirmed:
+        if found.get(loan['loan_id'], {}).get('approved_at') != loan['approved_at']:
+            release_budgets(loan)
+
+def store_loan(loan):
+    """
+    Store loan record in DynamoDB if its certificate has no loan yet
+    Output: (True, loan) when stored, (False, existing loan) otherwise
+    """
+    try:
+        table.put_item(Item=loan_item(loan), ConditionExpression='attribute_not_exists(claimId)')
+        return True, loan
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    return False, fetch_loan(loan['loan_id'])
+
+def record_repayment(loan_id, amount, repayment_id):
+    """
+    Store a repayment against a loan, once per repayment_id; it carries the
+    loan's farmer, district and damage type for the portfolio view
+    Output: (True, repayment) when stored, (False, stored repayment) otherwise
+    Raises KeyError for an unknown loan, ValueError for an unusable amount
+    """
+    amount = round(float(amount), 2)
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError(f'Invalid repayment amount {amount!r}')
+    item = table.get_item(Key={'claimId': loan_id}, ConsistentRead=True).get('Item')
+    if item is None or item.get('type') != 'LOAN':
+        raise KeyError(f'No loan {loan_id}')
+    loan = loan_from_item(item)
+    if amount > loan['loan_amount']:
+        raise ValueError(f"Repayment ₹{amount:,.2f} exceeds the ₹{loan['loan_amount']:,.2f} loan")
+    
+    repayment = {'repayment_id': str(repayment_id), 'loan_id': loan_id, 'amount': amount,
+                 'repaid_at': datetime.utcnow().isoformat()}
+    repayment.update({key: loan[key] for key in ('certificate_id', 'farmer_id', 'district', 'damage_type')
+                      if key in loan})
+    try:
+        table.put_item(Item={
+            'claimId': f'REPAYMENT#{repayment_id}',
+            'timestamp': int(datetime.utcnow().timestamp()),
+            'type': 'REPAYMENT',
+            'data': json.loads(json.dumps(repayment), parse_float=Decimal),
+            **index_attributes('REPAYMENT', repayment)
+        }, ConditionExpression='attribute_not_exists(claimId)')
+        return True, repayment
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    stored = table.get_item(Key={'claimId': f'REPAYMENT#{repayment_id}'}, ConsistentRead=True)['Item']
+    return False, loan_from_item(stored)
+
+def fetch_loan(loan_id):
+    """
+    Stored loan record (strongly consistent read)
+    """
+    return loan_from_item(table.get_item(Key={'claimId': loan_id}, ConsistentRead=True)['Item'])
+
+def loan_for_certificate(certificate_id):
+    """
+    The certificate's loan, or None: a GetItem on its derived loan ID
+    """
+    item = table.get_item(Key={'claimId': loan_id_for(certificate_id)}).get('Item')
+    return loan_from_item(item) if item is not None else None
+
+def farmer_loans(farmer_id, item_type='LOAN', newest_first=True, page_size=None):
+    """
+    Iterator over a farmer's index entries (loans, or REPAYMENT entries),
+    newest first; pages of page_size are queried from FarmerIndex as the
+    iterator reaches them
+    """
+    for entries, _ in index_pages(FARMER_INDEX, 'farmerId', farmer_id, item_type, newest_first, page_size):
+        yield from entries
+
+def certificate_entries(certificate_id, item_type=None, newest_first=True, page_size=None):
+    """
+    Iterator over a certificate's loan and repayment entries from
+    CertificateIndex, newest first
+    """
+    for entries, _ in index_pages(CERTIFICATE_INDEX, 'certificateId', certificate_id, item_type, newest_first,
+                                  page_size):
+        yield from entries
 
-def disburse_loan(amount, upi_id):
+def index_pages(index_name, key_name, key_value, item_type=None, newest_first=True, page_size=None, cursor=None):
     """
-    Simulate UPI disbursement
-    For MVP: Mock payment gateway
-    In production: Integrate with actual UPI gateway (Razorpay, PayTM, etc.)
+    Query one partition of a LOAN_INDEXES index page by page, following
+    LastEvaluatedKey from cursor (None for the first page)
+    Output: yields (entries, cursor of the next page or None)
+    Raises ValueError for an unknown item_type
     """
+    if item_type is not None and item_type not in ENTRY_TYPES:
+        raise ValueError(f"Unknown type {item_type!r}; use one of {', '.join(ENTRY_TYPES)}")
+    request = {
+        'IndexName': index_name,
+        'KeyConditionExpression': '#key = :key',
+        'ExpressionAttributeNames': {'#key': key_name},
+        'ExpressionAttributeValues': {':key': key_value},
+        'ScanIndexForward': not newest_first,
+        'Limit': page_size or QUERY_PAGE_SIZE
+    }
+    if item_type is not None:
+        request['KeyConditionExpression'] += ' AND begins_with(#sort, :prefix)'
+        request['ExpressionAttributeNames']['#sort'] = 'sortKey'
+        request['ExpressionAttributeValues'][':prefix'] = f'{item_type}#'
+    while True:
+        if cursor is not None:
+            request['ExclusiveStartKey'] = cursor
+        response = table.query(**request)
+        cursor = response.get('LastEvaluatedKey')
+        yield [index_entry(item) for item in response['Items']], cursor
+        if cursor is None:
+            return
+
+def index_entry(item):
+    """
+    Listing entry from a projected index item
+    """
+    entry = {
+        'type': item['type'],
+        'loan_id': item['loanId'],
+        'farmer_id': item.get('farmerId'),
+        'certificate_id': item.get('certificateId'),
+        'amount': float(item['amount']),
+        'at': item['sortKey'].split('#', 1)[1]
+    }
+    if item['type'] == 'LOAN':
+        entry['status'] = item.get('loanStatus')
+    else:
+        entry['repayment_id'] = item['claimId'].split('#', 1)[1]
+    return entry
+
+def encode_cursor(key):
+    """
+    LastEvaluatedKey as an opaque string for API callers (None stays None)
+    """
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key, sort_keys=True).encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def backfill_index_attributes(segments=4):
+    """
+    Add the LOAN_INDEXES attributes to loans and repayments stored before
+    them, with a parallel segmented Scan; run once after creating the
+    indexes (loan-index-migration.py does both)
+    Output: number of items updated
+    """
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        return sum(executor.map(lambda segment: backfill_segment(segment, segments), range(segments)))
+
+def backfill_segment(segment, segments):
+    updated = 0
+    request = {
+        'Segment': segment,
+        'TotalSegments': segments,
+        'FilterExpression': '#type = :loan AND attribute_not_exists(sortKey) OR '
+                            '#type = :repayment AND attribute_not_exists(sortKey)',
+        'ExpressionAttributeNames': {'#type': 'type'},
+        'ExpressionAttributeValues': {':loan': 'LOAN', ':repayment': 'REPAYMENT'}
+    }
+    while True:
+        response = table.scan(**request)
+        for item in response['Items']:
+            attributes = index_attributes(item['type'], loan_from_item(item))
+            try:
+                table.update_item(
+                    Key={'claimId': item['claimId']},
+                    UpdateExpression='SET ' + ', '.join(f'#{name} = :{name}' for name in attributes),
+                    ConditionExpression='attribute_not_exists(sortKey)',
+                    ExpressionAttributeNames={f'#{name}': name for name in attributes},
+                    ExpressionAttributeValues={f':{name}': value for name, value in attributes.items()}
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            return updated
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def disbursement_job(loan):
+    """
+    Queue message body for a loan's disbursement
+    """
+    job = {key: loan[key] for key in ('loan_id', 'certificate_id', 'loan_amount', 'farmer_upi', 'approved_at')}
+    if loan.get('budget_ids'):
+        job['budget_ids'] = loan['budget_ids']
+    return json.dumps(job)
+
+def dispatch_disbursements(loans):
+    """
+    Queue the loans' disbursement jobs; with no queue configured (only
+    allowed with the mock gateway) run each job now through
+    disbursement-worker's process_job, one attempt on BATCH_WRITE_WORKERS
+    threads, and update the loans with their outcome. A retryable failure
+    leaves a loan pending for the next retry of the request
+    Output: set of loan IDs not queued
+    """
+    if DISBURSEMENT_QUEUE_URL:
+        return enqueue_disbursements(loans)
+    worker = importlib.import_module('disbursement-worker')
+
+    def disburse_now(loan):
+        def on_status(job, status, attempt, disbursement_ref=None, error=None):
+            recorded = worker.record_status(job, status, attempt, disbursement_ref, error)
+            if recorded:
+                loan['status'] = status
+                if disbursement_ref is not None:
+                    loan['disbursement_ref'] = disbursement_ref
+            return recorded
+        worker.process_job(json.loads(disbursement_job(loan)), 1, on_status=on_status)
+
+    with ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS) as executor:
+        list(executor.map(disburse_now, loans))
+    return set()
+
+def enqueue_disbursements(loans):
+    """
+    Queue disbursement jobs with SendMessageBatch, QUEUE_SEND_CHUNK per
+    request on BATCH_WRITE_WORKERS threads; returns the set of loan IDs
+    not queued after BATCH_MAX_RETRIES retries
+    """
+    chunks = [loans[i:i + QUEUE_SEND_CHUNK] for i in range(0, len(loans), QUEUE_SEND_CHUNK)]
+    unqueued = set()
+    if not chunks:
+        return unqueued
+    if len(chunks) == 1:
+        return set(send_job_chunk(chunks[0]))
+    with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_WORKERS, len(chunks))) as executor:
+        for failed in executor.map(send_job_chunk, chunks):
+            unqueued.update(failed)
+    return unqueued
+
+def send_job_chunk(loans):
+    """
+    One SendMessageBatch of up to 10 jobs, resending failed entries with
+    jittered exponential backoff; returns the loan IDs left unqueued
+    """
+    entries = [{'Id': str(i), 'MessageBody': disbursement_job(loan)} for i, loan in enumerate(loans)]
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        response = sqs.send_message_batch(QueueUrl=DISBURSEMENT_QUEUE_URL, Entries=entries)
+        failed = {entry['Id'] for entry in response.get('Failed', [])}
+        entries = [entry for entry in entries if entry['Id'] in failed]
+        if not entries:
+            return []
+        if attempt < BATCH_MAX_RETRIES:
+            time.sleep(BATCH_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+    return [loans[int(entry['Id'])]['loan_id'] for entry in entries]
+
+def fetch_loans(loan_ids):
+    """
+    Stored loans among loan_ids, by loan ID: BatchGetItem with BATCH_GET_CHUNK
+    keys per request on BATCH_WRITE_WORKERS threads
+    """
+    chunks = [loan_ids[i:i + BATCH_GET_CHUNK] for i in range(0, len(loan_ids), BATCH_GET_CHUNK)]
+    loans = {}
+    if not chunks:
+        return loans
+    with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_WORKERS, len(chunks))) as executor:
+        for found in executor.map(read_loan_chunk, chunks):
+            loans.update(found)
+    return loans
+
+def read_loan_chunk(loan_ids):
+    """
+    One BatchGetItem of up to 100 loan IDs, resending UnprocessedKeys with
+    jittered exponential backoff
+    """
+    loans = {}
+    request = {table.name: {'Keys': [{'claimId': loan_id} for loan_id in loan_ids], 'ConsistentRead': True}}
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        response = table.meta.client.batch_get_item(RequestItems=request)
+        for item in response['Responses'].get(table.name, []):
+            loans[item['claimId']] = loan_from_item(item)
+        request = response.get('UnprocessedKeys')
+        if not request:
+            return loans
+        if attempt < BATCH_MAX_RETRIES:
+            time.sleep(BATCH_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+    raise RuntimeError(f'{len(request[table.name]["Keys"])} loan lookups unprocessed after retries')
+
+def store_loans(loans):
+    """
+    Store many loan records, each only if its certificate has no loan yet,
+    BATCH_WRITE_CHUNK per transaction on BATCH_WRITE_WORKERS threads
+    Output: (loan IDs still unwritten after BATCH_MAX_RETRIES retries,
+             loan IDs that already had a loan stored)
+    """
+    chunks = [loans[i:i + BATCH_WRITE_CHUNK] for i in range(0, len(loans), BATCH_WRITE_CHUNK)]
+    failed, duplicates = set(), set()
+    if not chunks:
+        return failed, duplicates
+    with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_WORKERS, len(chunks))) as executor:
+        for unwritten, existing in executor.map(write_loan_chunk, chunks):
+            failed.update(unwritten)
+            duplicates.update(existing)
+    return failed, duplicates
+
+def write_loan_chunk(loans):
+    """
+    One TransactWriteItems of up to BATCH_WRITE_CHUNK conditional loan puts.
+    A cancellation names the loans that already exist: they are dropped and
+    the rest resent at once; throttling (a ThrottlingError cancellation or
+    a THROTTLING_ERRORS response) or a conflicting transaction is retried
+    with jittered exponential backoff. Other errors are raised
+    Output: (loan IDs left unwritten, loan IDs that already existed)
+    """
+    pending = list(loans)
+    existing = []
+    attempt = 0
+    while pending:
+        try:
+            table.meta.client.transact_write_items(TransactItems=[{'Put': {
+                'TableName': table.name,
+                'Item': loan_item(loan),
+                'ConditionExpression': 'attribute_not_exists(claimId)'
+            }} for loan in pending])
+            break
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code not in THROTTLING_ERRORS and code != 'TransactionCanceledException':
+                raise
+            reasons = e.response.get('CancellationReasons') or [{}] * len(pending)
+            duplicates = [loan['loan_id'] for loan, reason in zip(pending, reasons)
+                          if reason.get('Code') == 'ConditionalCheckFailed']
+            if duplicates:
+                existing += duplicates
+                pending = [loan for loan in pending if loan['loan_id'] not in duplicates]
+                continue
+        if attempt == BATCH_MAX_RETRIES:
+            return [loan['loan_id'] for loan in pending], existing
+        time.sleep(BATCH_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+        attempt += 1
+    return [], existing
+
+def disburse_loan(amount, upi_id, idempotency_key=None):
+    """
+    UPI disbursement through the configured payout provider
+    (upi-gateway-client.py); a mock when none is configured (MVP)
+    idempotency_key goes to the gateway's idempotency header; a repeated
+    key returns the original transfer instead of paying again
+    """
+    if gateway.CLIENT is not None:
+        return gateway.CLIENT.disburse(amount, upi_id, idempotency_key or str(uuid.uuid4()))
+    
     # Simulate payment processing
-    disbursement_ref = f"UPI-{uuid.uuid4().hex[:12].upper()}"
+    if idempotency_key is not None:
+        disbursement_ref = f"UPI-{uuid.uuid5(LOAN_ID_NAMESPACE, idempotency_key).hex[:12].upper()}"
+    else:
+        disbursement_ref = f"UPI-{uuid.uuid4().hex[:12].upper()}"
     
     # In production, you would:
     # 1. Call UPI payment gateway API
@@ -107,7 +934,8 @@ if __name__ == "__main__":
         'certificate_id': 'cert-123',
         'damage_amount': 50000,
         'farmer_id': 'farmer-456',
-        'farmer_upi': 'farmer@paytm'
+        'farmer_upi': 'farmer@paytm',
+        'district': 'Nashik'
     }
     result = lambda_handler(test_event, None)
     print(json.dumps(result, indent=2))
@@ -0,0 +1,431 @@
+"""
+VeriCrop FinBridge - Disbursement Budgets
+District and scheme budgets that bridge-loan-calculator.py checks every loan
+against. During a flood every approval in a district debits the same
+budget, and a single counter item would be throttled at DynamoDB's
+per-partition write limit; so each budget is split over N counter shards,
+items holding a share of what is left, and a reservation debits one random
+shard with a conditional ADD (remaining >= amount)
+    create_budget      budget record plus N shards splitting the limit
+    reserve            debit one shard; when no shard it tries can cover
+                       the amount, a transaction takes it from several.
+                       Refuses (BudgetExhausted) only when all shards
+                       together hold less than the amount
+    release            credit an amount back (loan not stored, payout failed)
+    budget_summary     limit, remaining and spent summed over the shards,
+                       cached for BUDGET_CACHE_TTL_SECONDS
+    rebalance_budget   re-split what is left evenly, optionally over a new
+                       number of shards, in one transaction
+Amounts are rupees with paise (Decimal in DynamoDB)
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table(os.environ.get('BUDGET_TABLE', 'vericrop-claims'))
+
+BUDGET_SHARDS = int(os.environ.get('BUDGET_SHARDS', '16'))
+BUDGET_CACHE_TTL_SECONDS = float(os.environ.get('BUDGET_CACHE_TTL_SECONDS', '2'))
+# Shards tried with a single-item debit before the cross-shard transaction
+BUDGET_SHARD_ATTEMPTS = 3
+BUDGET_TRANSACTION_RETRIES = 5
+BUDGET_RETRY_BASE_SECONDS = 0.02
+# TransactWriteItems takes at most 100 items: a rebalance writes every old
+# and new shard plus the budget record
+BUDGET_MAX_SHARDS = 64
+BATCH_GET_CHUNK = 100
+THROTTLING_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException')
+
+BUDGET_STATS = {'reserved': 0, 'refused': 0, 'released': 0, 'shard_misses': 0, 'throttled': 0,
+                'transactions': 0, 'transaction_conflicts': 0}
+BUDGET_CACHE = {}
+_cache_lock = threading.Lock()
+
+class BudgetExhausted(Exception):
+    """
+    The budget cannot cover the amount
+    """
+
+    def __init__(self, budget_id, amount, remaining):
+        super().__init__(f'Budget {budget_id} exhausted: ₹{float(remaining):,.2f} left, '
+                         f'₹{float(amount):,.2f} requested')
+        self.budget_id = budget_id
+        self.remaining = remaining
+
+def budget_ids_for(district=None, scheme=None):
+    """
+    Budgets a loan is checked against
+    """
+    ids = []
+    if district:
+        ids.append(f'DISTRICT#{district}')
+    if scheme:
+        ids.append(f'SCHEME#{scheme}')
+    return ids
+
+def create_budget(budget_id, limit, shards=None):
+    """
+    Store a budget of `limit` rupees split evenly over `shards` counters
+    Raises ClientError (ConditionalCheckFailedException) if it exists
+    """
+    shards = shards or BUDGET_SHARDS
+    if not 1 <= shards <= BUDGET_MAX_SHARDS:
+        raise ValueError(f'Budgets take 1 to {BUDGET_MAX_SHARDS} shards, got {shards}')
+    limit = to_amount(limit)
+    now = datetime.utcnow()
+    items = [{'Put': {'TableName': table.name, 'ConditionExpression': 'attribute_not_exists(claimId)', 'Item': {
+        'claimId': budget_key(budget_id),
+        'timestamp': int(now.timestamp()),
+        'type': 'BUDGET',
+        'data': {'budget_id': budget_id, 'limit': limit, 'shards': shards, 'version': 0,
+                 'created_at': now.isoformat()}
+    }}}]
+    for shard, share in enumerate(split_amount(limit, shards)):
+        items.append({'Put': {'TableName': table.name, 'Item': shard_item(budget_id, shard, share, now)}})
+    table.meta.client.transact_write_items(TransactItems=items)
+    forget_budget(budget_id)
+    return budget_summary(budget_id, max_age=0)
+
+def reserve(budget_id, amount):
+    """
+    Debit amount from the budget
+    Output: the shards debited, or None when no such budget exists
+    Raises BudgetExhausted when the shards together hold less than amount
+    """
+    amount = to_amount(amount)
+    summary = budget_summary(budget_id)
+    if summary is None:
+        return None
+
+    # Shards last seen holding enough go first, in random order
+    hints = shard_hints(budget_id) or [amount] * summary['shards']
+    candidates = random.sample(range(len(hints)), len(hints))
+    candidates.sort(key=lambda shard: hints[shard] < amount)
+    missed = False
+    throttled = None
+    for attempt, shard in enumerate(candidates[:BUDGET_SHARD_ATTEMPTS]):
+        try:
+            table.update_item(
+                Key={'claimId': shard_key(budget_id, shard)},
+                UpdateExpression='ADD remaining :debit, spent :amount',
+                ConditionExpression='remaining >= :amount',
+                ExpressionAttributeValues={':debit': -amount, ':amount': amount}
+            )
+            note_shard(budget_id, shard, -amount)
+            BUDGET_STATS['reserved'] += 1
+            return [shard]
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'ConditionalCheckFailedException':
+                BUDGET_STATS['shard_misses'] += 1
+                missed = True
+                note_shard(budget_id, shard, None, below=amount)
+            elif code in THROTTLING_ERRORS:
+                BUDGET_STATS['throttled'] += 1
+                throttled = throttled or e
+                time.sleep(BUDGET_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+            else:
+                raise
+    # Only shards found short of the amount call for the transaction; a
+    # budget whose shards are all throttled needs more shards instead
+    if not missed:
+        raise throttled
+    return reserve_across_shards(budget_id, amount)
+
+def reserve_across_shards(budget_id, amount):
+    """
+    Debit amount from as few shards as can cover it, in one transaction
+    against a consistent read of every shard; retried while other writes
+    change the shards under it
+    """
+    for attempt in range(BUDGET_TRANSACTION_RETRIES):
+        _, remaining, _ = read_budget(budget_id)
+        if sum(remaining) < amount:
+            BUDGET_STATS['refused'] += 1
+            raise BudgetExhausted(budget_id, amount, sum(remaining))
+
+        draws = []
+        needed = amount
+        for shard in sorted(range(len(remaining)), key=lambda s: -remaining[s]):
+            draw = min(needed, remaining[shard])
+            if draw > 0:
+                draws.append((shard, draw))
+                needed -= draw
+            if not needed:
+                break
+        try:
+            BUDGET_STATS['transactions'] += 1
+            table.meta.client.transact_write_items(TransactItems=[{'Update': {
+                'TableName': table.name,
+                'Key': {'claimId': shard_key(budget_id, shard)},
+                'UpdateExpression': 'ADD remaining :debit, spent :amount',
+                'ConditionExpression': 'remaining >= :amount',
+                'ExpressionAttributeValues': {':debit': -draw, ':amount': draw}
+            }} for shard, draw in draws])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException' or \
+                    attempt == BUDGET_TRANSACTION_RETRIES - 1:
+                raise
+            BUDGET_STATS['transaction_conflicts'] += 1
+            time.sleep(BUDGET_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+            continue
+        for shard, draw in draws:
+            note_shard(budget_id, shard, -draw)
+        BUDGET_STATS['reserved'] += 1
+        return [shard for shard, _ in draws]
+
+def release(budget_id, amount):
+    """
+    Credit amount back to a random shard of the budget
+    """
+    amount = to_amount(amount)
+    summary = budget_summary(budget_id)
+    if summary is None:
+        return
+    error = None
+    for shard in random.sample(range(summary['shards']), summary['shards']):
+        try:
+            # attribute_exists: a shard removed by a rebalance stays removed
+            table.update_item(
+                Key={'claimId': shard_key(budget_id, shard)},
+                UpdateExpression='ADD remaining :amount, spent :credit',
+                ConditionExpression='attribute_exists(claimId)',
+                ExpressionAttributeValues={':amount': amount, ':credit': -amount}
+            )
+            note_shard(budget_id, shard, amount)
+            BUDGET_STATS['released'] += 1
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('ConditionalCheckFailedException',) + THROTTLING_ERRORS:
+                raise
+            error = e
+    raise error
+
+def rebalance_budget(budget_id, shards=None):
+    """
+    Spread what is left of the budget evenly over `shards` counters (the
+    current number by default). Amounts move with relative ADDs, so
+    reservations carry on meanwhile and only a shard drained below what it
+    gives up cancels (and retries) the transaction. Removing shards first
+    retires them: once every container's cached shard count has expired
+    they are swept into the remaining ones and deleted
+    """
+    data, remaining, _ = read_budget(budget_id)
+    if data is None:
+        raise KeyError(f'No budget {budget_id}')
+    old = len(remaining)
+    new = shards or old
+    if not 1 <= new <= BUDGET_MAX_SHARDS:
+        raise ValueError(f'Budgets take 1 to {BUDGET_MAX_SHARDS} shards, got {new}')
+    if new < old:
+        set_shard_count(budget_id, new, int(data['version']))
+        time.sleep(BUDGET_CACHE_TTL_SECONDS)
+        for shard in range(new, old):
+            retire_shard(budget_id, shard, new)
+
+    for attempt in range(BUDGET_TRANSACTION_RETRIES):
+        data, remaining, _ = read_budget(budget_id)
+        old = len(remaining)
+        now = datetime.utcnow()
+        shares = split_amount(sum(remaining), new)
+        items = [shard_count_update(budget_id, new, int(data['version']), now)]
+        for shard in range(new):
+            if shard >= old:
+                items.append({'Put': {'TableName': table.name, 'Item': shard_item(budget_id, shard, shares[shard], now),
+                                      'ConditionExpression': 'attribute_not_exists(claimId)'}})
+                continue
+            delta = shares[shard] - remaining[shard]
+            if not delta:
+                continue
+            update = {
+                'TableName': table.name,
+                'Key': {'claimId': shard_key(budget_id, shard)},
+                'UpdateExpression': 'ADD remaining :delta',
+                'ExpressionAttributeValues': {':delta': delta}
+            }
+            if delta < 0:
+                update['ConditionExpression'] = 'remaining >= :give'
+                update['ExpressionAttributeValues'][':give'] = -delta
+            items.append({'Update': update})
+        try:
+            BUDGET_STATS['transactions'] += 1
+            table.meta.client.transact_write_items(TransactItems=items)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException' or \
+                    attempt == BUDGET_TRANSACTION_RETRIES - 1:
+                raise
+            BUDGET_STATS['transaction_conflicts'] += 1
+            time.sleep(BUDGET_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+            continue
+        forget_budget(budget_id)
+        return budget_summary(budget_id, max_age=0)
+
+def retire_shard(budget_id, shard, shards):
+    """
+    Move a retired shard's remaining and spent into shard `shard % shards`
+    and delete it, conditional on it not having changed since it was read
+    """
+    key = shard_key(budget_id, shard)
+    for attempt in range(BUDGET_TRANSACTION_RETRIES):
+        item = read_items([key]).get(key)
+        if item is None:
+            return
+        try:
+            table.meta.client.transact_write_items(TransactItems=[
+                {'Delete': {'TableName': table.name, 'Key': {'claimId': key},
+                            'ConditionExpression': 'remaining = :remaining AND spent = :spent',
+                            'ExpressionAttributeValues': {':remaining': item['remaining'], ':spent': item['spent']}}},
+                {'Update': {'TableName': table.name, 'Key': {'claimId': shard_key(budget_id, shard % shards)},
+                            'UpdateExpression': 'ADD remaining :remaining, spent :spent',
+                            'ExpressionAttributeValues': {':remaining': item['remaining'], ':spent': item['spent']}}}
+            ])
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException' or \
+                    attempt == BUDGET_TRANSACTION_RETRIES - 1:
+                raise
+            BUDGET_STATS['transaction_conflicts'] += 1
+            time.sleep(BUDGET_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+def set_shard_count(budget_id, shards, version):
+    table.meta.client.transact_write_items(
+        TransactItems=[shard_count_update(budget_id, shards, version, datetime.utcnow())])
+    forget_budget(budget_id)
+
+def shard_count_update(budget_id, shards, version, now):
+    return {'Update': {
+        'TableName': table.name,
+        'Key': {'claimId': budget_key(budget_id)},
+        'UpdateExpression': 'SET #data.shards = :shards, #data.version = :next, #data.rebalanced_at = :now',
+        'ConditionExpression': '#data.version = :version',
+        'ExpressionAttributeNames': {'#data': 'data'},
+        'ExpressionAttributeValues': {':shards': shards, ':next': version + 1, ':version': version,
+                                      ':now': now.isoformat()}
+    }}
+
+def budget_summary(budget_id, max_age=None):
+    """
+    Budget totals over its shards, at most max_age seconds old (default
+    BUDGET_CACHE_TTL_SECONDS; 0 forces a consistent read)
+    Output: {budget_id, limit, remaining, spent, shards, version} or None
+            when no such budget exists
+    """
+    max_age = BUDGET_CACHE_TTL_SECONDS if max_age is None else max_age
+    cached = BUDGET_CACHE.get(budget_id)
+    if cached is not None and time.monotonic() - cached['read_at'] < max_age:
+        return cached['summary']
+    return read_budget(budget_id, summary=True)
+
+def read_budget(budget_id, summary=False):
+    """
+    Consistent read of the budget record and every shard; refreshes the
+    cache
+    Output: (record data, [remaining per shard], [spent per shard]) as
+            Decimals, or the summary with summary=True
+    """
+    record = read_items([budget_key(budget_id)]).get(budget_key(budget_id))
+    if record is None:
+        data, remaining, spent, totals = None, [], [], None
+    else:
+        data = record['data']
+        keys = [shard_key(budget_id, shard) for shard in range(int(data['shards']))]
+        items = read_items(keys)
+        remaining = [items[key]['remaining'] if key in items else Decimal(0) for key in keys]
+        spent = [items[key]['spent'] if key in items else Decimal(0) for key in keys]
+        totals = {
+            'budget_id': budget_id,
+            'limit': float(data['limit']),
+            'remaining': float(sum(remaining)),
+            'spent': float(sum(spent)),
+            'shards': len(keys),
+            'version': int(data['version'])
+        }
+    with _cache_lock:
+        BUDGET_CACHE[budget_id] = {'read_at': time.monotonic(), 'summary': totals, 'hints': list(remaining)}
+    return totals if summary else (data, remaining, spent)
+
+def shard_hints(budget_id):
+    """
+    What each shard last held as far as this container knows
+    """
+    with _cache_lock:
+        cached = BUDGET_CACHE.get(budget_id)
+        return list(cached['hints']) if cached is not None else None
+
+def note_shard(budget_id, shard, delta, below=None):
+    """
+    Keep the cached shard hints roughly current after a write of ours (or
+    a failed debit: the shard holds less than `below`)
+    """
+    with _cache_lock:
+        cached = BUDGET_CACHE.get(budget_id)
+        if cached is None or shard >= len(cached['hints']):
+            return
+        if below is not None:
+            cached['hints'][shard] = min(cached['hints'][shard], below - Decimal('0.01'))
+        else:
+            cached['hints'][shard] += delta
+
+def forget_budget(budget_id):
+    with _cache_lock:
+        BUDGET_CACHE.pop(budget_id, None)
+
+def read_items(keys):
+    """
+    Items by claimId with strongly consistent BatchGetItem reads
+    """
+    found = {}
+    for i in range(0, len(keys), BATCH_GET_CHUNK):
+        request = {table.name: {'Keys': [{'claimId': key} for key in keys[i:i + BATCH_GET_CHUNK]],
+                                'ConsistentRead': True}}
+        while request:
+            response = table.meta.client.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(table.name, []):
+                found[item['claimId']] = item
+            request = response.get('UnprocessedKeys')
+    return found
+
+def budget_key(budget_id):
+    return f'BUDGET#{budget_id}'
+
+def shard_key(budget_id, shard):
+    return f'BUDGET#{budget_id}#SHARD#{shard:03d}'
+
+def shard_item(budget_id, shard, share, now):
+    # Counters are top-level attributes so ADD can update them
+    return {
+        'claimId': shard_key(budget_id, shard),
+        'timestamp': int(now.timestamp()),
+        'type': 'BUDGET_SHARD',
+        'budgetId': budget_id,
+        'shard': shard,
+        'remaining': share,
+        'spent': Decimal(0)
+    }
+
+def to_amount(amount):
+    return Decimal(str(round(float(amount), 2)))
+
+def split_amount(amount, parts):
+    """
+    amount in `parts` shares to the paisa, the odd paise going to the first
+    """
+    paise = int(to_amount(amount) * 100)
+    share, extra = divmod(paise, parts)
+    return [Decimal(share + (i < extra)).scaleb(-2) for i in range(parts)]
+
+# Test locally
+if __name__ == "__main__":
+    budget = budget_ids_for(district='Nashik')[0]
+    print(json.dumps(create_budget(budget, 5000000, shards=8), indent=2))
+    print(reserve(budget, 35000.0))
+    print(json.dumps(budget_summary(budget, max_age=0), indent=2))
@@ -0,0 +1,248 @@
+"""
+VeriCrop FinBridge - Disbursement Worker
+Drains the disbursement queue that bridge-loan-calculator.py fills on
+approval: pays each DISBURSEMENT_PENDING loan through the UPI gateway and
+records the outcome on the loan record (DISBURSED with its reference, or
+DISBURSEMENT_FAILED with the gateway's refusal)
+    lambda_handler           SQS event source mapping with partial batch
+                             responses: failed jobs go back on the queue
+    DisbursementWorkerPool   long-running poller for the same queue
+Both keep at most DISBURSEMENT_CONCURRENCY gateway calls in flight and hide
+a failed job from the queue for an exponentially growing delay before the
+next attempt. The gateway call carries the loan ID as idempotency key and
+every status update is conditional on the loan still being unsettled, so
+a redelivered job never pays twice. Only a gateway refusal fails a loan,
+which gives its amount back to its disbursement budgets; a loan out of
+attempts on retryable errors (timeouts, a payout still processing) becomes
+DISBURSEMENT_UNKNOWN and its job keeps checking the payout under the same
+idempotency key until it settles or is refused
+"""
+
+import importlib
+import json
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+from botocore.exceptions import ClientError
+
+calculator = importlib.import_module('bridge-loan-calculator')
+
+sqs = boto3.client('sqs')
+
+DISBURSEMENT_QUEUE_URL = calculator.DISBURSEMENT_QUEUE_URL
+DISBURSEMENT_CONCURRENCY = int(os.environ.get('DISBURSEMENT_CONCURRENCY', '16'))
+DISBURSEMENT_MAX_ATTEMPTS = int(os.environ.get('DISBURSEMENT_MAX_ATTEMPTS', '5'))
+DISBURSEMENT_RETRY_BASE_SECONDS = float(os.environ.get('DISBURSEMENT_RETRY_BASE_SECONDS', '2'))
+DISBURSEMENT_RETRY_MAX_SECONDS = 300
+# ReceiveMessage returns at most 10 messages
+RECEIVE_CHUNK = 10
+UNSETTLED = (calculator.DISBURSEMENT_PENDING, calculator.DISBURSEMENT_UNKNOWN)
+
+DISBURSEMENT_STATS = {'disbursed': 0, 'retried': 0, 'failed': 0, 'duplicates': 0, 'unknown': 0}
+
+def lambda_handler(event, context):
+    """
+    Input: SQS event (Records[] of disbursement jobs)
+    Output: {'batchItemFailures': [...]} naming the jobs to retry
+            (requires ReportBatchItemFailures on the event source mapping)
+    """
+    records = event['Records']
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(DISBURSEMENT_CONCURRENCY, len(records)))) as executor:
+        outcomes = executor.map(
+            lambda record: process_job(json.loads(record['body']),
+                                       int(record['attributes']['ApproximateReceiveCount'])),
+            records)
+        for record, outcome in zip(records, outcomes):
+            if outcome == 'RETRY':
+                delay_retry(sqs, DISBURSEMENT_QUEUE_URL, record['receiptHandle'],
+                            int(record['attributes']['ApproximateReceiveCount']))
+                failures.append({'itemIdentifier': record['messageId']})
+
+    print(json.dumps({'jobs': len(records), 'retrying': len(failures), 'stats': DISBURSEMENT_STATS}))
+    return {'batchItemFailures': failures}
+
+class DisbursementWorkerPool:
+    """
+    Long-running queue consumer (container task, or the local pipeline):
+    long-polls only for as many jobs as it has free slots, so at most
+    `concurrency` disbursements are in flight, and runs each on a thread
+    """
+
+    def __init__(self, queue_url=None, sqs_client=None, gateway=None, on_status=None,
+                 concurrency=None, max_attempts=None, wait_seconds=1):
+        self.queue_url = queue_url or DISBURSEMENT_QUEUE_URL
+        self.sqs = sqs_client or sqs
+        self.gateway = gateway
+        self.on_status = on_status
+        self.concurrency = concurrency or DISBURSEMENT_CONCURRENCY
+        self.max_attempts = max_attempts or DISBURSEMENT_MAX_ATTEMPTS
+        self.wait_seconds = wait_seconds
+        self.slots = threading.Semaphore(self.concurrency)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self, drain=False):
+        """
+        Poll until stop() - or, with drain=True, until the queue holds no
+        jobs (visible or awaiting retry) and none are in flight
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self.stopped.is_set():
+                self.slots.acquire()
+                free = 1
+                while free < RECEIVE_CHUNK and self.slots.acquire(blocking=False):
+                    free += 1
+                messages = self.sqs.receive_message(
+                    QueueUrl=self.queue_url, MaxNumberOfMessages=free, WaitTimeSeconds=self.wait_seconds,
+                    AttributeNames=['ApproximateReceiveCount']).get('Messages', [])
+                for _ in range(free - len(messages)):
+                    self.slots.release()
+                with self.lock:
+                    self.in_flight += len(messages)
+                for message in messages:
+                    executor.submit(self.handle, message)
+                if drain and not messages and self.idle():
+                    break
+
+    def stop(self):
+        self.stopped.set()
+
+    def idle(self):
+        with self.lock:
+            if self.in_flight:
+                return False
+        attributes = self.sqs.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible'])['Attributes']
+        return not int(attributes['ApproximateNumberOfMessages']) and \
+            not int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+    def handle(self, message):
+        try:
+            attempt = int(message['Attributes']['ApproximateReceiveCount'])
+            outcome = process_job(json.loads(message['Body']), attempt, gateway=self.gateway,
+                                  on_status=self.on_status, max_attempts=self.max_attempts)
+            if outcome == 'RETRY':
+                delay_retry(self.sqs, self.queue_url, message['ReceiptHandle'], attempt)
+            else:
+                self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message['ReceiptHandle'])
+        except Exception as e:
+            # Left on the queue: it reappears after the visibility timeout
+            print(f"Disbursement job {message.get('MessageId')} errored: {e}")
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+def process_job(job, attempt, gateway=None, on_status=None, max_attempts=None):
+    """
+    One disbursement attempt for a queued job
+    Output: 'DISBURSED', 'DUPLICATE' (the loan was already settled),
+            'RETRY' (retryable failure; retry later, as DISBURSEMENT_UNKNOWN
+            once out of attempts) or 'FAILED' (the gateway refused it)
+    """
+    gateway = gateway or calculator.disburse_loan
+    on_status = on_status or record_status
+    max_attempts = max_attempts or DISBURSEMENT_MAX_ATTEMPTS
+    # Replayed approvals queue a pending loan again; a copy of the job that
+    # finds it settled skips the gateway
+    if not loan_unsettled(job):
+        DISBURSEMENT_STATS['duplicates'] += 1
+        return 'DUPLICATE'
+    try:
+        reference = gateway(job['loan_amount'], job['farmer_upi'], idempotency_key=job['loan_id'])
+    except Exception as e:
+        if isinstance(e, calculator.DisbursementError) and not e.retryable:
+            # Whoever moves the loan to failed returns its budget
+            if on_status(job, calculator.DISBURSEMENT_FAILED, attempt, error=str(e)):
+                calculator.release_budgets(job)
+            DISBURSEMENT_STATS['failed'] += 1
+            return 'FAILED'
+        if attempt >= max_attempts:
+            on_status(job, calculator.DISBURSEMENT_UNKNOWN, attempt, error=str(e))
+            DISBURSEMENT_STATS['unknown'] += 1
+        else:
+            on_status(job, calculator.DISBURSEMENT_PENDING, attempt, error=str(e))
+        DISBURSEMENT_STATS['retried'] += 1
+        return 'RETRY'
+
+    if not on_status(job, calculator.DISBURSED, attempt, disbursement_ref=reference):
+        DISBURSEMENT_STATS['duplicates'] += 1
+        return 'DUPLICATE'
+    DISBURSEMENT_STATS['disbursed'] += 1
+    return 'DISBURSED'
+
+def loan_unsettled(job):
+    """
+    False once the job's loan record is DISBURSED or DISBURSEMENT_FAILED
+    """
+    item = calculator.table.get_item(Key={'claimId': job['loan_id']}, ConsistentRead=True).get('Item')
+    return item is None or item['data']['status'] in UNSETTLED
+
+def record_status(job, status, attempt, disbursement_ref=None, error=None):
+    """
+    Status callback: update the loan record if it is still unsettled
+    Output: False when the loan was already DISBURSED or DISBURSEMENT_FAILED
+    """
+    now = datetime.utcnow().isoformat()
+    assignments = ['#data.#status = :status', 'loanStatus = :status', '#data.disbursement_attempts = :attempt',
+                   '#data.updated_at = :now']
+    values = {':status': status, ':attempt': attempt, ':now': now, ':pending': calculator.DISBURSEMENT_PENDING,
+              ':unknown': calculator.DISBURSEMENT_UNKNOWN}
+    if disbursement_ref is not None:
+        assignments += ['#data.disbursement_ref = :ref', '#data.disbursed_at = :now']
+        values[':ref'] = disbursement_ref
+    if error is not None:
+        assignments.append('#data.last_error = :error')
+        values[':error'] = error
+    try:
+        calculator.table.update_item(
+            Key={'claimId': job['loan_id']},
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ConditionExpression='#data.#status = :pending OR #data.#status = :unknown',
+            ExpressionAttributeNames={'#data': 'data', '#status': 'status'},
+            ExpressionAttributeValues=values
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+def retry_delay(attempt):
+    """
+    Seconds before the next attempt: jittered exponential backoff, whole
+    seconds (SQS visibility timeouts are integers)
+    """
+    delay = min(DISBURSEMENT_RETRY_MAX_SECONDS, DISBURSEMENT_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return max(1, math.ceil(delay * random.uniform(0.5, 1.5)))
+
+def delay_retry(sqs_client, queue_url, receipt_handle, attempt):
+    sqs_client.change_message_visibility(QueueUrl=queue_url, ReceiptHandle=receipt_handle,
+                                         VisibilityTimeout=retry_delay(attempt))
+
+# Test locally
+if __name__ == "__main__":
+    test_event = {
+        'Records': [{
+            'messageId': 'msg-1',
+            'receiptHandle': 'receipt-1',
+            'attributes': {'ApproximateReceiveCount': '1'},
+            'body': json.dumps({
+                'loan_id': calculator.loan_id_for('cert-123'),
+                'certificate_id': 'cert-123',
+                'loan_amount': 35000.0,
+                'farmer_upi': 'farmer@paytm',
+                'approved_at': datetime.utcnow().isoformat()
+            })
+        }]
+    }
+    result = lambda_handler(test_event, None)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,82 @@
+"""
+VeriCrop FinBridge - Loan Index Migration
+Adds the loan lookup indexes (bridge-loan-calculator.py LOAN_INDEXES) to an
+existing claims table, one UpdateTable per index as DynamoDB requires, then
+backfills the index attributes on loans and repayments stored before them.
+The table's hash-only FarmerIndex and CertificateIndex are left alone.
+Rerunning skips indexes that exist and items already backfilled
+
+Usage:
+    python loan-index-migration.py --table VeriCropClaims
+    python loan-index-migration.py --table VeriCropClaims --read-capacity 10 --write-capacity 10
+"""
+
+import argparse
+import copy
+import importlib
+import json
+import time
+
+import boto3
+
+calculator = importlib.import_module('bridge-loan-calculator')
+
+INDEX_POLL_SECONDS = 10
+
+def add_loan_indexes(client, table_name, read_capacity=5, write_capacity=5, poll_seconds=INDEX_POLL_SECONDS):
+    """
+    Create the LOAN_INDEXES missing from the table, waiting for each to
+    become ACTIVE; provisioned tables give each index the capacities
+    Output: names of the indexes created
+    """
+    created = []
+    for definition in calculator.LOAN_INDEXES:
+        table = client.describe_table(TableName=table_name)['Table']
+        if definition['IndexName'] in {index['IndexName'] for index in table.get('GlobalSecondaryIndexes', [])}:
+            continue
+        index = copy.deepcopy(definition)
+        if table.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+            index['ProvisionedThroughput'] = {'ReadCapacityUnits': read_capacity, 'WriteCapacityUnits': write_capacity}
+        client.update_table(TableName=table_name, AttributeDefinitions=calculator.INDEX_KEY_ATTRIBUTES,
+                            GlobalSecondaryIndexUpdates=[{'Create': index}])
+        wait_for_index(client, table_name, definition['IndexName'], poll_seconds)
+        created.append(definition['IndexName'])
+    return created
+
+def wait_for_index(client, table_name, index_name, poll_seconds=INDEX_POLL_SECONDS):
+    """
+    Poll until the table and the index are ACTIVE (DynamoDB builds a new
+    index from the existing items first, which can take minutes)
+    """
+    while True:
+        table = client.describe_table(TableName=table_name)['Table']
+        status = {index['IndexName']: index['IndexStatus'] for index in table.get('GlobalSecondaryIndexes', [])}
+        if table['TableStatus'] == 'ACTIVE' and status.get(index_name) == 'ACTIVE':
+            return
+        time.sleep(poll_seconds)
+
+def migrate(table, segments=4, read_capacity=5, write_capacity=5, poll_seconds=INDEX_POLL_SECONDS):
+    """
+    Create the missing indexes on a Table resource, then backfill the items
+    stored before them
+    Output: {'indexes_created': [...], 'items_backfilled': n}
+    """
+    calculator.table = table
+    created = add_loan_indexes(table.meta.client, table.name, read_capacity, write_capacity, poll_seconds)
+    return {'indexes_created': created, 'items_backfilled': calculator.backfill_index_attributes(segments)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Add the loan lookup indexes and backfill their attributes')
+    parser.add_argument('--table', required=True, help='DynamoDB claims table')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel Scan segments for the backfill')
+    parser.add_argument('--read-capacity', type=int, default=5, help='Index RCU on a provisioned table')
+    parser.add_argument('--write-capacity', type=int, default=5, help='Index WCU on a provisioned table')
+    args = parser.parse_args()
+
+    start = time.time()
+    result = migrate(boto3.resource('dynamodb').Table(args.table), args.segments, args.read_capacity,
+                     args.write_capacity)
+    print(json.dumps(dict(result, seconds=round(time.time() - start, 1))))
+
+if __name__ == '__main__':
+    main()
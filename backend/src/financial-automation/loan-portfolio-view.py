@@ -0,0 +1,413 @@
+"""
+VeriCrop FinBridge - Loan Portfolio View
+Live loan-book totals for ops dashboards - principal lent, repaid and
+outstanding, and the number of live loans - overall, per district, per
+damage type and per farmer, kept in aggregate items instead of scanning
+every loan
+    lambda_handler           DynamoDB stream consumer (NEW_AND_OLD_IMAGES on
+                             vericrop-claims): each LOAN or REPAYMENT record
+                             becomes a delta on its aggregates, the
+                             difference between what the old and the new
+                             image contribute
+    query_lambda_handler     reads the aggregates
+    rebuild_portfolio        recomputes every aggregate with a parallel
+                             segmented Scan (first fill, or repair)
+Deltas for consecutive records are summed per aggregate and applied in one
+transaction per chunk. The same transaction moves a marker per source item
+to the highest sequence number applied for it, on condition the marker is
+below the item's records in the chunk: a redelivery, from the start of an
+earlier chunk or from the middle of one (a bisected retry), drops the
+records at or below the marker. Markers are per item because stream events
+do not name their shard, and an item's records are ordered within one
+A loan counts from approval until its disbursement fails; repayments are
+separate REPAYMENT items (bridge-loan-calculator.record_repayment). Records
+of other items, the view's own writes included, are skipped without a
+write (an event filter on type LOAN/REPAYMENT saves the invocations)
+"""
+
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table(os.environ.get('PORTFOLIO_TABLE', 'vericrop-claims'))
+
+DIMENSIONS = {'district': 'DISTRICT', 'damage_type': 'DAMAGE_TYPE', 'farmer': 'FARMER'}
+# Dimensions small enough to list: their keys are kept on a directory item
+LISTED_DIMENSIONS = ('district', 'damage_type')
+UNKNOWN = 'UNKNOWN'
+# TransactWriteItems takes at most 100 items: up to two directory updates,
+# then a marker per source item and the aggregates
+CHUNK_ITEMS = 98
+# Stream sequence numbers run to 40 digits, past the 38 a DynamoDB number
+# holds, so markers keep them as zero-padded strings
+SEQUENCE_DIGITS = 40
+MARKER_TTL_SECONDS = 2 * 24 * 3600
+PORTFOLIO_RETRIES = 5
+PORTFOLIO_RETRY_BASE_SECONDS = 0.05
+PORTFOLIO_SCAN_SEGMENTS = int(os.environ.get('PORTFOLIO_SCAN_SEGMENTS', '16'))
+BATCH_WRITE_CHUNK = 25
+BATCH_GET_CHUNK = 100
+FAILED_STATUS = 'DISBURSEMENT_FAILED'
+FIELDS = ('principal', 'repaid', 'outstanding', 'loans')
+
+VIEW_STATS = {'records': 0, 'chunks': 0, 'aggregate_writes': 0, 'replayed_records': 0, 'conflicts': 0}
+KNOWN_KEYS = set()
+_deserializer = TypeDeserializer()
+
+def lambda_handler(event, context):
+    """
+    Input: DynamoDB stream event (Records[] in sequence order)
+    Output: {'batchItemFailures': [...]} - the first record not applied,
+            so the stream retries from there
+    """
+    records = event['Records']
+    start = 0
+    while start < len(records):
+        end, changes = build_chunk(records, start)
+        first = records[start]['dynamodb']['SequenceNumber']
+        try:
+            apply_chunk(changes)
+        except Exception as e:
+            print(f'Portfolio chunk from {first} failed: {e}')
+            return {'batchItemFailures': [{'itemIdentifier': first}]}
+        start = end
+    VIEW_STATS['records'] += len(records)
+    return {'batchItemFailures': []}
+
+def build_chunk(records, start):
+    """
+    The changes of records[start:end], stopping before the chunk would
+    need more than CHUNK_ITEMS aggregates and markers
+    Output: (end, [(item key, sequence, {(dimension, key): {field: delta}})])
+            for the records that change the view
+    """
+    changes = []
+    aggregates, item_keys = set(), set()
+    end = start
+    while end < len(records):
+        record_deltas = record_delta(records[end])
+        if record_deltas:
+            change = records[end]['dynamodb']
+            item_key = _deserializer.deserialize(change['Keys']['claimId'])
+            needed = len(aggregates | record_deltas.keys()) + len(item_keys | {item_key})
+            if needed > CHUNK_ITEMS and end > start:
+                break
+            aggregates.update(record_deltas)
+            item_keys.add(item_key)
+            changes.append((item_key, sequence_key(change['SequenceNumber']), record_deltas))
+        end += 1
+    return end, changes
+
+def sum_deltas(changes):
+    """
+    Sum the changes' deltas per aggregate, dropping aggregates they leave
+    unchanged
+    """
+    deltas = {}
+    for _, _, record_deltas in changes:
+        for aggregate, delta in record_deltas.items():
+            total = deltas.setdefault(aggregate, dict.fromkeys(FIELDS, Decimal(0)))
+            for field, value in delta.items():
+                total[field] += value
+    return {aggregate: delta for aggregate, delta in deltas.items() if any(delta.values())}
+
+def record_delta(record):
+    """
+    What one stream record changes: the new image's contribution minus
+    the old one's, per aggregate
+    """
+    change = record['dynamodb']
+    deltas = {}
+    for image, sign in ((change.get('NewImage'), 1), (change.get('OldImage'), -1)):
+        if not image:
+            continue
+        item = {name: _deserializer.deserialize(value) for name, value in image.items()}
+        contribution = item_contribution(item)
+        if contribution is None:
+            continue
+        aggregates, values = contribution
+        for aggregate in aggregates:
+            total = deltas.setdefault(aggregate, dict.fromkeys(FIELDS, Decimal(0)))
+            for field, value in values.items():
+                total[field] += sign * value
+    return deltas
+
+def item_contribution(item):
+    """
+    (aggregates, {field: amount}) an item adds to the view, or None for
+    items the view ignores
+    """
+    data = item.get('data') or {}
+    if item.get('type') == 'LOAN':
+        if data.get('status') == FAILED_STATUS:
+            return None
+        amount = Decimal(str(data['loan_amount']))
+        values = {'principal': amount, 'outstanding': amount, 'loans': Decimal(1)}
+    elif item.get('type') == 'REPAYMENT':
+        amount = Decimal(str(data['amount']))
+        values = {'repaid': amount, 'outstanding': -amount}
+    else:
+        return None
+    aggregates = [('all', None)] + [(dimension, str(data.get(field) or UNKNOWN)) for dimension, field in
+                                    (('district', 'district'), ('damage_type', 'damage_type'),
+                                     ('farmer', 'farmer_id'))]
+    return aggregates, values
+
+def apply_chunk(changes):
+    """
+    Apply a chunk's deltas in one transaction that also moves each source
+    item's marker to the item's last sequence in the chunk, on condition
+    the marker is still below the item's first. A marker that is not (an
+    earlier delivery got further) drops that item's records up to it and
+    the rest is retried
+    Output: number of records dropped as already applied
+    """
+    applied = {}
+    attempt = 0
+    while True:
+        pending = [change for change in changes if change[1] > applied.get(change[0], '')]
+        dropped = len(changes) - len(pending)
+        if not pending:
+            VIEW_STATS['replayed_records'] += dropped
+            return dropped
+        bounds = {}
+        for item_key, sequence, _ in pending:
+            first, last = bounds.get(item_key, (sequence, sequence))
+            bounds[item_key] = (min(first, sequence), max(last, sequence))
+        deltas = sum_deltas(pending)
+        now = datetime.utcnow()
+        new_keys = {}
+        for dimension, key in deltas:
+            if dimension in LISTED_DIMENSIONS and (dimension, key) not in KNOWN_KEYS:
+                new_keys.setdefault(dimension, set()).add(key)
+
+        # Markers first: a cancellation's reasons line up with bounds
+        items = [{'Update': {
+            'TableName': table.name,
+            'Key': {'claimId': marker_key(item_key)},
+            'UpdateExpression': 'SET #type = :type, last_sequence = :last, expires_at = :expires',
+            'ConditionExpression': 'attribute_not_exists(last_sequence) OR last_sequence < :first',
+            'ExpressionAttributeNames': {'#type': 'type'},
+            'ExpressionAttributeValues': {':type': 'PORTFOLIO_MARKER', ':first': first, ':last': last,
+                                          ':expires': int(now.timestamp()) + MARKER_TTL_SECONDS}
+        }} for item_key, (first, last) in bounds.items()]
+        for dimension, keys in new_keys.items():
+            items.append({'Update': {
+                'TableName': table.name,
+                'Key': {'claimId': directory_key(dimension)},
+                'UpdateExpression': 'SET #type = :type ADD #keys :keys',
+                'ExpressionAttributeNames': {'#type': 'type', '#keys': 'keys'},
+                'ExpressionAttributeValues': {':type': 'PORTFOLIO_DIRECTORY', ':keys': keys}
+            }})
+        for (dimension, key), delta in deltas.items():
+            items.append({'Update': {
+                'TableName': table.name,
+                'Key': {'claimId': aggregate_key(dimension, key)},
+                'UpdateExpression': 'SET #type = :type, #dimension = :dimension, #key = :key, updated_at = :now '
+                                    'ADD principal :principal, repaid :repaid, outstanding :outstanding, '
+                                    'loans :loans',
+                'ExpressionAttributeNames': {'#type': 'type', '#dimension': 'dimension', '#key': 'key'},
+                'ExpressionAttributeValues': {':type': 'PORTFOLIO', ':dimension': dimension, ':key': key or 'ALL',
+                                              ':now': now.isoformat(),
+                                              **{f':{field}': delta[field] for field in FIELDS}}
+            }})
+
+        try:
+            table.meta.client.transact_write_items(TransactItems=items)
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = e.response.get('CancellationReasons') or []
+            stale = [item_key for item_key, reason in zip(bounds, reasons)
+                     if reason.get('Code') == 'ConditionalCheckFailed']
+            if stale:
+                # Redelivered records: every retry drops at least one
+                for item_key in stale:
+                    marker = table.get_item(Key={'claimId': marker_key(item_key)}, ConsistentRead=True)
+                    applied[item_key] = marker['Item']['last_sequence']
+                continue
+            if attempt == PORTFOLIO_RETRIES - 1:
+                raise
+            # Another consumer (stream shard) wrote the same aggregates
+            VIEW_STATS['conflicts'] += 1
+            time.sleep(PORTFOLIO_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    for dimension, keys in new_keys.items():
+        KNOWN_KEYS.update((dimension, key) for key in keys)
+    VIEW_STATS['chunks'] += 1
+    VIEW_STATS['aggregate_writes'] += len(deltas)
+    VIEW_STATS['replayed_records'] += dropped
+    return dropped
+
+def query_lambda_handler(event, context):
+    """
+    Input: {} for the overall totals, {'dimension': 'district'} for every
+           district (or damage_type), {'dimension': ..., 'key': ...} for
+           one district, damage type or farmer
+    Output: the totals as {dimension, key, principal, repaid, outstanding,
+            loans, updated_at}
+    """
+    try:
+        return {
+            'statusCode': 200,
+            'body': json.dumps(portfolio(event.get('dimension'), event.get('key')))
+        }
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to read loan portfolio'
+            })
+        }
+
+def portfolio(dimension=None, key=None):
+    """
+    Totals overall, for one key of a dimension, or (dimension only) for
+    every key of a listed dimension, largest outstanding first
+    """
+    if dimension is None:
+        return aggregate_totals(table.get_item(Key={'claimId': aggregate_key('all', None)}).get('Item'), 'all', None)
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension {dimension!r}; use one of {', '.join(DIMENSIONS)}")
+    if key is not None:
+        return aggregate_totals(table.get_item(Key={'claimId': aggregate_key(dimension, key)}).get('Item'),
+                                dimension, key)
+    if dimension not in LISTED_DIMENSIONS:
+        raise ValueError(f'{dimension} totals are read one key at a time')
+    directory = table.get_item(Key={'claimId': directory_key(dimension)}).get('Item') or {}
+    items = read_items([aggregate_key(dimension, key) for key in sorted(directory.get('keys', ()))])
+    totals = [aggregate_totals(item, dimension, item['key']) for item in items.values()]
+    return sorted(totals, key=lambda total: -total['outstanding'])
+
+def aggregate_totals(item, dimension, key):
+    item = item or {}
+    totals = {'dimension': dimension, 'key': key}
+    totals.update({field: float(item.get(field, 0)) for field in ('principal', 'repaid', 'outstanding')})
+    totals['loans'] = int(item.get('loans', 0))
+    totals['updated_at'] = item.get('updated_at')
+    return totals
+
+def scan_portfolio(segments=None):
+    """
+    Aggregate the whole table with a parallel segmented Scan - the view's
+    ground truth, and what a dashboard would cost without it
+    Output: {(dimension, key): {field: Decimal}}
+    """
+    segments = segments or PORTFOLIO_SCAN_SEGMENTS
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        partials = list(executor.map(lambda segment: scan_segment(segment, segments), range(segments)))
+    totals = partials[0]
+    for partial in partials[1:]:
+        for aggregate, values in partial.items():
+            total = totals.setdefault(aggregate, dict.fromkeys(FIELDS, Decimal(0)))
+            for field in FIELDS:
+                total[field] += values[field]
+    return totals
+
+def scan_segment(segment, segments):
+    totals = {}
+    request = {
+        'Segment': segment,
+        'TotalSegments': segments,
+        'FilterExpression': '#type = :loan OR #type = :repayment',
+        'ProjectionExpression': '#type, #data.loan_amount, #data.amount, #data.#status, '
+                                '#data.district, #data.damage_type, #data.farmer_id',
+        'ExpressionAttributeNames': {'#type': 'type', '#data': 'data', '#status': 'status'},
+        'ExpressionAttributeValues': {':loan': 'LOAN', ':repayment': 'REPAYMENT'}
+    }
+    while True:
+        response = table.scan(**request)
+        for item in response['Items']:
+            contribution = item_contribution(item)
+            if contribution is None:
+                continue
+            aggregates, values = contribution
+            for aggregate in aggregates:
+                total = totals.setdefault(aggregate, dict.fromkeys(FIELDS, Decimal(0)))
+                for field, value in values.items():
+                    total[field] += value
+        if 'LastEvaluatedKey' not in response:
+            return totals
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def rebuild_portfolio(segments=None):
+    """
+    Overwrite every aggregate and directory with scan_portfolio's totals,
+    zeroing listed keys the scan no longer sees. Run it with the stream
+    consumer paused: a write landing mid-scan could be counted by both
+    Output: {'aggregates': n, 'seconds': s}
+    """
+    start = time.time()
+    totals = scan_portfolio(segments)
+    now = datetime.utcnow().isoformat()
+    directories = {dimension: {key for (d, key) in totals if d == dimension} for dimension in LISTED_DIMENSIONS}
+    for dimension in LISTED_DIMENSIONS:
+        old = table.get_item(Key={'claimId': directory_key(dimension)}).get('Item') or {}
+        for key in set(old.get('keys', ())) - directories[dimension]:
+            totals[(dimension, key)] = dict.fromkeys(FIELDS, Decimal(0))
+
+    items = [{'claimId': aggregate_key(dimension, key), 'type': 'PORTFOLIO', 'dimension': dimension,
+              'key': key or 'ALL', 'updated_at': now, **values} for (dimension, key), values in totals.items()]
+    items += [{'claimId': directory_key(dimension), 'type': 'PORTFOLIO_DIRECTORY', 'keys': keys}
+              for dimension, keys in directories.items() if keys]
+    chunks = [items[i:i + BATCH_WRITE_CHUNK] for i in range(0, len(items), BATCH_WRITE_CHUNK)]
+    with ThreadPoolExecutor(max_workers=segments or PORTFOLIO_SCAN_SEGMENTS) as executor:
+        list(executor.map(write_chunk, chunks))
+    KNOWN_KEYS.clear()
+    return {'aggregates': len(totals), 'seconds': round(time.time() - start, 3)}
+
+def write_chunk(items):
+    """
+    BatchWriteItem with unprocessed items retried
+    """
+    requests = [{'PutRequest': {'Item': item}} for item in items]
+    for attempt in range(PORTFOLIO_RETRIES * 2):
+        response = table.meta.client.batch_write_item(RequestItems={table.name: requests})
+        requests = response.get('UnprocessedItems', {}).get(table.name, [])
+        if not requests:
+            return
+        time.sleep(PORTFOLIO_RETRY_BASE_SECONDS * 2 ** min(attempt, 5) * random.uniform(0.5, 1.5))
+    raise RuntimeError(f'{len(requests)} portfolio aggregates unprocessed after retries')
+
+def read_items(keys):
+    found = {}
+    for i in range(0, len(keys), BATCH_GET_CHUNK):
+        request = {table.name: {'Keys': [{'claimId': key} for key in keys[i:i + BATCH_GET_CHUNK]]}}
+        while request:
+            response = table.meta.client.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(table.name, []):
+                found[item['claimId']] = item
+            request = response.get('UnprocessedKeys')
+    return found
+
+def aggregate_key(dimension, key):
+    return 'PORTFOLIO#ALL' if dimension == 'all' else f'PORTFOLIO#{DIMENSIONS[dimension]}#{key}'
+
+def directory_key(dimension):
+    return f'PORTFOLIO#{DIMENSIONS[dimension]}'
+
+def marker_key(item_key):
+    return f'PORTFOLIO#APPLIED#{item_key}'
+
+def sequence_key(sequence):
+    """
+    A stream sequence number zero-padded so sequence numbers compare
+    correctly as strings
+    """
+    return sequence.zfill(SEQUENCE_DIGITS)
+
+# Test locally
+if __name__ == "__main__":
+    print(json.dumps(query_lambda_handler({'dimension': 'district'}, None), indent=2))
@@ -0,0 +1,221 @@
+"""
+VeriCrop FinBridge - UPI Gateway Client
+Payout client for Razorpay/PayTM-style UPI payout APIs, used by
+bridge-loan-calculator.disburse_loan (and so by the disbursement worker)
+    POST {endpoint}/v1/payouts        create a payout; the loan ID goes in
+                                      the X-Payout-Idempotency header
+    GET  {endpoint}/v1/payouts/{id}   payout status (queued, processing,
+                                      processed, failed, reversed)
+Built for surge days with thousands of disbursements in flight:
+- one urllib3 pool of keep-alive connections per provider, reused across
+  calls and invocations, so each payout skips the TCP/TLS handshake
+- a per-provider semaphore caps calls in flight at the provider's limit
+- every disbursement has a total time budget; each request's connect and
+  read timeouts are cut to what is left of it
+- connection errors, timeouts, 429 and 5xx are retried with jittered
+  backoff under the same idempotency key while the budget lasts
+- payouts still settling are polled with growing intervals; a poll slower
+  than GATEWAY_HEDGE_AFTER_MS is hedged with a second one (when the
+  provider has a free slot) and the first answer wins
+Providers come from UPI_GATEWAY_PROVIDERS (JSON list of {name, endpoint,
+api_key, max_concurrency}) or UPI_GATEWAY_ENDPOINT; with neither set
+CLIENT is None and disburse_loan stays a mock
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import urllib3
+
+UPI_GATEWAY_PROVIDERS = os.environ.get('UPI_GATEWAY_PROVIDERS', '')
+UPI_GATEWAY_PROVIDER = os.environ.get('UPI_GATEWAY_PROVIDER', 'razorpay')
+UPI_GATEWAY_ENDPOINT = os.environ.get('UPI_GATEWAY_ENDPOINT', '')
+UPI_GATEWAY_API_KEY = os.environ.get('UPI_GATEWAY_API_KEY', '')
+GATEWAY_MAX_CONCURRENCY = int(os.environ.get('GATEWAY_MAX_CONCURRENCY', '32'))
+GATEWAY_BUDGET_SECONDS = float(os.environ.get('GATEWAY_BUDGET_SECONDS', '20'))
+GATEWAY_HEDGE_AFTER_MS = float(os.environ.get('GATEWAY_HEDGE_AFTER_MS', '300'))
+GATEWAY_CONNECT_TIMEOUT = 2.0
+GATEWAY_READ_TIMEOUT = 5.0
+GATEWAY_MAX_ATTEMPTS = 4
+GATEWAY_RETRY_BASE_SECONDS = 0.2
+GATEWAY_POLL_BASE_SECONDS = 0.1
+GATEWAY_POLL_MAX_SECONDS = 2.0
+
+PAYOUT_SETTLED = 'processed'
+PAYOUT_IN_PROGRESS = ('queued', 'pending', 'processing')
+TRANSIENT_STATUSES = (408, 429, 500, 502, 503, 504)
+
+GATEWAY_STATS = {'requests': 0, 'retries': 0, 'polls': 0, 'hedges': 0, 'hedge_wins': 0,
+                 'saturated': 0, 'budget_exhausted': 0}
+
+class DisbursementError(Exception):
+    """
+    Gateway refusal; retryable=False for ones a retry cannot fix (invalid
+    VPA, account closed)
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class _TransientError(Exception):
+    pass
+
+class GatewayProvider:
+    """
+    One payout provider: its endpoint, credentials, keep-alive connection
+    pool and concurrency semaphore
+    """
+
+    def __init__(self, name, endpoint, api_key='', max_concurrency=None, keep_alive=True):
+        self.name = name
+        self.endpoint = endpoint.rstrip('/')
+        self.max_concurrency = max_concurrency or GATEWAY_MAX_CONCURRENCY
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {api_key}'}
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+        # Hedged polls can hold a second connection per slot
+        self.http = urllib3.PoolManager(maxsize=2 * self.max_concurrency, block=False, retries=False)
+
+class UpiGatewayClient:
+    """
+    Disburse through one of several providers (the first by default)
+    """
+
+    def __init__(self, providers, budget_seconds=None, hedge_after_ms=None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.default = providers[0].name
+        self.budget_seconds = budget_seconds or GATEWAY_BUDGET_SECONDS
+        self.hedge_after_ms = GATEWAY_HEDGE_AFTER_MS if hedge_after_ms is None else hedge_after_ms
+        self.executor = ThreadPoolExecutor(max_workers=2 * sum(p.max_concurrency for p in providers))
+
+    def disburse(self, amount, upi_id, idempotency_key, provider=None):
+        """
+        Pay amount (rupees) to upi_id and wait for the payout to settle
+        Output: the payout's UTR (or payout ID)
+        Raises DisbursementError: retryable=False when the provider refuses
+        or fails the payout, retryable=True when the budget runs out first
+        (a retry with the same key resumes the same payout)
+        """
+        provider = self.providers[provider or self.default]
+        deadline = time.monotonic() + self.budget_seconds
+        payout = self._send(provider, 'POST', '/v1/payouts', deadline, body={
+            'amount': int(round(amount * 100)),
+            'currency': 'INR',
+            'mode': 'UPI',
+            'vpa': upi_id,
+            'reference_id': idempotency_key,
+            'purpose': 'BRIDGE_LOAN'
+        }, headers={'X-Payout-Idempotency': idempotency_key})
+
+        delay = GATEWAY_POLL_BASE_SECONDS
+        while payout['status'] in PAYOUT_IN_PROGRESS:
+            if time.monotonic() + delay >= deadline:
+                GATEWAY_STATS['budget_exhausted'] += 1
+                raise DisbursementError(f"Payout {payout['id']} still {payout['status']} "
+                                        f"after {self.budget_seconds:.0f} s", retryable=True)
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(2 * delay, GATEWAY_POLL_MAX_SECONDS)
+            payout = self._poll(provider, payout, deadline)
+
+        if payout['status'] == PAYOUT_SETTLED:
+            return payout.get('utr') or payout['id']
+        raise DisbursementError(f"Payout {payout['id']} {payout['status']}: "
+                                f"{payout.get('failure_reason', 'no reason given')}", retryable=False)
+
+    def _poll(self, provider, payout, deadline):
+        """
+        One status check, hedged when the first request is slow; keeps the
+        last known payout if every request fails
+        """
+        GATEWAY_STATS['polls'] += 1
+        path = f"/v1/payouts/{payout['id']}"
+        primary = self.executor.submit(self._request, provider, 'GET', path, deadline)
+        futures = [primary]
+        if self.hedge_after_ms and not wait(futures, timeout=self.hedge_after_ms / 1000).done:
+            GATEWAY_STATS['hedges'] += 1
+            futures.append(self.executor.submit(self._request, provider, 'GET', path, deadline, blocking=False))
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    result = future.result()
+                except _TransientError:
+                    continue
+                if future is not primary:
+                    GATEWAY_STATS['hedge_wins'] += 1
+                return result
+        return payout
+
+    def _send(self, provider, method, path, deadline, body=None, headers=None):
+        """
+        Request with retries on transient failures while the budget lasts
+        """
+        for attempt in range(GATEWAY_MAX_ATTEMPTS):
+            try:
+                return self._request(provider, method, path, deadline, body=body, headers=headers)
+            except _TransientError as e:
+                delay = GATEWAY_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+                if attempt == GATEWAY_MAX_ATTEMPTS - 1 or time.monotonic() + delay >= deadline:
+                    raise DisbursementError(f'{provider.name} unavailable: {e}', retryable=True)
+                GATEWAY_STATS['retries'] += 1
+                time.sleep(delay)
+
+    def _request(self, provider, method, path, deadline, body=None, headers=None, blocking=True):
+        """
+        One HTTP request inside a provider slot, timeouts capped by deadline
+        Raises _TransientError for failures worth retrying
+        """
+        remaining = deadline - time.monotonic()
+        if not provider.slots.acquire(blocking=blocking, timeout=max(0.0, remaining) if blocking else None):
+            GATEWAY_STATS['saturated'] += 1
+            raise _TransientError(f'{provider.name} at its {provider.max_concurrency} request limit')
+        try:
+            GATEWAY_STATS['requests'] += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise _TransientError('time budget spent')
+            response = provider.http.request(
+                method, provider.endpoint + path,
+                body=json.dumps(body) if body is not None else None,
+                headers=dict(provider.headers, **(headers or {})),
+                timeout=urllib3.Timeout(connect=min(GATEWAY_CONNECT_TIMEOUT, remaining),
+                                        read=min(GATEWAY_READ_TIMEOUT, remaining)))
+        except urllib3.exceptions.HTTPError as e:
+            raise _TransientError(str(e))
+        finally:
+            provider.slots.release()
+
+        if response.status in TRANSIENT_STATUSES:
+            raise _TransientError(f'HTTP {response.status}')
+        payload = json.loads(response.data or b'{}')
+        if response.status >= 400:
+            raise DisbursementError(f"{provider.name} rejected payout: HTTP {response.status} "
+                                    f"{payload.get('error', {}).get('description', '')}".rstrip(),
+                                    retryable=False)
+        return payload
+
+def client_from_environment():
+    """
+    Client for the configured providers, or None when none are configured
+    """
+    if UPI_GATEWAY_PROVIDERS:
+        providers = [GatewayProvider(p['name'], p['endpoint'], p.get('api_key', ''), p.get('max_concurrency'))
+                     for p in json.loads(UPI_GATEWAY_PROVIDERS)]
+    elif UPI_GATEWAY_ENDPOINT:
+        providers = [GatewayProvider(UPI_GATEWAY_PROVIDER, UPI_GATEWAY_ENDPOINT, UPI_GATEWAY_API_KEY)]
+    else:
+        return None
+    return UpiGatewayClient(providers)
+
+CLIENT = client_from_environment()
@@ -0,0 +1,170 @@
+"""
+VeriCrop FinBridge - Evidence Proxy Builder
+Ingestion-stage worker run when evidence video lands in S3 (S3 ObjectCreated
+notification): writes a compact analysis proxy next to the original so the
+analysis steps never pull the full-resolution upload again
+    <key>.proxy.mp4   every keyframe of the original at 480p, all-intra
+                      H.264 carrying the source timestamps
+    <key>.proxy.json  frame-timestamp index (source time and proxy pts of
+                      every frame) plus source and proxy properties
+Keyframes stream from byte ranges of the original through the decoder into
+the encoder one at a time, so memory stays bounded by the range prefetch
+and one frame whatever the upload's length
+"""
+
+import importlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from fractions import Fraction
+from urllib.parse import unquote_plus
+
+import av
+import boto3
+
+sampler = importlib.import_module('video-frame-sampler')
+mp4 = sampler.mp4
+
+s3 = boto3.client('s3')
+
+PROXY_HEIGHT = int(os.environ.get('PROXY_HEIGHT', '480'))
+PROXY_MAX_KEYFRAMES = int(os.environ.get('PROXY_MAX_KEYFRAMES', '1800'))
+PROXY_CRF = os.environ.get('PROXY_CRF', '23')
+PROXY_PRESET = os.environ.get('PROXY_PRESET', 'veryfast')
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v')
+# Proxy timestamps in milliseconds
+PROXY_TIME_BASE = Fraction(1, 1000)
+
+def lambda_handler(event, context):
+    """
+    Input: S3 event notification (Records[].s3), or bucket and video_key
+    Output: the proxy index written for each video
+    """
+    try:
+        if 'Records' in event:
+            objects = [(record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key']))
+                       for record in event['Records']]
+        else:
+            objects = [(event['bucket'], event['video_key'])]
+
+        proxies = []
+        for bucket, key in objects:
+            if not is_original_video(key):
+                print(f'Skipping {key}: not an original evidence video')
+                continue
+            index = build_proxy(bucket, key)
+            print(json.dumps({'proxy': index['proxy_key'], 'frames': len(index['frames']),
+                              'size_reduction': index['size_reduction'], 'seconds': index['build_seconds']}))
+            proxies.append({k: v for k, v in index.items() if k != 'frames'})
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'proxies': proxies})
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to build evidence proxy'
+            })
+        }
+
+def is_original_video(key):
+    """
+    Video uploads only; the proxies this worker writes land in the same
+    prefix and must not trigger another build
+    """
+    lower = key.lower()
+    return lower.endswith(VIDEO_EXTENSIONS) and not lower.endswith(sampler.PROXY_SUFFIX)
+
+def build_proxy(bucket, key, s3_client=None):
+    """
+    Stream the original's keyframes into a 480p all-intra proxy, upload it,
+    then upload its index (last, so a visible index means a complete proxy)
+    Output: the index dict
+    """
+    client = s3_client or s3
+    start = time.time()
+    stats = {}
+    try:
+        frames = sampler.iter_indexed_keyframes(client, bucket, key, PROXY_MAX_KEYFRAMES, stats=stats)
+    except mp4.Mp4IndexError as e:
+        print(f'Index fetch unavailable for {key} ({e}); streaming instead')
+        reader = sampler.S3RangeReader(client, bucket, key)
+        frames = sampler.iter_sampled_frames(reader, mode='keyframes', max_frames=PROXY_MAX_KEYFRAMES)
+        stats = {'size': reader.size}
+
+    with tempfile.NamedTemporaryFile(suffix=sampler.PROXY_SUFFIX) as proxy_file:
+        properties = encode_proxy(frames, proxy_file.name)
+        proxy_size = os.path.getsize(proxy_file.name)
+        client.upload_file(proxy_file.name, bucket, key + sampler.PROXY_SUFFIX)
+
+    source_size = stats.get('size')
+    index = dict(properties, **{
+        'format_version': sampler.PROXY_FORMAT_VERSION,
+        'source_key': key,
+        'source_size': source_size,
+        'source_bytes_read': stats.get('bytes_fetched', source_size),
+        'proxy_key': key + sampler.PROXY_SUFFIX,
+        'proxy_size': proxy_size,
+        'size_reduction': round(source_size / proxy_size, 1) if source_size and proxy_size else None,
+        'build_seconds': round(time.time() - start, 2),
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
+    client.put_object(Bucket=bucket, Key=key + sampler.PROXY_INDEX_SUFFIX, Body=json.dumps(index).encode())
+    return index
+
+def encode_proxy(frames, path):
+    """
+    Encode (timestamp, av frame) pairs as all-intra H.264 at PROXY_HEIGHT
+    (never upscaled) with millisecond source timestamps, moov first
+    Output: {'width', 'height', 'source_width', 'source_height',
+    'frames': [{'t': seconds, 'pts': proxy pts in ms}]}
+    """
+    properties = {'frames': []}
+    last_pts = -1
+    with av.open(path, mode='w', options={'movflags': '+faststart'}) as container:
+        stream = None
+        for timestamp, frame in frames:
+            if stream is None:
+                height = min(PROXY_HEIGHT, frame.height) // 2 * 2
+                width = max(2, int(round(frame.width * height / frame.height / 2)) * 2)
+                stream = container.add_stream('libx264', rate=30)
+                stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+                stream.time_base = PROXY_TIME_BASE
+                stream.codec_context.gop_size = 1
+                stream.options = {'crf': PROXY_CRF, 'preset': PROXY_PRESET}
+                properties.update({'width': width, 'height': height,
+                                   'source_width': frame.width, 'source_height': frame.height})
+
+            # Timestamps must increase strictly; keep source times otherwise
+            pts = max(int(round(timestamp * 1000)), last_pts + 1)
+            last_pts = pts
+            scaled = frame.reformat(width=stream.width, height=stream.height, format='yuv420p')
+            scaled.pts, scaled.time_base = pts, PROXY_TIME_BASE
+            for packet in stream.encode(scaled):
+                container.mux(packet)
+            properties['frames'].append({'t': round(timestamp, 3), 'pts': pts})
+
+        if stream is None:
+            raise ValueError('No keyframes decoded')
+        for packet in stream.encode():
+            container.mux(packet)
+    return properties
+
+# Test locally
+if __name__ == "__main__":
+    test_event = {
+        'Records': [{
+            's3': {
+                'bucket': {'name': 'vericrop-evidence-123456'},
+                'object': {'key': 'claims/CLM-TEST-001/evidence/test-video.mp4'}
+            }
+        }]
+    }
+    result = lambda_handler(test_event, None)
+    print(json.dumps(result, indent=2))
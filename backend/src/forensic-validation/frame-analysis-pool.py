@@ -0,0 +1,94 @@
+"""
+VeriCrop FinBridge - Frame Analysis Pool
+Runs a per-frame analysis function on several cores while the caller keeps
+decoding. The 'process' backend hands frames to worker processes through a
+ring of shared-memory slots (no pickled frame copies); the 'thread' backend
+runs the NumPy analysis in threads, which works where /dev/shm is missing
+(AWS Lambda). Results come back in frame order.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Largest frame a shared-memory slot holds: 1920 px wide grayscale 16:9
+DEFAULT_SLOT_BYTES = 1920 * 1080
+
+# Shared-memory segments a worker process has already attached, by name
+_ATTACHED = {}
+
+class FrameAnalysisPool:
+    """
+    Bounded pipeline: at most 2 × workers frames are in flight at once, so
+    memory stays fixed however long the video is
+    """
+
+    def __init__(self, analyse, workers, backend='process', slot_bytes=DEFAULT_SLOT_BYTES):
+        self.analyse = analyse
+        self.workers = workers
+        self.backend = backend
+        self.max_in_flight = 2 * workers
+        self.slots = []
+        if backend == 'process':
+            self.slots = [shared_memory.SharedMemory(create=True, size=slot_bytes)
+                          for _ in range(self.max_in_flight)]
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            # Start the workers now, before the caller opens decoder threads
+            self.executor.submit(int).result()
+        elif backend == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f'Unknown frame analysis backend: {backend}')
+
+    def map_frames(self, frames):
+        """
+        Yield analyse(frame) for each frame of the iterable, in order
+        Frames are pulled lazily; closing the generator early cancels the
+        frames still queued
+        """
+        pending = deque()
+        free_slots = deque(self.slots)
+        try:
+            for frame in frames:
+                if len(pending) >= self.max_in_flight:
+                    future, slot = pending.popleft()
+                    yield future.result()
+                    free_slots.append(slot)
+                pending.append(self._submit(frame, free_slots))
+            while pending:
+                future, slot = pending.popleft()
+                yield future.result()
+                free_slots.append(slot)
+        finally:
+            # Frames already running must finish before their slots are reused
+            wait([future for future, _ in pending if not future.cancel()])
+
+    def _submit(self, frame, free_slots):
+        if self.backend == 'thread':
+            return self.executor.submit(self.analyse, frame), None
+
+        slot = free_slots.popleft()
+        if frame.nbytes > slot.size:
+            raise ValueError(f'Frame of {frame.nbytes} bytes exceeds the {slot.size}-byte shared slot')
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+        future = self.executor.submit(_analyse_shared, self.analyse, slot.name, frame.shape, frame.dtype.str)
+        return future, slot
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+        self.slots = []
+
+def _analyse_shared(analyse, name, shape, dtype):
+    """
+    Worker side: view the frame in shared memory in place and analyse it
+    """
+    segment = _ATTACHED.get(name)
+    if segment is None:
+        segment = _ATTACHED[name] = shared_memory.SharedMemory(name=name)
+    frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    return analyse(frame)
@@ -0,0 +1,291 @@
+"""
+VeriCrop FinBridge - Keyframe Label Detector
+Crop-damage labels from a handful of keyframes with image-level Rekognition
+DetectLabels, instead of an asynchronous video label job with polling.
+Keyframes come from the analysis proxy or the MP4 index, near-duplicates
+are dropped by perceptual hash and the remaining frames go out as JPEG with
+at most LABEL_MAX_CONCURRENCY calls in flight. Labels are cached by frame hash
+(in-process, optionally in DynamoDB), so resubmitted or duplicate frames
+never cost a second call.
+"""
+
+import importlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+import numpy as np
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+sampler = importlib.import_module('video-frame-sampler')
+phash = importlib.import_module('perceptual-hash-index')
+
+rekognition = boto3.client('rekognition')
+s3 = boto3.client('s3')
+
+# Keyframes sampled over the clip, and at most how many distinct ones are sent
+LABEL_CANDIDATE_FRAMES = int(os.environ.get('LABEL_CANDIDATE_FRAMES', '12'))
+LABEL_MAX_FRAMES = int(os.environ.get('LABEL_MAX_FRAMES', '5'))
+LABEL_MAX_CONCURRENCY = int(os.environ.get('LABEL_MAX_CONCURRENCY', '3'))
+# Frames within LABEL_DEDUP_RADIUS bits of an already selected frame show
+# the same scene; cached labels are reused within LABEL_CACHE_RADIUS bits
+LABEL_DEDUP_RADIUS = int(os.environ.get('LABEL_DEDUP_RADIUS', '10'))
+LABEL_CACHE_RADIUS = int(os.environ.get('LABEL_CACHE_RADIUS', '4'))
+LABEL_CACHE_MAX_ENTRIES = int(os.environ.get('LABEL_CACHE_MAX_ENTRIES', '50000'))
+LABEL_CACHE_TABLE = os.environ.get('LABEL_CACHE_TABLE')
+# Sample from the 480p analysis proxy (evidence-proxy-builder.py) if present
+LABEL_USE_PROXY = os.environ.get('LABEL_USE_PROXY', 'true').lower() == 'true'
+
+LABEL_MIN_CONFIDENCE = float(os.environ.get('LABEL_MIN_CONFIDENCE', '70'))
+LABEL_MAX_LABELS = int(os.environ.get('LABEL_MAX_LABELS', '25'))
+LABEL_IMAGE_WIDTH = int(os.environ.get('LABEL_IMAGE_WIDTH', '1024'))
+LABEL_JPEG_QSCALE = 4  # MJPEG quantizer, 2 (best) - 31
+LABEL_MAX_RETRIES = 3
+HASH_WIDTH = 160
+
+THROTTLING_ERRORS = {'ThrottlingException', 'ProvisionedThroughputExceededException', 'LimitExceededException'}
+
+# Same keyword list as rekognition-video-analyzer.ts
+DAMAGE_KEYWORDS = [
+    'plant', 'crop', 'leaf', 'stem', 'root', 'field', 'farm',
+    'damage', 'disease', 'pest', 'insect', 'fungus', 'blight',
+    'drought', 'flood', 'hail', 'fire', 'storm', 'wind',
+    'brown', 'yellow', 'wilted', 'dead', 'broken', 'torn',
+]
+
+# Per-container counters, reported with every result
+LABEL_STATS = {
+    'videos': 0,
+    'frames_sampled': 0,
+    'duplicates_skipped': 0,
+    'cache_hits': 0,
+    'calls': 0,
+    'calls_avoided': 0,
+    'throttle_retries': 0
+}
+
+class LabelCache:
+    """
+    DetectLabels results by 64-bit frame hash: exact and near (within
+    LABEL_CACHE_RADIUS bits) hits from an in-process hash index, then exact
+    hits from DynamoDB items claimId 'LABELS#<hash>' when a table is given
+    The in-process part is cleared once it holds max_entries frames
+    """
+
+    def __init__(self, table=None, radius=LABEL_CACHE_RADIUS, max_entries=LABEL_CACHE_MAX_ENTRIES):
+        self.table = table
+        self.radius = radius
+        self.max_entries = max_entries
+        self.clear()
+
+    def clear(self):
+        self.index = phash.PerceptualHashIndex()
+        self.labels = {}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def get(self, frame_hash):
+        labels = self.labels.get(frame_hash)
+        if labels is not None:
+            return labels
+        video_ids, distances = self.index.search(frame_hash, self.radius)
+        if len(video_ids):
+            return self.index.videos[int(video_ids[np.argmin(distances)])]['analysis']
+        if self.table:
+            items = self.table.query(KeyConditionExpression=Key('claimId').eq(f'LABELS#{frame_hash:016x}'),
+                                     Limit=1).get('Items', [])
+            if items:
+                labels = json.loads(items[0]['data']['labels'])
+                self._remember(frame_hash, labels)
+                return labels
+        return None
+
+    def put(self, frame_hash, labels):
+        self._remember(frame_hash, labels)
+        if self.table:
+            self.table.put_item(Item={
+                'claimId': f'LABELS#{frame_hash:016x}',
+                'timestamp': int(time.time()),
+                'type': 'LABELS',
+                'data': {'labels': json.dumps(labels)}
+            })
+
+    def _remember(self, frame_hash, labels):
+        if len(self.labels) >= self.max_entries:
+            self.clear()
+        self.labels[frame_hash] = labels
+        self.index.add_video(f'{frame_hash:016x}', [frame_hash], analysis=labels)
+
+LABEL_CACHE = LabelCache(boto3.resource('dynamodb').Table(LABEL_CACHE_TABLE) if LABEL_CACHE_TABLE else None)
+
+def lambda_handler(event, context):
+    """
+    Input: claimId and videoS3Uri (s3://bucket/key), or bucket and video_key
+    Output: crop-damage labels from the sampled keyframes and call counters
+    """
+    start = time.time()
+    try:
+        if 'videoS3Uri' in event:
+            bucket, video_key = parse_s3_uri(event['videoS3Uri'])
+        else:
+            bucket, video_key = event['bucket'], event['video_key']
+
+        result = detect_keyframe_labels(bucket, video_key)
+        damage_patterns = result['damage_patterns']
+        result.update({
+            'claim_id': event.get('claimId', event.get('claim_id')),
+            'video_key': video_key,
+            'overall_confidence': round(float(np.mean([p['confidence'] for p in damage_patterns])), 2)
+            if damage_patterns else 0,
+            'analysis_timestamp': datetime.now(timezone.utc).isoformat(),
+            'processing_time_ms': int((time.time() - start) * 1000),
+            'label_stats': LABEL_STATS
+        })
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to detect keyframe labels'
+            })
+        }
+
+def parse_s3_uri(uri):
+    if not uri.startswith('s3://') or '/' not in uri[5:]:
+        raise ValueError('Invalid S3 URI format. Expected: s3://bucket/key')
+    bucket, key = uri[5:].split('/', 1)
+    return bucket, key
+
+def detect_keyframe_labels(bucket, video_key, s3_client=None, rekognition_client=None, cache=None,
+                           max_frames=None, concurrency=None):
+    """
+    Labels for up to max_frames distinct keyframes of a video
+    Output: {'damage_patterns': [{'label', 'confidence', 'timestamp' (ms),
+    'bounding_box'}], 'labels': {name: best confidence}, 'frames_sampled',
+    'frames_labelled', 'duplicates_skipped', 'cache_hits', 'calls',
+    'calls_avoided'}; calls_avoided counts sampled keyframes that did not
+    need their own call
+    """
+    cache = LABEL_CACHE if cache is None else cache
+    max_frames = LABEL_MAX_FRAMES if max_frames is None else max_frames
+    concurrency = LABEL_MAX_CONCURRENCY if concurrency is None else concurrency
+
+    frames, sampled, duplicates = select_distinct_keyframes(s3_client or s3, bucket, video_key, max_frames)
+
+    # Cached frames are answered now; the rest are encoded and sent
+    labelled, uncached = [], []
+    for timestamp, frame, frame_hash in frames:
+        labels = cache.get(frame_hash)
+        if labels is None:
+            uncached.append((timestamp, frame_hash, sampler.to_jpeg(frame, LABEL_IMAGE_WIDTH, LABEL_JPEG_QSCALE)))
+        else:
+            labelled.append((timestamp, labels))
+
+    client = rekognition_client or rekognition
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        responses = list(executor.map(lambda item: detect_image_labels(client, item[2]), uncached))
+    for (timestamp, frame_hash, _), labels in zip(uncached, responses):
+        cache.put(frame_hash, labels)
+        labelled.append((timestamp, labels))
+
+    stats = {
+        'frames_sampled': sampled,
+        'frames_labelled': len(labelled),
+        'duplicates_skipped': duplicates,
+        'cache_hits': len(frames) - len(uncached),
+        'calls': len(uncached),
+        'calls_avoided': sampled - len(uncached)
+    }
+    LABEL_STATS['videos'] += 1
+    for counter in ('frames_sampled', 'duplicates_skipped', 'cache_hits', 'calls', 'calls_avoided'):
+        LABEL_STATS[counter] += stats[counter]
+
+    labelled.sort(key=lambda item: item[0])
+    return dict(stats, **summarize_labels(labelled))
+
+def select_distinct_keyframes(s3_client, bucket, video_key, max_frames):
+    """
+    Sample LABEL_CANDIDATE_FRAMES keyframes over the clip, drop those within
+    LABEL_DEDUP_RADIUS bits of a frame already kept (and flat frames), and
+    keep up to max_frames spread over what is left
+    Output: ([(timestamp, av frame, hash)], frames sampled, duplicates dropped)
+    """
+    frames = sampler.iter_evidence_keyframes(s3_client, bucket, video_key, LABEL_CANDIDATE_FRAMES,
+                                             use_proxy=LABEL_USE_PROXY)
+    distinct, sampled, duplicates = [], 0, 0
+    for timestamp, frame in frames:
+        sampled += 1
+        frame_hash = phash.phash64(sampler.to_gray(frame, HASH_WIDTH))
+        if frame_hash is None or any((frame_hash ^ kept).bit_count() <= LABEL_DEDUP_RADIUS
+                                     for _, _, kept in distinct):
+            duplicates += 1
+            continue
+        distinct.append((timestamp, frame, frame_hash))
+
+    if len(distinct) > max_frames:
+        picks = np.round(np.linspace(0, len(distinct) - 1, max_frames)).astype(int)
+        distinct = [distinct[i] for i in picks]
+    return distinct, sampled, duplicates
+
+def detect_image_labels(client, image_bytes):
+    """
+    DetectLabels for one JPEG, retried with jittered backoff when throttled
+    Output: [{'Name', 'Confidence', 'BoundingBox'}] (first instance's box)
+    """
+    for attempt in range(LABEL_MAX_RETRIES + 1):
+        try:
+            response = client.detect_labels(Image={'Bytes': image_bytes}, MaxLabels=LABEL_MAX_LABELS,
+                                            MinConfidence=LABEL_MIN_CONFIDENCE)
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLING_ERRORS or attempt == LABEL_MAX_RETRIES:
+                raise
+            LABEL_STATS['throttle_retries'] += 1
+            time.sleep(0.1 * 2 ** attempt * (1 + random.random()))
+    return [{
+        'Name': label['Name'],
+        'Confidence': round(float(label['Confidence']), 2),
+        'BoundingBox': (label.get('Instances') or [{}])[0].get('BoundingBox')
+    } for label in response.get('Labels', [])]
+
+def is_crop_damage_label(name):
+    lower = name.lower()
+    return any(keyword in lower for keyword in DAMAGE_KEYWORDS)
+
+def summarize_labels(labelled):
+    """
+    Crop-damage patterns per frame and each label's best confidence
+    """
+    damage_patterns = []
+    best = {}
+    for timestamp, labels in labelled:
+        for label in labels:
+            best[label['Name']] = max(label['Confidence'], best.get(label['Name'], 0))
+            if is_crop_damage_label(label['Name']):
+                damage_patterns.append({
+                    'label': label['Name'],
+                    'confidence': label['Confidence'],
+                    'timestamp': int(timestamp * 1000),
+                    'bounding_box': label['BoundingBox']
+                })
+    return {'damage_patterns': damage_patterns, 'labels': best}
+
+# Test locally
+if __name__ == "__main__":
+    test_event = {
+        'claimId': 'CLM-TEST-001',
+        'videoS3Uri': 's3://vericrop-evidence-123456/test-video.mp4'
+    }
+    result = lambda_handler(test_event, None)
+    print(json.dumps(result, indent=2))
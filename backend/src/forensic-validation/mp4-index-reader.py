@@ -0,0 +1,422 @@
+"""
+VeriCrop FinBridge - MP4 Index Reader
+Reads only the container index (moov atom) of an MP4 evidence video with
+ranged GETs, builds the video track's sample table and plans the byte ranges
+of the keyframes to analyse, merging neighbouring ranges into one request
+Phone recordings usually store moov after mdat, so the reader follows the
+top-level atom headers instead of assuming it is at the start
+The same moov also yields the capture metadata (creation time, GPS) that
+the forensic checks compare with the claim before any frame is decoded
+"""
+
+import re
+import struct
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# First/next ranged read when looking for moov; covers the whole index of
+# clips up to a few minutes long
+PROBE_BYTES = 64 * 1024
+# Keyframe ranges closer than this are fetched in one request, up to
+# MAX_REQUEST_BYTES per request
+COALESCE_GAP_BYTES = 256 * 1024
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+# Ranged GETs kept in flight ahead of the decoder
+PREFETCH_REQUESTS = 4
+
+# Sample entry type -> (decoder name, decoder configuration atom)
+VIDEO_CODECS = {
+    'avc1': ('h264', 'avcC'),
+    'avc3': ('h264', 'avcC'),
+    'hvc1': ('hevc', 'hvcC'),
+    'hev1': ('hevc', 'hvcC'),
+}
+
+class Mp4IndexError(ValueError):
+    """
+    The object is not an MP4 this reader can index (no moov, fragmented,
+    unsupported codec); callers fall back to streaming the whole file
+    """
+
+def iter_atoms(buffer, start=0, end=None):
+    """
+    Yield (type, payload_start, atom_end) for consecutive atoms in buffer
+    """
+    end = len(buffer) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', buffer, position)
+        header = 8
+        if size == 1:
+            if position + 16 > end:
+                return
+            size = struct.unpack_from('>Q', buffer, position + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            raise Mp4IndexError(f'Corrupt atom header at byte {position}')
+        yield kind.decode('latin-1'), position + header, position + size
+        position += size
+
+def child_atoms(buffer, start, end):
+    return {kind: (payload, atom_end) for kind, payload, atom_end in iter_atoms(buffer, start, end)}
+
+class Mp4VideoIndex:
+    """
+    Sample table of the first video track: byte offset, size and decode time
+    of every sample, which samples are keyframes, and the decoder setup
+    """
+
+    def __init__(self, codec, extradata, width, height, timescale, offsets, sizes, dts, keyframes):
+        self.codec = codec
+        self.extradata = extradata
+        self.width = width
+        self.height = height
+        self.timescale = timescale
+        self.offsets = offsets
+        self.sizes = sizes
+        self.dts = dts
+        self.keyframes = keyframes
+
+    @property
+    def duration(self):
+        return float(self.dts[-1]) / self.timescale if len(self.dts) else 0.0
+
+    def select_keyframes(self, max_frames):
+        """
+        Up to max_frames keyframe sample indices spread evenly over the video
+        """
+        if len(self.keyframes) <= max_frames:
+            return self.keyframes
+        picks = np.unique(np.round(np.linspace(0, len(self.keyframes) - 1, max_frames)).astype(np.int64))
+        return self.keyframes[picks]
+
+    def plan_ranges(self, samples, gap=COALESCE_GAP_BYTES, max_request=MAX_REQUEST_BYTES):
+        """
+        Group samples into byte ranges for ranged GETs
+        Output: list of (start, end_inclusive, [sample indices]) in file order
+        """
+        ranges = []
+        for sample in sorted(samples, key=lambda s: self.offsets[s]):
+            start = int(self.offsets[sample])
+            end = start + int(self.sizes[sample]) - 1
+            if ranges and start - ranges[-1][1] - 1 <= gap and end - ranges[-1][0] < max_request:
+                ranges[-1][1] = max(ranges[-1][1], end)
+                ranges[-1][2].append(int(sample))
+            else:
+                ranges.append([start, end, [int(sample)]])
+        return [tuple(r) for r in ranges]
+
+def read_video_index(s3_client, bucket, key, probe_bytes=PROBE_BYTES):
+    """
+    Fetch the moov atom with ranged GETs and parse the video track index
+    Output: (Mp4VideoIndex, stats dict with requests/bytes_fetched/size)
+    """
+    moov, stats = read_moov(s3_client, bucket, key, probe_bytes)
+    return parse_moov(moov), stats
+
+def read_moov(s3_client, bucket, key, probe_bytes=PROBE_BYTES):
+    """
+    Fetch just the moov atom with ranged GETs (one request for faststart
+    files, usually two when moov follows mdat)
+    Output: (memoryview of the moov atom, stats dict with requests/bytes_fetched/size)
+    """
+    stats = {'requests': 0, 'bytes_fetched': 0, 'size': None}
+
+    def fetch(start, end):
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')
+        data = response['Body'].read()
+        stats['requests'] += 1
+        stats['bytes_fetched'] += len(data)
+        if stats['size'] is None:
+            stats['size'] = int(response['ContentRange'].rsplit('/', 1)[1])
+        return data
+
+    position = 0
+    window_start, window = 0, fetch(0, probe_bytes - 1)
+    if window[4:8] != b'ftyp':
+        raise Mp4IndexError(f'{key} is not an MP4 (no ftyp atom)')
+
+    while position + 8 <= stats['size']:
+        offset = position - window_start
+        if offset < 0 or offset + 16 > len(window):
+            window_start, window = position, fetch(position, position + probe_bytes - 1)
+            offset = 0
+        kind, _, atom_end = next(iter_atoms(window, offset))
+        size = atom_end - offset
+        if struct.unpack_from('>I', window, offset)[0] == 0:
+            # Size 0: the atom runs to the end of the file
+            size = stats['size'] - position
+        if kind == 'moov':
+            if offset + size > len(window):
+                window = window[offset:] + fetch(window_start + len(window), position + size - 1)
+                window_start, offset = position, 0
+            return memoryview(window)[offset:offset + size], stats
+        if kind == 'moof':
+            raise Mp4IndexError(f'{key} is a fragmented MP4')
+        position += size
+
+    raise Mp4IndexError(f'No moov atom in {key}')
+
+def parse_moov(moov):
+    """
+    Build the Mp4VideoIndex of the first video track in a moov atom buffer
+    """
+    _, moov_payload, moov_end = next(iter_atoms(moov))
+    for kind, payload, end in iter_atoms(moov, moov_payload, moov_end):
+        if kind != 'trak':
+            continue
+        trak = child_atoms(moov, payload, end)
+        if 'mdia' not in trak:
+            continue
+        mdia = child_atoms(moov, *trak['mdia'])
+        if 'hdlr' not in mdia or bytes(moov[mdia['hdlr'][0] + 8:mdia['hdlr'][0] + 12]) != b'vide':
+            continue
+        minf = child_atoms(moov, *mdia['minf'])
+        stbl = child_atoms(moov, *minf['stbl'])
+        return build_index(moov, mdia, stbl)
+    raise Mp4IndexError('No video track in moov')
+
+# mvhd times count seconds from 1904-01-01 UTC
+MP4_EPOCH_OFFSET = 2082844800
+# QuickTime metadata keys written by phone camera apps
+QUICKTIME_LOCATION_KEY = 'com.apple.quicktime.location.ISO6709'
+QUICKTIME_CREATIONDATE_KEY = 'com.apple.quicktime.creationdate'
+ISO6709_PATTERN = re.compile(r'([+-]\d+(?:\.\d+)?)([+-]\d+(?:\.\d+)?)')
+
+def parse_capture_metadata(moov):
+    """
+    Capture metadata from a moov atom buffer, without touching the track
+    tables: mvhd creation_time, and location/creation date from the QuickTime
+    meta keys, udta ©xyz (Android) or the 3GPP loci box, in that preference
+    Output: dict with creation_time (epoch, mvhd), capture_time (epoch,
+    creationdate), latitude, longitude, location_source; None when absent
+    """
+    metadata = {'creation_time': None, 'capture_time': None, 'latitude': None, 'longitude': None,
+                'location_source': None}
+    locations = {}
+    _, payload, end = next(iter_atoms(moov))
+    for kind, start, atom_end in iter_atoms(moov, payload, end):
+        if kind == 'mvhd':
+            # Version 1 stores 64-bit times
+            seconds = struct.unpack_from('>Q' if moov[start] == 1 else '>I', moov, start + 4)[0]
+            if seconds:
+                metadata['creation_time'] = seconds - MP4_EPOCH_OFFSET
+        elif kind == 'meta':
+            read_quicktime_keys(moov, start, atom_end, metadata, locations)
+        elif kind == 'udta':
+            for child, child_start, child_end in iter_atoms(moov, start, atom_end):
+                if child == 'meta':
+                    read_quicktime_keys(moov, child_start, child_end, metadata, locations)
+                elif child == '\xa9xyz':
+                    # 16-bit string length and language, then the ISO 6709 string
+                    length = struct.unpack_from('>H', moov, child_start)[0]
+                    text = bytes(moov[child_start + 4:min(child_start + 4 + length, child_end)])
+                    locations['udta_xyz'] = parse_iso6709(text.decode('latin-1'))
+                elif child == 'loci':
+                    locations['3gpp_loci'] = parse_loci(moov, child_start, child_end)
+
+    for source in ('quicktime_keys', 'udta_xyz', '3gpp_loci'):
+        if locations.get(source) and locations[source][0] is not None:
+            metadata['latitude'], metadata['longitude'] = locations[source]
+            metadata['location_source'] = source
+            break
+    return metadata
+
+def read_quicktime_keys(moov, start, end, metadata, locations):
+    values = quicktime_metadata(moov, start, end)
+    if QUICKTIME_LOCATION_KEY in values:
+        locations['quicktime_keys'] = parse_iso6709(values[QUICKTIME_LOCATION_KEY])
+    if QUICKTIME_CREATIONDATE_KEY in values:
+        try:
+            metadata['capture_time'] = datetime.fromisoformat(values[QUICKTIME_CREATIONDATE_KEY]).timestamp()
+        except ValueError:
+            pass
+
+def parse_loci(moov, start, end):
+    """
+    (latitude, longitude) from a 3GPP loci box: version/flags, language,
+    null-terminated place name, role, then 16.16 fixed-point longitude,
+    latitude and altitude
+    """
+    name_end = start + 6
+    while name_end < end and moov[name_end] != 0:
+        name_end += 1
+    position = name_end + 2
+    if position + 8 > end:
+        return None, None
+    longitude, latitude = struct.unpack_from('>ii', moov, position)
+    return latitude / 65536, longitude / 65536
+
+def quicktime_metadata(moov, start, end):
+    """
+    {key: text value} from a QuickTime meta atom (hdlr 'mdta', keys + ilst)
+    """
+    # ISO meta is a full box; QuickTime's is not - its first child follows directly
+    if struct.unpack_from('>I', moov, start)[0] == 0:
+        start += 4
+    children = child_atoms(moov, start, end)
+    if 'keys' not in children or 'ilst' not in children:
+        return {}
+
+    keys = []
+    position, keys_end = children['keys']
+    count = struct.unpack_from('>I', moov, position + 4)[0]
+    position += 8
+    for _ in range(count):
+        size = struct.unpack_from('>I', moov, position)[0]
+        if size < 8 or position + size > keys_end:
+            break
+        keys.append(bytes(moov[position + 8:position + size]).decode('utf-8', 'replace'))
+        position += size
+
+    values = {}
+    for kind, item_start, item_end in iter_atoms(moov, *children['ilst']):
+        key_index = int.from_bytes(kind.encode('latin-1'), 'big') - 1
+        if not 0 <= key_index < len(keys):
+            continue
+        for child, data_start, data_end in iter_atoms(moov, item_start, item_end):
+            # data atom: 4-byte type indicator (1 = UTF-8), 4-byte locale, value
+            if child == 'data' and struct.unpack_from('>I', moov, data_start)[0] == 1:
+                values[keys[key_index]] = bytes(moov[data_start + 8:data_end]).decode('utf-8', 'replace')
+    return values
+
+def parse_iso6709(text):
+    """
+    (latitude, longitude) from an ISO 6709 string such as '+19.0760+072.8777/'
+    Degrees, degrees-minutes (±DDMM.M) and degrees-minutes-seconds forms
+    """
+    match = ISO6709_PATTERN.match(text.strip())
+    if not match:
+        return None, None
+    return iso6709_degrees(match.group(1), 2), iso6709_degrees(match.group(2), 3)
+
+def iso6709_degrees(value, degree_digits):
+    sign = -1.0 if value[0] == '-' else 1.0
+    whole, _, fraction = value[1:].partition('.')
+    fraction = float('0.' + fraction) if fraction else 0.0
+    if len(whole) <= degree_digits:
+        return sign * (int(whole) + fraction)
+    degrees = int(whole[:degree_digits])
+    if len(whole) <= degree_digits + 2:
+        return sign * (degrees + (int(whole[degree_digits:]) + fraction) / 60)
+    minutes = int(whole[degree_digits:degree_digits + 2])
+    seconds = int(whole[degree_digits + 2:]) + fraction
+    return sign * (degrees + minutes / 60 + seconds / 3600)
+
+def full_box(moov, atoms, kind):
+    """
+    Payload of a full box (after version/flags) as (start, end), or None
+    """
+    if kind not in atoms:
+        return None
+    start, end = atoms[kind]
+    return start + 4, end
+
+def uint32_table(moov, start, count, columns=1):
+    return np.frombuffer(moov, dtype='>u4', count=count * columns, offset=start).astype(np.int64).reshape(count, columns)
+
+def build_index(moov, mdia, stbl):
+    # Timescale from mdhd (version 1 has 64-bit creation/modification times)
+    mdhd = mdia['mdhd'][0]
+    timescale = struct.unpack_from('>I', moov, mdhd + (20 if moov[mdhd] == 1 else 12))[0]
+
+    codec, extradata, width, height = parse_sample_description(moov, *full_box(moov, stbl, 'stsd'))
+
+    # Sample sizes
+    start, _ = full_box(moov, stbl, 'stsz')
+    uniform_size, count = struct.unpack_from('>II', moov, start)
+    if count == 0:
+        raise Mp4IndexError('Empty sample table (fragmented MP4?)')
+    sizes = (np.full(count, uniform_size, dtype=np.int64) if uniform_size
+             else uint32_table(moov, start + 8, count)[:, 0])
+
+    # Chunk offsets
+    if 'co64' in stbl:
+        start, _ = full_box(moov, stbl, 'co64')
+        n_chunks = struct.unpack_from('>I', moov, start)[0]
+        chunk_offsets = np.frombuffer(moov, dtype='>u8', count=n_chunks, offset=start + 4).astype(np.int64)
+    else:
+        start, _ = full_box(moov, stbl, 'stco')
+        n_chunks = struct.unpack_from('>I', moov, start)[0]
+        chunk_offsets = uint32_table(moov, start + 4, n_chunks)[:, 0]
+
+    # Sample-to-chunk runs -> chunk of every sample -> byte offset of every sample
+    start, _ = full_box(moov, stbl, 'stsc')
+    runs = uint32_table(moov, start + 4, struct.unpack_from('>I', moov, start)[0], 3)
+    run_lengths = np.diff(np.append(runs[:, 0], n_chunks + 1))
+    samples_per_chunk = np.repeat(runs[:, 1], run_lengths)
+    sample_chunk = np.repeat(np.arange(n_chunks), samples_per_chunk)[:count]
+    chunk_first_sample = np.concatenate(([0], np.cumsum(samples_per_chunk)[:-1]))
+    size_before = np.concatenate(([0], np.cumsum(sizes)))
+    offsets = chunk_offsets[sample_chunk] + size_before[:count] - size_before[chunk_first_sample[sample_chunk]]
+
+    # Decode timestamps from time-to-sample runs
+    start, _ = full_box(moov, stbl, 'stts')
+    runs = uint32_table(moov, start + 4, struct.unpack_from('>I', moov, start)[0], 2)
+    dts = np.concatenate(([0], np.cumsum(np.repeat(runs[:, 1], runs[:, 0]))))[:count]
+
+    # Sync samples (1-based); no stss means every sample is a keyframe
+    if 'stss' in stbl:
+        start, _ = full_box(moov, stbl, 'stss')
+        keyframes = uint32_table(moov, start + 4, struct.unpack_from('>I', moov, start)[0])[:, 0] - 1
+    else:
+        keyframes = np.arange(count)
+
+    return Mp4VideoIndex(codec, extradata, width, height, timescale, offsets, sizes, dts, keyframes)
+
+def parse_sample_description(moov, start, end):
+    """
+    Codec, decoder configuration bytes and dimensions from the first stsd entry
+    """
+    entry = start + 4
+    kind = bytes(moov[entry + 4:entry + 8]).decode('latin-1')
+    if kind not in VIDEO_CODECS:
+        raise Mp4IndexError(f'Unsupported video codec {kind!r}')
+    codec, config_atom = VIDEO_CODECS[kind]
+    entry_size = struct.unpack_from('>I', moov, entry)[0]
+    width, height = struct.unpack_from('>HH', moov, entry + 32)
+    # Visual sample entry fields take 78 bytes after the 8-byte header
+    children = child_atoms(moov, entry + 86, entry + entry_size)
+    if config_atom not in children:
+        raise Mp4IndexError(f'No {config_atom} decoder configuration')
+    config_start, config_end = children[config_atom]
+    return codec, bytes(moov[config_start:config_end]), width, height
+
+def iter_sample_data(s3_client, bucket, key, index, samples, stats=None, prefetch=PREFETCH_REQUESTS):
+    """
+    Yield (sample index, bytes) for the given samples, fetched as coalesced
+    byte ranges in file order with up to `prefetch` requests in flight;
+    stopping early skips the ranges not yet requested
+    """
+    def fetch(start, end):
+        response = s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')
+        return response['Body'].read()
+
+    ranges = iter(index.plan_ranges(samples))
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        try:
+            for start, end, range_samples in ranges:
+                in_flight.append((start, range_samples, executor.submit(fetch, start, end)))
+                if len(in_flight) < prefetch:
+                    continue
+                yield from _split_range(index, *in_flight.popleft(), stats)
+            while in_flight:
+                yield from _split_range(index, *in_flight.popleft(), stats)
+        finally:
+            for _, _, future in in_flight:
+                future.cancel()
+
+def _split_range(index, start, range_samples, future, stats):
+    data = memoryview(future.result())
+    if stats is not None:
+        stats['requests'] += 1
+        stats['bytes_fetched'] += len(data)
+    for sample in range_samples:
+        offset = int(index.offsets[sample]) - start
+        yield sample, bytes(data[offset:offset + int(index.sizes[sample])])
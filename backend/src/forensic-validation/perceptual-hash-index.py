@@ -0,0 +1,434 @@
+"""
+VeriCrop FinBridge - Perceptual Hash Index
+64-bit perceptual hashes (pHash, dHash) of sampled video frames and a
+multi-index hashing structure for Hamming-radius search over millions of
+stored frame hashes. Each hash is split into four 16-bit substrings with one
+bucket table each; a stored hash within radius r of the query agrees with it
+within r // 4 bits on at least one substring, so only those buckets are read.
+Snapshots persist as .npz arrays plus a JSON sidecar; per-video records can
+also be kept in DynamoDB, with the same substring buckets stored as items so
+a lookup reads only the buckets it needs (no Scan, nothing held in memory).
+
+Usage (snapshot from DynamoDB records, or bucket items for records stored
+without them):
+    python perceptual-hash-index.py --table vericrop-claims --output ./phash-index
+    python perceptual-hash-index.py --table vericrop-claims --write-buckets
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+INDEX_FORMAT_VERSION = 1
+SUBSTRINGS = 4
+SUBSTRING_BITS = 16
+SUBSTRING_MASK = (1 << SUBSTRING_BITS) - 1
+
+# Hamming radius for "same frame" (re-encoded, rescaled, recompressed) and
+# how many sampled frames must match one stored video to call it a duplicate
+MATCH_RADIUS = int(os.environ.get('PHASH_MATCH_RADIUS', '7'))
+MIN_MATCHED_FRAMES = int(os.environ.get('PHASH_MIN_MATCHED_FRAMES', '3'))
+# Flat frames (sky, lens cap) hash alike across unrelated videos
+MIN_FRAME_STD = 4.0
+# Hashes added since the last table build are searched by brute force
+# until there are this many
+REBUILD_THRESHOLD = 20000
+
+# DynamoDB store: bucket items are read with BatchGetItem (100 keys per
+# request) and written with one UpdateItem each, STORE_WORKERS at a time
+STORE_BATCH_GET_CHUNK = 100
+STORE_WORKERS = int(os.environ.get('PHASH_STORE_WORKERS', '8'))
+STORE_MAX_RETRIES = 8
+STORE_RETRY_BASE_SECONDS = 0.05
+
+def resize_mean(gray, height, width):
+    """
+    Area-average downscale of a 2-D array to (height, width)
+    """
+    rows = np.linspace(0, gray.shape[0], height + 1).astype(np.int64)
+    cols = np.linspace(0, gray.shape[1], width + 1).astype(np.int64)
+    sums = np.add.reduceat(np.add.reduceat(gray.astype(np.float64), rows[:-1], axis=0), cols[:-1], axis=1)
+    return sums / np.outer(np.diff(rows), np.diff(cols))
+
+def dct_matrix(n):
+    """
+    Orthonormal DCT-II matrix
+    """
+    k = np.arange(n)[:, None]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+DCT_32 = dct_matrix(32)
+
+def bits_to_hash(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+def phash64(gray):
+    """
+    DCT perceptual hash: signs of the 8×8 lowest frequencies of a 32×32
+    thumbnail against their median; None for flat frames
+    """
+    if gray.std() < MIN_FRAME_STD:
+        return None
+    low = (DCT_32 @ resize_mean(gray, 32, 32) @ DCT_32.T)[:8, :8]
+    return bits_to_hash(low > np.median(low.ravel()[1:]))
+
+def dhash64(gray):
+    """
+    Difference hash: left-to-right brightness gradient signs of a 9×8 thumbnail
+    """
+    if gray.std() < MIN_FRAME_STD:
+        return None
+    small = resize_mean(gray, 8, 9)
+    return bits_to_hash(small[:, 1:] > small[:, :-1])
+
+@lru_cache(maxsize=None)
+def substring_flip_masks(radius):
+    """
+    All 16-bit masks with at most `radius` bits set
+    """
+    masks = np.arange(1 << SUBSTRING_BITS, dtype=np.int64)
+    return masks[np.bitwise_count(masks) <= radius]
+
+class PerceptualHashIndex:
+    """
+    Frame hashes of previously analysed videos with multi-index search
+    Each video keeps its key, claim and cached shadow analysis so a match
+    can be reported and reused without decoding the new upload
+    """
+
+    def __init__(self):
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.video_ids = np.zeros(0, dtype=np.int32)
+        self.videos = []
+        self.orders = None
+        self.offsets = None
+        self.pending_hashes = []
+        self.pending_ids = []
+
+    def __len__(self):
+        return len(self.hashes) + len(self.pending_hashes)
+
+    def add_video(self, video_key, hashes, claim_id=None, analysis=None):
+        """
+        Register a video's frame hashes; returns its video id
+        """
+        video_id = len(self.videos)
+        self.videos.append({'video_key': video_key, 'claim_id': claim_id, 'analysis': analysis})
+        hashes = [h for h in hashes if h is not None]
+        self.pending_hashes.extend(hashes)
+        self.pending_ids.extend([video_id] * len(hashes))
+        if len(self.pending_hashes) >= REBUILD_THRESHOLD:
+            self.build()
+        return video_id
+
+    def build(self):
+        """
+        Merge pending hashes and rebuild the four substring bucket tables
+        (CSR layout: entries sorted by substring, offsets per substring value)
+        """
+        if self.pending_hashes:
+            self.hashes = np.concatenate([self.hashes, np.array(self.pending_hashes, dtype=np.uint64)])
+            self.video_ids = np.concatenate([self.video_ids, np.array(self.pending_ids, dtype=np.int32)])
+            self.pending_hashes, self.pending_ids = [], []
+
+        self.orders = np.empty((SUBSTRINGS, len(self.hashes)), dtype=np.uint32)
+        self.offsets = np.empty((SUBSTRINGS, (1 << SUBSTRING_BITS) + 1), dtype=np.int64)
+        for table in range(SUBSTRINGS):
+            keys = self.substrings(self.hashes, table)
+            self.orders[table] = np.argsort(keys, kind='stable')
+            self.offsets[table, 0] = 0
+            np.cumsum(np.bincount(keys, minlength=1 << SUBSTRING_BITS), out=self.offsets[table, 1:])
+
+    @staticmethod
+    def substrings(hashes, table):
+        # uint16 keys let the stable argsort use radix sort
+        shift = np.uint64(table * SUBSTRING_BITS)
+        return ((hashes >> shift) & np.uint64(SUBSTRING_MASK)).astype(np.uint16)
+
+    def search(self, query, radius=MATCH_RADIUS):
+        """
+        Stored entries within `radius` bits of one 64-bit hash
+        Output: (video ids, Hamming distances)
+        """
+        query = np.uint64(query)
+        video_ids, distances = [], []
+        if self.orders is not None and len(self.hashes):
+            # Buckets of every substring value within radius // 4 bits, in all
+            # four tables, gathered as one flat index into the sorted orders
+            flips = substring_flip_masks(radius // SUBSTRINGS)
+            substrings = np.array([(int(query) >> (t * SUBSTRING_BITS)) & SUBSTRING_MASK
+                                   for t in range(SUBSTRINGS)])
+            tables = np.arange(SUBSTRINGS)[:, None]
+            keys = substrings[:, None] ^ flips[None, :]
+            starts = self.offsets[tables, keys].ravel()
+            lengths = self.offsets[tables, keys + 1].ravel() - starts
+            flat_starts = starts + np.repeat(np.arange(SUBSTRINGS) * len(self.hashes), len(flips))
+            run_starts = np.cumsum(lengths) - lengths
+            positions = np.repeat(flat_starts - run_starts, lengths) + np.arange(lengths.sum())
+            entries = self.orders.reshape(-1)[positions]
+
+            # A hash can sit in the buckets of several tables: dedupe the hits only
+            entry_distances = np.bitwise_count(self.hashes[entries] ^ query)
+            entries = np.unique(entries[entry_distances <= radius])
+            video_ids.append(self.video_ids[entries])
+            distances.append(np.bitwise_count(self.hashes[entries] ^ query))
+        if self.pending_hashes:
+            pending_distances = np.bitwise_count(np.array(self.pending_hashes, dtype=np.uint64) ^ query)
+            close = pending_distances <= radius
+            video_ids.append(np.array(self.pending_ids, dtype=np.int32)[close])
+            distances.append(pending_distances[close])
+        if not video_ids:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8)
+        return np.concatenate(video_ids), np.concatenate(distances)
+
+    def find_duplicate(self, hashes, radius=MATCH_RADIUS, min_frames=MIN_MATCHED_FRAMES,
+                       exclude_video_key=None, exclude_claim_id=None):
+        """
+        Stored video matched by the most query frames, if at least
+        min(min_frames, usable query frames) frames match it; re-submissions
+        of the same upload or claim are excluded
+        Output: {'video_key', 'claim_id', 'analysis', 'matched_frames',
+        'mean_distance'} or None
+        """
+        hashes = [h for h in hashes if h is not None]
+        matched = {}
+        for query in hashes:
+            video_ids, distances = self.search(query, radius)
+            best = {}
+            for video_id, distance in zip(video_ids.tolist(), distances.tolist()):
+                best[video_id] = min(distance, best.get(video_id, distance))
+            for video_id, distance in best.items():
+                matched.setdefault(video_id, []).append(distance)
+
+        required = min(min_frames, len(hashes))
+        for video_id, distances in sorted(matched.items(), key=lambda item: -len(item[1])):
+            video = self.videos[video_id]
+            if len(distances) < max(1, required):
+                break
+            if video['video_key'] == exclude_video_key or (exclude_claim_id and video['claim_id'] == exclude_claim_id):
+                continue
+            return dict(video, matched_frames=len(distances), mean_distance=round(float(np.mean(distances)), 2))
+        return None
+
+    def save(self, path):
+        """
+        Write <path>.npz (hashes, video ids, bucket tables) and <path>.json
+        """
+        self.build()
+        np.savez(f'{path}.npz', hashes=self.hashes, video_ids=self.video_ids,
+                 orders=self.orders, offsets=self.offsets)
+        with open(f'{path}.json', 'w') as f:
+            json.dump({'format_version': INDEX_FORMAT_VERSION, 'videos': self.videos}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(f'{path}.json') as f:
+            metadata = json.load(f)
+        if metadata.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f'Unsupported hash index format {metadata.get("format_version")}')
+        index = cls()
+        index.videos = metadata['videos']
+        with np.load(f'{path}.npz') as arrays:
+            index.hashes = arrays['hashes']
+            index.video_ids = arrays['video_ids']
+            index.orders = arrays['orders']
+            index.offsets = arrays['offsets']
+        return index
+
+class DynamoHashStore:
+    """
+    Durable per-video hash records in the claims table, one item per video:
+    claimId 'PHASH#<video_key>', type 'PHASH', data {video_key, claim_id,
+    hashes as hex strings, analysis as JSON}. Each hash is also added to
+    its four substring buckets, items 'PHASHBUCKET#<table>#<substring hex>'
+    (type 'PHASH_BUCKET') with a string set of '<hash hex> <video_key>'
+    entries, so find_duplicate reads the buckets a query needs and sees
+    videos registered by any container as soon as they are written
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @staticmethod
+    def bucket_key(table, value):
+        return f'PHASHBUCKET#{table}#{value:04x}'
+
+    def put_video(self, video_key, hashes, claim_id=None, analysis=None):
+        self.table.put_item(Item={
+            'claimId': f'PHASH#{video_key}',
+            'timestamp': int(time.time()),
+            'type': 'PHASH',
+            'data': {
+                'video_key': video_key,
+                'claim_id': claim_id,
+                'hashes': [f'{h:016x}' for h in hashes if h is not None],
+                'analysis': json.dumps(analysis)
+            }
+        })
+        self.add_to_buckets(video_key, hashes)
+
+    def add_to_buckets(self, video_key, hashes):
+        """
+        Add a video's hashes to their substring bucket items
+        """
+        buckets = {}
+        for value in {h for h in hashes if h is not None}:
+            for table in range(SUBSTRINGS):
+                key = self.bucket_key(table, (value >> (table * SUBSTRING_BITS)) & SUBSTRING_MASK)
+                buckets.setdefault(key, set()).add(f'{value:016x} {video_key}')
+        if not buckets:
+            return
+        with ThreadPoolExecutor(max_workers=STORE_WORKERS) as executor:
+            list(executor.map(lambda bucket: self.table.update_item(
+                Key={'claimId': bucket[0]},
+                UpdateExpression='SET #t = :bucket ADD entries :entries',
+                ExpressionAttributeNames={'#t': 'type'},
+                ExpressionAttributeValues={':bucket': 'PHASH_BUCKET', ':entries': bucket[1]}
+            ), buckets.items()))
+
+    def read_buckets(self, keys):
+        """
+        Entries of the bucket items among keys, as {key: [(hash, video_key)]}
+        """
+        chunks = [keys[i:i + STORE_BATCH_GET_CHUNK] for i in range(0, len(keys), STORE_BATCH_GET_CHUNK)]
+        buckets = {}
+        if not chunks:
+            return buckets
+        with ThreadPoolExecutor(max_workers=min(STORE_WORKERS, len(chunks))) as executor:
+            for found in executor.map(self.read_bucket_chunk, chunks):
+                buckets.update(found)
+        return buckets
+
+    def read_bucket_chunk(self, keys):
+        """
+        One BatchGetItem of up to 100 bucket keys, resending UnprocessedKeys
+        with jittered exponential backoff
+        """
+        buckets = {}
+        name = self.table.name
+        request = {name: {'Keys': [{'claimId': key} for key in keys], 'ProjectionExpression': 'claimId, entries'}}
+        for attempt in range(STORE_MAX_RETRIES + 1):
+            response = self.table.meta.client.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(name, []):
+                buckets[item['claimId']] = [(int(value, 16), video_key) for value, video_key in
+                                            (entry.split(' ', 1) for entry in item.get('entries', ()))]
+            request = response.get('UnprocessedKeys')
+            if not request:
+                return buckets
+            if attempt < STORE_MAX_RETRIES:
+                time.sleep(STORE_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+        raise RuntimeError(f'{len(request[name]["Keys"])} hash bucket reads unprocessed after retries')
+
+    def find_duplicate(self, hashes, radius=MATCH_RADIUS, min_frames=MIN_MATCHED_FRAMES,
+                       exclude_video_key=None, exclude_claim_id=None):
+        """
+        PerceptualHashIndex.find_duplicate against the stored buckets: the
+        buckets of every substring within radius // 4 bits of each query
+        hash are read in one round of BatchGetItem, candidates are checked
+        for the full radius and the best video's record is fetched
+        Output: as PerceptualHashIndex.find_duplicate
+        """
+        hashes = [h for h in hashes if h is not None]
+        flips = substring_flip_masks(radius // SUBSTRINGS).tolist()
+        query_keys = [[self.bucket_key(table, ((query >> (table * SUBSTRING_BITS)) & SUBSTRING_MASK) ^ flip)
+                       for table in range(SUBSTRINGS) for flip in flips] for query in hashes]
+        buckets = self.read_buckets(sorted({key for keys in query_keys for key in keys}))
+
+        matched = {}
+        for query, keys in zip(hashes, query_keys):
+            best = {}
+            for key in keys:
+                for value, video_key in buckets.get(key, ()):
+                    distance = bin(value ^ query).count('1')
+                    if distance <= radius:
+                        best[video_key] = min(distance, best.get(video_key, distance))
+            for video_key, distance in best.items():
+                matched.setdefault(video_key, []).append(distance)
+
+        required = min(min_frames, len(hashes))
+        for video_key, distances in sorted(matched.items(), key=lambda item: -len(item[1])):
+            if len(distances) < max(1, required):
+                break
+            if video_key == exclude_video_key:
+                continue
+            item = self.table.get_item(Key={'claimId': f'PHASH#{video_key}'}).get('Item')
+            if item is None or (exclude_claim_id and item['data'].get('claim_id') == exclude_claim_id):
+                continue
+            return {'video_key': video_key, 'claim_id': item['data'].get('claim_id'),
+                    'analysis': json.loads(item['data']['analysis']), 'matched_frames': len(distances),
+                    'mean_distance': round(float(np.mean(distances)), 2)}
+        return None
+
+    def records(self):
+        """
+        Every stored video record (paginated Scan)
+        """
+        kwargs = {'FilterExpression': '#t = :phash', 'ExpressionAttributeNames': {'#t': 'type'},
+                  'ExpressionAttributeValues': {':phash': 'PHASH'}}
+        while True:
+            page = self.table.scan(**kwargs)
+            for item in page.get('Items', []):
+                data = item['data']
+                yield data['video_key'], [int(h, 16) for h in data['hashes']], data
+
+            if 'LastEvaluatedKey' not in page:
+                return
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    def write_buckets(self):
+        """
+        Add every stored record's hashes to the bucket items (records
+        written before the buckets existed); entries are a set, so a rerun
+        adds nothing twice. Output: number of records
+        """
+        count = 0
+        for video_key, hashes, _ in self.records():
+            self.add_to_buckets(video_key, hashes)
+            count += 1
+        return count
+
+    def load_index(self):
+        """
+        Build an in-memory index from every stored record (paginated Scan),
+        for snapshots
+        """
+        index = PerceptualHashIndex()
+        for video_key, hashes, data in self.records():
+            index.add_video(video_key, hashes, claim_id=data.get('claim_id'), analysis=json.loads(data['analysis']))
+        index.build()
+        return index
+
+def main():
+    import boto3
+
+    parser = argparse.ArgumentParser(description='Snapshot the perceptual hash index from DynamoDB')
+    parser.add_argument('--table', required=True, help='DynamoDB table holding PHASH records')
+    parser.add_argument('--output', help='Snapshot path without extension')
+    parser.add_argument('--write-buckets', action='store_true', help='Write bucket items for stored records')
+    args = parser.parse_args()
+    if not args.output and not args.write_buckets:
+        parser.error('give --output and/or --write-buckets')
+
+    start = time.time()
+    store = DynamoHashStore(boto3.resource('dynamodb').Table(args.table))
+    if args.write_buckets:
+        records = store.write_buckets()
+        print(json.dumps({'bucketed_videos': records, 'seconds': round(time.time() - start, 1)}))
+        if not args.output:
+            return
+        start = time.time()
+    index = store.load_index()
+    index.save(args.output)
+    print(json.dumps({'videos': len(index.videos), 'hashes': len(index),
+                      'seconds': round(time.time() - start, 1)}))
+
+if __name__ == '__main__':
+    main()
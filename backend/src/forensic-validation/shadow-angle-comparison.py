@@ -0,0 +1,133 @@
+"""
+VeriCrop FinBridge - Shadow Angle Comparison
+Wrap-aware comparison of measured shadow angles with expected solar azimuths,
+for one claim or whole arrays of claims, and of a shadow's trajectory over
+the frames of one clip
+358° vs 2° is a 4° difference, not 356°
+"""
+
+import numpy as np
+
+# Fraud tolerance and risk bands on the absolute angular difference
+FRAUD_TOLERANCE_DEG = 5.0
+MEDIUM_RISK_MAX_DEG = 15.0
+
+# Per-frame axis noise never assumed below this, so a very steady clip does
+# not turn a 1° wobble into a high splice score
+TRAJECTORY_NOISE_FLOOR_DEG = 1.0
+
+def signed_angle_delta(observed, expected):
+    """
+    Signed difference observed - expected in degrees, in [-180, 180)
+    Positive means the shadow-derived bearing is clockwise of the expected one
+    """
+    return (observed - expected + 180.0) % 360.0 - 180.0
+
+def risk_level(variance):
+    """
+    LOW up to the fraud tolerance, MEDIUM up to 15°, HIGH beyond
+    """
+    if variance <= FRAUD_TOLERANCE_DEG:
+        return "LOW"
+    elif variance <= MEDIUM_RISK_MAX_DEG:
+        return "MEDIUM"
+    else:
+        return "HIGH"
+
+def compare_shadow_angles_batch(observed, expected):
+    """
+    Vectorized comparison of observed shadow angles with expected azimuths
+    Input: array-likes of degrees (broadcastable)
+    Output: dict of arrays - signed_delta, variance (absolute wrap-aware
+            difference), is_fraud and risk_level (same bands as risk_level)
+    """
+    delta = signed_angle_delta(np.asarray(observed, dtype=np.float64),
+                               np.asarray(expected, dtype=np.float64))
+    variance = np.abs(delta)
+    levels = np.where(variance <= FRAUD_TOLERANCE_DEG, 'LOW',
+                      np.where(variance <= MEDIUM_RISK_MAX_DEG, 'MEDIUM', 'HIGH'))
+    return {
+        'signed_delta': delta,
+        'variance': variance,
+        'is_fraud': variance > FRAUD_TOLERANCE_DEG,
+        'risk_level': levels
+    }
+
+def axial_delta(observed, expected):
+    """
+    Signed difference of axial angles (shadow edges have no head or tail),
+    in [-90, 90)
+    """
+    return (observed - expected + 90.0) % 180.0 - 90.0
+
+def shadow_trajectory(times, measured_axes, expected_azimuths, min_segment=3):
+    """
+    Consistency of a clip's per-frame shadow axes with the sun's motion
+    Input: frame times (seconds), measured shadow axes (0-180°, compass
+           frame) and the expected solar azimuth at each frame time
+    The residual measured - expected should stay flat in a genuine clip
+    (camera heading only adds a constant); a clip spliced from footage shot
+    at another time or place steps from one level to another
+    Output: dict - offset_deg (median residual), drift_deg_per_min
+            (Theil-Sen slope), noise_deg (robust per-frame noise),
+            discontinuity_score / max_jump_deg / jump_at_s (largest
+            frame-to-frame step in noise units), splice_score /
+            splice_shift_deg / splice_at_s (best two-segment mean shift,
+            each segment at least min_segment frames)
+    """
+    t = np.asarray(times, dtype=np.float64)
+    residual = axial_delta(np.asarray(measured_axes, dtype=np.float64),
+                           np.asarray(expected_azimuths, dtype=np.float64) % 180.0)
+    n = len(t)
+
+    # Unwrap around the axial mean so an offset near ±90° does not split
+    doubled = np.radians(2 * residual)
+    centre = np.degrees(np.arctan2(np.sin(doubled).sum(), np.cos(doubled).sum())) / 2
+    residual = axial_delta(residual, centre) + centre
+    offset = float(np.median(residual))
+
+    i, j = np.triu_indices(n, 1)
+    dt = t[j] - t[i]
+    moving = dt > 0
+    drift = float(np.median((residual[j] - residual[i])[moving] / dt[moving])) * 60 if moving.any() else 0.0
+
+    # First differences are robust to a single step; MAD → σ, /√2 per frame
+    steps = np.diff(residual)
+    noise = max(TRAJECTORY_NOISE_FLOOR_DEG, 1.4826 * float(np.median(np.abs(steps))) / np.sqrt(2)) \
+        if n > 1 else TRAJECTORY_NOISE_FLOOR_DEG
+    scores = {
+        'frames': n,
+        'span_s': round(float(t[-1] - t[0]), 2) if n else 0.0,
+        'offset_deg': round(offset, 2),
+        'drift_deg_per_min': round(drift, 3),
+        'noise_deg': round(noise, 2),
+        'discontinuity_score': 0.0,
+        'max_jump_deg': 0.0,
+        'jump_at_s': None,
+        'splice_score': 0.0,
+        'splice_shift_deg': 0.0,
+        'splice_at_s': None
+    }
+    if n > 1:
+        jump = int(np.argmax(np.abs(steps)))
+        scores.update({
+            'discontinuity_score': round(float(abs(steps[jump]) / (noise * np.sqrt(2))), 2),
+            'max_jump_deg': round(float(steps[jump]), 2),
+            'jump_at_s': round(float(t[jump + 1]), 2)
+        })
+
+    if n >= 2 * min_segment:
+        # Mean shift between residual[:k] and residual[k:] for every split k,
+        # from one cumulative sum, scaled to a z-score
+        k = np.arange(min_segment, n - min_segment + 1)
+        total = np.cumsum(residual)
+        left = total[k - 1] / k
+        right = (total[-1] - total[k - 1]) / (n - k)
+        z = np.abs(right - left) * np.sqrt(k * (n - k) / n) / noise
+        best = int(np.argmax(z))
+        scores.update({
+            'splice_score': round(float(z[best]), 2),
+            'splice_shift_deg': round(float(right[best] - left[best]), 2),
+            'splice_at_s': round(float(t[k[best]]), 2)
+        })
+    return scores
@@ -0,0 +1,155 @@
+"""
+VeriCrop FinBridge - Shadow Claim Rescorer
+Re-scores an export of shadow comparisons (JSON lines or CSV) with the
+wrap-aware comparator, streaming fixed-size chunks so memory does not grow
+with the file. Each output record gains signed_delta, variance, is_fraud and
+risk_level; a summary of how many decisions changed goes to stderr.
+
+Usage:
+    python shadow-claim-rescorer.py claims.jsonl --output rescored.jsonl
+    python shadow-claim-rescorer.py claims.csv --output rescored.csv --chunk-size 50000
+    python shadow-claim-rescorer.py claims.jsonl.gz --summary-only
+"""
+
+import argparse
+import csv
+import gzip
+import importlib
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+comparison = importlib.import_module('shadow-angle-comparison')
+
+RESCORED_FIELDS = ['signed_delta', 'variance', 'is_fraud', 'risk_level']
+
+def open_text(path, mode='r'):
+    """
+    Open a (possibly gzip-compressed) text file; '-' means stdin/stdout
+    """
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='')
+    return open(path, mode, newline='')
+
+def detect_format(path):
+    return 'csv' if path.removesuffix('.gz').endswith('.csv') else 'jsonl'
+
+def read_records(handle, file_format):
+    """
+    Yield claim records as dicts, one at a time
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    for line in handle:
+        if line.strip():
+            yield json.loads(line)
+
+def rescore_chunk(records, observed_field, expected_field):
+    """
+    Add the rescored fields in place to every record with numeric angles;
+    returns those records (records without usable angles are left as-is)
+    """
+    observed = np.full(len(records), np.nan)
+    expected = np.full(len(records), np.nan)
+    for i, record in enumerate(records):
+        try:
+            observed[i] = float(record[observed_field])
+            expected[i] = float(record[expected_field])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    valid = np.isfinite(observed) & np.isfinite(expected)
+    scored = comparison.compare_shadow_angles_batch(observed[valid], expected[valid])
+    signed_delta = np.round(scored['signed_delta'], 2).tolist()
+    variance = np.round(scored['variance'], 2).tolist()
+    is_fraud = scored['is_fraud'].tolist()
+    risk_level = scored['risk_level'].tolist()
+
+    valid_records = [record for record, ok in zip(records, valid) if ok]
+    for j, record in enumerate(valid_records):
+        record['previous_is_fraud'] = record.get('is_fraud')
+        record['signed_delta'] = signed_delta[j]
+        record['variance'] = variance[j]
+        record['is_fraud'] = is_fraud[j]
+        record['risk_level'] = risk_level[j]
+    return valid_records
+
+def previous_decision(value):
+    """
+    Stored is_fraud from an export (bool, or 'true'/'false' text in CSV)
+    """
+    if isinstance(value, str):
+        return {'true': True, 'false': False}.get(value.strip().lower())
+    return value
+
+def rescore_file(input_path, output_path=None, file_format=None, chunk_size=100000,
+                 observed_field='actual_shadow_angle', expected_field='expected_azimuth'):
+    """
+    Stream input_path through the comparator; returns summary counters
+    """
+    file_format = file_format or detect_format(input_path)
+    summary = Counter()
+    writer = None
+    output = open_text(output_path, 'w') if output_path else None
+    try:
+        with open_text(input_path) as handle:
+            records = read_records(handle, file_format)
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                valid = rescore_chunk(chunk, observed_field, expected_field)
+                summary['records'] += len(chunk)
+                summary['invalid'] += len(chunk) - len(valid)
+                for record in valid:
+                    summary[record['risk_level']] += 1
+                    previous = previous_decision(record.pop('previous_is_fraud'))
+                    if previous is not None and previous != record['is_fraud']:
+                        summary['fraud_to_valid' if previous else 'valid_to_fraud'] += 1
+
+                if output is None:
+                    continue
+                if file_format == 'csv':
+                    if writer is None:
+                        fields = list(chunk[0].keys()) + [f for f in RESCORED_FIELDS if f not in chunk[0]]
+                        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
+                        writer.writeheader()
+                    writer.writerows(chunk)
+                else:
+                    output.writelines(json.dumps(record) + '\n' for record in chunk)
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score exported shadow comparisons with wrap-aware deltas')
+    parser.add_argument('input', help='JSON-lines or CSV export (.gz allowed, - for stdin)')
+    parser.add_argument('--output', help='Where to write rescored records (same format)')
+    parser.add_argument('--summary-only', action='store_true', help='Only print the summary')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='Input format (default: from extension)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Records per vectorized batch')
+    parser.add_argument('--observed-field', default='actual_shadow_angle')
+    parser.add_argument('--expected-field', default='expected_azimuth')
+    args = parser.parse_args()
+
+    if not args.output and not args.summary_only:
+        parser.error('--output is required unless --summary-only is given')
+
+    start = time.time()
+    summary = rescore_file(args.input, None if args.summary_only else args.output, args.format,
+                           args.chunk_size, args.observed_field, args.expected_field)
+    elapsed = time.time() - start
+    summary['seconds'] = round(elapsed, 2)
+    summary['records_per_second'] = int(summary['records'] / elapsed) if elapsed else 0
+    print(json.dumps(dict(summary)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,120 @@
 VeriCrop FinBridge - Shadow Angle Comparator
 Compares actual shadow angle from video with expected solar azimuth
 Flags fraud if variance exceeds ±5 degrees
+Claims filmed at night or with a very low sun are not analysed at all
+Claims whose MP4 capture time or GPS contradicts the claim are flagged
+before any frame is decoded, and videos already analysed for another claim
+are recognised by perceptual hash and reuse the cached analysis
 """
 
+import importlib
 import json
+import os
 import boto3
 import math
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+solar = importlib.import_module('solar-azimuth-calculator')
+sampler = importlib.import_module('video-frame-sampler')
+frame_pool = importlib.import_module('frame-analysis-pool')
+comparison = importlib.import_module('shadow-angle-comparison')
+phash = importlib.import_module('perceptual-hash-index')
 
-rekognition = boto3.client('rekognition')
 s3 = boto3.client('s3')
 
+# Frame sampling for shadow analysis
+SHADOW_SAMPLE_MODE = os.environ.get('SHADOW_SAMPLE_MODE', 'keyframes')  # or 'fps'
+SHADOW_SAMPLE_FPS = float(os.environ.get('SHADOW_SAMPLE_FPS', '1'))
+SHADOW_MAX_FRAMES = int(os.environ.get('SHADOW_MAX_FRAMES', '60'))
+SHADOW_ANALYSIS_WIDTH = int(os.environ.get('SHADOW_ANALYSIS_WIDTH', '320'))
+# 'index': in keyframes mode read the MP4 index and range-GET only the
+# sampled keyframes; 'stream': read the file sequentially
+SHADOW_FETCH_MODE = os.environ.get('SHADOW_FETCH_MODE', 'index')
+# Read keyframes from the 480p analysis proxy written at upload time
+# (evidence-proxy-builder.py) when the video has one
+SHADOW_USE_PROXY = os.environ.get('SHADOW_USE_PROXY', 'true').lower() == 'true'
+
+# Progressive analysis: the first SHADOW_COARSE_FRAMES frames are analysed at
+# SHADOW_COARSE_WIDTH, and sampling stops once the confidence interval of the
+# measured angle lies entirely inside or outside the fraud tolerance
+SHADOW_PROGRESSIVE = os.environ.get('SHADOW_PROGRESSIVE', 'true').lower() == 'true'
+SHADOW_COARSE_WIDTH = int(os.environ.get('SHADOW_COARSE_WIDTH', '160'))
+SHADOW_COARSE_FRAMES = int(os.environ.get('SHADOW_COARSE_FRAMES', '4'))
+SHADOW_MIN_FRAMES = int(os.environ.get('SHADOW_MIN_FRAMES', '3'))
+SHADOW_CI_Z = float(os.environ.get('SHADOW_CI_Z', '1.96'))  # 95% interval
+# Per-clip bias that more frames cannot average away (synthetic-clip error)
+SHADOW_SYSTEMATIC_ERROR_DEG = float(os.environ.get('SHADOW_SYSTEMATIC_ERROR_DEG', '2'))
+
+# Parallel frame analysis: SHADOW_WORKERS > 1 analyses decoded frames on a
+# pool while decoding continues; 'process' passes frames through shared
+# memory, 'thread' is used where shared memory is unavailable (Lambda)
+SHADOW_WORKERS = int(os.environ.get('SHADOW_WORKERS', '1'))
+SHADOW_PARALLEL_BACKEND = os.environ.get('SHADOW_PARALLEL_BACKEND', 'process')
+
+# Trajectory check: per-frame shadow axes against the sun's motion over the
+# clip; a two-segment shift this many noise units (and degrees) apart means
+# footage from another time or place was spliced in
+SHADOW_TRAJECTORY_CHECK = os.environ.get('SHADOW_TRAJECTORY_CHECK', 'true').lower() == 'true'
+SHADOW_TRAJECTORY_MIN_FRAMES = int(os.environ.get('SHADOW_TRAJECTORY_MIN_FRAMES', '6'))
+SHADOW_SPLICE_SCORE = float(os.environ.get('SHADOW_SPLICE_SCORE', '6'))
+SHADOW_SPLICE_MIN_SHIFT_DEG = float(os.environ.get('SHADOW_SPLICE_MIN_SHIFT_DEG', '5'))
+
+# Recycled-evidence check: frames hashed while sampling are looked up after
+# PHASH_PROBE_FRAMES against a snapshot loaded at cold start (PHASH_INDEX_PATH,
+# see perceptual-hash-index.py) and the DynamoDB store in PHASH_INDEX_TABLE,
+# whose substring buckets are read per probe so every container's videos count
+PHASH_PROBE_FRAMES = int(os.environ.get('PHASH_PROBE_FRAMES', '3'))
+PHASH_INDEX_PATH = os.environ.get('PHASH_INDEX_PATH')
+PHASH_INDEX_TABLE = os.environ.get('PHASH_INDEX_TABLE')
+
+# Container metadata vs claim: allowed capture-time and location differences
+METADATA_TIME_TOLERANCE_MINUTES = float(os.environ.get('METADATA_TIME_TOLERANCE_MINUTES', '30'))
+METADATA_GPS_TOLERANCE_KM = float(os.environ.get('METADATA_GPS_TOLERANCE_KM', '5'))
+EARTH_RADIUS_KM = 6371.0
+
+# ±5° tolerance between measured shadow angle and expected azimuth
+FRAUD_TOLERANCE_DEG = comparison.FRAUD_TOLERANCE_DEG
+
+# Edge orientations are axial (0-180°); 5° histogram bins
+ORIENTATION_BIN_DEG = 5
+# Frames whose axis is further than this from the first estimate are outliers
+OUTLIER_AXIS_DEG = 15
+
+# Per-container counters for the sun-altitude gate: how many claims were
+# short-circuited before any S3 download or Rekognition call
+GATE_STATS = {
+    'claims': 0,
+    'NIGHT': 0,
+    'INDETERMINATE_LOW_SUN': 0,
+    'METADATA_MISMATCH': 0,
+    'DUPLICATE_EVIDENCE': 0,
+    'SPLICED': 0,
+    'analysed': 0
+}
+
+# Frame analysis pools by worker count, kept warm across invocations
+FRAME_POOLS = {}
+
+def load_hash_index():
+    """
+    In-memory perceptual hash index for this container: the snapshot if
+    configured, else empty. The DynamoDB store is never loaded; probes
+    query it directly
+    """
+    if PHASH_INDEX_PATH and os.path.exists(f'{PHASH_INDEX_PATH}.json'):
+        return phash.PerceptualHashIndex.load(PHASH_INDEX_PATH)
+    return phash.PerceptualHashIndex()
+
+HASH_STORE = phash.DynamoHashStore(boto3.resource('dynamodb').Table(PHASH_INDEX_TABLE)) if PHASH_INDEX_TABLE else None
+HASH_INDEX = load_hash_index()
+
 def lambda_handler(event, context):
     """
-    Input: S3 video location, expected azimuth angle
+    Input: S3 video location, expected azimuth angle, and optionally
+           expected_altitude or latitude/longitude/timestamp for the sun gate
     Output: Fraud risk assessment
     """
     
@@ -22,28 +124,125 @@ def lambda_handler(event, context):
         bucket = event['bucket']
         video_key = event['video_key']
         expected_azimuth = float(event['expected_azimuth'])
+
+        # Gate on sun altitude before any S3 or Rekognition work
+        GATE_STATS['claims'] += 1
+        altitude = claimed_sun_altitude(event)
+        outcome = solar.classify_shadow_conditions(altitude) if altitude is not None else None
+        if outcome:
+            GATE_STATS[outcome] += 1
+            print(json.dumps({'shadow_gate': outcome, 'video_key': video_key,
+                              'altitude': round(altitude, 2), 'gate_stats': GATE_STATS}))
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'outcome': outcome,
+                    'expected_azimuth': expected_azimuth,
+                    'sun_altitude': round(altitude, 2),
+                    'is_fraud': None,
+                    'risk_level': None,
+                    'gate_stats': GATE_STATS,
+                    'message': f'Shadow analysis skipped: sun at {altitude:.2f}° at claimed time ({outcome})'
+                })
+            }
+
+        # Cross-check the container's capture time and GPS with the claim;
+        # the moov fetched here is reused for keyframe fetching
+        moov, metadata = read_container_metadata(bucket, video_key)
+        mismatches = check_capture_metadata(metadata, event) if metadata else []
+        if mismatches:
+            GATE_STATS['METADATA_MISMATCH'] += 1
+            print(json.dumps({'shadow_gate': 'METADATA_MISMATCH', 'video_key': video_key,
+                              'mismatches': mismatches, 'gate_stats': GATE_STATS}))
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'outcome': 'METADATA_MISMATCH',
+                    'expected_azimuth': expected_azimuth,
+                    'metadata_mismatches': mismatches,
+                    'is_fraud': True,
+                    'risk_level': 'HIGH',
+                    'gate_stats': GATE_STATS,
+                    'message': 'Video metadata contradicts the claim: ' +
+                               ', '.join(m['field'] for m in mismatches)
+                })
+            }
+        GATE_STATS['analysed'] += 1
         
-        # Extract shadow angle from video (simplified for MVP)
-        # In production, this would use computer vision to detect shadows
-        actual_shadow_angle = extract_shadow_angle(bucket, video_key)
+        # Extract shadow angle from sampled video frames
+        claim_id = event.get('claim_id', event.get('claimId'))
+        check_trajectory = SHADOW_TRAJECTORY_CHECK and all(k in event for k in ('latitude', 'longitude', 'timestamp'))
+        estimate = extract_shadow_angle(
+            bucket, video_key, expected_azimuth,
+            camera_heading=float(event.get('camera_heading', 0.0)),
+            moov=moov, claim_id=claim_id, trajectory=check_trajectory
+        )
+        frame_hashes = estimate.pop('frame_hashes')
+        frame_times = estimate.pop('frame_times')
+        frame_axes = estimate.pop('frame_axes')
+        duplicate = estimate.get('duplicate_of')
+        if not duplicate:
+            register_analysed_video(video_key, frame_hashes, claim_id, estimate)
+        actual_shadow_angle = estimate['angle']
         
-        # Calculate variance
-        variance = abs(actual_shadow_angle - expected_azimuth)
+        # Calculate variance (wrap-aware: 358° vs 2° differ by 4°)
+        signed_delta = comparison.signed_angle_delta(actual_shadow_angle, expected_azimuth)
+        variance = abs(signed_delta)
         
         # Determine fraud risk
-        is_fraud = variance > 5.0  # ±5° tolerance
+        is_fraud = variance > FRAUD_TOLERANCE_DEG
         risk_level = calculate_risk_level(variance)
         
+        trajectory = None
+        if check_trajectory and not duplicate and len(frame_times) >= SHADOW_TRAJECTORY_MIN_FRAMES:
+            trajectory = check_shadow_trajectory(float(event['latitude']), float(event['longitude']),
+                                                 event['timestamp'], frame_times, frame_axes)
+        spliced = bool(trajectory and trajectory['spliced'])
+
+        if duplicate:
+            GATE_STATS['DUPLICATE_EVIDENCE'] += 1
+            is_fraud, risk_level = True, 'HIGH'
+        elif spliced:
+            GATE_STATS['SPLICED'] += 1
+            is_fraud, risk_level = True, 'HIGH'
+
+        result = {
+            'outcome': 'DUPLICATE_EVIDENCE' if duplicate else 'SPLICED' if spliced else 'FRAUD' if is_fraud else 'VALID',
+            'expected_azimuth': expected_azimuth,
+            'actual_shadow_angle': round(actual_shadow_angle, 2),
+            'confidence': estimate['confidence'],
+            'frames_analysed': estimate['frames_analysed'],
+            'frames_decoded': estimate['frames_decoded'],
+            'angle_ci_deg': estimate['ci_half_width'],
+            'early_exit': estimate['early_exit'],
+            'signed_delta': round(signed_delta, 2),
+            'variance': round(variance, 2),
+            'is_fraud': is_fraud,
+            'risk_level': risk_level,
+            'gate_stats': GATE_STATS,
+            'message': f'Shadow variance: {variance:.2f}° ({"FRAUD" if is_fraud else "VALID"})'
+        }
+        if duplicate:
+            result['duplicate_of'] = duplicate
+            result['message'] = (f"Evidence video reused from claim {duplicate['claim_id']} "
+                                 f"({duplicate['matched_frames']} matching frames)")
+        if trajectory:
+            result['trajectory'] = trajectory
+        if spliced:
+            result['message'] = (f"Shadow jumps {trajectory['splice_shift_deg']:+.1f}° at "
+                                 f"{trajectory['splice_at_s']:.1f} s: clip appears spliced")
+
+        # For flagged claims, work out when on the claimed day the measured
+        # shadow would actually have occurred (timestamp-forgery evidence)
+        if is_fraud and all(k in event for k in ('latitude', 'longitude', 'timestamp')):
+            result['consistent_capture_windows'] = find_consistent_capture_windows(
+                float(event['latitude']), float(event['longitude']),
+                event['timestamp'], actual_shadow_angle
+            )
+        
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'expected_azimuth': expected_azimuth,
-                'actual_shadow_angle': actual_shadow_angle,
-                'variance': round(variance, 2),
-                'is_fraud': is_fraud,
-                'risk_level': risk_level,
-                'message': f'Shadow variance: {variance:.2f}° ({"FRAUD" if is_fraud else "VALID"})'
-            })
+            'body': json.dumps(result)
         }
         
     except Exception as e:
@@ -55,41 +254,387 @@ def lambda_handler(event, context):
             })
         }
 
-def extract_shadow_angle(bucket, video_key):
+def extract_shadow_angle(bucket, video_key, expected_azimuth=None, camera_heading=0.0,
+                         s3_client=None, progressive=None, workers=None, moov=None, claim_id=None,
+                         trajectory=False):
     """
     Extract shadow direction from video frames
-    For MVP: Simplified simulation
-    In production: Use Rekognition + OpenCV for actual shadow detection
-    """
-    # Simulate shadow extraction for MVP
-    # In production, this would:
-    # 1. Extract frames from video
-    # 2. Detect objects and their shadows using Rekognition
-    # 3. Calculate shadow direction using edge detection
-    # 4. Return average shadow angle
-    
-    # For demo: Return a simulated angle
-    # You would replace this with actual computer vision logic
-    import random
-    return random.uniform(170, 190)  # Simulated shadow angle
+    Fetches the video from S3 with ranged GETs (only the index and sampled
+    keyframes for MP4s, see open_sampled_frames), decodes only sampled frames,
+    estimates each frame's dominant shadow-edge axis from a gradient
+    orientation histogram and combines them with a robust circular mean
+    In progressive mode (needs expected_azimuth) the first frames are
+    analysed at low resolution and sampling stops as soon as the angle's
+    confidence interval settles the ±5° decision either way
+    With workers > 1 frames are analysed on a pool while decoding continues
+    An already fetched moov atom can be passed in to skip re-reading it
+    Frames are perceptually hashed as they are sampled; if the first
+    PHASH_PROBE_FRAMES match a video analysed for another claim, sampling
+    stops and that video's cached analysis is returned with 'duplicate_of'
+    With trajectory=True a settled VALID decision does not end sampling: the
+    rest of the clip is analysed at the coarse width for the per-frame
+    trajectory only (a splice later in the clip would otherwise be missed)
+    Output: {'angle', 'confidence', 'ci_half_width', 'frames_analysed',
+    'frames_decoded', 'early_exit', 'frame_hashes', 'frame_times',
+    'frame_axes'}; angle is a compass bearing comparable with the expected
+    solar azimuth, frame_axes are per-frame shadow axes in the compass frame
+    """
+    if progressive is None:
+        progressive = SHADOW_PROGRESSIVE
+    progressive = progressive and expected_azimuth is not None
+
+    frames = open_sampled_frames(s3_client or s3, bucket, video_key, moov)
+    decoded = [0]
+    frame_hashes = []
+    frame_times = []
+    settled = None
+
+    def gray_frames():
+        for timestamp, frame in frames:
+            coarse = progressive and (decoded[0] < SHADOW_COARSE_FRAMES or settled is not None)
+            decoded[0] += 1
+            frame_times.append(timestamp)
+            gray = sampler.to_gray(frame, SHADOW_COARSE_WIDTH if coarse else SHADOW_ANALYSIS_WIDTH)
+            frame_hashes.append(phash.phash64(gray))
+            yield gray
+
+    pool = get_frame_pool(SHADOW_WORKERS if workers is None else workers)
+    frame_results = pool.map_frames(gray_frames()) if pool else map(estimate_frame_shadow_axis, gray_frames())
+
+    axes = []
+    strengths = []
+    axis_times = []
+    early_exit = False
+    duplicate = None
+    duplicate_checked = len(HASH_INDEX) == 0 and HASH_STORE is None
+    for frame_number, (axis, strength) in enumerate(frame_results):
+        if not duplicate_checked and len(frame_hashes) >= PHASH_PROBE_FRAMES:
+            duplicate_checked = True
+            duplicate = find_recycled_video(frame_hashes, video_key, claim_id)
+            if duplicate:
+                break
+
+        if strength > 0:
+            axes.append(axis)
+            strengths.append(strength)
+            axis_times.append(frame_times[frame_number])
+
+        if progressive and settled is None and len(axes) >= SHADOW_MIN_FRAMES:
+            estimate = summarize_shadow_axes(axes, strengths, expected_azimuth, camera_heading)
+            if tolerance_decided(estimate['angle'], estimate['ci_half_width'], expected_azimuth):
+                settled = estimate
+                delta = abs(comparison.signed_angle_delta(estimate['angle'], expected_azimuth))
+                if not trajectory or delta > FRAUD_TOLERANCE_DEG:
+                    early_exit = True
+                    break
+    if pool:
+        frame_results.close()
+    frames_decoded = decoded[0]
+
+    if not duplicate_checked:
+        duplicate = find_recycled_video(frame_hashes, video_key, claim_id)
+    if duplicate:
+        return dict(duplicate.pop('analysis'), frames_decoded=frames_decoded, early_exit=True,
+                    frame_hashes=frame_hashes, frame_times=[], frame_axes=[], duplicate_of=duplicate)
+
+    if not axes:
+        raise ValueError(f'No measurable shadow edges in {video_key}')
+
+    estimate = settled or summarize_shadow_axes(axes, strengths, expected_azimuth, camera_heading)
+    estimate.update({'frames_decoded': frames_decoded, 'early_exit': early_exit, 'frame_hashes': frame_hashes,
+                     'frame_times': axis_times, 'frame_axes': [(a + camera_heading) % 180 for a in axes]})
+    return estimate
+
+def find_recycled_video(frame_hashes, video_key, claim_id=None):
+    """
+    Previously analysed video (other upload, other claim) whose frames match
+    these hashes, or None; the snapshot is checked first, then the store
+    """
+    start = time.perf_counter()
+    duplicate = None
+    if len(HASH_INDEX):
+        duplicate = HASH_INDEX.find_duplicate(frame_hashes, exclude_video_key=video_key, exclude_claim_id=claim_id)
+    if duplicate is None and HASH_STORE:
+        duplicate = HASH_STORE.find_duplicate(frame_hashes, exclude_video_key=video_key, exclude_claim_id=claim_id)
+    if duplicate:
+        print(json.dumps({'duplicate_evidence': video_key, 'original': duplicate['video_key'],
+                          'lookup_ms': round((time.perf_counter() - start) * 1000, 3)}))
+    return duplicate
+
+def register_analysed_video(video_key, frame_hashes, claim_id, estimate):
+    """
+    Add a freshly analysed video to the DynamoDB store (or, without one, to
+    this container's index) with the analysis a later duplicate would reuse
+    """
+    analysis = {k: estimate[k] for k in ('angle', 'confidence', 'ci_half_width', 'frames_analysed')}
+    if HASH_STORE:
+        HASH_STORE.put_video(video_key, frame_hashes, claim_id=claim_id, analysis=analysis)
+    else:
+        HASH_INDEX.add_video(video_key, frame_hashes, claim_id=claim_id, analysis=analysis)
+
+def open_sampled_frames(s3_client, bucket, video_key, moov=None):
+    """
+    Iterator of (timestamp, frame) for the configured sampling; keyframes come
+    from the analysis proxy, or from ranged GETs planned on the MP4 index
+    when the container allows it
+    """
+    if SHADOW_SAMPLE_MODE == 'keyframes' and SHADOW_FETCH_MODE == 'index':
+        return sampler.iter_evidence_keyframes(s3_client, bucket, video_key, SHADOW_MAX_FRAMES,
+                                               moov=moov, use_proxy=SHADOW_USE_PROXY)
+    reader = sampler.S3RangeReader(s3_client, bucket, video_key)
+    return sampler.iter_sampled_frames(reader, mode=SHADOW_SAMPLE_MODE, fps=SHADOW_SAMPLE_FPS,
+                                       max_frames=SHADOW_MAX_FRAMES)
+
+def get_frame_pool(workers):
+    """
+    Shared frame analysis pool for `workers` (None for serial analysis)
+    Falls back to threads when the process backend cannot start
+    """
+    if workers <= 1:
+        return None
+    pool = FRAME_POOLS.get(workers)
+    if pool is None:
+        try:
+            pool = frame_pool.FrameAnalysisPool(estimate_frame_shadow_axis, workers, SHADOW_PARALLEL_BACKEND)
+        except OSError as e:
+            print(f'Process frame pool unavailable ({e}); using threads')
+            pool = frame_pool.FrameAnalysisPool(estimate_frame_shadow_axis, workers, 'thread')
+        FRAME_POOLS[workers] = pool
+    return pool
+
+def summarize_shadow_axes(axes, strengths, expected_azimuth=None, camera_heading=0.0):
+    """
+    Combine per-frame axes into a bearing with confidence and a CI half-width
+    """
+    axis, confidence, half_width = robust_axial_mean(np.array(axes), np.array(strengths))
+    return {
+        'angle': resolve_shadow_bearing((axis + camera_heading) % 180, expected_azimuth),
+        'confidence': round(float(confidence), 3),
+        'ci_half_width': round(half_width + SHADOW_SYSTEMATIC_ERROR_DEG, 2),
+        'frames_analysed': len(axes)
+    }
+
+def tolerance_decided(angle, ci_half_width, expected_azimuth):
+    """
+    True when the whole interval angle ± ci_half_width is on one side of the
+    fraud tolerance, i.e. more frames could not change the outcome
+    """
+    delta = abs(comparison.signed_angle_delta(angle, expected_azimuth))
+    return delta + ci_half_width <= FRAUD_TOLERANCE_DEG or delta - ci_half_width > FRAUD_TOLERANCE_DEG
+
+def estimate_frame_shadow_axis(gray):
+    """
+    Dominant shadow-edge axis of one grayscale frame, in degrees clockwise
+    from image up (0-180), and the share of shadow-edge energy behind it
+    Only strong edges bordering the darkest pixels (shadows) are counted
+    """
+    image = gray.astype(np.float32)
+    # 3×3 box blur to suppress sensor noise before differentiating
+    padded = np.pad(image, 1, mode='edge')
+    image = sum(padded[dy:dy + image.shape[0], dx:dx + image.shape[1]]
+                for dy in range(3) for dx in range(3)) / 9
+
+    gy, gx = np.gradient(image)
+    magnitude = np.hypot(gx, gy)
+
+    # Strong edges next to a dark pixel (3×3 neighbourhood minimum)
+    padded = np.pad(image, 1, mode='edge')
+    local_min = np.minimum.reduce([padded[dy:dy + image.shape[0], dx:dx + image.shape[1]]
+                                   for dy in range(3) for dx in range(3)])
+    shadow_edges = ((magnitude > np.percentile(magnitude, 90)) &
+                    (local_min < np.percentile(image, 15)))
+    if not shadow_edges.any():
+        return 0.0, 0.0
+
+    # Edges run perpendicular to the gradient; image y grows downwards
+    weights = magnitude[shadow_edges]
+    edge_axis = (np.degrees(np.arctan2(gx[shadow_edges], -gy[shadow_edges])) + 90) % 180
+
+    bins = 180 // ORIENTATION_BIN_DEG
+    histogram, _ = np.histogram(edge_axis, bins=bins, range=(0, 180), weights=weights)
+    smoothed = histogram + 0.5 * (np.roll(histogram, 1) + np.roll(histogram, -1))
+    peak = (np.argmax(smoothed) + 0.5) * ORIENTATION_BIN_DEG
+
+    # Refine the peak with the weighted mean offset of the edges around it
+    offset = (edge_axis - peak + 90) % 180 - 90
+    near = np.abs(offset) <= 1.5 * ORIENTATION_BIN_DEG
+    axis = (peak + np.average(offset[near], weights=weights[near])) % 180
+
+    # Share of edge energy in the peak window, rescaled so that a uniform
+    # (directionless) histogram scores 0
+    uniform_share = 3 * ORIENTATION_BIN_DEG / 180
+    share = weights[near].sum() / weights.sum()
+    return float(axis), float(max(0.0, (share - uniform_share) / (1 - uniform_share)))
+
+def robust_axial_mean(axes, weights):
+    """
+    Weighted circular mean of axial angles (0-180°) with one outlier-rejection
+    pass; returns (axis, confidence in 0-1, CI half-width in degrees)
+    """
+    def axial_mean(mask):
+        doubled = np.radians(axes[mask] * 2)
+        c = np.sum(weights[mask] * np.cos(doubled))
+        s = np.sum(weights[mask] * np.sin(doubled))
+        resultant = math.hypot(c, s) / np.sum(weights[mask])
+        return math.degrees(math.atan2(s, c)) / 2 % 180, resultant
+
+    everything = np.ones(axes.shape, dtype=bool)
+    axis, _ = axial_mean(everything)
+    inliers = np.abs((axes - axis + 90) % 180 - 90) <= OUTLIER_AXIS_DEG
+    if not inliers.any():
+        inliers = everything
+    axis, resultant = axial_mean(inliers)
+
+    # Agreement between frames × share of inlier frames × mean frame strength
+    confidence = resultant * inliers.mean() * float(np.mean(weights[inliers]))
+    return axis, confidence, axial_confidence_half_width(axes[inliers], weights[inliers], axis, resultant)
+
+def axial_confidence_half_width(axes, weights, axis, resultant):
+    """
+    Half-width (degrees) of the SHADOW_CI_Z confidence interval of an axial
+    mean, from the circular standard error (Fisher 1993) on doubled angles
+    with the weights' effective sample size; 90 when undetermined
+    """
+    n_effective = weights.sum() ** 2 / np.sum(weights ** 2)
+    if n_effective < 2 or resultant <= 0:
+        return 90.0
+    rho2 = np.average(np.cos(np.radians(4 * (axes - axis))), weights=weights)
+    standard_error = math.sqrt(max(0.0, 1 - rho2) / (2 * resultant ** 2) / n_effective)
+    if SHADOW_CI_Z * standard_error >= 1:
+        return 90.0
+    return math.degrees(math.asin(SHADOW_CI_Z * standard_error)) / 2
+
+def resolve_shadow_bearing(axis, expected_azimuth=None):
+    """
+    Turn a shadow axis (0-180°) into a bearing comparable with the solar azimuth
+    A shadow edge gives the line through the sun's azimuth, not which end of it
+    the sun is on: pick the end closest to the expected azimuth, or without one
+    the southern half of the sky (the sun's side for Indian latitudes)
+    """
+    if expected_azimuth is None:
+        return axis if axis >= 90 else axis + 180
+    return min((axis, axis + 180), key=lambda c: abs((c - expected_azimuth + 180) % 360 - 180))
+
+def check_shadow_trajectory(latitude, longitude, timestamp, frame_times, frame_axes):
+    """
+    Per-frame expected azimuths (claimed start time + frame timestamp, one
+    batch ephemeris call) against the measured per-frame shadow axes
+    Output: comparison.shadow_trajectory scores plus expected_motion_deg and
+    'spliced'
+    """
+    claimed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    epochs = solar.datetime_to_epoch(claimed) + np.asarray(frame_times, dtype=np.float64)
+    expected, _ = solar.calculate_solar_azimuth_batch(
+        np.full(len(epochs), latitude), np.full(len(epochs), longitude), epochs
+    )
+    scores = comparison.shadow_trajectory(frame_times, frame_axes, expected)
+    scores['expected_motion_deg'] = round(float(comparison.signed_angle_delta(expected[-1], expected[0])), 3)
+    scores['spliced'] = (scores['splice_score'] > SHADOW_SPLICE_SCORE and
+                         abs(scores['splice_shift_deg']) > SHADOW_SPLICE_MIN_SHIFT_DEG)
+    return scores
+
+def claimed_sun_altitude(event):
+    """
+    Sun altitude at the claimed capture time: taken from the solar step's
+    expected_altitude if present, else computed from latitude/longitude/timestamp
+    None when the event carries neither
+    """
+    if 'expected_altitude' in event:
+        return float(event['expected_altitude'])
+    if all(k in event for k in ('latitude', 'longitude', 'timestamp')):
+        claimed = datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00'))
+        _, altitude = solar.calculate_solar_position(
+            float(event['latitude']), float(event['longitude']), solar.datetime_to_epoch(claimed)
+        )
+        return altitude
+    return None
+
+def read_container_metadata(bucket, video_key, s3_client=None):
+    """
+    Fetch the MP4 moov atom and parse its capture metadata
+    Output: (moov, metadata) or (None, None) when the video is not an indexable MP4
+    """
+    try:
+        moov, _ = sampler.mp4.read_moov(s3_client or s3, bucket, video_key)
+    except sampler.mp4.Mp4IndexError as e:
+        print(f'No container metadata for {video_key} ({e})')
+        return None, None
+    return moov, sampler.mp4.parse_capture_metadata(moov)
+
+def check_capture_metadata(metadata, event):
+    """
+    Compare the container's capture time and GPS with the claimed
+    timestamp/latitude/longitude; fields missing on either side are skipped
+    Output: list of {'field', 'claimed', 'recorded', 'difference'} mismatches
+    """
+    mismatches = []
+    if event.get('timestamp'):
+        claimed_dt = datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00'))
+        claimed = solar.datetime_to_epoch(claimed_dt)
+        recorded = metadata['capture_time']
+        if recorded is not None:
+            minutes = abs(recorded - claimed) / 60
+        elif metadata['creation_time'] is not None:
+            recorded = metadata['creation_time']
+            # mvhd should be UTC, but some Android encoders write IST wall time
+            minutes = min(abs(recorded - claimed),
+                          abs(recorded - solar.IST_UTC_OFFSET_MINUTES * 60 - claimed)) / 60
+        if recorded is not None and minutes > METADATA_TIME_TOLERANCE_MINUTES:
+            mismatches.append({
+                'field': 'capture_time',
+                'claimed': event['timestamp'],
+                'recorded': solar.epoch_to_iso(recorded),
+                'difference': f'{minutes:.1f} min'
+            })
+
+    if metadata['latitude'] is not None and 'latitude' in event and 'longitude' in event:
+        claimed = (float(event['latitude']), float(event['longitude']))
+        recorded = (metadata['latitude'], metadata['longitude'])
+        distance = haversine_km(*claimed, *recorded)
+        if distance > METADATA_GPS_TOLERANCE_KM:
+            mismatches.append({
+                'field': 'location',
+                'claimed': list(claimed),
+                'recorded': [round(recorded[0], 5), round(recorded[1], 5)],
+                'difference': f'{distance:.1f} km'
+            })
+    return mismatches
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def find_consistent_capture_windows(latitude, longitude, timestamp, actual_shadow_angle):
+    """
+    Capture-time windows on the claimed (IST) date that match the measured shadow
+    """
+    claimed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if claimed.tzinfo is None:
+        claimed = claimed.replace(tzinfo=timezone.utc)
+    local_date = (claimed.astimezone(timezone.utc) +
+                  timedelta(minutes=solar.IST_UTC_OFFSET_MINUTES)).date()
+    return solar.find_capture_windows(latitude, longitude, actual_shadow_angle, local_date)
 
 def calculate_risk_level(variance):
     """
     Calculate fraud risk level based on variance
     """
-    if variance <= 5:
-        return "LOW"
-    elif variance <= 15:
-        return "MEDIUM"
-    else:
-        return "HIGH"
+    return comparison.risk_level(variance)
 
 # Test locally
 if __name__ == "__main__":
     test_event = {
         'bucket': 'vericrop-evidence-123456',
         'video_key': 'test-video.mp4',
-        'expected_azimuth': 180.0
+        'expected_azimuth': 180.0,
+        'latitude': 19.0760,
+        'longitude': 72.8777,
+        'timestamp': '2026-03-01T06:30:00Z'
     }
     result = lambda_handler(test_event, None)
     print(json.dumps(result, indent=2))
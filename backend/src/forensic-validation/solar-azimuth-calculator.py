@@ -2,18 +2,31 @@
 VeriCrop FinBridge - Solar Azimuth Calculator
 Calculates expected shadow angle using physics formula to detect fraud
 Formula: sin α = sin Φ sin δ + cos Φ cos δ cos h
+Declination (δ) and equation of time come from the NOAA solar position
+algorithm, precomputed per day of the year at import
 """
 
 import json
 import math
+import os
+from collections import OrderedDict
 from datetime import datetime, timezone
 
+import numpy as np
+
 def lambda_handler(event, context):
     """
     Input: GPS coordinates (lat, lon), timestamp, timezone
-    Output: Expected solar azimuth angle in degrees
+           or 'observations': [{latitude, longitude, timestamp}, ...] for a batch
+           or observed_azimuth + date for the inverse (capture-time) search
+    Output: Expected solar azimuth angle in degrees (per observation for a batch)
     """
     
+    if 'observations' in event:
+        return handle_observations(event['observations'])
+    if 'observed_azimuth' in event:
+        return handle_capture_windows(event)
+
     try:
         # Extract input from event
         latitude = float(event['latitude'])  # Φ (phi) in degrees
@@ -23,8 +36,32 @@ def lambda_handler(event, context):
         # Parse timestamp
         dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
         
-        # Calculate solar azimuth
-        azimuth = calculate_solar_azimuth(latitude, longitude, dt)
+        # Calculate solar azimuth from the precomputed grid when it covers the
+        # location and the sun is far enough from the zenith (or nadir) for
+        # its interpolated azimuth, otherwise directly (cached per quantized
+        # location/time cell when SOLAR_CACHE_ENABLED)
+        epoch_seconds = datetime_to_epoch(dt)
+        geometry = None
+        if SOLAR_GEOMETRY_GRID is not None and SOLAR_GEOMETRY_GRID.covers(latitude, longitude):
+            azimuth, altitude = SOLAR_GEOMETRY_GRID.get_position(latitude, longitude, epoch_seconds)
+            if abs(altitude) <= GRID_MAX_ALTITUDE_DEG:
+                sunrise, solar_noon, sunset = calculate_sun_times(latitude, longitude, epoch_seconds)
+                geometry = {
+                    'azimuth': azimuth,
+                    'altitude': altitude,
+                    'shadow_length_ratio': shadow_length_ratio(altitude),
+                    'sunrise': sunrise,
+                    'solar_noon': solar_noon,
+                    'sunset': sunset
+                }
+                source = 'grid'
+        if geometry is None and SOLAR_POSITION_CACHE is not None:
+            geometry = SOLAR_POSITION_CACHE.get_geometry(latitude, longitude, epoch_seconds)
+            source = 'cached'
+        elif geometry is None:
+            geometry = calculate_solar_geometry(latitude, longitude, epoch_seconds)
+            source = 'calculated'
+        azimuth = round(geometry['azimuth'], 2)
         
         return {
             'statusCode': 200,
@@ -33,6 +70,9 @@ def lambda_handler(event, context):
                 'latitude': latitude,
                 'longitude': longitude,
                 'timestamp': timestamp,
+                **format_geometry_extras(geometry),
+                'source': source,
+                'cache': SOLAR_POSITION_CACHE.stats() if SOLAR_POSITION_CACHE is not None else None,
                 'message': f'Expected shadow angle: {azimuth:.2f}°'
             })
         }
@@ -46,54 +86,823 @@ def lambda_handler(event, context):
             })
         }
 
+def handle_observations(observations):
+    """
+    Batch mode: validate every observation, then compute all valid ones in a
+    single vectorized call. Invalid items get a per-item error instead of
+    failing the whole request.
+    """
+    if not isinstance(observations, list):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': 'observations must be a list',
+                'message': 'Failed to calculate solar azimuth'
+            })
+        }
+
+    results = [None] * len(observations)
+    valid_indices = []
+    latitudes = []
+    longitudes = []
+    epoch_seconds = []
+
+    for index, observation in enumerate(observations):
+        try:
+            latitude, longitude, dt = parse_observation(observation)
+        except Exception as e:
+            results[index] = {'index': index, 'error': str(e)}
+            continue
+        valid_indices.append(index)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        epoch_seconds.append(dt.timestamp())
+
+    if valid_indices:
+        geometry = calculate_solar_geometry_batch(latitudes, longitudes, epoch_seconds)
+        azimuths = np.round(geometry['azimuth'], 2).tolist()
+        extras = format_geometry_extras_batch(geometry)
+        for position, index in enumerate(valid_indices):
+            results[index] = {
+                'index': index,
+                'azimuth': azimuths[position],
+                'latitude': latitudes[position],
+                'longitude': longitudes[position],
+                'timestamp': observations[index]['timestamp'],
+                **extras[position]
+            }
+
+    error_count = len(observations) - len(valid_indices)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'results': results,
+            'count': len(observations),
+            'error_count': error_count,
+            'message': f'Calculated {len(valid_indices)} of {len(observations)} observations'
+        })
+    }
+
+def format_geometry_extras(geometry):
+    """
+    Response fields derived from the fused geometry: altitude, shadow ratio,
+    sun times as ISO 8601 UTC, and whether the sun was up at all
+    """
+    ratio = geometry['shadow_length_ratio']
+    has_ratio = ratio is not None and not math.isnan(ratio)
+    return {
+        'altitude': round(geometry['altitude'], 2),
+        'sun_above_horizon': geometry['altitude'] > 0,
+        'shadow_gate': classify_shadow_conditions(geometry['altitude']),
+        'shadow_length_ratio': round(ratio, 3) if has_ratio else None,
+        'sunrise': optional_epoch_to_iso(geometry['sunrise']),
+        'solar_noon': optional_epoch_to_iso(geometry['solar_noon']),
+        'sunset': optional_epoch_to_iso(geometry['sunset'])
+    }
+
+def format_geometry_extras_batch(geometry):
+    """
+    Vectorized format_geometry_extras, one dict per observation
+    """
+    ratio = np.round(geometry['shadow_length_ratio'], 3)
+    columns = {
+        'altitude': np.round(geometry['altitude'], 2).tolist(),
+        'sun_above_horizon': (geometry['altitude'] > 0).tolist(),
+        'shadow_gate': np.select(
+            [geometry['altitude'] <= 0, geometry['altitude'] < MIN_SHADOW_ALTITUDE_DEG],
+            ['NIGHT', 'INDETERMINATE_LOW_SUN'], ''
+        ).tolist(),
+        'shadow_length_ratio': np.where(np.isnan(ratio), None, ratio).tolist(),
+        'sunrise': epochs_to_iso(geometry['sunrise']),
+        'solar_noon': epochs_to_iso(geometry['solar_noon']),
+        'sunset': epochs_to_iso(geometry['sunset'])
+    }
+    columns['shadow_gate'] = [gate or None for gate in columns['shadow_gate']]
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def epochs_to_iso(epoch_seconds):
+    """
+    ISO 8601 UTC strings for an array of epoch seconds, None for NaN
+    """
+    missing = np.isnan(epoch_seconds)
+    seconds = np.where(missing, 0, np.round(epoch_seconds)).astype('int64').astype('datetime64[s]')
+    strings = np.char.add(np.datetime_as_string(seconds, unit='s'), 'Z')
+    return np.where(missing, None, strings).tolist()
+
+def optional_epoch_to_iso(epoch_seconds):
+    if epoch_seconds is None or math.isnan(epoch_seconds):
+        return None
+    return epoch_to_iso(epoch_seconds)
+
+def parse_observation(observation):
+    """
+    Validate one batch observation and return (latitude, longitude, UTC datetime)
+    """
+    latitude = float(observation['latitude'])
+    longitude = float(observation['longitude'])
+    if not -90 <= latitude <= 90:
+        raise ValueError(f'latitude out of range: {latitude}')
+    if not -180 <= longitude <= 180:
+        raise ValueError(f'longitude out of range: {longitude}')
+
+    dt = datetime.fromisoformat(observation['timestamp'].replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    return latitude, longitude, dt
+
+# ========================================
+# NOAA solar position, tabulated per day
+# ========================================
+#
+# Declination and equation of time follow the NOAA solar calculator (Meeus,
+# "Astronomical Algorithms"). They change by at most ~0.4° and ~30 s per day,
+# so they are evaluated once at import for every day of the year and linearly
+# interpolated per call. The table is indexed by position in the tropical year
+# rather than the calendar day so that the leap-year cycle does not shift it.
+
+TROPICAL_YEAR_DAYS = 365.2422
+EPHEMERIS_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+J2000_JULIAN_DAY = 2451545.0
+
+def noaa_sun_terms(julian_day):
+    """
+    Solar declination (degrees) and equation of time (minutes) for a Julian day
+    Accepts a scalar or a NumPy array
+    """
+    t = (np.asarray(julian_day, dtype=np.float64) - J2000_JULIAN_DAY) / 36525
+
+    mean_longitude = np.radians((280.46646 + t * (36000.76983 + t * 0.0003032)) % 360)
+    mean_anomaly = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    equation_of_center = (np.sin(mean_anomaly) * (1.914602 - t * (0.004817 + 0.000014 * t)) +
+                          np.sin(2 * mean_anomaly) * (0.019993 - 0.000101 * t) +
+                          np.sin(3 * mean_anomaly) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_longitude = np.radians(np.degrees(mean_longitude) + equation_of_center -
+                                    0.00569 - 0.00478 * np.sin(omega))
+
+    mean_obliquity = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+
+    declination_deg = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(apparent_longitude)))
+
+    y = np.tan(obliquity / 2) ** 2
+    equation_of_time_min = 4 * np.degrees(
+        y * np.sin(2 * mean_longitude) -
+        2 * eccentricity * np.sin(mean_anomaly) +
+        4 * eccentricity * y * np.sin(mean_anomaly) * np.cos(2 * mean_longitude) -
+        0.5 * y * y * np.sin(4 * mean_longitude) -
+        1.25 * eccentricity * eccentricity * np.sin(2 * mean_anomaly)
+    )
+
+    return declination_deg, equation_of_time_min
+
+def build_ephemeris_table():
+    """
+    366 rows of (declination°, equation of time min, sin δ, cos δ), one per day
+    of the tropical year starting at EPHEMERIS_EPOCH
+    """
+    julian_days = UNIX_EPOCH_JULIAN_DAY + EPHEMERIS_EPOCH / 86400 + np.arange(366)
+    declination_deg, equation_of_time_min = noaa_sun_terms(julian_days)
+    declination_rad = np.radians(declination_deg)
+    return np.column_stack([
+        declination_deg,
+        equation_of_time_min,
+        np.sin(declination_rad),
+        np.cos(declination_rad)
+    ])
+
+EPHEMERIS_TABLE = build_ephemeris_table()
+_EPHEMERIS_ROWS = EPHEMERIS_TABLE.tolist()
+
+def ephemeris_day(epoch_seconds):
+    """
+    Table row, next row and interpolation fraction for one instant
+    """
+    position = ((epoch_seconds - EPHEMERIS_EPOCH) / 86400) % TROPICAL_YEAR_DAYS
+    day = int(position)
+    if day >= 365:
+        # The last row covers the 0.2422-day remainder of the tropical year
+        return 365, 0, (position - 365) / (TROPICAL_YEAR_DAYS - 365)
+    return day, day + 1, position - day
+
+def lookup_ephemeris(epoch_seconds):
+    """
+    Interpolated (declination°, equation of time min, sin δ, cos δ) for one instant
+    """
+    day, next_day, fraction = ephemeris_day(epoch_seconds)
+    row = _EPHEMERIS_ROWS[day]
+    next_row = _EPHEMERIS_ROWS[next_day]
+    return tuple(a + (b - a) * fraction for a, b in zip(row, next_row))
+
+def ephemeris_day_batch(epoch_seconds):
+    """
+    Table row, next row and interpolation fraction for each instant
+    """
+    position = ((np.asarray(epoch_seconds, dtype=np.float64) - EPHEMERIS_EPOCH) / 86400) % TROPICAL_YEAR_DAYS
+    day = np.minimum(position.astype(np.int64), 365)
+    last = day == 365
+    next_day = np.where(last, 0, day + 1)
+    fraction = np.where(last, (position - 365) / (TROPICAL_YEAR_DAYS - 365), position - day)
+    return day, next_day, fraction
+
+def lookup_ephemeris_batch(epoch_seconds):
+    """
+    Vectorized lookup_ephemeris, returns a (N, 4) array
+    """
+    day, next_day, fraction = ephemeris_day_batch(epoch_seconds)
+    row = EPHEMERIS_TABLE[day]
+    return row + (EPHEMERIS_TABLE[next_day] - row) * fraction[:, None]
+
+def atmospheric_refraction(altitude_deg):
+    """
+    NOAA refraction correction in degrees for a geometric altitude (scalar)
+    """
+    if altitude_deg > 85:
+        return 0.0
+    if altitude_deg > 5:
+        tan_alt = math.tan(math.radians(altitude_deg))
+        return (58.1 / tan_alt - 0.07 / tan_alt ** 3 + 0.000086 / tan_alt ** 5) / 3600
+    if altitude_deg > -0.575:
+        a = altitude_deg
+        return (1735 + a * (-518.2 + a * (103.4 + a * (-12.79 + a * 0.711)))) / 3600
+    return -20.772 / math.tan(math.radians(altitude_deg)) / 3600
+
+def atmospheric_refraction_batch(altitude_deg):
+    """
+    Vectorized atmospheric_refraction
+    """
+    a = np.asarray(altitude_deg, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        inv_tan = 1 / np.tan(np.radians(a))
+        inv_tan_sq = inv_tan * inv_tan
+        refraction = np.where(
+            a > 85, 0.0,
+            np.where(
+                a > 5, inv_tan * (58.1 - inv_tan_sq * (0.07 - 0.000086 * inv_tan_sq)),
+                np.where(
+                    a > -0.575, 1735 + a * (-518.2 + a * (103.4 + a * (-12.79 + a * 0.711))),
+                    -20.772 * inv_tan
+                )
+            )
+        )
+    return refraction / 3600
+
+def datetime_to_epoch(dt):
+    """
+    UTC epoch seconds for a datetime; naive datetimes are treated as UTC
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
 def calculate_solar_azimuth(latitude, longitude, dt):
     """
     Calculate solar azimuth using astronomical formulas
     """
-    # Convert latitude to radians
-    lat_rad = math.radians(latitude)
+    azimuth_deg, _ = calculate_solar_position(latitude, longitude, datetime_to_epoch(dt))
+    return round(azimuth_deg, 2)
 
-    
-    # Calculate day of year
-    day_of_year = dt.timetuple().tm_yday
-    
-    # Calculate solar declination (δ) using Cooper's equation
-    # δ = 23.45° × sin(360/365 × (284 + n))
-    declination_deg = 23.45 * math.sin(math.radians((360/365) * (day_of_year + 284)))
-    declination_rad = math.radians(declination_deg)
-    
-    # Calculate hour angle (h)
-    # h = 15° × (solar_time - 12)
-    # Solar time = UTC time + (longitude / 15)
-    utc_hour = dt.hour + dt.minute/60 + dt.second/3600
-    solar_time = utc_hour + (longitude / 15)
-    hour_angle_deg = 15 * (solar_time - 12)
+# Sun centre at -0.833° (refraction plus solar radius) marks sunrise/sunset
+SUNRISE_ALTITUDE_DEG = -0.833
+_SIN_SUNRISE_ALTITUDE = math.sin(math.radians(SUNRISE_ALTITUDE_DEG))
+
+def _solar_terms(latitude, longitude, epoch_seconds):
+    """
+    Shared intermediates for one observation: hour angle, latitude and
+    declination trig, azimuth and geometric altitude
+    """
+    _, equation_of_time, sin_dec, cos_dec = lookup_ephemeris(epoch_seconds)
+
+    # Hour angle (h) from true solar time:
+    # true solar time (min) = UTC minutes + equation of time + 4 × longitude
+    # h = true solar time / 4 - 180°
+    utc_minutes = (epoch_seconds % 86400) / 60
+    true_solar_minutes = utc_minutes + equation_of_time + 4 * longitude
+    hour_angle_deg = (true_solar_minutes / 4) % 360 - 180
     hour_angle_rad = math.radians(hour_angle_deg)
-    
-    # Calculate solar altitude (α) using the formula:
+
+    lat_rad = math.radians(latitude)
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+
     # sin(α) = sin(Φ) × sin(δ) + cos(Φ) × cos(δ) × cos(h)
-    sin_altitude = (math.sin(lat_rad) * math.sin(declination_rad) + 
-                    math.cos(lat_rad) * math.cos(declination_rad) * math.cos(hour_angle_rad))
-    
+    sin_altitude = sin_lat * sin_dec + cos_lat * cos_dec * math.cos(hour_angle_rad)
+    sin_altitude = max(-1, min(1, sin_altitude))
     altitude_rad = math.asin(sin_altitude)
-    altitude_deg = math.degrees(altitude_rad)
-    
-    # Calculate solar azimuth
+
     # cos(azimuth) = (sin(δ) - sin(α) × sin(Φ)) / (cos(α) × cos(Φ))
-    cos_azimuth = ((math.sin(declination_rad) - sin_altitude * math.sin(lat_rad)) / 
-                   (math.cos(altitude_rad) * math.cos(lat_rad)))
-    
+    denominator = math.cos(altitude_rad) * cos_lat
+    cos_azimuth = (sin_dec - sin_altitude * sin_lat) / denominator if denominator else 1.0
+
     # Clamp to [-1, 1] to avoid math domain errors
     cos_azimuth = max(-1, min(1, cos_azimuth))
-    
-    azimuth_rad = math.acos(cos_azimuth)
-    azimuth_deg = math.degrees(azimuth_rad)
-    
+    azimuth_deg = math.degrees(math.acos(cos_azimuth))
+
     # Adjust azimuth based on hour angle (morning vs afternoon)
     if hour_angle_deg > 0:  # Afternoon
         azimuth_deg = 360 - azimuth_deg
-    
-    return round(azimuth_deg, 2)
+
+    return hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec, azimuth_deg, math.degrees(altitude_rad)
+
+def _sun_times(epoch_seconds, hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec):
+    """
+    (sunrise, solar noon, sunset) epoch seconds of the solar day containing the
+    observation; sunrise/sunset are None when the sun never crosses the horizon
+    """
+    # The hour angle is 4 minutes (240 s) of time per degree
+    solar_noon = epoch_seconds - hour_angle_deg * 240
+    denominator = cos_lat * cos_dec
+    if not denominator:
+        return None, solar_noon, None
+    # cos(h0) = (sin(-0.833°) - sin(Φ) × sin(δ)) / (cos(Φ) × cos(δ))
+    cos_h0 = (_SIN_SUNRISE_ALTITUDE - sin_lat * sin_dec) / denominator
+    if not -1 <= cos_h0 <= 1:
+        return None, solar_noon, None
+    half_day = math.degrees(math.acos(cos_h0)) * 240
+    return solar_noon - half_day, solar_noon, solar_noon + half_day
+
+# Below this altitude shadows are too long and faint for their direction to
+# be measured reliably, so shadow analysis is skipped
+MIN_SHADOW_ALTITUDE_DEG = float(os.environ.get('MIN_SHADOW_ALTITUDE_DEG', '10'))
+
+def classify_shadow_conditions(altitude_deg):
+    """
+    'NIGHT' or 'INDETERMINATE_LOW_SUN' when shadow geometry cannot be used
+    at this sun altitude, None when it can
+    """
+    if altitude_deg <= 0:
+        return 'NIGHT'
+    if altitude_deg < MIN_SHADOW_ALTITUDE_DEG:
+        return 'INDETERMINATE_LOW_SUN'
+    return None
+
+def shadow_length_ratio(altitude_deg):
+    """
+    Expected shadow length per unit object height, cot(altitude); None at night
+    """
+    if altitude_deg <= 0:
+        return None
+    return 1 / math.tan(math.radians(altitude_deg))
+
+def calculate_solar_position(latitude, longitude, epoch_seconds):
+    """
+    Solar azimuth (degrees clockwise from north) and apparent altitude
+    (degrees, refraction corrected) for one observation
+    """
+    terms = _solar_terms(latitude, longitude, epoch_seconds)
+    altitude_deg = terms[6]
+    return terms[5], altitude_deg + atmospheric_refraction(altitude_deg)
+
+def calculate_solar_geometry(latitude, longitude, epoch_seconds):
+    """
+    Fused solar geometry for one observation: azimuth, apparent altitude,
+    shadow-length-to-height ratio and sunrise/solar noon/sunset (UTC epoch
+    seconds), all from one set of trig intermediates
+    """
+    hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec, azimuth_deg, altitude_deg = _solar_terms(
+        latitude, longitude, epoch_seconds
+    )
+    altitude_deg += atmospheric_refraction(altitude_deg)
+    sunrise, solar_noon, sunset = _sun_times(epoch_seconds, hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec)
+    return {
+        'azimuth': azimuth_deg,
+        'altitude': altitude_deg,
+        'shadow_length_ratio': shadow_length_ratio(altitude_deg),
+        'sunrise': sunrise,
+        'solar_noon': solar_noon,
+        'sunset': sunset
+    }
+
+def calculate_sun_times(latitude, longitude, epoch_seconds):
+    """
+    (sunrise, solar noon, sunset) for the solar day containing the observation
+    """
+    hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec, _, _ = _solar_terms(latitude, longitude, epoch_seconds)
+    return _sun_times(epoch_seconds, hour_angle_deg, sin_lat, cos_lat, sin_dec, cos_dec)
+
+def calculate_solar_azimuth_batch(latitudes, longitudes, epoch_seconds):
+    """
+    Vectorized solar azimuth and altitude for many observations at once
+    Same model as calculate_solar_position, evaluated with NumPy in one pass
+    Input: array-likes of latitude, longitude (degrees) and UTC epoch seconds
+    Output: (azimuth_deg, altitude_deg) float64 arrays, unrounded
+    """
+    epoch = np.asarray(epoch_seconds, dtype=np.float64)
+    ephemeris = lookup_ephemeris_batch(epoch)
+    return solar_geometry_batch(
+        latitudes, longitudes, (epoch % 86400) / 60,
+        ephemeris[:, 1], ephemeris[:, 2], ephemeris[:, 3]
+    )
+
+def calculate_solar_geometry_batch(latitudes, longitudes, epoch_seconds):
+    """
+    Vectorized calculate_solar_geometry: dict of float64 arrays, with NaN for
+    the shadow ratio at night and for sunrise/sunset when there is none
+    """
+    epoch = np.asarray(epoch_seconds, dtype=np.float64)
+    ephemeris = lookup_ephemeris_batch(epoch)
+    return solar_geometry_batch(
+        latitudes, longitudes, (epoch % 86400) / 60,
+        ephemeris[:, 1], ephemeris[:, 2], ephemeris[:, 3],
+        extended_epoch=epoch
+    )
+
+def solar_geometry_batch(latitudes, longitudes, utc_minutes, equation_of_time, sin_dec, cos_dec,
+                         extended_epoch=None):
+    """
+    Azimuth and apparent altitude from already looked-up ephemeris terms
+    All inputs broadcast against each other. With extended_epoch, returns the
+    fused geometry dict of calculate_solar_geometry_batch instead
+    """
+    lat_rad = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitude = np.asarray(longitudes, dtype=np.float64)
+
+    # Hour angle from true solar time, as in the scalar path
+    true_solar_minutes = utc_minutes + equation_of_time + 4 * longitude
+    hour_angle_deg = (true_solar_minutes / 4) % 360 - 180
+
+    sin_lat = np.sin(lat_rad)
+    cos_lat = np.cos(lat_rad)
+
+    # sin(α) = sin(Φ) × sin(δ) + cos(Φ) × cos(δ) × cos(h)
+    sin_altitude = sin_lat * sin_dec + cos_lat * cos_dec * np.cos(np.radians(hour_angle_deg))
+    sin_altitude = np.clip(sin_altitude, -1, 1)
+    altitude_rad = np.arcsin(sin_altitude)
+
+    # cos(azimuth) = (sin(δ) - sin(α) × sin(Φ)) / (cos(α) × cos(Φ))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_azimuth = (sin_dec - sin_altitude * sin_lat) / (np.cos(altitude_rad) * cos_lat)
+    cos_azimuth = np.clip(np.nan_to_num(cos_azimuth, nan=1.0), -1, 1)
+
+    azimuth_deg = np.degrees(np.arccos(cos_azimuth))
+
+    # Afternoon (positive hour angle) mirrors the azimuth, as in the scalar path
+    azimuth_deg = np.where(hour_angle_deg > 0, 360 - azimuth_deg, azimuth_deg)
+
+    altitude_deg = np.degrees(altitude_rad)
+    altitude_deg = altitude_deg + atmospheric_refraction_batch(altitude_deg)
+    if extended_epoch is None:
+        return azimuth_deg, altitude_deg
+
+    # Solar noon from the hour angle (240 s per degree), sunrise/sunset from
+    # cos(h0) = (sin(-0.833°) - sin(Φ) × sin(δ)) / (cos(Φ) × cos(δ))
+    solar_noon = extended_epoch - hour_angle_deg * 240
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_h0 = (_SIN_SUNRISE_ALTITUDE - sin_lat * sin_dec) / (cos_lat * cos_dec)
+        half_day = np.degrees(np.arccos(np.where(np.abs(cos_h0) <= 1, cos_h0, np.nan))) * 240
+        ratio = np.where(altitude_deg > 0, 1 / np.tan(np.radians(altitude_deg)), np.nan)
+    return {
+        'azimuth': azimuth_deg,
+        'altitude': altitude_deg,
+        'shadow_length_ratio': ratio,
+        'sunrise': solar_noon - half_day,
+        'solar_noon': solar_noon,
+        'sunset': solar_noon + half_day
+    }
+
+# ========================================
+# Quantized position cache
+# ========================================
+#
+# Claims cluster in space and time (one village, one afternoon), so single
+# lookups can go through an LRU cache keyed on the quantized (lat, lon,
+# minute-of-day, day-of-year) cell; a hit returns the position computed at
+# the cell centre. With the default steps (0.01° ≈ 1 km, 1 minute) the added
+# error stays below 1° azimuth (p99 0.3°) and 0.15° altitude for a sun 5°-80°
+# above the horizon, see solar-position-cache-benchmark.py. Near the zenith
+# the azimuth itself is ill-conditioned and the error grows like
+# 1/cos(altitude).
+#
+# The cache is off unless SOLAR_CACHE_ENABLED=true: since the ephemeris table
+# a direct calculation takes about as long as a cache hit (~10 µs), so the
+# cache buys no latency and would only add its error to the expected angle.
+
+class SolarPositionCache:
+    """
+    Bounded LRU cache of fused solar geometry per quantized observation cell
+    """
+
+    def __init__(self, max_size=50000, latlon_step=0.01, minute_step=1.0):
+        self.max_size = max_size
+        self.latlon_step = latlon_step
+        self.minute_step = minute_step
+        self.step_seconds = minute_step * 60
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_position(self, latitude, longitude, epoch_seconds):
+        """
+        (azimuth, altitude) for the cell containing the observation
+        """
+        geometry = self.get_geometry(latitude, longitude, epoch_seconds)
+        return geometry['azimuth'], geometry['altitude']
+
+    def get_geometry(self, latitude, longitude, epoch_seconds):
+        """
+        calculate_solar_geometry result for the cell containing the observation
+        """
+        # The time cell counts minute steps since the epoch, which is the
+        # (day-of-year, minute-of-day) cell with the year folded in
+        lat_cell = round(latitude / self.latlon_step)
+        lon_cell = round(longitude / self.latlon_step)
+        time_cell = round(epoch_seconds / self.step_seconds)
+        key = (lat_cell, lon_cell, time_cell)
+
+        geometry = self.entries.get(key)
+        if geometry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return geometry
+
+        self.misses += 1
+        geometry = calculate_solar_geometry(
+            lat_cell * self.latlon_step, lon_cell * self.latlon_step, time_cell * self.step_seconds
+        )
+        self.entries[key] = geometry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return geometry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+SOLAR_CACHE_ENABLED = os.environ.get('SOLAR_CACHE_ENABLED', 'false').lower() == 'true'
+SOLAR_POSITION_CACHE = SolarPositionCache(
+    max_size=int(os.environ.get('SOLAR_CACHE_MAX_SIZE', '50000')),
+    latlon_step=float(os.environ.get('SOLAR_CACHE_LATLON_STEP', '0.01')),
+    minute_step=float(os.environ.get('SOLAR_CACHE_MINUTE_STEP', '1'))
+) if SOLAR_CACHE_ENABLED else None
+
+# ========================================
+# Precomputed solar geometry grid
+# ========================================
+#
+# An offline-built grid (solar-geometry-grid-builder.py) of azimuth and
+# altitude per ephemeris day, UTC time slot and lat/lon grid point, stored as
+# a raw .npy array plus a .json sidecar. The handler memory-maps it at cold
+# start: only the pages a lookup touches are read, and warm containers on the
+# same host share them through the page cache. A lookup interpolates 16 grid
+# values (2 days × 2 slots × 2×2 points).
+#
+# Layout: uint16[day(366), slot(24h / slot_minutes + 1), lat, lon, 2]
+#   [..., 0] = azimuth × GRID_SCALE
+#   [..., 1] = (altitude + 90) × GRID_SCALE
+#
+# Interpolated altitude stays accurate everywhere, but azimuth swings fast
+# near the zenith (and the nadir) and interpolating it there is off by more
+# than the ±5° fraud tolerance beyond ~80°. Lookups with the sun further
+# than GRID_MAX_ALTITUDE_DEG above or below the horizon are calculated
+# directly instead, see solar-geometry-grid-benchmark.py.
+
+GRID_FORMAT_VERSION = 1
+GRID_SCALE = 100
+GRID_MAX_ALTITUDE_DEG = float(os.environ.get('SOLAR_GRID_MAX_ALTITUDE_DEG', '60'))
+
+class SolarGeometryGrid:
+    """
+    Read-only, memory-mapped view of a solar geometry grid file
+    """
+
+    def __init__(self, path):
+        with open(grid_metadata_path(path)) as f:
+            self.metadata = json.load(f)
+        if self.metadata['format_version'] != GRID_FORMAT_VERSION:
+            raise ValueError(f"Unsupported grid format version {self.metadata['format_version']}")
+        if self.metadata['ephemeris_epoch'] != EPHEMERIS_EPOCH:
+            raise ValueError('Grid was built against a different ephemeris table')
+
+        self.values = np.load(path, mmap_mode='r')
+        self.lat_min = self.metadata['lat_min']
+        self.lon_min = self.metadata['lon_min']
+        self.step = self.metadata['step']
+        self.slot_minutes = self.metadata['slot_minutes']
+        _, _, self.n_lat, self.n_lon, _ = self.values.shape
+        self.lat_max = self.lat_min + (self.n_lat - 1) * self.step
+        self.lon_max = self.lon_min + (self.n_lon - 1) * self.step
+
+    def covers(self, latitude, longitude):
+        return (self.lat_min <= latitude <= self.lat_max and
+                self.lon_min <= longitude <= self.lon_max)
+
+    def get_position(self, latitude, longitude, epoch_seconds):
+        """
+        Interpolated (azimuth, altitude) for one observation inside the grid
+        """
+        lat_position = (latitude - self.lat_min) / self.step
+        lon_position = (longitude - self.lon_min) / self.step
+        i = min(int(lat_position), self.n_lat - 2)
+        j = min(int(lon_position), self.n_lon - 2)
+        lat_weight = lat_position - i
+        lon_weight = lon_position - j
+
+        day, next_day, day_weight = ephemeris_day(epoch_seconds)
+        slot_position = (epoch_seconds % 86400) / 60 / self.slot_minutes
+        slot = int(slot_position)
+        slot_weight = slot_position - slot
+
+        # One basic slice per day reads its 2×2×2 neighbourhood in one go
+        azimuth_offset = 0.0
+        altitude = 0.0
+        reference = None
+        for day_index, w_day in ((day, 1 - day_weight), (next_day, day_weight)):
+            block = self.values[day_index, slot:slot + 2, i:i + 2, j:j + 2].tolist()
+            for slot_values, w_slot in zip(block, (1 - slot_weight, slot_weight)):
+                for lat_values, w_lat in zip(slot_values, (1 - lat_weight, lat_weight)):
+                    for (azimuth_raw, altitude_raw), w_lon in zip(lat_values, (1 - lon_weight, lon_weight)):
+                        weight = w_day * w_slot * w_lat * w_lon
+                        corner_azimuth = azimuth_raw / GRID_SCALE
+                        if reference is None:
+                            reference = corner_azimuth
+                        azimuth_offset += weight * ((corner_azimuth - reference + 180) % 360 - 180)
+                        altitude += weight * altitude_raw / GRID_SCALE
+
+        return (reference + azimuth_offset) % 360, altitude - 90
+
+    def get_positions(self, latitudes, longitudes, epoch_seconds):
+        """
+        Vectorized lookup; every point must satisfy covers()
+        """
+        lat_index, lat_weight = self._axis(latitudes, self.lat_min, self.n_lat)
+        lon_index, lon_weight = self._axis(longitudes, self.lon_min, self.n_lon)
+
+        epoch = np.asarray(epoch_seconds, dtype=np.float64)
+        day, next_day, day_weight = ephemeris_day_batch(epoch)
+        slot_position = (epoch % 86400) / 60 / self.slot_minutes
+        slot = slot_position.astype(np.int64)
+        slot_weight = slot_position - slot
+
+        azimuth_sum = np.zeros(epoch.shape)
+        altitude_sum = np.zeros(epoch.shape)
+        reference = None
+        for day_index, w_day in ((day, 1 - day_weight), (next_day, day_weight)):
+            for slot_index, w_slot in ((slot, 1 - slot_weight), (slot + 1, slot_weight)):
+                for i, w_lat in ((lat_index, 1 - lat_weight), (lat_index + 1, lat_weight)):
+                    for j, w_lon in ((lon_index, 1 - lon_weight), (lon_index + 1, lon_weight)):
+                        corner = self.values[day_index, slot_index, i, j].astype(np.float64) / GRID_SCALE
+                        weight = w_day * w_slot * w_lat * w_lon
+                        if reference is None:
+                            reference = corner[:, 0]
+                        # Azimuth is interpolated as a signed offset from the
+                        # first corner so that 359° and 1° average to 0°
+                        offset = (corner[:, 0] - reference + 180) % 360 - 180
+                        azimuth_sum += weight * offset
+                        altitude_sum += weight * corner[:, 1]
+
+        return (reference + azimuth_sum) % 360, altitude_sum - 90
+
+    def _axis(self, coordinates, origin, count):
+        position = (np.asarray(coordinates, dtype=np.float64) - origin) / self.step
+        index = np.clip(position.astype(np.int64), 0, count - 2)
+        return index, position - index
+
+def grid_metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def open_solar_grid(path):
+    """
+    Open the grid configured for this container, or None if there is none
+    """
+    if not path:
+        return None
+    try:
+        return SolarGeometryGrid(path)
+    except Exception as e:
+        print(f"Solar geometry grid {path} unavailable, using direct calculation: {e}")
+        return None
+
+SOLAR_GEOMETRY_GRID = open_solar_grid(os.environ.get('SOLAR_GRID_PATH'))
+
+# ========================================
+# Inverse solver: capture-time windows
+# ========================================
+#
+# Given a location and a measured shadow angle, find every time window on a
+# date where the sun's azimuth is within tolerance of it. The day is swept in
+# one vectorized call and the window edges are then refined together by
+# vectorized bisection.
+
+IST_UTC_OFFSET_MINUTES = 330
+
+def find_capture_windows(latitude, longitude, observed_azimuth, date, tolerance=5.0,
+                         min_altitude=0.0, utc_offset_minutes=IST_UTC_OFFSET_MINUTES,
+                         step_seconds=60, resolution_seconds=1):
+    """
+    Time windows on a local date where the sun is at least min_altitude high
+    and its azimuth is within ±tolerance of observed_azimuth
+    Output: list of {start, end, duration_seconds, closest_time, closest_delta}
+    """
+    day_start = (datetime(date.year, date.month, date.day, tzinfo=timezone.utc).timestamp() -
+                 utc_offset_minutes * 60)
+    times = day_start + np.arange(0, 86400 + step_seconds, step_seconds, dtype=np.float64)
+    times[-1] = min(times[-1], day_start + 86400)
+
+    def margins(epochs):
+        # ≥ 0 inside a window: within tolerance and above min_altitude
+        azimuth, altitude = calculate_solar_azimuth_batch(
+            np.full(epochs.shape, latitude), np.full(epochs.shape, longitude), epochs
+        )
+        delta = (azimuth - observed_azimuth + 180) % 360 - 180
+        return np.minimum(tolerance - np.abs(delta), altitude - min_altitude), delta
+
+    margin, delta = margins(times)
+    inside = margin >= 0
+
+    # Bisect every inside/outside transition of the sweep at once
+    edges = np.flatnonzero(inside[1:] != inside[:-1])
+    low = times[edges]
+    high = times[edges + 1]
+    low_inside = inside[edges]
+    while edges.size and (high - low).max() > resolution_seconds:
+        middle = (low + high) / 2
+        middle_inside = margins(middle)[0] >= 0
+        same_as_low = middle_inside == low_inside
+        low = np.where(same_as_low, middle, low)
+        high = np.where(same_as_low, high, middle)
+
+    # Rising edges start a window at their first inside instant, falling
+    # edges end one at their last inside instant
+    starts = list(high[~low_inside])
+    ends = list(low[low_inside])
+    if inside[0]:
+        starts.insert(0, times[0])
+    if inside[-1]:
+        ends.append(times[-1])
+
+    windows = []
+    for start, end in zip(starts, ends):
+        in_window = (times >= start) & (times <= end)
+        if in_window.any():
+            best = np.flatnonzero(in_window)[np.argmin(np.abs(delta[in_window]))]
+            closest_time, closest_delta = times[best], delta[best]
+        else:
+            closest_time = (start + end) / 2
+            closest_delta = float(margins(np.array([closest_time]))[1][0])
+        windows.append({
+            'start': epoch_to_iso(start),
+            'end': epoch_to_iso(end),
+            'duration_seconds': round(float(end - start)),
+            'closest_time': epoch_to_iso(closest_time),
+            'closest_delta': round(float(closest_delta), 2)
+        })
+    return windows
+
+def epoch_to_iso(epoch_seconds):
+    return datetime.fromtimestamp(round(float(epoch_seconds)), tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def handle_capture_windows(event):
+    """
+    Inverse mode: latitude, longitude, observed_azimuth, date (YYYY-MM-DD),
+    optional tolerance / min_altitude / utc_offset_minutes
+    """
+    try:
+        latitude = float(event['latitude'])
+        longitude = float(event['longitude'])
+        observed_azimuth = float(event['observed_azimuth'])
+        date = datetime.fromisoformat(event['date']).date()
+        tolerance = float(event.get('tolerance', 5.0))
+
+        windows = find_capture_windows(
+            latitude, longitude, observed_azimuth, date,
+            tolerance=tolerance,
+            min_altitude=float(event.get('min_altitude', 0.0)),
+            utc_offset_minutes=int(event.get('utc_offset_minutes', IST_UTC_OFFSET_MINUTES))
+        )
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'windows': windows,
+                'latitude': latitude,
+                'longitude': longitude,
+                'observed_azimuth': observed_azimuth,
+                'date': event['date'],
+                'tolerance': tolerance,
+                'message': f'{len(windows)} capture window(s) consistent with a {observed_azimuth:.2f}° shadow'
+            })
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e),
+                'message': 'Failed to find capture windows'
+            })
+        }
 
 # Test locally
 if __name__ == "__main__":
@@ -105,3 +914,24 @@ if __name__ == "__main__":
     }
     result = lambda_handler(test_event, None)
     print(json.dumps(result, indent=2))
+
+    # Test case: three video frames in one batch call, one with a bad timestamp
+    batch_event = {
+        'observations': [
+            {'latitude': 19.0760, 'longitude': 72.8777, 'timestamp': '2026-03-01T06:30:00Z'},
+            {'latitude': 19.0760, 'longitude': 72.8777, 'timestamp': '2026-03-01T06:30:02Z'},
+            {'latitude': 19.0760, 'longitude': 72.8777, 'timestamp': 'not-a-time'}
+        ]
+    }
+    result = lambda_handler(batch_event, None)
+    print(json.dumps(result, indent=2))
+
+    # Test case: when could a 250° shadow have been filmed in Mumbai on 1 March?
+    inverse_event = {
+        'latitude': 19.0760,
+        'longitude': 72.8777,
+        'observed_azimuth': 250.0,
+        'date': '2026-03-01'
+    }
+    result = lambda_handler(inverse_event, None)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,109 @@
+"""
+VeriCrop FinBridge - Solar Geometry Grid Builder
+Offline builder for the memory-mapped azimuth/altitude grid read by
+solar-azimuth-calculator.py (see SolarGeometryGrid there for the file format)
+
+Usage:
+    python solar-geometry-grid-builder.py --state odisha --output-dir ./grids
+    python solar-geometry-grid-builder.py --name pune --bbox 18.0 19.0 73.5 74.5
+"""
+
+import argparse
+import importlib
+import json
+import os
+import time
+
+import numpy as np
+
+solar = importlib.import_module('solar-azimuth-calculator')
+
+# Approximate bounding boxes (lat_min, lat_max, lon_min, lon_max) of the
+# states with the highest claim volume
+STATE_BOUNDING_BOXES = {
+    'andhra-pradesh': (12.6, 19.9, 76.7, 84.8),
+    'maharashtra': (15.6, 22.1, 72.6, 80.9),
+    'odisha': (17.8, 22.6, 81.3, 87.5),
+    'punjab': (29.5, 32.5, 73.8, 77.0),
+    'uttar-pradesh': (23.8, 30.4, 77.0, 84.7),
+}
+
+def build_grid(output_path, lat_min, lat_max, lon_min, lon_max, step=0.1, slot_minutes=5):
+    """
+    Write the grid and its metadata sidecar, one ephemeris day at a time so
+    memory stays at one day's worth of values
+    """
+    if (24 * 60) % slot_minutes:
+        raise ValueError('slot_minutes must divide a day')
+
+    n_lat = int(round((lat_max - lat_min) / step)) + 1
+    n_lon = int(round((lon_max - lon_min) / step)) + 1
+    n_slots = 24 * 60 // slot_minutes + 1
+    n_days = len(solar.EPHEMERIS_TABLE)
+
+    values = np.lib.format.open_memmap(
+        output_path, mode='w+', dtype=np.uint16, shape=(n_days, n_slots, n_lat, n_lon, 2)
+    )
+
+    latitudes = (lat_min + np.arange(n_lat) * step)[None, :, None]
+    longitudes = (lon_min + np.arange(n_lon) * step)[None, None, :]
+    utc_minutes = (np.arange(n_slots) * slot_minutes)[:, None, None]
+
+    for day, (_, equation_of_time, sin_dec, cos_dec) in enumerate(solar.EPHEMERIS_TABLE):
+        azimuth, altitude = solar.solar_geometry_batch(
+            latitudes, longitudes, utc_minutes, equation_of_time, sin_dec, cos_dec
+        )
+        values[day, ..., 0] = np.rint(azimuth * solar.GRID_SCALE) % (360 * solar.GRID_SCALE)
+        values[day, ..., 1] = np.rint((altitude + 90) * solar.GRID_SCALE)
+
+    values.flush()
+    del values
+
+    metadata = {
+        'format_version': solar.GRID_FORMAT_VERSION,
+        'lat_min': lat_min,
+        'lon_min': lon_min,
+        'step': step,
+        'n_lat': n_lat,
+        'n_lon': n_lon,
+        'slot_minutes': slot_minutes,
+        'n_slots': n_slots,
+        'n_days': n_days,
+        'ephemeris_epoch': solar.EPHEMERIS_EPOCH,
+        'scale': solar.GRID_SCALE,
+        'layout': 'uint16[day, slot, lat, lon, (azimuth*scale, (altitude+90)*scale)]'
+    }
+    with open(solar.grid_metadata_path(output_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a memory-mapped solar geometry grid')
+    parser.add_argument('--state', choices=sorted(STATE_BOUNDING_BOXES), help='Predefined state bounding box')
+    parser.add_argument('--name', help='Grid name when using --bbox')
+    parser.add_argument('--bbox', type=float, nargs=4, metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'))
+    parser.add_argument('--step', type=float, default=0.1, help='Grid spacing in degrees (default: 0.1)')
+    parser.add_argument('--slot-minutes', type=int, default=5, help='Time resolution (default: 5)')
+    parser.add_argument('--output-dir', default='.', help='Where to write <name>.npy and <name>.json')
+    args = parser.parse_args()
+
+    if args.state:
+        name, bbox = args.state, STATE_BOUNDING_BOXES[args.state]
+    elif args.name and args.bbox:
+        name, bbox = args.name, args.bbox
+    else:
+        parser.error('either --state or both --name and --bbox are required')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f'{name}.npy')
+
+    start = time.time()
+    metadata = build_grid(output_path, *bbox, step=args.step, slot_minutes=args.slot_minutes)
+    size_mb = os.path.getsize(output_path) / 1e6
+    print(f"Built {output_path}: {metadata['n_lat']}x{metadata['n_lon']} points, "
+          f"{metadata['n_slots']} slots x {metadata['n_days']} days, "
+          f"{size_mb:,.1f} MB in {time.time() - start:.1f} s")
+
+if __name__ == '__main__':
+    main()
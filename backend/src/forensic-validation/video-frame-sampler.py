@@ -0,0 +1,241 @@
+"""
+VeriCrop FinBridge - Video Frame Sampler
+Streams evidence videos from S3 and decodes only the sampled frames
+(keyframes or N frames per second), downscaled to grayscale for analysis
+Memory stays bounded by the read-ahead cache and one decoded frame
+For MP4s, keyframes can instead be fetched by byte range from the container
+index so the rest of the file is never downloaded, and videos with an
+analysis proxy (evidence-proxy-builder.py) are read from the proxy instead
+"""
+
+import importlib
+import io
+import json
+from collections import OrderedDict
+from fractions import Fraction
+
+import av
+from botocore.exceptions import ClientError
+
+mp4 = importlib.import_module('mp4-index-reader')
+
+# Read-ahead cache: 8 blocks of 1 MiB per open video
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_MAX_BLOCKS = 8
+
+# Analysis proxy written next to each original: <key>.proxy.mp4 (keyframes,
+# all-intra, source timestamps) and <key>.proxy.json (frame-timestamp index)
+PROXY_SUFFIX = '.proxy.mp4'
+PROXY_INDEX_SUFFIX = '.proxy.json'
+PROXY_FORMAT_VERSION = 1
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over an S3 object using ranged GETs
+    Fetched blocks are kept in a small LRU cache so the decoder's seeks
+    between the index and the media data do not re-download anything
+    """
+
+    def __init__(self, s3_client, bucket, key, block_size=DEFAULT_BLOCK_SIZE,
+                 max_blocks=DEFAULT_MAX_BLOCKS, size=None):
+        super().__init__()
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.size = size if size is not None else s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.position = 0
+        self.blocks = OrderedDict()
+        self.bytes_fetched = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        self.position = max(0, self.position)
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b''
+
+        chunks = []
+        while size > 0:
+            index, offset = divmod(self.position, self.block_size)
+            block = self._block(index)
+            chunk = block[offset:offset + size]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _block(self, index):
+        block = self.blocks.get(index)
+        if block is not None:
+            self.blocks.move_to_end(index)
+            return block
+
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')
+        block = response['Body'].read()
+        self.requests += 1
+        self.bytes_fetched += len(block)
+
+        self.blocks[index] = block
+        if len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+        return block
+
+def iter_sampled_frames(fileobj, mode='keyframes', fps=1.0, max_frames=60):
+    """
+    Yield (timestamp_seconds, av.VideoFrame) for the sampled frames
+    mode='keyframes' decodes keyframes only; mode='fps' keeps `fps` frames per
+    second of video (every frame still has to be decoded in that mode)
+    Stopping the iteration early stops decoding and further S3 reads
+    """
+    with av.open(fileobj, mode='r') as container:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        if mode == 'keyframes':
+            stream.codec_context.skip_frame = 'NONKEY'
+
+        next_sample_time = 0.0
+        yielded = 0
+        for frame in container.decode(stream):
+            timestamp = float(frame.time) if frame.time is not None else 0.0
+            if mode == 'fps':
+                if timestamp + 1e-6 < next_sample_time:
+                    continue
+                next_sample_time = timestamp + 1.0 / fps
+
+            yield timestamp, frame
+            yielded += 1
+            if yielded >= max_frames:
+                break
+
+def iter_indexed_keyframes(s3_client, bucket, key, max_frames=60, stats=None, moov=None):
+    """
+    Yield (timestamp_seconds, av.VideoFrame) for up to max_frames keyframes
+    spread over the video, fetching only the moov atom and the keyframes'
+    byte ranges; the compressed samples go straight to the decoder
+    A moov atom already fetched (e.g. for the metadata checks) is reused
+    Raises mp4.Mp4IndexError before anything is yielded if the object
+    cannot be indexed, so callers can fall back to iter_sampled_frames
+    """
+    if moov is None:
+        moov, index_stats = mp4.read_moov(s3_client, bucket, key)
+    else:
+        index_stats = {'requests': 0, 'bytes_fetched': 0}
+    index = mp4.parse_moov(moov)
+    if stats is not None:
+        stats.update(index_stats)
+    else:
+        stats = index_stats
+    samples = index.select_keyframes(max_frames)
+    return _decode_samples(s3_client, bucket, key, index, samples, stats)
+
+def iter_evidence_keyframes(s3_client, bucket, key, max_frames=60, moov=None, use_proxy=True):
+    """
+    Yield (timestamp_seconds, av.VideoFrame) for up to max_frames keyframes
+    spread over an evidence video: from its analysis proxy when there is
+    one, else by byte range from the original's MP4 index, else by streaming
+    the original (first max_frames keyframes)
+    """
+    if use_proxy:
+        proxy = read_proxy_index(s3_client, bucket, key)
+        if proxy:
+            return iter_indexed_keyframes(s3_client, bucket, proxy['proxy_key'], max_frames)
+    try:
+        return iter_indexed_keyframes(s3_client, bucket, key, max_frames, moov=moov)
+    except mp4.Mp4IndexError as e:
+        print(f'Index fetch unavailable for {key} ({e}); streaming instead')
+    reader = S3RangeReader(s3_client, bucket, key)
+    return iter_sampled_frames(reader, mode='keyframes', max_frames=max_frames)
+
+def _decode_samples(s3_client, bucket, key, index, samples, stats):
+    codec = av.CodecContext.create(index.codec, 'r')
+    codec.extradata = index.extradata
+    for sample, data in mp4.iter_sample_data(s3_client, bucket, key, index, samples, stats):
+        # Each keyframe decodes on its own: drain, then reset the decoder
+        frames = codec.decode(av.Packet(data)) + codec.decode(None)
+        codec.flush_buffers()
+        for frame in frames:
+            yield float(index.dts[sample]) / index.timescale, frame
+
+def to_gray(frame, width=320):
+    """
+    Downscale a decoded frame to `width` pixels (aspect kept) as a uint8 array
+    """
+    return frame.reformat(width=width, height=_scaled_height(frame, width), format='gray').to_ndarray()
+
+def to_jpeg(frame, width=1024, qscale=4):
+    """
+    JPEG bytes of a decoded frame scaled down to `width` (never up);
+    qscale is the MJPEG quantizer, 2 (best) to 31
+    """
+    width = min(width, frame.width) // 2 * 2
+    height = _scaled_height(frame, width)
+    codec = av.CodecContext.create('mjpeg', 'w')
+    codec.width, codec.height, codec.pix_fmt = width, height, 'yuvj420p'
+    codec.time_base = Fraction(1, 25)
+    codec.qmin = codec.qmax = qscale
+    packets = codec.encode(frame.reformat(width=width, height=height, format='yuvj420p')) + codec.encode(None)
+    return b''.join(bytes(packet) for packet in packets)
+
+def sample_frames(fileobj, mode='keyframes', fps=1.0, max_frames=60, width=320):
+    """
+    Yield (timestamp_seconds, grayscale uint8 array) for the sampled frames
+    """
+    for timestamp, frame in iter_sampled_frames(fileobj, mode, fps, max_frames):
+        yield timestamp, to_gray(frame, width)
+
+def read_proxy_index(s3_client, bucket, key):
+    """
+    Frame-timestamp index of the video's analysis proxy, or None when the
+    video has none (yet). The index is written after the proxy, so a proxy
+    is complete whenever its index exists; originals are write-once
+    (Object Lock), so a proxy never goes stale
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key + PROXY_INDEX_SUFFIX)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    index = json.loads(response['Body'].read())
+    if index.get('format_version') != PROXY_FORMAT_VERSION:
+        return None
+    return index
+
+def _scaled_height(frame, width):
+    """
+    Even output height that keeps the frame's aspect ratio at `width`
+    """
+    return max(2, int(round(frame.height * width / frame.width / 2)) * 2)
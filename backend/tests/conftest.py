@@ -0,0 +1,15 @@
+"""
+VeriCrop FinBridge - Backend Unit Tests
+Shared setup: the tests load the Lambda modules and the in-memory AWS
+stand-ins the way the benchmark scripts do (benchmark-utils, local-aws)
+
+Usage:
+    python -m pytest backend/tests -q
+"""
+
+import sys
+from pathlib import Path
+
+BENCHMARKS = str(Path(__file__).resolve().parent.parent / 'benchmarks')
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
@@ -0,0 +1,178 @@
+"""
+bridge-loan-calculator.py: conditional bulk writes (write_loan_chunk) and
+the budgets the batch handler gives back for loans it did not store
+"""
+
+import importlib
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+budgets = utils.load_lambda_module('financial-automation', 'disbursement-budget')
+
+TABLE = 'vericrop-claims'
+DISTRICT = 'Nashik'
+BUDGET_ID = f'DISTRICT#{DISTRICT}'
+# 70% of a ₹1,000 damage amount
+LOAN_AMOUNT = 700
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = local_aws.LocalDynamoDB()
+    monkeypatch.setattr(calculator, 'table', db.Table(TABLE))
+    monkeypatch.setattr(budgets, 'table', db.Table(TABLE))
+    # No queue and the mock gateway: approvals pay inline
+    monkeypatch.setattr(calculator, 'DISBURSEMENT_QUEUE_URL', '')
+    monkeypatch.setattr(calculator.gateway, 'CLIENT', None)
+    monkeypatch.setattr(calculator, 'BATCH_RETRY_BASE_SECONDS', 0)
+    calculator.RECENT_LOANS.clear()
+    budgets.BUDGET_CACHE.clear()
+    return db
+
+
+def certificates(count, prefix='CERT'):
+    return [{'certificate_id': f'{prefix}-{i:04d}', 'damage_amount': 1000, 'farmer_id': f'FARMER-{i:04d}',
+             'farmer_upi': f'farmer{i}@upi', 'district': DISTRICT} for i in range(count)]
+
+
+def stored_loans(db):
+    return {key: item for key, item in db.items(TABLE).items() if item.get('type') == 'LOAN'}
+
+
+def spent():
+    return float(budgets.budget_summary(BUDGET_ID, max_age=0)['spent'])
+
+
+def fail_loan_writes(db, error_code, write_first=False):
+    """
+    Make TransactWriteItems of loan puts raise error_code; with write_first
+    the first one is applied before it raises (the response was lost)
+    """
+    transact = db.meta.client.transact_write_items
+    calls = []
+
+    def failing(**kwargs):
+        first_item = kwargs['TransactItems'][0].get('Put', {}).get('Item', {})
+        if first_item.get('type') != 'LOAN':
+            return transact(**kwargs)
+        calls.append(len(kwargs['TransactItems']))
+        if write_first and len(calls) == 1:
+            transact(**kwargs)
+        raise ClientError({'Error': {'Code': error_code, 'Message': error_code}}, 'TransactWriteItems')
+
+    db.meta.client.transact_write_items = failing
+    return calls
+
+
+def test_write_loan_chunk_stores_new_loans_and_names_existing_ones(db):
+    loans = [calculator.build_loan(certificate) for certificate in certificates(20)]
+    originals = [dict(loan, approved_at='2025-01-01T00:00:00') for loan in loans[:8]]
+    assert calculator.write_loan_chunk(originals) == ([], [])
+
+    unwritten, existing = calculator.write_loan_chunk(loans)
+    assert unwritten == []
+    assert sorted(existing) == sorted(loan['loan_id'] for loan in originals)
+    items = stored_loans(db)
+    assert len(items) == 20
+    # The loans already stored keep their original record
+    for loan in originals:
+        assert items[loan['loan_id']]['data']['approved_at'] == '2025-01-01T00:00:00'
+
+
+def test_write_loan_chunk_of_only_duplicates(db):
+    loans = [calculator.build_loan(certificate) for certificate in certificates(5)]
+    calculator.write_loan_chunk(loans)
+    writes = db.items_written
+    assert calculator.write_loan_chunk(loans) == ([], [loan['loan_id'] for loan in loans])
+    assert db.items_written == writes
+
+
+def test_write_loan_chunk_retries_throttling(db):
+    loans = [calculator.build_loan(certificate) for certificate in certificates(10)]
+    transact = db.meta.client.transact_write_items
+    calls = []
+
+    def throttled_twice(**kwargs):
+        calls.append(1)
+        if len(calls) <= 2:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                              'TransactWriteItems')
+        return transact(**kwargs)
+
+    db.meta.client.transact_write_items = throttled_twice
+    assert calculator.write_loan_chunk(loans) == ([], [])
+    assert len(calls) == 3
+    assert len(stored_loans(db)) == 10
+
+
+def test_write_loan_chunk_gives_up_after_retries(db, monkeypatch):
+    monkeypatch.setattr(calculator, 'BATCH_MAX_RETRIES', 2)
+    loans = [calculator.build_loan(certificate) for certificate in certificates(4)]
+    calls = fail_loan_writes(db, 'ProvisionedThroughputExceededException')
+    assert calculator.write_loan_chunk(loans) == ([loan['loan_id'] for loan in loans], [])
+    assert len(calls) == 3
+
+
+def test_write_loan_chunk_raises_other_errors(db):
+    loans = [calculator.build_loan(certificate) for certificate in certificates(4)]
+    fail_loan_writes(db, 'ValidationException')
+    with pytest.raises(ClientError):
+        calculator.write_loan_chunk(loans)
+
+
+def test_batch_releases_budgets_of_loans_stored_meanwhile(db, monkeypatch):
+    budgets.create_budget(BUDGET_ID, 10 ** 6, shards=4)
+    batch = certificates(40)
+    reserve = calculator.reserve_loan_budgets
+
+    def overlapping_batch(loans):
+        # Another batch stores ten of these loans between the lookup and
+        # the write: the conditional write finds them
+        refused = reserve(loans)
+        calculator.store_loans([calculator.build_loan(certificate) for certificate in batch[:10]])
+        return refused
+
+    monkeypatch.setattr(calculator, 'reserve_loan_budgets', overlapping_batch)
+    response = calculator.batch_lambda_handler({'certificates': batch}, None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['summary']['APPROVED'] == 40
+    assert body['replayed'] == 10
+    # Only the 30 loans this batch stored keep their reservation
+    assert spent() == 30 * LOAN_AMOUNT
+
+
+def test_batch_releases_budgets_when_the_write_raises(db, monkeypatch):
+    monkeypatch.setattr(calculator, 'BATCH_WRITE_WORKERS', 1)
+    budgets.create_budget(BUDGET_ID, 10 ** 6, shards=4)
+    # The first chunk is written but its response lost, the second fails
+    fail_loan_writes(db, 'InternalServerError', write_first=True)
+    response = calculator.batch_lambda_handler({'certificates': certificates(40)}, None)
+    assert response['statusCode'] == 400
+    assert len(stored_loans(db)) == calculator.BATCH_WRITE_CHUNK
+    assert spent() == calculator.BATCH_WRITE_CHUNK * LOAN_AMOUNT
+
+
+def test_retried_batch_reserves_nothing_twice(db):
+    budgets.create_budget(BUDGET_ID, 10 ** 6, shards=4)
+    batch = certificates(30)
+    first = json.loads(calculator.batch_lambda_handler({'certificates': batch}, None)['body'])
+    calculator.RECENT_LOANS.clear()
+    retry = json.loads(calculator.batch_lambda_handler({'certificates': batch}, None)['body'])
+    assert first['summary']['APPROVED'] == retry['summary']['APPROVED'] == 30
+    assert retry['replayed'] == 30
+    assert {result['loan_status'] for result in retry['results']} == {calculator.DISBURSED}
+    assert spent() == 30 * LOAN_AMOUNT
+
+
+def test_refused_loans_hold_no_budget(db):
+    budgets.create_budget(BUDGET_ID, 10 * LOAN_AMOUNT, shards=1)
+    body = json.loads(calculator.batch_lambda_handler({'certificates': certificates(15)}, None)['body'])
+    assert body['summary'] == {'APPROVED': 10, 'REJECTED': 0, 'REFUSED': 5, 'FAILED': 0}
+    assert len(stored_loans(db)) == 10
+    assert spent() == 10 * LOAN_AMOUNT
@@ -0,0 +1,134 @@
+"""
+loan-portfolio-view.py: stream records applied once, whichever way the
+stream redelivers them
+"""
+
+import importlib
+import random
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+utils = importlib.import_module('benchmark-utils')
+local_aws = importlib.import_module('local-aws')
+calculator = utils.load_lambda_module('financial-automation', 'bridge-loan-calculator')
+worker = utils.load_lambda_module('financial-automation', 'disbursement-worker')
+view = utils.load_lambda_module('financial-automation', 'loan-portfolio-view')
+
+TABLE = 'vericrop-claims'
+DISTRICTS = ['Nashik', 'Pune', 'Satara']
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """
+    Stream records of 60 approvals, some failed disbursements and repayments
+    """
+    db = local_aws.LocalDynamoDB(stream=True)
+    monkeypatch.setattr(calculator, 'table', db.Table(TABLE))
+    monkeypatch.setattr(view, 'table', db.Table(TABLE))
+    monkeypatch.setattr(view, 'VIEW_STATS', dict.fromkeys(view.VIEW_STATS, 0))
+    monkeypatch.setattr(view, 'PORTFOLIO_RETRY_BASE_SECONDS', 0)
+    view.KNOWN_KEYS.clear()
+
+    rng = random.Random(5)
+    loans = [calculator.build_loan({
+        'certificate_id': f'CERT-{i:04d}', 'damage_amount': rng.randrange(10000, 80000),
+        'farmer_id': f'FARMER-{i % 20:04d}', 'farmer_upi': f'farmer{i}@upi', 'district': rng.choice(DISTRICTS),
+        'damage_type': rng.choice(['FLOOD', 'HAIL'])}) for i in range(60)]
+    calculator.store_loans(loans)
+    for loan in loans[:6]:
+        worker.record_status(loan, calculator.DISBURSEMENT_FAILED, 1, error='VPA closed')
+    for i, loan in enumerate(loans[10:30]):
+        calculator.record_repayment(loan['loan_id'], round(loan['loan_amount'] / 2, 2), f'UTR-{i:04d}')
+    records = db.stream_records(TABLE)
+    assert len(records) == 86
+    return records
+
+
+def deliver(records):
+    response = view.lambda_handler({'Records': records}, None)
+    assert response == {'batchItemFailures': []}
+    return response
+
+
+def assert_view_matches_scan():
+    expected = view.scan_portfolio(2)
+    assert expected
+    for (dimension, key), values in expected.items():
+        totals = view.portfolio(dimension if dimension != 'all' else None, key)
+        for field in view.FIELDS:
+            assert Decimal(str(totals[field])) == values[field], (dimension, key, field)
+
+
+def test_single_delivery_matches_the_scan(records):
+    deliver(records)
+    assert_view_matches_scan()
+    assert view.VIEW_STATS['replayed_records'] == 0
+
+
+def test_redelivered_batch_is_skipped(records):
+    deliver(records[:40])
+    deliver(records[40:])
+    totals = view.portfolio()
+    deliver(records[:40])
+    assert view.portfolio() == totals
+    assert view.VIEW_STATS['replayed_records'] == 40
+    assert_view_matches_scan()
+
+
+def test_redelivery_from_the_middle_of_an_applied_chunk(records):
+    # A bisected retry: records 20-39 come back after 0-39 were applied as
+    # one chunk, so no chunk starts where the retry does
+    deliver(records[:40])
+    assert view.VIEW_STATS['chunks'] == 1
+    totals = view.portfolio()
+    deliver(records[20:40])
+    assert view.portfolio() == totals
+    assert view.VIEW_STATS['replayed_records'] == 20
+    deliver(records[40:])
+    assert_view_matches_scan()
+
+
+def test_redelivery_overlapping_new_records(records):
+    deliver(records[:40])
+    deliver(records[30:70])
+    assert view.VIEW_STATS['replayed_records'] == 10
+    deliver(records[60:])
+    assert view.VIEW_STATS['replayed_records'] == 20
+    assert_view_matches_scan()
+
+
+def test_item_changed_twice_in_one_chunk_then_redelivered(records):
+    # A loan's approval and its failed disbursement land in one chunk; a
+    # retry holding only the failure must not take the loan off again
+    failure = next(i for i, record in enumerate(records) if record['eventName'] == 'MODIFY')
+    deliver(records[:failure + 1])
+    totals = view.portfolio()
+    deliver(records[failure:failure + 1])
+    assert view.portfolio() == totals
+    deliver(records[failure + 1:])
+    assert_view_matches_scan()
+
+
+def test_failed_chunk_is_reported_and_applied_once_on_retry(records, monkeypatch):
+    transact = view.table.meta.client.transact_write_items
+    calls = []
+
+    def fail_once(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'Internal error'}},
+                              'TransactWriteItems')
+        return transact(**kwargs)
+
+    monkeypatch.setattr(view.table.meta.client, 'transact_write_items', fail_once)
+    response = view.lambda_handler({'Records': records}, None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': records[0]['dynamodb']['SequenceNumber']}]}
+    deliver(records)
+    assert_view_matches_scan()
+
+
+def test_sequence_numbers_of_different_lengths_compare_numerically():
+    assert view.sequence_key('999999999999999999999') < view.sequence_key('1000000000000000000000')
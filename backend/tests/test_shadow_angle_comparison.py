@@ -0,0 +1,68 @@
+"""
+shadow-angle-comparison.py: wrap-aware angle deltas and risk bands
+"""
+
+import importlib
+
+import numpy as np
+import pytest
+
+utils = importlib.import_module('benchmark-utils')
+comparison = utils.load_lambda_module('forensic-validation', 'shadow-angle-comparison')
+
+
+@pytest.mark.parametrize('observed, expected, delta', [
+    (358.0, 2.0, -4.0),
+    (2.0, 358.0, 4.0),
+    (10.0, 350.0, 20.0),
+    (180.0, 0.0, -180.0),
+    (0.0, 180.0, -180.0),
+    (90.0, 90.0, 0.0),
+    (725.0, 5.0, 0.0),
+    (-30.0, 330.0, 0.0),
+])
+def test_signed_angle_delta_wraps(observed, expected, delta):
+    assert comparison.signed_angle_delta(observed, expected) == pytest.approx(delta)
+
+
+def test_signed_angle_delta_range_and_antisymmetry():
+    rng = np.random.default_rng(3)
+    observed, expected = rng.uniform(-720, 720, 10000), rng.uniform(-720, 720, 10000)
+    delta = comparison.signed_angle_delta(observed, expected)
+    assert ((delta >= -180) & (delta < 180)).all()
+    # Same direction once wrapped, and never further apart than half a turn
+    assert np.allclose(np.cos(np.radians(expected + delta - observed)), 1.0)
+    reverse = comparison.signed_angle_delta(expected, observed)
+    not_opposite = np.abs(delta) < 179.999
+    assert np.allclose(delta[not_opposite], -reverse[not_opposite])
+
+
+@pytest.mark.parametrize('observed, expected, delta', [
+    (179.0, 1.0, -2.0),
+    (1.0, 179.0, 2.0),
+    (10.0, 190.0, 0.0),
+    (90.0, 0.0, -90.0),
+    (45.0, 0.0, 45.0),
+])
+def test_axial_delta_treats_opposite_bearings_as_one_axis(observed, expected, delta):
+    assert comparison.axial_delta(observed, expected) == pytest.approx(delta)
+
+
+def test_batch_comparison_across_north():
+    result = comparison.compare_shadow_angles_batch([358.0, 1.0, 10.0, 200.0], [2.0, 355.0, 350.0, 10.0])
+    assert np.allclose(result['signed_delta'], [-4.0, 6.0, 20.0, -170.0])
+    assert np.allclose(result['variance'], [4.0, 6.0, 20.0, 170.0])
+    assert result['is_fraud'].tolist() == [False, True, True, True]
+    assert result['risk_level'].tolist() == ['LOW', 'MEDIUM', 'HIGH', 'HIGH']
+    assert [comparison.risk_level(v) for v in result['variance']] == result['risk_level'].tolist()
+
+
+def test_trajectory_offset_survives_the_axis_wrap():
+    # A steady camera heading puts the residual near ±90°, where axial
+    # deltas wrap; the unwrapped offset must not split between the two
+    times = np.arange(20) * 5.0
+    expected = 100.0 + times * 0.004
+    measured = (expected + 89.5 + np.where(np.arange(20) % 2, 1.0, -1.0)) % 180.0
+    scores = comparison.shadow_trajectory(times, measured, expected)
+    assert abs(comparison.axial_delta(scores['offset_deg'], 89.5)) < 1.5
+    assert scores['splice_score'] < 3
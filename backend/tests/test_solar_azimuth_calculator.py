@@ -0,0 +1,110 @@
+"""
+solar-azimuth-calculator.py: the vectorized model against the scalar one,
+and the inverse capture-window solver
+"""
+
+import importlib
+import json
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+utils = importlib.import_module('benchmark-utils')
+solar = utils.load_lambda_module('forensic-validation', 'solar-azimuth-calculator')
+
+# Pune
+LATITUDE, LONGITUDE = 18.5204, 73.8567
+
+
+def azimuth_delta(a, b):
+    return (np.asarray(a) - np.asarray(b) + 180) % 360 - 180
+
+
+def random_observations(count, seed=7):
+    rng = np.random.default_rng(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    end = datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+    return rng.uniform(-65, 65, count), rng.uniform(-180, 180, count), rng.uniform(start, end, count)
+
+
+def test_batch_azimuth_matches_scalar():
+    latitudes, longitudes, epochs = random_observations(2000)
+    azimuths, altitudes = solar.calculate_solar_azimuth_batch(latitudes, longitudes, epochs)
+    expected = np.array([solar.calculate_solar_position(*observation)
+                         for observation in zip(latitudes, longitudes, epochs)])
+    # Azimuth is undefined at the zenith: compare where the sun is not overhead
+    away_from_zenith = expected[:, 1] < 89
+    assert away_from_zenith.sum() > 1900
+    assert np.abs(azimuth_delta(azimuths, expected[:, 0]))[away_from_zenith].max() < 1e-6
+    assert np.abs(altitudes - expected[:, 1]).max() < 1e-6
+
+
+def test_batch_geometry_matches_scalar():
+    latitudes, longitudes, epochs = random_observations(300, seed=11)
+    batch = solar.calculate_solar_geometry_batch(latitudes, longitudes, epochs)
+    for i, observation in enumerate(zip(latitudes, longitudes, epochs)):
+        scalar = solar.calculate_solar_geometry(*observation)
+        assert abs(batch['altitude'][i] - scalar['altitude']) < 1e-6
+        for field in ('sunrise', 'solar_noon', 'sunset'):
+            if scalar[field] is None:
+                assert np.isnan(batch[field][i])
+            else:
+                assert abs(batch[field][i] - scalar[field]) < 1e-3
+
+
+def test_batch_handles_the_turn_of_the_tropical_year():
+    # The ephemeris table's last row covers the year's 0.2422-day remainder
+    epochs = solar.EPHEMERIS_EPOCH + solar.TROPICAL_YEAR_DAYS * 86400 + np.linspace(-2 * 86400, 2 * 86400, 97)
+    azimuths, _ = solar.calculate_solar_azimuth_batch(np.full(97, LATITUDE), np.full(97, LONGITUDE), epochs)
+    expected = [solar.calculate_solar_position(LATITUDE, LONGITUDE, epoch)[0] for epoch in epochs]
+    assert np.abs(azimuth_delta(azimuths, expected)).max() < 1e-6
+
+
+def test_capture_windows_contain_the_true_capture_time():
+    captured = datetime(2025, 3, 14, 5, 30, tzinfo=timezone.utc)  # 11:00 IST
+    azimuth, altitude = solar.calculate_solar_position(LATITUDE, LONGITUDE, captured.timestamp())
+    assert altitude > 0
+
+    windows = solar.find_capture_windows(LATITUDE, LONGITUDE, azimuth, date(2025, 3, 14), tolerance=2.0)
+    containing = [window for window in windows
+                  if window['start'] <= captured.isoformat().replace('+00:00', 'Z') <= window['end']]
+    assert len(containing) == 1
+    window = containing[0]
+    assert 0 < window['duration_seconds'] < 3 * 3600
+    assert abs(window['closest_delta']) <= 0.5
+
+
+def test_capture_window_edges_sit_on_the_tolerance():
+    tolerance = 3.0
+    observed, _ = solar.calculate_solar_position(
+        LATITUDE, LONGITUDE, datetime(2025, 6, 1, 3, 0, tzinfo=timezone.utc).timestamp())
+    windows = solar.find_capture_windows(LATITUDE, LONGITUDE, observed, date(2025, 6, 1), tolerance=tolerance,
+                                         resolution_seconds=1)
+    assert windows
+    for window in windows:
+        for edge, outward in ((window['start'], -2), (window['end'], 2)):
+            epoch = datetime.fromisoformat(edge.replace('Z', '+00:00')).timestamp()
+            inside, _ = solar.calculate_solar_position(LATITUDE, LONGITUDE, epoch)
+            outside, altitude = solar.calculate_solar_position(LATITUDE, LONGITUDE, epoch + outward)
+            assert abs(azimuth_delta(inside, observed)) <= tolerance + 0.01
+            assert abs(azimuth_delta(outside, observed)) > tolerance or altitude < 0
+
+
+def test_no_capture_window_when_the_sun_never_reaches_the_azimuth():
+    # At 60°N in December the sun stays in the southern sky
+    assert solar.find_capture_windows(60.0, 10.0, 0.0, date(2025, 12, 21), tolerance=5.0) == []
+
+
+def test_min_altitude_trims_the_windows():
+    low = solar.find_capture_windows(LATITUDE, LONGITUDE, 250.0, date(2025, 1, 10), tolerance=10.0)
+    high = solar.find_capture_windows(LATITUDE, LONGITUDE, 250.0, date(2025, 1, 10), tolerance=10.0,
+                                      min_altitude=30.0)
+    assert low
+    assert sum(w['duration_seconds'] for w in high) < sum(w['duration_seconds'] for w in low)
+
+
+def test_capture_window_handler_rejects_a_bad_date():
+    response = solar.handle_capture_windows({'latitude': LATITUDE, 'longitude': LONGITUDE,
+                                             'observed_azimuth': 120, 'date': '2025-02-30'})
+    assert response['statusCode'] == 400
+    assert 'error' in json.loads(response['body'])
@@ -9,6 +9,27 @@ const TABLE_NAME = 'VeriCropClaims';
 
 const client = new DynamoDBClient({ region: REGION });
 
+// Loan lookup indexes queried by the Python bridge loan Lambdas; keep in
+// step with LOAN_INDEXES in backend/src/financial-automation/bridge-loan-calculator.py
+const LOAN_INDEXES = [
+  { IndexName: 'FarmerLoanIndex', hashKey: 'farmerId' },
+  { IndexName: 'CertificateLoanIndex', hashKey: 'certificateId' },
+].map(({ IndexName, hashKey }) => ({
+  IndexName,
+  KeySchema: [
+    { AttributeName: hashKey, KeyType: 'HASH' },
+    { AttributeName: 'sortKey', KeyType: 'RANGE' },
+  ],
+  Projection: {
+    ProjectionType: 'INCLUDE',
+    NonKeyAttributes: ['type', 'loanId', 'amount', 'loanStatus'],
+  },
+  ProvisionedThroughput: {
+    ReadCapacityUnits: 5,
+    WriteCapacityUnits: 5,
+  },
+}));
+
 async function createTable() {
   console.log('🔧 Creating DynamoDB table...\n');
   
@@ -21,6 +42,13 @@ async function createTable() {
       console.log(`   Table Name: ${TABLE_NAME}`);
       console.log(`   Status: ${existingTable.Table.TableStatus}`);
       console.log(`   Region: ${REGION}`);
+      const indexNames = (existingTable.Table.GlobalSecondaryIndexes || []).map(index => index.IndexName);
+      const missing = LOAN_INDEXES.filter(index => !indexNames.includes(index.IndexName));
+      if (missing.length > 0) {
+        console.log(`\n⚠️  Missing loan indexes: ${missing.map(index => index.IndexName).join(', ')}`);
+        console.log('   Add them and backfill existing loans with:');
+        console.log(`   python ../backend/src/financial-automation/loan-index-migration.py --table ${TABLE_NAME}`);
+      }
       return;
     } catch (error) {
       if (error.name !== 'ResourceNotFoundException') {
@@ -35,6 +63,7 @@ async function createTable() {
         { AttributeName: 'claimId', AttributeType: 'S' },
         { AttributeName: 'certificateId', AttributeType: 'S' },
         { AttributeName: 'farmerId', AttributeType: 'S' },
+        { AttributeName: 'sortKey', AttributeType: 'S' },
       ],
       KeySchema: [
         { AttributeName: 'claimId', KeyType: 'HASH' },
@@ -62,6 +91,7 @@ async function createTable() {
             WriteCapacityUnits: 5,
           },
         },
+        ...LOAN_INDEXES,
       ],
       ProvisionedThroughput: {
         ReadCapacityUnits: 5,
@@ -22,10 +22,14 @@ aws dynamodb create-table ^
   --attribute-definitions ^
     AttributeName=claimId,AttributeType=S ^
     AttributeName=certificateId,AttributeType=S ^
+    AttributeName=farmerId,AttributeType=S ^
+    AttributeName=sortKey,AttributeType=S ^
   --key-schema ^
     AttributeName=claimId,KeyType=HASH ^
   --global-secondary-indexes ^
     "IndexName=CertificateIndex,KeySchema=[{AttributeName=certificateId,KeyType=HASH}],Projection={ProjectionType=ALL},ProvisionedThroughput={ReadCapacityUnits=5,WriteCapacityUnits=5}" ^
+    "IndexName=FarmerLoanIndex,KeySchema=[{AttributeName=farmerId,KeyType=HASH},{AttributeName=sortKey,KeyType=RANGE}],Projection={ProjectionType=INCLUDE,NonKeyAttributes=[type,loanId,amount,loanStatus]},ProvisionedThroughput={ReadCapacityUnits=5,WriteCapacityUnits=5}" ^
+    "IndexName=CertificateLoanIndex,KeySchema=[{AttributeName=certificateId,KeyType=HASH},{AttributeName=sortKey,KeyType=RANGE}],Projection={ProjectionType=INCLUDE,NonKeyAttributes=[type,loanId,amount,loanStatus]},ProvisionedThroughput={ReadCapacityUnits=5,WriteCapacityUnits=5}" ^
   --provisioned-throughput ^
     ReadCapacityUnits=5,WriteCapacityUnits=5 ^
   --region ap-south-1 2>nul